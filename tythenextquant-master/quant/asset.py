@@ -20,15 +20,20 @@ class Asset:
         assets: Asset information, e.g. {"BTC": {"free": "1.1", "locked": "2.2", "total": "3.3"}, ... }
         timestamp: Published time, millisecond.
         update: If any update? True or False.
+        ltime: Local receive time, millisecond.
+        latency: Latency corrected by exchange clock offset, millisecond.
     """
 
-    def __init__(self, platform=None, account=None, assets=None, timestamp=None, update=False):
+    def __init__(self, platform=None, account=None, assets=None, timestamp=None, update=False, ltime=None,
+                 latency=None):
         """ Initialize. """
         self.platform = platform
         self.account = account
         self.assets = assets
         self.timestamp = timestamp
         self.update = update
+        self.ltime = ltime
+        self.latency = latency
 
     @property
     def data(self):
@@ -0,0 +1,426 @@
+# -*- coding:utf-8 -*-
+
+"""
+Vectorized kline backtest and parameter sweep.
+A signal function maps kline columns to the target position of every bar, e.g. 1 is long, -1 is short and 0 is flat,
+then returns, costs, equity and metrics of the whole series are computed with NumPy at once. The position decided at
+the close of a bar is held during the next bar, so there is no look-ahead.
+
+Parameter grids are evaluated in a process pool, kline columns are copied into one shared memory block once and
+attached by every worker without copy, so thousands of combinations are evaluated in seconds on one machine.
+
+A signal function must be defined at module level to be used by worker processes, it's called as
+`signal(columns, **params)` and returns an array of positions, the same length as `columns["c"]`, or None to skip
+invalid parameters, e.g. a fast average longer than the slow one.
+
+Usage:
+    columns = await load_klines("binance", "BTC/USDT", start, end)
+    result = backtest(columns, sma_cross, fee=0.001, fast=10, slow=30)
+    results = sweep(columns, sma_cross, {"fast": range(5, 50, 5), "slow": range(20, 200, 10)}, fee=0.001)
+    print(format_table(results[:20]))
+
+Benchmark:
+    python -m quant.backtest --bars 500000 --signal sma_cross --grid fast=5:100:5 slow=20:400:20
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import os
+import sys
+import math
+import time
+import asyncio
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from quant.utils import logger
+
+
+__all__ = ("backtest", "sweep", "evaluate", "load_klines", "format_table", "sma_cross", "breakout", "SIGNALS", )
+
+
+YEAR = 365 * 24 * 60 * 60 * 1000  # Milliseconds per year.
+METRICS = ("total_return", "annual_return", "sharpe", "max_drawdown", "trades", "turnover", "exposure")
+
+
+def sma_cross(columns, fast=10, slow=30, short=False):
+    """ Moving average cross, long when the fast average of close is above the slow one.
+
+    Args:
+        columns: Kline columns, e.g. {"t": [...], "c": [...], ...}
+        fast: Bars of the fast average.
+        slow: Bars of the slow average.
+        short: If True, short when the fast average is below the slow one, otherwise flat.
+
+    Returns:
+        positions: Target position of every bar.
+    """
+    import numpy as np
+    close = columns["c"]
+    if fast >= slow:
+        return None
+    positions = np.zeros(len(close))
+    if slow > len(close):
+        return positions
+    s = _cached("cumsum", close, lambda c: np.concatenate(([0.0], np.cumsum(c))))
+    fast_ma = (s[slow:] - s[slow - fast:-fast]) / fast
+    slow_ma = (s[slow:] - s[:-slow]) / slow
+    positions[slow - 1:] = np.where(fast_ma > slow_ma, 1.0, -1.0 if short else 0.0)
+    return positions
+
+
+def breakout(columns, window=20, short=False):
+    """ Channel breakout, long when close breaks the highest high of the previous `window` bars, and exit when close
+    breaks the lowest low of them.
+
+    Args:
+        columns: Kline columns, e.g. {"t": [...], "h": [...], "l": [...], "c": [...], ...}
+        window: Bars of the channel.
+        short: If True, short when close breaks the lowest low, otherwise flat.
+
+    Returns:
+        positions: Target position of every bar.
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+    close, high, low = columns["c"], columns["h"], columns["l"]
+    n = len(close)
+    positions = np.zeros(n)
+    if window >= n:
+        return positions
+    upper = sliding_window_view(high, window).max(axis=1)[:-1]  # Channel of bars [i - window, i).
+    lower = sliding_window_view(low, window).min(axis=1)[:-1]
+    signal = np.full(n, np.nan)
+    signal[window:][close[window:] > upper] = 1.0
+    signal[window:][close[window:] < lower] = -1.0 if short else 0.0
+    # Hold the last signal until the next one.
+    index = np.where(np.isnan(signal), 0, np.arange(n))
+    np.maximum.accumulate(index, out=index)
+    positions = signal[index]
+    positions[np.isnan(positions)] = 0
+    return positions
+
+
+_cache = {}  # Arrays derived from kline columns, shared by backtests of a sweep, e.g. {(name, id): (source, result)}
+
+
+def _cached(name, array, func):
+    """ Get `func(array)` computed once for the same array, e.g. returns of close prices.
+    """
+    key = (name, id(array))
+    value = _cache.get(key)
+    if value is None or value[0] is not array:
+        if len(_cache) >= 16:
+            _cache.clear()
+        value = (array, func(array))
+        _cache[key] = value
+    return value[1]
+
+
+def _bar_returns(close):
+    import numpy as np
+    returns = np.empty(len(close))
+    returns[0] = 0
+    np.divide(close[1:], close[:-1], out=returns[1:])
+    returns[1:] -= 1
+    return returns
+
+
+SIGNALS = {
+    "sma_cross": sma_cross,
+    "breakout": breakout
+}
+
+
+def evaluate(columns, positions, fee=0, slippage=0):
+    """ Evaluate positions over kline columns.
+
+    Args:
+        columns: Kline columns, `t` and `c` are used.
+        positions: Target position of every bar, decided at the close of the bar.
+        fee: Fee rate of the traded value.
+        slippage: Slippage rate of the traded value.
+
+    Returns:
+        result: e.g. {"total_return": 0.1, "annual_return": 0.05, "sharpe": 1.2, "max_drawdown": -0.08,
+            "trades": 10, "turnover": 20.0, "exposure": 0.5}
+    """
+    import numpy as np
+    t, close = columns["t"], columns["c"]
+    n = len(close)
+    if n < 2:
+        return {m: 0 for m in METRICS}
+    positions = np.nan_to_num(np.asarray(positions, dtype=np.float64))
+    returns = _cached("returns", close, _bar_returns)
+    changes = np.empty(n)
+    changes[0] = positions[0]
+    np.subtract(positions[1:], positions[:-1], out=changes[1:])
+    np.abs(changes, out=changes)
+    # The position of a bar is held during the next bar.
+    pnl = np.empty(n)
+    pnl[0] = 0
+    np.multiply(positions[:-1], returns[1:], out=pnl[1:])
+    if fee or slippage:
+        pnl -= changes * (fee + slippage)
+    equity = np.add(pnl, 1)
+    np.cumprod(equity, out=equity)
+    peak = np.maximum.accumulate(equity)
+    max_drawdown = float((equity / peak).min() - 1)
+
+    years = (int(t[-1]) - int(t[0])) / YEAR
+    total = float(equity[-1] - 1)
+    std = float(pnl.std())
+    periods = (n - 1) / years if years > 0 else 0
+    result = {
+        "total_return": total,
+        "annual_return": (1 + total) ** (1 / years) - 1 if years > 0 and total > -1 else -1.0 if total <= -1 else 0,
+        "sharpe": float(pnl.mean()) / std * math.sqrt(periods) if std > 0 and periods else 0,
+        "max_drawdown": max_drawdown,
+        "trades": int(np.count_nonzero(changes)),
+        "turnover": float(changes.sum()),
+        "exposure": float(np.count_nonzero(positions[:-1]) / n)
+    }
+    return result
+
+
+def backtest(columns, signal, fee=0, slippage=0, **params):
+    """ Backtest a signal with a set of parameters.
+
+    Args:
+        columns: Kline columns, e.g. {"t": int64 array, "o": ..., "h": ..., "l": ..., "c": ..., "v": ...}
+        signal: Signal function, or its name in `SIGNALS`.
+        fee: Fee rate of the traded value.
+        slippage: Slippage rate of the traded value.
+        params: Parameters of the signal function.
+
+    Returns:
+        result: Parameters and metrics, e.g. {"fast": 10, "slow": 30, "total_return": 0.1, "sharpe": 1.2, ...}, None if
+            the signal function returns None, e.g. invalid parameters.
+    """
+    if isinstance(signal, str):
+        signal = SIGNALS[signal]
+    positions = signal(columns, **params)
+    if positions is None:
+        return None
+    result = dict(params)
+    result.update(evaluate(columns, positions, fee, slippage))
+    return result
+
+
+_shared = None  # (shared memory, columns) attached by a worker process.
+
+
+def _share(columns):
+    """ Copy kline columns into a shared memory block.
+
+    Returns:
+        (shm, layout): Shared memory and layout of columns, e.g. [(column, dtype, offset, length), ...]
+    """
+    import numpy as np
+    from multiprocessing import shared_memory
+    arrays = {c: np.ascontiguousarray(v) for c, v in columns.items()}
+    layout = []
+    offset = 0
+    for c, a in arrays.items():
+        layout.append((c, a.dtype.str, offset, len(a)))
+        offset += a.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (c, dtype, offset, length), a in zip(layout, arrays.values()):
+        np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)[:] = a
+    return shm, layout
+
+
+def _attach(name, layout):
+    """Worker initializer, attach shared kline columns."""
+    global _shared
+    import numpy as np
+    from multiprocessing import shared_memory
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13, workers share the resource tracker of the parent, which unlinks the block once.
+        shm = shared_memory.SharedMemory(name=name)
+    columns = {}
+    for c, dtype, offset, length in layout:
+        a = np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)
+        a.flags.writeable = False
+        columns[c] = a
+    _shared = (shm, columns)
+
+
+def _run_shared(task):
+    signal, params, fee, slippage = task
+    try:
+        return backtest(_shared[1], signal, fee, slippage, **params)
+    except Exception as e:
+        logger.error("backtest error:", e, "params:", params, caller="backtest")
+        return None
+
+
+def sweep(columns, signal, grid, fee=0, slippage=0, workers=None, sort="sharpe", chunksize=None):
+    """ Backtest every combination of a parameter grid, in a process pool.
+
+    Args:
+        columns: Kline columns, e.g. {"t": int64 array, "c": float64 array, ...}
+        signal: Signal function defined at module level, or its name in `SIGNALS`.
+        grid: Values of every parameter, e.g. {"fast": [5, 10, 20], "slow": range(20, 200, 10)}
+        fee: Fee rate of the traded value.
+        slippage: Slippage rate of the traded value.
+        workers: Worker processes, default is the number of CPU cores, 1 to run in this process.
+        sort: Metric to rank results by, descending, default is "sharpe".
+        chunksize: Combinations sent to a worker at a time, default is about 4 chunks per worker.
+
+    Returns:
+        results: Results of all combinations ranked by `sort`, e.g. [{"fast": 10, "slow": 30, "sharpe": 1.2, ...}, ...],
+            None if NumPy not installed.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        logger.error("numpy not installed, `pip install numpy` to run backtests.", caller="backtest")
+        return None
+    if isinstance(signal, str):
+        signal = SIGNALS[signal]
+    columns = {c: np.asarray(v) for c, v in columns.items()}
+    keys = list(grid.keys())
+    tasks = [(signal, dict(zip(keys, values)), fee, slippage) for values in itertools.product(*grid.values())]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        results = []
+        for _, params, _, _ in tasks:
+            result = backtest(columns, signal, fee, slippage, **params)
+            if result:
+                results.append(result)
+    else:
+        shm, layout = _share(columns)
+        try:
+            with ProcessPoolExecutor(workers, initializer=_attach, initargs=(shm.name, layout)) as executor:
+                chunksize = chunksize or max(1, len(tasks) // (workers * 4))
+                results = [r for r in executor.map(_run_shared, tasks, chunksize=chunksize) if r]
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def key(r):
+        v = r.get(sort)
+        return -math.inf if v is None or v != v else v
+
+    results.sort(key=key, reverse=True)
+    return results
+
+
+async def load_klines(platform, symbol, start, end, resolution="1m"):
+    """ Load kline columns from the kline store of `KLINE_STORE.backend` config.
+
+    Args:
+        platform: Exchange platform name.
+        symbol: Symbol pair, e.g. BTC/USDT.
+        start: Millisecond timestamp.
+        end: Millisecond timestamp.
+        resolution: Kline resolution, default is "1m".
+
+    Returns:
+        columns: {"t": int64 array, "o": float64 array, ...}, None if failed.
+    """
+    import numpy as np
+    from quant.data import get_kline_data
+    result = await get_kline_data(platform).get_kline_columns(symbol, start, end, resolution)
+    if result is None:
+        return None
+    return {c: np.asarray(v) for c, v in result.items()}
+
+
+def format_table(results, keys=None):
+    """ Format results as a text table.
+
+    Args:
+        results: Results of `sweep`.
+        keys: Columns of the table, default is all parameters and metrics.
+
+    Returns:
+        table: Text table, a row per result.
+    """
+    if not results:
+        return ""
+    keys = keys or list(results[0].keys())
+    rows = [[str(i + 1)] + ["{:.4f}".format(r[k]) if isinstance(r[k], float) else str(r[k]) for k in keys]
+            for i, r in enumerate(results)]
+    header = ["rank"] + keys
+    widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+    lines = ["  ".join(v.rjust(w) for v, w in zip(row, widths)) for row in [header] + rows]
+    return "\n".join(lines)
+
+
+def _parse_grid(items):
+    """ Parse grid arguments, e.g. ["fast=5:50:5", "short=0,1"] -> {"fast": [5, 10, ..., 50], "short": [0, 1]}"""
+    grid = {}
+    for item in items:
+        name, values = item.split("=", 1)
+        number = float if "." in values else int
+        if ":" in values:
+            start, stop, step = (number(v) for v in values.split(":"))
+            count = int(round((stop - start) / step)) + 1
+            grid[name] = [start + step * i for i in range(count)]
+        else:
+            grid[name] = [number(v) for v in values.split(",")]
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized kline backtest parameter sweep.")
+    parser.add_argument("config", nargs="?", help="Config file, with `KLINE_STORE` or `MONGODB`.")
+    parser.add_argument("--platform", default="binance")
+    parser.add_argument("--symbol", default="BTC/USDT")
+    parser.add_argument("--start", type=int, help="Start time in milliseconds.")
+    parser.add_argument("--end", type=int, help="End time in milliseconds.")
+    parser.add_argument("--resolution", default="1m")
+    parser.add_argument("--bars", type=int, help="Use random walk klines of this many bars instead of the store.")
+    parser.add_argument("--signal", default="sma_cross", choices=sorted(SIGNALS))
+    parser.add_argument("--grid", nargs="+", default=["fast=5:100:5", "slow=20:400:20"],
+                        help="Parameter values, e.g. fast=5:100:5 (start:stop:step, inclusive) or short=0,1.")
+    parser.add_argument("--fee", type=float, default=0.001)
+    parser.add_argument("--slippage", type=float, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sort", default="sharpe", choices=METRICS)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    import numpy as np
+    if args.bars:
+        rnd = np.random.default_rng(1)
+        close = 10000 * np.exp(np.cumsum(rnd.normal(0, 0.001, args.bars)))
+        noise = np.abs(rnd.normal(0, 0.0005, args.bars)) * close
+        columns = {
+            "t": 1570000000000 + np.arange(args.bars, dtype=np.int64) * 60000,
+            "o": np.concatenate(([close[0]], close[:-1])),
+            "h": close + noise,
+            "l": close - noise,
+            "c": close,
+            "v": np.ones(args.bars)
+        }
+    else:
+        from quant.config import config
+        config.loads(args.config)
+        columns = asyncio.get_event_loop().run_until_complete(
+            load_klines(args.platform, args.symbol, args.start, args.end, args.resolution))
+        if not columns or len(columns["t"]) < 2:
+            print("no klines loaded.")
+            sys.exit(1)
+
+    grid = _parse_grid(args.grid)
+    combinations = 1
+    for values in grid.values():
+        combinations *= len(values)
+    begin = time.perf_counter()
+    results = sweep(columns, args.signal, grid, args.fee, args.slippage, args.workers, args.sort)
+    elapsed = time.perf_counter() - begin
+    print(format_table(results[:args.top]))
+    print("bars: {} combinations: {} elapsed: {:.3f}s combinations/s: {:.1f}".format(
+        len(columns["t"]), combinations, elapsed, combinations / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -22,12 +22,17 @@ class Config:
             SERVER_ID: Server id, every running process has a unique id.
             RUN_TIME_UPDATE: If this server support run-time-update(receive EventConfig), True or False, default is False.
             LOG: Logger print config.
+            LOOP: Event loop config, e.g. {"uvloop": true, "monitor": true}, default is {}.
             RABBITMQ: RabbitMQ config, default is None.
+            EVENT_BUS: Event bus config, e.g. {"mode": "hybrid"}, mode is `local` / `broker` / `hybrid`, default is {}.
             MONGODB: MongoDB config, default is None.
+            KLINE_STORE: Kline storage config, e.g. {"backend": "local", "path": "data/kline"}, default is {}.
+            RECORDER: Raw Websocket frame recorder config, e.g. {"path": "data/frames"}, default is {}.
             REDIS: Redis config, default is None.
             PLATFORMS: Trading Exchanges config, default is {}.
             ACCOUNTS: Trading Exchanges config list, default is [].
             MARKETS: Market Server config list, default is {}.
+            MARKET_SERVER: Multi-process market server config, e.g. {"workers": 4}, default is {}.
             HEARTBEAT: Server heartbeat config, default is {}.
             PROXY: HTTP proxy config, default is None.
     """
@@ -36,12 +41,17 @@ class Config:
         self.server_id = None
         self.run_time_update = False
         self.log = {}
+        self.loop = {}
         self.rabbitmq = {}
+        self.event_bus = {}
         self.mongodb = {}
+        self.kline_store = {}
+        self.recorder = {}
         self.redis = {}
         self.platforms = {}
         self.accounts = []
         self.markets = {}
+        self.market_server = {}
         self.heartbeat = {}
         self.proxy = None
 
@@ -107,12 +117,17 @@ class Config:
         self.server_id = update_fields.get("SERVER_ID", tools.get_uuid1())
         self.run_time_update = update_fields.get("RUN_TIME_UPDATE", False)
         self.log = update_fields.get("LOG", {})
+        self.loop = update_fields.get("LOOP", {})
         self.rabbitmq = update_fields.get("RABBITMQ", None)
+        self.event_bus = update_fields.get("EVENT_BUS", {})
         self.mongodb = update_fields.get("MONGODB", None)
+        self.kline_store = update_fields.get("KLINE_STORE", {})
+        self.recorder = update_fields.get("RECORDER", {})
         self.redis = update_fields.get("REDIS", None)
         self.platforms = update_fields.get("PLATFORMS", {})
         self.accounts = update_fields.get("ACCOUNTS", [])
         self.markets = update_fields.get("MARKETS", {})
+        self.market_server = update_fields.get("MARKET_SERVER", {})
         self.heartbeat = update_fields.get("HEARTBEAT", {})
         self.proxy = update_fields.get("PROXY", None)
 
@@ -35,6 +35,7 @@ MEXC = "mexc"  # mexc https://www.mexc.com/zh-CN
 BYBIT = "bybit"  # bybit https://www.bybit.com/
 BITGET = "bitget"  # bitget SPOT https://www.bitget.me/spot/trade
 OKX = "okx"  # OKx SPOT https://www.okx.me/spot/trade
+SIM = "sim"  # Simulated exchange for backtesting, see `quant.platform.sim`
 
 
 
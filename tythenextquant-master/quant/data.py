@@ -2,16 +2,71 @@
 
 """
 Data to db.
+Inserts and updates are buffered by the bulk writer of every collection and written in batches, call `flush` to write
+them immediately, e.g. before reading them back.
+Indexes of time fields are created on first use of a collection. Old klines and asset snapshots are downsampled to
+coarser resolutions by rollup jobs, pass `resolution="auto"` to queries to get the finest resolution that fits
+`MAX_POINTS` documents.
+`LocalKLineData` has the same API as `KLineData` and saves klines in local column files without MongoDB, use
+`get_kline_data` to get the one of `KLINE_STORE.backend` config.
 
 Author: xunfeng
 Date:   2018/05/17
 Email:  xunfeng@test.com
 """
 
+import os
+import asyncio
+import collections
+
 from quant.utils import tools
+from quant.utils import logger
 from quant.asset import Asset
 from quant.market import Kline
-from quant.utils.mongo import MongoDBBase
+from quant.config import config
+from quant.tasks import LoopRunTask
+
+
+MAX_POINTS = 2000  # Max documents returned by queries with `resolution="auto"`.
+
+# Resolutions of klines and their bucket size(milliseconds), `1m` is the raw kline collection.
+KLINE_RESOLUTIONS = collections.OrderedDict([
+    ("1m", 60 * 1000),
+    ("15m", 15 * 60 * 1000),
+    ("1h", 60 * 60 * 1000),
+    ("1d", 24 * 60 * 60 * 1000)
+])
+
+# Resolutions of asset snapshots and their bucket size(milliseconds), `raw` is the snapshot collection, saved about
+# every minute.
+SNAPSHOT_RESOLUTIONS = collections.OrderedDict([
+    ("raw", 60 * 1000),
+    ("1h", 60 * 60 * 1000),
+    ("1d", 24 * 60 * 60 * 1000)
+])
+
+
+def pick_resolution(start, end, resolutions, max_points=MAX_POINTS, retention=None):
+    """ Pick the finest resolution that returns at most `max_points` documents between two timestamps.
+
+    Args:
+        start: Millisecond timestamp.
+        end: Millisecond timestamp.
+        resolutions: Resolutions and bucket size, e.g. `KLINE_RESOLUTIONS`.
+        max_points: Max documents, default is `MAX_POINTS`.
+        retention: How long(milliseconds) data of resolutions is kept, e.g. {"1m": 30 * 24 * 60 * 60 * 1000}, a
+            resolution whose data before `start` is deleted is skipped.
+
+    Returns:
+        resolution: Resolution name, e.g. "15m".
+    """
+    now = tools.get_cur_timestamp_ms()
+    for name, ms in resolutions.items():
+        if retention and retention.get(name) and start < now - retention[name]:
+            continue
+        if (end - start) / ms <= max_points:
+            return name
+    return list(resolutions)[-1]
 
 
 class KLineData:
@@ -26,18 +81,27 @@ class KLineData:
             "t": timestamp # Millisecond timestamp
         }
 
+    Rollup collections of a resolution are named by the suffix, e.g. `kline_BTCUSDT_1h`, with an extra field
+    "n", the number of 1m klines in the bucket.
+
     Attributes:
         platform: Exchange platform name.
+        retention: How long(milliseconds) klines of resolutions are kept, only `1m` klines are deleted by the rollup
+            job, after rolled up, e.g. {"1m": 30 * 24 * 60 * 60 * 1000}. Default is None, kept forever.
     """
 
-    def __init__(self, platform):
+    def __init__(self, platform, retention=None):
         """ Initialize object.
         """
         self._db_name = platform  # Db name. => MongoDB db name.
         self._collection = "kline"  # Table name. => MongoDB collection name.
         self._platform = platform
+        self._retention = retention or {}
         self._k_to_c = {}   # Kline types cursor for db. e.g. {"BTC/USD": "kline_btc_usd"}
+        from quant.utils.mongo import MongoDBBase
         self._db = MongoDBBase(self._db_name, self._collection)  # db instance
+        self._rollup_symbols = []
+        self._rolling = False
 
     async def create_new_kline(self, kline: Kline):
         """ Insert kline data to db.
@@ -48,7 +112,7 @@ class KLineData:
         Returns:
             kline_id: Kline id, it's a MongoDB document _id.
         """
-        cursor = self._get_kline_cursor_by_symbol(kline.symbol)
+        cursor = await self._get_cursor(kline.symbol)
         data = {
             "o": kline.open,
             "h": kline.high,
@@ -57,7 +121,7 @@ class KLineData:
             "v": kline.volume,
             "t": kline.timestamp
         }
-        kline_id = await self._db.insert(data, cursor=cursor)
+        kline_id = await self._db.bulk_writer(cursor).insert(data)
         return kline_id
 
     async def get_kline_at_ts(self, symbol, ts=None):
@@ -70,7 +134,7 @@ class KLineData:
         Returns:
             result: kline data, dict format. If no any data in db, result is None.
         """
-        cursor = self._get_kline_cursor_by_symbol(symbol)
+        cursor = await self._get_cursor(symbol)
         if ts:
             spec = {"t": {"$lte": ts}}
         else:
@@ -93,18 +157,35 @@ class KLineData:
         result = await self._db.find_one(sort=sort, cursor=cursor)
         return result
 
-    async def get_kline_between_ts(self, symbol, start, end):
+    async def get_kline_between_ts(self, symbol, start, end, resolution="1m"):
         """ Get some kline data between two timestamps.
 
         Args:
             symbol: Symbol pair, e.g. ETH/BTC.
             start: Millisecond timestamp, the start time you want to specific.
             end: Millisecond timestamp, the end time you want to specific.
+            resolution: Resolution in `KLINE_RESOLUTIONS`, or "auto" to pick by `pick_resolution`, default is "1m".
 
         Returns:
             result: kline data, list format. If no any data in db, result is a empty list.
         """
-        cursor = self._get_kline_cursor_by_symbol(symbol)
+        datas = [item async for item in self.iter_kline_between_ts(symbol, start, end, resolution)]
+        return datas
+
+    async def iter_kline_between_ts(self, symbol, start, end, resolution="1m", batch_size=1000):
+        """ Iterate kline data between two timestamps in time order, fetched in batches.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            start: Millisecond timestamp, the start time you want to specific.
+            end: Millisecond timestamp, the end time you want to specific.
+            resolution: Resolution in `KLINE_RESOLUTIONS`, or "auto" to pick by `pick_resolution`, default is "1m".
+            batch_size: Klines per batch fetched from db, default is 1000.
+
+        Yield:
+            kline: kline data, dict format.
+        """
+        cursor = await self._get_cursor(symbol, self.pick_resolution(start, end, resolution))
         spec = {
             "t": {
                 "$gte": start,
@@ -116,27 +197,192 @@ class KLineData:
             "update_time": 0
         }
         _sort = [("t", 1)]
-        datas = await self._db.get_list(spec, fields=fields, sort=_sort, cursor=cursor)
-        return datas
+        async for item in self._db.iter_list(spec, fields=fields, sort=_sort, batch_size=batch_size, cursor=cursor):
+            yield item
+
+    async def get_kline_columns(self, symbol, start, end, resolution="1m"):
+        """ Get kline data between two timestamps as NumPy arrays in time order.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            start: Millisecond timestamp, the start time you want to specific.
+            end: Millisecond timestamp, the end time you want to specific.
+            resolution: Resolution in `KLINE_RESOLUTIONS`, or "auto" to pick by `pick_resolution`, default is "1m".
+
+        Returns:
+            result: {"t": int64 array, "o": float64 array, "h": ..., "l": ..., "c": ..., "v": ...}, None if NumPy not
+                installed.
+        """
+        cursor = await self._get_cursor(symbol, self.pick_resolution(start, end, resolution))
+        spec = {
+            "t": {
+                "$gte": start,
+                "$lte": end
+            }
+        }
+        result = await self._db.get_columns(spec, sort=[("t", 1)], cursor=cursor)
+        return result
+
+    async def get_kline_times(self, symbol, start, end, resolution="1m"):
+        """ Get timestamps of klines between two timestamps in time order, e.g. to find missing klines.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            start: Millisecond timestamp, the start time you want to specific.
+            end: Millisecond timestamp, the end time you want to specific.
+            resolution: Resolution in `KLINE_RESOLUTIONS`, default is "1m".
+
+        Returns:
+            result: int64 array of timestamps, None if NumPy not installed.
+        """
+        cursor = await self._get_cursor(symbol, resolution)
+        spec = {
+            "t": {
+                "$gte": start,
+                "$lte": end
+            }
+        }
+        result = await self._db.get_columns(spec, columns=("t", ), sort=[("t", 1)], cursor=cursor)
+        return result["t"] if result else None
+
+    async def save_klines(self, symbol, rows, resolution="1m"):
+        """ Save klines, e.g. downloaded history, a kline with the same timestamp is replaced.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            rows: Klines, e.g. [(t, o, h, l, c, v), ...]
+            resolution: Resolution in `KLINE_RESOLUTIONS`, default is "1m".
+
+        Returns:
+            count: Klines saved.
+        """
+        cursor = await self._get_cursor(symbol, resolution)
+        writer = self._db.bulk_writer(cursor)
+        for t, o, h, l, c, v in rows:
+            await writer.update({"t": t}, {"$set": {"o": o, "h": h, "l": l, "c": c, "v": v}}, upsert=True)
+        return len(rows)
+
+    def pick_resolution(self, start, end, resolution="auto"):
+        """ Get the resolution to query, the finest one fits `MAX_POINTS` klines and not deleted if "auto".
+        """
+        if resolution != "auto":
+            return resolution
+        return pick_resolution(start, end, KLINE_RESOLUTIONS, retention=self._retention)
 
-    def _get_kline_cursor_by_symbol(self, symbol):
+    def _get_kline_cursor_by_symbol(self, symbol, resolution="1m"):
         """ Get a cursor name by symbol, we will convert a symbol name to a collection name.
-            e.g. ETH/BTC => kline_eth_btc
+            e.g. ETH/BTC => kline_eth_btc, kline_eth_btc_1h
 
         Args:
             symbol: Symbol pair, e.g. ETH/BTC.
+            resolution: Resolution in `KLINE_RESOLUTIONS`, default is "1m".
 
         Returns:
             cursor: DB query cursor name.
         """
-        cursor = self._k_to_c.get(symbol)
+        key = symbol if resolution == "1m" else (symbol, resolution)
+        cursor = self._k_to_c.get(key)
         if not cursor:
             s = symbol.replace("/", "").replace("-", "")
-            collection = "kline_{}".format(s)
+            collection = "kline_{}".format(s) if resolution == "1m" else "kline_{}_{}".format(s, resolution)
             cursor = self._db.new_cursor(self._db_name, collection)
-            self._k_to_c[symbol] = cursor
+            self._k_to_c[key] = cursor
         return cursor
 
+    async def _get_cursor(self, symbol, resolution="1m"):
+        """ Get a cursor by symbol, the unique index of `t` is created on first use. """
+        cursor = self._get_kline_cursor_by_symbol(symbol, resolution)
+        await self._db.ensure_index([("t", 1)], unique=True, cursor=cursor)
+        return cursor
+
+    async def rollup(self, symbol, resolution):
+        """ Downsample 1m klines into a coarser resolution, only complete buckets are rolled up. The rollup starts from
+        the bucket after the latest one rolled up, so it can be run repeatedly, and 1m klines rolled up are not needed
+        again and can be deleted.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            resolution: Resolution in `KLINE_RESOLUTIONS` except "1m".
+
+        Returns:
+            end: Millisecond timestamp, 1m klines before it are rolled up.
+        """
+        from quant.utils.mongo import DELETE_FLAG
+        source = await self._get_cursor(symbol)
+        target = await self._get_cursor(symbol, resolution)
+        ms = KLINE_RESOLUTIONS[resolution]
+        end = tools.get_cur_timestamp_ms() // ms * ms
+        last = await self._db.find_one(fields={"t": 1}, sort=[("t", -1)], cursor=target)
+        start = last["t"] + ms if last else 0
+        pipeline = [
+            {"$match": {"t": {"$gte": start, "$lt": end}, DELETE_FLAG: {"$ne": True}}},
+            {"$sort": {"t": 1}},
+            {"$group": {
+                "_id": {"$subtract": ["$t", {"$mod": ["$t", ms]}]},
+                "o": {"$first": "$o"},
+                "h": {"$max": "$h"},
+                "l": {"$min": "$l"},
+                "c": {"$last": "$c"},
+                "v": {"$sum": "$v"},
+                "n": {"$sum": 1}
+            }},
+            {"$project": {"_id": 0, "t": "$_id", "o": 1, "h": 1, "l": 1, "c": 1, "v": 1, "n": 1}},
+            {"$merge": {"into": target.name, "on": "t", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+        await self._db.aggregate(pipeline, cursor=source)
+        return end
+
+    async def rollup_symbol(self, symbol):
+        """ Roll up 1m klines of a symbol into all resolutions, then delete 1m klines older than `retention["1m"]`
+        which are rolled up.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+        """
+        ends = []
+        for resolution in list(KLINE_RESOLUTIONS)[1:]:
+            ends.append(await self.rollup(symbol, resolution))
+        if self._retention.get("1m"):
+            before = min(ends + [tools.get_cur_timestamp_ms() - self._retention["1m"]])
+            cursor = await self._get_cursor(symbol)
+            count = await self._db.remove({"t": {"$lt": before}}, multi=True, cursor=cursor)
+            if count:
+                logger.info("1m klines deleted, symbol:", symbol, "count:", count, caller=self)
+
+    def start_rollup(self, symbols, interval=300):
+        """ Start a rollup job, running `rollup_symbol` of symbols every `interval` seconds.
+
+        Args:
+            symbols: Symbol list, e.g. ["ETH/BTC", ...]
+            interval: Interval(seconds), default is 300.
+
+        Returns:
+            task_id: Task id of the job.
+        """
+        self._rollup_symbols = list(symbols)
+        return LoopRunTask.register(self._do_rollup, interval)
+
+    async def _do_rollup(self, *args, **kwargs):
+        if self._rolling:
+            return
+        self._rolling = True
+        try:
+            for symbol in self._rollup_symbols:
+                await self.rollup_symbol(symbol)
+        except Exception as e:
+            logger.error("rollup error:", e, caller=self)
+        finally:
+            self._rolling = False
+
+    async def flush(self):
+        """ Write buffered kline data of all symbols.
+
+        Returns:
+            success: True if all written.
+        """
+        results = [await self._db.bulk_writer(cursor).flush() for cursor in self._k_to_c.values()]
+        return all(results)
+
 
 class AssetData:
     """ Save or fetch asset data via MongoDB.
@@ -155,6 +401,7 @@ class AssetData:
 
     def __init__(self):
         """Initialize object."""
+        from quant.utils.mongo import MongoDBBase
         self._db = MongoDBBase(self.DB, self.COLLECTION)  # db instance
 
     async def create_new_asset(self, asset: Asset):
@@ -172,7 +419,7 @@ class AssetData:
             "timestamp": asset.timestamp,
             "assets": asset.assets
         }
-        asset_id = await self._db.insert(d)
+        asset_id = await self._db.bulk_writer().insert(d)
         return asset_id
 
     async def create_new_assets(self, *assets: Asset):
@@ -193,7 +440,7 @@ class AssetData:
                 "assets": asset.assets
             }
             docs.append(d)
-        asset_ids = await self._db.insert(docs)
+        asset_ids = await self._db.bulk_writer().insert(docs)
         return asset_ids
 
     async def update_asset(self, asset: Asset):
@@ -202,16 +449,15 @@ class AssetData:
         Args:
             asset: Asset object.
 
-        Returns:
-            count: How many documents have been updated.
+        NOTE:
+            The update is buffered and written later, updates of the same account are merged.
         """
         spec = {
             "platform": asset.platform,
             "account": asset.account
         }
         update_fields = {"$set": {"timestamp": asset.timestamp, "assets": asset.assets}}
-        count = await self._db.update(spec, update_fields=update_fields, upsert=True)
-        return count
+        await self._db.bulk_writer().update(spec, update_fields, upsert=True)
 
     async def get_latest_asset(self, platform, account):
         """ Get latest asset data.
@@ -237,6 +483,14 @@ class AssetData:
             del asset["_id"]
         return asset
 
+    async def flush(self):
+        """ Write buffered asset data.
+
+        Returns:
+            success: True if all written.
+        """
+        return await self._db.bulk_writer().flush()
+
 
 class AssetSnapshotData(AssetData):
     """ Save or fetch asset snapshot data via MongoDB.
@@ -250,12 +504,25 @@ class AssetSnapshotData(AssetData):
             "ETH": { ... },
             ...
         }
+
+    Rollup collections of a resolution are named by the suffix, e.g. `snapshot_1h`, keeping the last snapshot of every
+    bucket with an extra field "bucket", the bucket start timestamp.
+
+    Attributes:
+        retention: How long(milliseconds) snapshots of resolutions are kept, only `raw` snapshots are deleted by the
+            rollup job, after rolled up, e.g. {"raw": 7 * 24 * 60 * 60 * 1000}. Default is None, kept forever.
     """
 
     DB = "asset"  # db name
     COLLECTION = "snapshot"  # collection name
 
-    async def get_asset_snapshot(self, platform, account, start=None, end=None):
+    def __init__(self, retention=None):
+        """Initialize object."""
+        super(AssetSnapshotData, self).__init__()
+        self._retention = retention or {}
+        self._rolling = False
+
+    async def get_asset_snapshot(self, platform, account, start=None, end=None, resolution="raw"):
         """ Get asset snapshot data from db.
 
         Args:
@@ -263,6 +530,7 @@ class AssetSnapshotData(AssetData):
             account: Account name. e.g. test@gmail.com
             start: Start time, Millisecond timestamp, default is a day ago.
             end: End time, Millisecond timestamp, default is current timestamp.
+            resolution: Resolution in `SNAPSHOT_RESOLUTIONS`, or "auto" to pick by `pick_resolution`, default is "raw".
 
         Returns:
             datas: Asset data list. e.g. [{"BTC": {"free": "1.1", "locked": "2.2", "total": "3.3"}, ... }, ... ]
@@ -271,6 +539,9 @@ class AssetSnapshotData(AssetData):
             end = tools.get_cur_timestamp_ms()  # Current timestamp
         if not start:
             start = end - 60 * 60 * 1000 * 24  # A day ago.
+        if resolution == "auto":
+            resolution = pick_resolution(start, end, SNAPSHOT_RESOLUTIONS, retention=self._retention)
+        cursor = await self._get_cursor(resolution)
         spec = {
             "platform": platform,
             "account": account,
@@ -284,9 +555,93 @@ class AssetSnapshotData(AssetData):
             "account": 0,
             "update_time": 0
         }
-        datas = await self._db.get_list(spec, fields=fields)
+        _sort = [("timestamp", 1)]
+        datas = [item async for item in self._db.iter_list(spec, fields=fields, sort=_sort, cursor=cursor)]
         return datas
 
+    async def _get_cursor(self, resolution="raw"):
+        """ Get a cursor by resolution, the index of platform / account / timestamp is created on first use. """
+        if resolution == "raw":
+            cursor = self._db.new_cursor(self.DB, self.COLLECTION)
+        else:
+            cursor = self._db.new_cursor(self.DB, "{}_{}".format(self.COLLECTION, resolution))
+            await self._db.ensure_index([("platform", 1), ("account", 1), ("bucket", 1)], unique=True, cursor=cursor)
+        await self._db.ensure_index([("platform", 1), ("account", 1), ("timestamp", 1)], cursor=cursor)
+        return cursor
+
+    async def rollup(self, resolution):
+        """ Downsample snapshots of all accounts into a coarser resolution, the last snapshot of every complete bucket
+        is kept. The rollup starts from the bucket after the latest one rolled up, so it can be run repeatedly, and
+        snapshots rolled up are not needed again and can be deleted.
+
+        Args:
+            resolution: Resolution in `SNAPSHOT_RESOLUTIONS` except "raw".
+
+        Returns:
+            end: Millisecond timestamp, snapshots before it are rolled up.
+        """
+        from quant.utils.mongo import DELETE_FLAG
+        source = await self._get_cursor()
+        target = await self._get_cursor(resolution)
+        ms = SNAPSHOT_RESOLUTIONS[resolution]
+        end = tools.get_cur_timestamp_ms() // ms * ms
+        last = await self._db.find_one(fields={"bucket": 1}, sort=[("bucket", -1)], cursor=target)
+        start = last["bucket"] + ms if last else 0
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": start, "$lt": end}, DELETE_FLAG: {"$ne": True}}},
+            {"$sort": {"timestamp": 1}},
+            {"$group": {
+                "_id": {
+                    "platform": "$platform",
+                    "account": "$account",
+                    "bucket": {"$subtract": ["$timestamp", {"$mod": ["$timestamp", ms]}]}
+                },
+                "doc": {"$last": "$$ROOT"}
+            }},
+            {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$doc", {"bucket": "$_id.bucket"}]}}},
+            {"$project": {"_id": 0, "create_time": 0, "update_time": 0}},
+            {"$merge": {"into": target.name, "on": ["platform", "account", "bucket"], "whenMatched": "replace",
+                        "whenNotMatched": "insert"}}
+        ]
+        await self._db.aggregate(pipeline, cursor=source)
+        return end
+
+    async def rollup_all(self):
+        """ Roll up snapshots into all resolutions, then delete snapshots older than `retention["raw"]` which are
+        rolled up.
+        """
+        ends = []
+        for resolution in list(SNAPSHOT_RESOLUTIONS)[1:]:
+            ends.append(await self.rollup(resolution))
+        if self._retention.get("raw"):
+            before = min(ends + [tools.get_cur_timestamp_ms() - self._retention["raw"]])
+            cursor = await self._get_cursor()
+            count = await self._db.remove({"timestamp": {"$lt": before}}, multi=True, cursor=cursor)
+            if count:
+                logger.info("asset snapshots deleted, count:", count, caller=self)
+
+    def start_rollup(self, interval=300):
+        """ Start a rollup job, running `rollup_all` every `interval` seconds.
+
+        Args:
+            interval: Interval(seconds), default is 300.
+
+        Returns:
+            task_id: Task id of the job.
+        """
+        return LoopRunTask.register(self._do_rollup, interval)
+
+    async def _do_rollup(self, *args, **kwargs):
+        if self._rolling:
+            return
+        self._rolling = True
+        try:
+            await self.rollup_all()
+        except Exception as e:
+            logger.error("rollup error:", e, caller=self)
+        finally:
+            self._rolling = False
+
 
 class OrderData:
     """ Save or fetch order data via MongoDB.
@@ -316,6 +671,7 @@ class OrderData:
         """Initialize object."""
         self._db = "order"  # db name
         self._collection = "order"  # collection name
+        from quant.utils.mongo import MongoDBBase
         self._db = MongoDBBase(self._db, self._collection)  # db instance
 
     async def create_new_order(self, order):
@@ -344,7 +700,7 @@ class OrderData:
             "ct": order.ctime,
             "ut": order.utime
         }
-        order_id = await self._db.insert(data)
+        order_id = await self._db.bulk_writer().insert(data)
         return order_id
 
     async def get_order_by_no(self, platform, order_no):
@@ -370,19 +726,20 @@ class OrderData:
         Args:
             order: Order object.
 
-        Returns:
-            count: How many documents have been updated.
+        NOTE:
+            The update is buffered and written later, updates of the same order are merged.
         """
         spec = {
             "p": order.platform,
             "n": order.order_no
         }
         update_fields = {
-            "s": order.status,
-            "r": order.remain
+            "st": order.status,
+            "ap": order.avg_price,
+            "r": order.remain,
+            "ut": order.utime
         }
-        count = await self._db.update(spec, update_fields={"$set": update_fields})
-        return count
+        await self._db.bulk_writer().update(spec, {"$set": update_fields})
 
     async def get_latest_order(self, platform, symbol):
         """ Get a latest order data.
@@ -401,3 +758,308 @@ class OrderData:
         _sort = [("ut", -1)]
         data = await self._db.find_one(spec, sort=_sort)
         return data
+
+    async def flush(self):
+        """ Write buffered order data.
+
+        Returns:
+            success: True if all written.
+        """
+        return await self._db.bulk_writer().flush()
+
+
+# Kline types of `Kline.kline_type` and their interval names, klines of other types are saved by the type name.
+KLINE_INTERVALS = {
+    "kline": "1m",
+    "kline_5m": "5m",
+    "kline_15m": "15m"
+}
+
+
+class LocalKLineData:
+    """ Save or fetch kline data in local column files, the same API as `KLineData`.
+
+    Klines of every (platform, symbol, interval) are saved in a `ColumnStore` under
+    `{path}/{platform}/{symbol}/{interval}`, e.g. `data/kline/binance/BTCUSDT/1m`. New klines are buffered and
+    appended in batches, when `batch_size` klines are buffered or `interval` milliseconds passed since the first one.
+    Buffered klines of a symbol are appended before it's read.
+
+    Attributes:
+        platform: Exchange platform name.
+        path: Root directory, default is `KLINE_STORE.path` config or "data/kline".
+        batch_size: Max klines buffered, default is `KLINE_STORE.batch_size` config or 500.
+        interval: Max milliseconds a kline is buffered, default is `KLINE_STORE.interval` config or 1000.
+    """
+
+    def __init__(self, platform, path=None, batch_size=None, interval=None):
+        """ Initialize object.
+        """
+        self._platform = platform
+        self._path = path or config.kline_store.get("path", "data/kline")
+        self._batch_size = batch_size or config.kline_store.get("batch_size", 500)
+        self._interval = (interval or config.kline_store.get("interval", 1000)) / 1000
+        self._stores = {}  # ColumnStore of (symbol, interval), e.g. {("BTC/USDT", "1m"): ColumnStore, ... }
+        self._pending = collections.defaultdict(list)  # Buffered rows of (symbol, interval).
+        self._count = 0
+        self._timer = None
+
+    async def create_new_kline(self, kline: Kline):
+        """ Save kline data, a kline with the same timestamp as the last one replaces it.
+
+        Args:
+            kline: kline object.
+
+        Returns:
+            kline_id: Kline timestamp.
+        """
+        interval = KLINE_INTERVALS.get(kline.kline_type, kline.kline_type or "1m")
+        row = (kline.timestamp, kline.open, kline.high, kline.low, kline.close, kline.volume)
+        self._pending[(kline.symbol, interval)].append(row)
+        self._count += 1
+        if self._count >= self._batch_size:
+            self._flush()
+        elif not self._timer:
+            self._timer = asyncio.get_event_loop().call_later(self._interval, self._flush)
+        return kline.timestamp
+
+    async def get_kline_at_ts(self, symbol, ts=None):
+        """ Get a kline data, you can specific symbol and timestamp.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            ts: Millisecond timestamp. If this param is None, ts will be specific current timestamp.
+
+        Returns:
+            result: kline data, dict format. If no any data, result is None.
+        """
+        store = self._get_store(symbol)
+        i = store.search(ts, right=True) if ts else store.rows
+        return store.row(i - 1)
+
+    async def get_latest_kline_by_symbol(self, symbol):
+        """ Get latest kline data by symbol.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+
+        Returns:
+            result: kline data, dict format. If no any data, result is None.
+        """
+        return self._get_store(symbol).last()
+
+    async def get_kline_between_ts(self, symbol, start, end, resolution="1m"):
+        """ Get some kline data between two timestamps.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            start: Millisecond timestamp, the start time you want to specific.
+            end: Millisecond timestamp, the end time you want to specific.
+            resolution: Kline interval, e.g. "1m" / "15m", or "auto" to pick by `pick_resolution` from intervals
+                saved, default is "1m".
+
+        Returns:
+            result: kline data, list format. If no any data, result is a empty list.
+        """
+        datas = [item async for item in self.iter_kline_between_ts(symbol, start, end, resolution)]
+        return datas
+
+    async def iter_kline_between_ts(self, symbol, start, end, resolution="1m", batch_size=10000):
+        """ Iterate kline data between two timestamps in time order, read in batches.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            start: Millisecond timestamp, the start time you want to specific.
+            end: Millisecond timestamp, the end time you want to specific.
+            resolution: Kline interval, or "auto", default is "1m".
+            batch_size: Klines per batch, default is 10000.
+
+        Yield:
+            kline: kline data, dict format.
+        """
+        store = self._get_store(symbol, self.pick_resolution(symbol, start, end, resolution))
+        for item in store.iter_rows(start, end, batch_size):
+            yield item
+
+    async def get_kline_columns(self, symbol, start, end, resolution="1m"):
+        """ Get kline data between two timestamps as arrays in time order, without copy if in one segment.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            start: Millisecond timestamp, the start time you want to specific.
+            end: Millisecond timestamp, the end time you want to specific.
+            resolution: Kline interval, or "auto", default is "1m".
+
+        Returns:
+            result: {"t": int64 array, "o": float64 array, "h": ..., "l": ..., "c": ..., "v": ...}, NumPy arrays if
+                installed, otherwise memoryview.
+        """
+        store = self._get_store(symbol, self.pick_resolution(symbol, start, end, resolution))
+        return store.read(start, end)
+
+    async def get_kline_times(self, symbol, start, end, resolution="1m"):
+        """ Get timestamps of klines between two timestamps in time order, e.g. to find missing klines.
+
+        Returns:
+            result: int64 array of timestamps, NumPy array if installed, otherwise memoryview.
+        """
+        return self._get_store(symbol, resolution).read(start, end, columns=("t", ))["t"]
+
+    async def save_klines(self, symbol, rows, resolution="1m"):
+        """ Save klines in time order, e.g. downloaded history. A kline with the same timestamp as the last one replaces
+        it, klines older than the last one are rejected, the column files are append-only.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            rows: Klines, e.g. [(t, o, h, l, c, v), ...]
+            resolution: Kline interval, default is "1m".
+
+        Returns:
+            count: Klines saved.
+        """
+        appended, replaced, _ = self._get_store(symbol, resolution).append(rows)
+        return appended + replaced
+
+    def pick_resolution(self, symbol, start, end, resolution="auto"):
+        """ Get the interval to query, the finest one saved that fits `MAX_POINTS` klines if "auto".
+        """
+        if resolution != "auto":
+            return resolution
+        saved = os.listdir(self._symbol_path(symbol)) if os.path.isdir(self._symbol_path(symbol)) else []
+        resolutions = collections.OrderedDict((k, v) for k, v in KLINE_RESOLUTIONS.items() if k in saved)
+        if not resolutions:
+            return "1m"
+        return pick_resolution(start, end, resolutions)
+
+    async def flush(self):
+        """ Append buffered kline data of all symbols and flush them to disk.
+
+        Returns:
+            success: True if all written.
+        """
+        self._flush()
+        for store in self._stores.values():
+            store.sync()
+        return True
+
+    def _flush(self, key=None):
+        """Append buffered rows of a (symbol, interval), or all if `key` is None."""
+        if key is None:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            keys = list(self._pending)
+        else:
+            keys = [key] if key in self._pending else []
+        for k in keys:
+            rows = self._pending.pop(k)
+            self._count -= len(rows)
+            try:
+                self._get_store(*k, flush=False).append(rows)
+            except Exception as e:
+                logger.error("append klines error:", e, "symbol:", k[0], "interval:", k[1], caller=self)
+
+    def _symbol_path(self, symbol):
+        s = symbol.replace("/", "").replace("-", "")
+        return os.path.join(self._path, self._platform, s)
+
+    def _get_store(self, symbol, interval="1m", flush=True):
+        """ Get the `ColumnStore` of a symbol and interval, buffered rows are appended first if `flush` is True.
+        """
+        from quant.utils.columnstore import ColumnStore
+        key = (symbol, interval)
+        if flush:
+            self._flush(key)
+        store = self._stores.get(key)
+        if not store:
+            store = ColumnStore(os.path.join(self._symbol_path(symbol), interval))
+            self._stores[key] = store
+        return store
+
+
+# Columns of local trade history, s(side) is 1 for BUY and -1 for SELL.
+TRADE_COLUMNS = ("id", "t", "p", "q", "s")
+TRADE_INT_COLUMNS = ("id", "t", "s")
+
+
+class LocalTradeData:
+    """ Save or fetch trade history in local column files, in trade id order.
+
+    Trades of every (platform, symbol) are saved in a `ColumnStore` under `{path}/{platform}/{symbol}`, e.g.
+    `data/trade/binance/BTCUSDT`, with columns `TRADE_COLUMNS`.
+
+    Attributes:
+        platform: Exchange platform name.
+        path: Root directory, default is `KLINE_STORE.trade_path` config or "data/trade".
+    """
+
+    def __init__(self, platform, path=None):
+        """ Initialize object.
+        """
+        self._platform = platform
+        self._path = path or config.kline_store.get("trade_path", "data/trade")
+        self._stores = {}  # e.g. {"BTC/USDT": ColumnStore, ... }
+
+    async def save_trades(self, symbol, rows):
+        """ Save trades in trade id order, trades with ids not greater than the last one saved are skipped.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            rows: Trades, e.g. [(id, t, p, q, s), ...]
+
+        Returns:
+            count: Trades saved.
+        """
+        store = self._get_store(symbol)
+        last = store.last()
+        if last:
+            rows = [r for r in rows if r[0] > last["id"]]
+        appended, _, _ = store.append(rows)
+        return appended
+
+    async def get_latest_trade(self, symbol):
+        """ Get the last trade saved, e.g. {"id": 1, "t": 1570000000000, "p": 1.0, "q": 0.1, "s": 1}, None if empty.
+        """
+        return self._get_store(symbol).last()
+
+    async def get_trade_columns(self, symbol, start_id=None, end_id=None):
+        """ Get trades between two trade ids as arrays, without copy if in one segment.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            start_id: Start trade id, included, default is the first one.
+            end_id: End trade id, included, default is the last one.
+
+        Returns:
+            result: {"id": int64 array, "t": ..., "p": float64 array, "q": ..., "s": ...}
+        """
+        return self._get_store(symbol).read(start_id, end_id)
+
+    async def flush(self):
+        """ Flush saved trades to disk.
+        """
+        for store in self._stores.values():
+            store.sync()
+        return True
+
+    def _get_store(self, symbol):
+        from quant.utils.columnstore import ColumnStore
+        store = self._stores.get(symbol)
+        if not store:
+            s = symbol.replace("/", "").replace("-", "")
+            store = ColumnStore(os.path.join(self._path, self._platform, s), TRADE_COLUMNS, TRADE_INT_COLUMNS)
+            self._stores[symbol] = store
+        return store
+
+
+def get_kline_data(platform):
+    """ Get kline data object of `KLINE_STORE.backend` config.
+
+    Args:
+        platform: Exchange platform name.
+
+    Returns:
+        kline_data: `LocalKLineData` if backend is "local", otherwise `KLineData` of MongoDB.
+    """
+    if config.kline_store.get("backend") == "local":
+        return LocalKLineData(platform)
+    return KLineData(platform)
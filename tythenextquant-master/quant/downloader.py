@@ -0,0 +1,586 @@
+# -*- coding:utf-8 -*-
+
+"""
+Historical kline and trade downloader.
+A time range is split into pages, e.g. 1000 klines or one hour of trades, pages are fetched from the public REST API of
+the exchange by several concurrent requests under a token bucket rate limit, failed requests are retried with
+backoff. Pages are saved in time order, a page fetched ahead of the earlier ones is buffered until they are saved, so
+the append-only local column files get rows in order.
+
+Runs are incremental, only missing data is fetched:
+    * Klines in MongoDB, the head before the first kline saved, the gaps between klines and the tail after the last
+      one, the last kline saved is fetched again since it may be unfinished.
+    * Klines in local column files (append-only), the tail after the last kline saved.
+    * Trades, saved in local column files by `LocalTradeData`, the tail after the last trade saved.
+
+Usage:
+    downloader = Downloader(const.BINANCE, concurrency=8)
+    stats = await downloader.download_klines("BTC/USDT", start=1570000000000, interval="1m")
+    stats = await downloader.download_trades("BTC/USDT", start=1570000000000)
+
+Command line:
+    python -m quant.downloader binance BTC/USDT --kind kline --interval 1m --days 30 [--config config.json]
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from quant import const
+from quant.utils import tools
+from quant.utils import logger
+from quant.data import KLINE_RESOLUTIONS, LocalKLineData, LocalTradeData, get_kline_data
+
+
+__all__ = ("Downloader", "RateLimiter", "SOURCES", "register_source", )
+
+
+class RateLimiter:
+    """ Token bucket rate limiter.
+
+    Attributes:
+        rate: Tokens added per second, e.g. requests per second.
+        burst: Max tokens in the bucket, default is `rate`.
+    """
+
+    def __init__(self, rate, burst=None):
+        """Initialize."""
+        self._rate = rate
+        self._burst = burst or max(rate, 1)
+        self._tokens = self._burst
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        """Wait until `tokens` are available and take them, callers are served in order."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self._rate)
+
+
+class BinanceSource:
+    """ History of Binance spot.
+
+    Attributes:
+        limiter: `RateLimiter` of requests.
+        host: REST API host, default is `HOST`.
+    """
+
+    HOST = "https://api.binance.com"
+    KLINE_URI = "/api/v3/klines"
+    TRADE_URI = "/api/v3/aggTrades"
+    RATE = 10  # Default requests per second.
+    KLINE_LIMIT = 1000  # Klines per request.
+    TRADE_LIMIT = 1000  # Trades per request.
+    TRADE_WINDOW = 60 * 60 * 1000 - 1  # Max time range(milliseconds) of a trade request.
+    INTERVALS = {"1m": "1m", "15m": "15m", "1h": "1h", "1d": "1d"}
+
+    def __init__(self, limiter, host=None):
+        """Initialize."""
+        self._limiter = limiter
+        self._rest = self._create_rest(host or self.HOST)
+        self.requests = 0
+
+    def _create_rest(self, host):
+        from quant.platform.binance import BinanceRestAPI
+        return BinanceRestAPI(host, "", "")
+
+    async def _request(self, uri, params):
+        await self._limiter.acquire()
+        self.requests += 1
+        return await self._rest.request("GET", uri, params)
+
+    async def fetch_klines(self, symbol, interval, start, end):
+        """ Fetch klines between two timestamps, no more than `KLINE_LIMIT`.
+
+        Returns:
+            rows: Klines in time order, e.g. [(t, o, h, l, c, v), ...], None if failed.
+            error: Error information, otherwise it's None.
+        """
+        params = {
+            "symbol": symbol.replace("/", ""),
+            "interval": self.INTERVALS[interval],
+            "startTime": start,
+            "endTime": end,
+            "limit": self.KLINE_LIMIT
+        }
+        success, error = await self._request(self.KLINE_URI, params)
+        if error:
+            return None, error
+        rows = [(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in success]
+        return rows, None
+
+    async def fetch_trades(self, symbol, start, end):
+        """ Fetch trades between two timestamps, no longer than `TRADE_WINDOW`.
+
+        Returns:
+            rows: Trades, e.g. [(id, t, p, q, s), ...], may be duplicated, None if failed.
+            error: Error information, otherwise it's None.
+        """
+        rows = []
+        params = {
+            "symbol": symbol.replace("/", ""),
+            "startTime": start,
+            "endTime": end,
+            "limit": self.TRADE_LIMIT
+        }
+        while True:
+            success, error = await self._request(self.TRADE_URI, params)
+            if error:
+                return None, error
+            for t in success:
+                rows.append((int(t["a"]), int(t["T"]), float(t["p"]), float(t["q"]), -1 if t["m"] else 1))
+            if len(success) < self.TRADE_LIMIT or int(success[-1]["T"]) > end:
+                break
+            # Page by aggregate trade id, no trade is skipped even if many of them are in one millisecond.
+            params = {
+                "symbol": symbol.replace("/", ""),
+                "fromId": int(success[-1]["a"]) + 1,
+                "limit": self.TRADE_LIMIT
+            }
+        return rows, None
+
+
+class BinanceFutureSource(BinanceSource):
+    """ History of Binance USDT-M futures.
+    """
+
+    HOST = "https://fapi.binance.com"
+    KLINE_URI = "/fapi/v1/klines"
+    TRADE_URI = "/fapi/v1/aggTrades"
+    KLINE_LIMIT = 1500
+
+    def _create_rest(self, host):
+        from quant.platform.binance_future import BinanceFutureRestAPI
+        return BinanceFutureRestAPI(host, "", "")
+
+
+class OkxSource(BinanceSource):
+    """ History of OKX, klines and trades are returned in reverse time order and paged backward.
+    """
+
+    HOST = "https://www.okx.com"
+    KLINE_URI = "/api/v5/market/history-candles"
+    TRADE_URI = "/api/v5/market/history-trades"
+    KLINE_LIMIT = 100
+    TRADE_LIMIT = 100
+    INTERVALS = {"1m": "1m", "15m": "15m", "1h": "1H", "1d": "1Dutc"}
+
+    def _create_rest(self, host):
+        from quant.platform.okx import OkxRestAPI
+        return OkxRestAPI(host, "", "", "")
+
+    async def _request(self, uri, params):
+        success, error = await super(OkxSource, self)._request(uri, params)
+        if error:
+            return None, error
+        if success.get("code") != "0":
+            return None, success
+        return success["data"], None
+
+    async def fetch_klines(self, symbol, interval, start, end):
+        params = {
+            "instId": symbol.replace("/", "-"),
+            "bar": self.INTERVALS[interval],
+            "after": end + 1,  # Klines before `after` and after `before`, both excluded.
+            "before": start - 1,
+            "limit": self.KLINE_LIMIT
+        }
+        success, error = await self._request(self.KLINE_URI, params)
+        if error:
+            return None, error
+        rows = [(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in reversed(success)]
+        return rows, None
+
+    async def fetch_trades(self, symbol, start, end):
+        rows = []
+        params = {
+            "instId": symbol.replace("/", "-"),
+            "type": 2,  # The first page by timestamp, trades before `after`.
+            "after": end + 1,
+            "limit": self.TRADE_LIMIT
+        }
+        while True:
+            success, error = await self._request(self.TRADE_URI, params)
+            if error:
+                return None, error
+            for t in success:
+                ts = int(t["ts"])
+                if ts < start:
+                    break
+                rows.append((int(t["tradeId"]), ts, float(t["px"]), float(t["sz"]), 1 if t["side"] == "buy" else -1))
+            if len(success) < self.TRADE_LIMIT or int(success[-1]["ts"]) < start:
+                break
+            # Then by trade id, no trade is skipped even if many of them are in one millisecond.
+            params = {
+                "instId": symbol.replace("/", "-"),
+                "type": 1,
+                "after": int(success[-1]["tradeId"]),
+                "limit": self.TRADE_LIMIT
+            }
+        return rows, None
+
+
+class BybitSource(BinanceSource):
+    """ History of Bybit spot, klines only, the public API has no trade history.
+
+    Attributes:
+        category: Product type of Bybit V5 API, e.g. "spot", "linear", default is "spot".
+    """
+
+    HOST = "https://api.bybit.com"
+    KLINE_URI = "/v5/market/kline"
+    TRADE_URI = None
+    KLINE_LIMIT = 1000
+    INTERVALS = {"1m": "1", "15m": "15", "1h": "60", "1d": "D"}
+
+    def __init__(self, limiter, host=None, category="spot"):
+        """Initialize."""
+        super(BybitSource, self).__init__(limiter, host)
+        self._category = category
+
+    def _create_rest(self, host):
+        from quant.platform.bybit import BybitRestAPIV5
+        return BybitRestAPIV5(host, "", "")
+
+    async def fetch_klines(self, symbol, interval, start, end):
+        params = {
+            "category": self._category,
+            "symbol": symbol.replace("/", ""),
+            "interval": self.INTERVALS[interval],
+            "start": start,
+            "end": end,
+            "limit": self.KLINE_LIMIT
+        }
+        success, error = await self._request(self.KLINE_URI, params)
+        if error:
+            return None, error
+        if success.get("retCode") != 0:
+            return None, success
+        result = success["result"]["list"]
+        rows = [(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in reversed(result)]
+        return rows, None
+
+    async def fetch_trades(self, symbol, start, end):
+        return None, "trade history not supported"
+
+
+# History sources of platforms.
+SOURCES = {
+    const.BINANCE: BinanceSource,
+    const.BINANCE_FUTURE: BinanceFutureSource,
+    const.OKX: OkxSource,
+    const.BYBIT: BybitSource
+}
+
+
+def register_source(platform, source_class):
+    """ Register the history source of a platform, e.g. a class with the interface of `BinanceSource`.
+    """
+    SOURCES[platform] = source_class
+
+
+class Downloader:
+    """ Download klines and trades of a platform.
+
+    Attributes:
+        platform: Exchange platform name, in `SOURCES`.
+        concurrency: Max concurrent pages, default is 4.
+        rate: Max requests per second, default is `RATE` of the source.
+        retries: Retry times of a failed request, default is 3.
+        host: REST API host, default is the one of the source.
+        kline_data: Kline data object to save klines, default is `get_kline_data(platform)`.
+        trade_data: Trade data object to save trades, default is `LocalTradeData(platform)`.
+        progress_callback: Function called with `stats` after every page, e.g. `def on_progress(stats): pass`.
+    """
+
+    def __init__(self, platform, concurrency=4, rate=None, retries=3, host=None, kline_data=None, trade_data=None,
+                 progress_callback=None):
+        """Initialize."""
+        self._platform = platform
+        self._concurrency = max(concurrency, 1)
+        self._retries = retries
+        self._kline_data = kline_data
+        self._trade_data = trade_data
+        self._progress_callback = progress_callback
+        self._source = None
+        S = SOURCES.get(platform)
+        if not S:
+            logger.error("platform not supported:", platform, caller=self)
+        else:
+            self._source = S(RateLimiter(rate or S.RATE), host)
+        self._reset()
+
+    @property
+    def stats(self):
+        elapsed = time.time() - self._begin if self._begin else 0
+        d = {
+            "pages": self._pages,
+            "done": self._done,
+            "failed": self._failed,
+            "rows": self._rows,
+            "saved": self._saved,
+            "requests": self._source.requests - self._requests if self._source else 0,
+            "retries": self._retry_count,
+            "elapsed": round(elapsed, 3),
+            "throughput": round(self._rows / elapsed, 3) if elapsed else 0
+        }
+        return d
+
+    def _reset(self):
+        self._begin = None
+        self._pages = 0
+        self._done = 0
+        self._failed = 0
+        self._rows = 0
+        self._saved = 0
+        self._retry_count = 0
+        self._requests = self._source.requests if self._source else 0
+
+    async def download_klines(self, symbol, start, end=None, interval="1m"):
+        """ Download missing klines between two timestamps.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            start: Millisecond timestamp, the start time you want to specific.
+            end: Millisecond timestamp, the end time you want to specific, default is now.
+            interval: Kline interval in `KLINE_RESOLUTIONS`, default is "1m".
+
+        Returns:
+            stats: Download stats, same as `stats`, None if failed.
+        """
+        if not self._source:
+            return None
+        if interval not in KLINE_RESOLUTIONS or interval not in self._source.INTERVALS:
+            logger.error("interval not supported:", interval, caller=self)
+            return None
+        if not self._kline_data:
+            self._kline_data = get_kline_data(self._platform)
+        ms = KLINE_RESOLUTIONS[interval]
+        start = start // ms * ms
+        end = (end or tools.get_cur_timestamp_ms()) // ms * ms
+        times = await self._kline_data.get_kline_times(symbol, start, end, interval)
+        times = list(times) if times is not None else []
+        ranges = _missing_ranges(times, start, end, ms, isinstance(self._kline_data, LocalKLineData))
+        size = self._source.KLINE_LIMIT * ms
+        pages = []
+        for a, b in ranges:
+            for p in range(a, b + 1, size):
+                pages.append((p, min(p + size - ms, b)))
+
+        async def fetch(page):
+            return await self._source.fetch_klines(symbol, interval, page[0], page[1])
+
+        async def save(page, rows):
+            return await self._kline_data.save_klines(symbol, _dedupe(rows, 0, page), interval)
+
+        await self._run(pages, fetch, save, isinstance(self._kline_data, LocalKLineData))
+        await self._kline_data.flush()
+        return self.stats
+
+    async def download_trades(self, symbol, start, end=None):
+        """ Download trades between two timestamps after the last trade saved.
+
+        Args:
+            symbol: Symbol pair, e.g. ETH/BTC.
+            start: Millisecond timestamp, the start time you want to specific.
+            end: Millisecond timestamp, the end time you want to specific, default is now.
+
+        Returns:
+            stats: Download stats, same as `stats`, None if failed.
+        """
+        if not self._source:
+            return None
+        if not self._source.TRADE_URI:
+            logger.error("trade history not supported:", self._platform, caller=self)
+            return None
+        if not self._trade_data:
+            self._trade_data = LocalTradeData(self._platform)
+        end = end or tools.get_cur_timestamp_ms()
+        last = await self._trade_data.get_latest_trade(symbol)
+        if last:
+            start = max(start, last["t"])
+        size = self._source.TRADE_WINDOW + 1
+        pages = [(p, min(p + size - 1, end)) for p in range(start, end + 1, size)]
+
+        async def fetch(page):
+            return await self._source.fetch_trades(symbol, page[0], page[1])
+
+        async def save(page, rows):
+            return await self._trade_data.save_trades(symbol, _dedupe(rows, 1, page))
+
+        await self._run(pages, fetch, save, True)
+        await self._trade_data.flush()
+        return self.stats
+
+    async def _run(self, pages, fetch, save, append_only=False):
+        """ Fetch pages concurrently and save them in order.
+
+        Args:
+            pages: Time ranges, e.g. [(start, end), ...]
+            fetch: Asynchronous function to fetch rows of a page, returns (rows, error).
+            save: Asynchronous function to save rows of a page, returns the count saved.
+            append_only: If the store is append-only, e.g. local column files, stop at the first failed page, so no
+                hole is left behind the saved rows and the next run resumes from the failed page.
+        """
+        self._reset()
+        self._begin = time.time()
+        self._pages = len(pages)
+        results = {}  # Fetched pages waiting for the earlier ones, e.g. {index: rows, ... }
+        cond = asyncio.Condition()
+        state = {"next": 0, "index": 0, "stopped": False}  # Next page to save, next page to fetch.
+        window = self._concurrency * 4  # Max pages fetched ahead of the next one to save.
+
+        async def worker():
+            while state["index"] < len(pages) and not state["stopped"]:
+                i = state["index"]
+                state["index"] += 1
+                async with cond:
+                    await cond.wait_for(lambda: i - state["next"] < window or state["stopped"])
+                if state["stopped"]:
+                    break
+                rows = await self._fetch(fetch, pages[i])
+                async with cond:
+                    results[i] = rows
+                    while state["next"] in results and not state["stopped"]:
+                        n = state["next"]
+                        rows = results.pop(n)
+                        ok = rows is not None
+                        if rows:
+                            try:
+                                self._saved += await save(pages[n], rows) or 0
+                            except Exception as e:
+                                logger.error("save page error:", e, "page:", pages[n], caller=self)
+                                self._failed += 1
+                                ok = False
+                        if not ok and append_only:
+                            logger.error("stopped at failed page:", pages[n], "later pages are not saved, run again to "
+                                         "resume from it.", caller=self)
+                            state["stopped"] = True
+                            break
+                        state["next"] += 1
+                        self._done += 1
+                        self._progress()
+                    cond.notify_all()
+
+        await asyncio.gather(*[worker() for _ in range(min(self._concurrency, len(pages)))])
+
+    async def _fetch(self, fetch, page):
+        """Fetch a page, retry with exponential backoff if failed, None if all retries failed."""
+        for n in range(self._retries + 1):
+            if n:
+                self._retry_count += 1
+                await asyncio.sleep(min(0.5 * 2 ** (n - 1), 30))
+            try:
+                rows, error = await fetch(page)
+            except Exception as e:
+                rows, error = None, e
+            if not error:
+                self._rows += len(rows)
+                return rows
+        logger.error("fetch page failed:", page, "error:", error, caller=self)
+        self._failed += 1
+        return None
+
+    def _progress(self):
+        if self._progress_callback:
+            try:
+                self._progress_callback(self.stats)
+            except Exception as e:
+                logger.error("progress callback error:", e, caller=self)
+
+
+def _missing_ranges(times, start, end, ms, append_only=False):
+    """ Get missing time ranges of klines.
+
+    Args:
+        times: Timestamps of klines saved between `start` and `end`, in time order.
+        start: Millisecond timestamp, the start time.
+        end: Millisecond timestamp, the end time.
+        ms: Kline interval in milliseconds.
+        append_only: Only the tail after the last kline can be saved, e.g. local column files.
+
+    Returns:
+        ranges: Time ranges, both included, e.g. [(start, end), ...]
+    """
+    if not times:
+        return [(start, end)]
+    if append_only:
+        return [(times[-1], end)]
+    ranges = []
+    if times[0] > start:
+        ranges.append((start, times[0] - ms))
+    for a, b in zip(times, times[1:]):
+        if b - a > ms:
+            ranges.append((a + ms, b - ms))
+    ranges.append((times[-1], end))
+    return ranges
+
+
+def _dedupe(rows, ts_index, page):
+    """ Drop rows outside the page time range, and duplicated rows by the first column, sorted by the first column.
+    """
+    d = {}
+    for r in rows:
+        if page[0] <= r[ts_index] <= page[1]:
+            d[r[0]] = r
+    return [d[k] for k in sorted(d)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download history klines or trades.")
+    parser.add_argument("platform", help="Platform name, e.g. binance.")
+    parser.add_argument("symbols", nargs="+", help="Symbol pairs, e.g. BTC/USDT.")
+    parser.add_argument("--kind", choices=("kline", "trade"), default="kline", help="Download klines or trades.")
+    parser.add_argument("--interval", default="1m", help="Kline interval, e.g. 1m, 15m, 1h, 1d.")
+    parser.add_argument("--start", type=int, default=None, help="Start time in milliseconds.")
+    parser.add_argument("--end", type=int, default=None, help="End time in milliseconds, default is now.")
+    parser.add_argument("--days", type=float, default=1, help="Days before end if no start.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max concurrent pages.")
+    parser.add_argument("--rate", type=float, default=None, help="Max requests per second.")
+    parser.add_argument("--config", default=None, help="Config file, with `KLINE_STORE` or `MONGODB`.")
+    args = parser.parse_args()
+
+    from quant.config import config
+
+    config.loads(args.config)
+    if config.mongodb and config.kline_store.get("backend") != "local":
+        from quant.utils.mongo import initMongodb
+        initMongodb(**config.mongodb)
+
+    def on_progress(stats):
+        sys.stdout.write("\r{done}/{pages} pages, {rows} rows, {requests} requests, {throughput} rows/s".format(**stats))
+        sys.stdout.flush()
+
+    async def run():
+        downloader = Downloader(args.platform, args.concurrency, args.rate, progress_callback=on_progress)
+        end = args.end or tools.get_cur_timestamp_ms()
+        start = args.start or int(end - args.days * 24 * 60 * 60 * 1000)
+        failed = False
+        for symbol in args.symbols:
+            if args.kind == "kline":
+                stats = await downloader.download_klines(symbol, start, end, args.interval)
+            else:
+                stats = await downloader.download_trades(symbol, start, end)
+            print("\n" + symbol, json.dumps(stats))
+            failed = failed or not stats or stats["failed"] > 0
+        return failed
+
+    failed = asyncio.get_event_loop().run_until_complete(run())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,25 +8,36 @@ Date:   2018/05/04
 Email:  xunfeng@test.com
 """
 
+import os
 import json
+import time
 import zlib
+import copy
 import asyncio
-
-import aioamqp
+import collections
 
 from quant import const
+from quant.utils import tools
 from quant.utils import logger
 from quant.config import config
 from quant.tasks import LoopRunTask, SingleTask
 from quant.utils.decorator import async_method_locker
+from quant.utils.router import TopicRouter
 from quant.market import Orderbook, Trade, Kline
 from quant.asset import Asset
 from quant.order import Order
 from quant.position import Position
+from quant.transport import create_transport
 
 
 __all__ = ("EventCenter", "EventConfig", "EventHeartbeat", "EventAsset", "EventOrder", "EventKline", "EventOrderbook",
-           "EventTrade")
+           "EventTrade", "EVENT_BUS_LOCAL", "EVENT_BUS_BROKER", "EVENT_BUS_HYBRID")
+
+
+# Event bus mode.
+EVENT_BUS_LOCAL = "local"  # Deliver events to subscribers in this process only, nothing serialized.
+EVENT_BUS_BROKER = "broker"  # Every event goes through the transport, even if the subscriber is in this process.
+EVENT_BUS_HYBRID = "hybrid"  # Deliver to local subscribers directly, and publish to the transport for remote ones.
 
 
 class Event:
@@ -85,25 +96,45 @@ class Event:
         return b
 
     def loads(self, b):
-        b = zlib.decompress(b)
-        d = json.loads(b.decode("utf8"))
+        d = self.loads_data(b)
         self._name = d.get("n")
         self._data = d.get("d")
         return d
 
+    @staticmethod
+    def loads_data(b):
+        """Decode a consumed message to {"n": name, "d": data}, no event instance modified."""
+        b = zlib.decompress(b)
+        return json.loads(b.decode("utf8"))
+
     def parse(self):
         raise NotImplemented
 
-    def subscribe(self, callback, multi=False):
+    def parse_data(self, data):
+        """ Parse data of a consumed message to object, without modifying this event, so that one subscribed event
+        can parse concurrent messages. Subclasses should override it, the default parses a copy of this event.
+        """
+        event = copy.copy(self)
+        event._data = data
+        return event.parse()
+
+    def subscribe(self, callback, multi=False, inline=False, conflate=False, prefetch_count=None):
         """ Subscribe this event.
 
         Args:
             callback: Asynchronous callback function.
-            multi: If subscribe multiple channels ?
+            multi: If subscribe multiple channels ? Routing key patterns with `*`/`#` are always supported, it's kept
+                for compatibility.
+            inline: If True, callback is awaited by the consumer directly, it must be fast; otherwise events are handled
+                one by one in order by a worker of this subscription. Default is False.
+            conflate: If True, only the newest event of every routing key is kept while callback is running, for
+                Orderbook/Ticker subscribers that only need the latest state. Default is False.
+            prefetch_count: How many messages can be delivered before acked, the consumer queue uses the max one of
+                all subscriptions, default is None, use `EVENT_BUS.prefetch_count`.
         """
         from quant.quant import quant
         self._callback = callback
-        SingleTask.run(quant.event_center.subscribe, self, self.callback, multi)
+        SingleTask.run(quant.event_center.subscribe, self, callback, multi, inline, conflate, prefetch_count)
 
     def publish(self):
         """Publish this event."""
@@ -111,10 +142,7 @@ class Event:
         SingleTask.run(quant.event_center.publish, self)
 
     async def callback(self, channel, body, envelope, properties):
-        self._exchange = envelope.exchange_name
-        self._routing_key = envelope.routing_key
-        self.loads(body)
-        o = self.parse()
+        o = self.parse_data(self.loads_data(body).get("d"))
         await self._callback(o)
 
     def __str__(self):
@@ -153,6 +181,9 @@ class EventConfig(Event):
     def parse(self):
         return self._data
 
+    def parse_data(self, data):
+        return data
+
 
 class EventHeartbeat(Event):
     """ Server Heartbeat event.
@@ -181,6 +212,9 @@ class EventHeartbeat(Event):
     def parse(self):
         return self._data
 
+    def parse_data(self, data):
+        return data
+
 
 class EventAsset(Event):
     """ Asset event.
@@ -215,7 +249,10 @@ class EventAsset(Event):
         super(EventAsset, self).__init__(name, exchange, queue, routing_key, data=data)
 
     def parse(self):
-        asset = Asset(**self.data)
+        return self.parse_data(self._data)
+
+    def parse_data(self, data):
+        asset = Asset(**data)
         return asset
 
 
@@ -275,7 +312,10 @@ class EventOrder(Event):
     def parse(self):
         """ Parse self._data to Order object.
         """
-        order = Order(**self.data)
+        return self.parse_data(self._data)
+
+    def parse_data(self, data):
+        order = Order(**data)
         return order
 
 
@@ -331,7 +371,10 @@ class EventKline(Event):
         super(EventKline, self).__init__(name, exchange, queue, routing_key, data=data)
 
     def parse(self):
-        kline = Kline(**self.data)
+        return self.parse_data(self._data)
+
+    def parse_data(self, data):
+        kline = Kline(**data)
         return kline
 
 
@@ -368,7 +411,10 @@ class EventOrderbook(Event):
         super(EventOrderbook, self).__init__(name, exchange, queue, routing_key, data=data)
 
     def parse(self):
-        orderbook = Orderbook(**self.data)
+        return self.parse_data(self._data)
+
+    def parse_data(self, data):
+        orderbook = Orderbook(**data)
         return orderbook
 
 
@@ -408,43 +454,255 @@ class EventTrade(Event):
         super(EventTrade, self).__init__(name, exchange, queue, routing_key, data=data)
 
     def parse(self):
-        trade = Trade(**self.data)
+        return self.parse_data(self._data)
+
+    def parse_data(self, data):
+        trade = Trade(**data)
         return trade
 
 
+class Subscription:
+    """ A subscription of EventCenter.
+
+    Attributes:
+        event: Subscribed event, its exchange and routing key (pattern) are the binding.
+        callback: Asynchronous callback function, e.g. async def on_event(o): pass
+        inline: If True, callback is awaited by the consumer directly; otherwise events are put into the ordered queue
+            of this subscription and handled one by one, a worker task runs only while the queue is not empty.
+        conflate: If True, only the newest pending event of every routing key is kept, older ones are replaced.
+        prefetch_count: Prefetch window asked by this subscription, None means default.
+
+    Metrics:
+        received: Events put into this subscription.
+        handled: Events passed to callback.
+        conflated: Events replaced by newer ones of the same routing key.
+        max_pending: Max pending events ever.
+        lag_ms: Time(milliseconds) the latest handled event waited in queue.
+        max_lag_ms: Max `lag_ms` ever.
+    """
+
+    __slots__ = ("event", "callback", "inline", "conflate", "prefetch_count", "received", "handled", "conflated",
+                 "max_pending", "lag_ms", "max_lag_ms", "_queue", "_latest", "_running", )
+
+    def __init__(self, event, callback, inline=False, conflate=False, prefetch_count=None):
+        """Initialize."""
+        self.event = event
+        self.callback = callback
+        self.inline = inline
+        self.conflate = conflate
+        self.prefetch_count = prefetch_count
+        self.received = 0
+        self.handled = 0
+        self.conflated = 0
+        self.max_pending = 0
+        self.lag_ms = 0
+        self.max_lag_ms = 0
+        self._queue = collections.deque()  # e.g. [(enqueue time, object), ...]
+        self._latest = {}  # Conflated events, e.g. {routing_key: (enqueue time, object), ...}
+        self._running = False
+
+    @property
+    def pending(self):
+        """How many events waiting in queue."""
+        return len(self._latest) if self.conflate else len(self._queue)
+
+    async def call(self, o):
+        """Call callback directly."""
+        try:
+            await self.callback(o)
+        except Exception as e:
+            logger.error("event callback error:", e, caller=self)
+
+    def put(self, o, key=None):
+        """ Put an event into the queue.
+
+        Args:
+            o: Parsed event object.
+            key: Conflation key, the routing key of this event.
+        """
+        self.received += 1
+        if self.conflate:
+            if key in self._latest:
+                self.conflated += 1
+            self._latest[key] = (time.time(), o)  # A replaced key keeps its position, so no key is starved.
+        else:
+            self._queue.append((time.time(), o))
+        pending = self.pending
+        if pending > self.max_pending:
+            self.max_pending = pending
+        if not self._running:
+            self._running = True
+            SingleTask.run(self._work)
+
+    async def deliver(self, o, key=None):
+        if self.inline:
+            self.received += 1
+            self.handled += 1
+            await self.call(o)
+        else:
+            self.put(o, key)
+
+    async def _work(self):
+        try:
+            while True:
+                if self.conflate:
+                    if not self._latest:
+                        break
+                    ts, o = self._latest.pop(next(iter(self._latest)))
+                else:
+                    if not self._queue:
+                        break
+                    ts, o = self._queue.popleft()
+                self.lag_ms = round((time.time() - ts) * 1000, 3)
+                if self.lag_ms > self.max_lag_ms:
+                    self.max_lag_ms = self.lag_ms
+                self.handled += 1
+                await self.call(o)
+        finally:
+            self._running = False
+
+    @property
+    def stats(self):
+        d = {
+            "exchange": self.event.exchange,
+            "routing_key": self.event.routing_key,
+            "inline": self.inline,
+            "conflate": self.conflate,
+            "received": self.received,
+            "handled": self.handled,
+            "conflated": self.conflated,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "lag_ms": self.lag_ms,
+            "max_lag_ms": self.max_lag_ms
+        }
+        return d
+
+
 class EventCenter:
     """ Event center.
+
+    The bus is set by config `EVENT_BUS`, e.g. {"mode": "hybrid", "transport": "unix", "remote_exchanges": ["Order"]}
+        mode: `local` / `broker` / `hybrid`, default is `broker` if `RABBITMQ` or `transport` configured, otherwise
+            `local`.
+        transport: `amqp` (RabbitMQ, configured by `RABBITMQ`) / `unix` (brokerless Unix domain sockets, configured
+            by `EVENT_BUS.unix`, e.g. {"path": "/tmp/quant_bus"}) / `redis` (Redis Streams, configured by `REDIS`),
+            default is `amqp`.
+        remote_exchanges: Only for `hybrid` mode, exchanges published to the transport, default is None, all
+            exchanges. The publisher can't know whether a remote subscriber exists, so exchanges only consumed in
+            this process (e.g. Orderbook) can be left out to skip serialization.
+
+    In `local` and `hybrid` mode, local subscribers get the parsed object of the published event directly, the same
+    object is shared by all local subscribers, do not modify it. In `hybrid` mode, messages published by this process
+    are skipped when consumed back from the transport, so no subscriber receives an event twice.
+
+    Every process consumes its own auto-delete queue, `{server_id}.EventCenter.{pid}`, bound with the bindings of all
+    subscriptions, so every subscribing process receives every matched message, even if several processes have the
+    same `server_id`. `Event.queue` is not used to consume any more. Set `EVENT_BUS.queue` to share one queue by
+    several processes instead, then every message is consumed by only one of them. A consumed message is routed by a
+    topic trie to matched subscriptions, decoded once and parsed per subscription without touching shared event
+    instances.
+
+    Flow control is set by config `EVENT_BUS` too:
+        prefetch_count: Prefetch window of the consumer queue, default is 100, raised by subscriptions asking more.
+        ack_batch: Ack once with `multiple` after so many messages, default is a quarter of prefetch window.
+        ack_interval_ms: Max delay(milliseconds) of a pending ack, default is 100ms.
     """
 
     def __init__(self):
-        self._host = config.rabbitmq.get("host", "localhost")
-        self._port = config.rabbitmq.get("port", 5672)
-        self._username = config.rabbitmq.get("username", "guest")
-        self._password = config.rabbitmq.get("password", "guest")
-        self._protocol = None
-        self._channel = None  # Connection channel.
-        self._connected = False  # If connect success.
-        self._subscribers = []  # e.g. [(event, callback, multi), ...]
-        self._event_handler = {}  # e.g. {"exchange:routing_key": [callback_function, ...]}
-
-        # Register a loop run task to check TCP connection's healthy.
-        LoopRunTask.register(self._check_connection, 10)
+        event_bus = config.event_bus or {}
+        default_mode = EVENT_BUS_BROKER if config.rabbitmq or event_bus.get("transport") else EVENT_BUS_LOCAL
+        self._mode = event_bus.get("mode", default_mode)
+        self._remote_exchanges = event_bus.get("remote_exchanges")
+        self._app_id = tools.get_uuid1()  # Mark messages published by this process.
+        self._transport = None
+        self._queue_name = event_bus.get("queue") or "{server_id}.EventCenter.{pid}".format(
+            server_id=config.server_id, pid=os.getpid())
+        self._queue = None  # Queue name declared, None if not consuming.
+        self._bindings = []  # e.g. [(exchange, routing_key), ...]
+        self._prefetch_count = event_bus.get("prefetch_count", 100)
+        self._ack_batch = event_bus.get("ack_batch")
+        self._ack_interval = event_bus.get("ack_interval_ms", 100) / 1000
+        self._unacked = 0  # Messages handled but not acked yet.
+        self._last_envelope = None  # Envelope of the latest handled message.
+        self._ack_handle = None
+        self._consumed = 0
+        self._published = 0
+        self._subscriptions = []
+        self._router = TopicRouter()  # Remote messages => subscriptions.
+        self._local_router = TopicRouter()  # Local events => subscriptions.
+
+        if self._mode != EVENT_BUS_LOCAL:
+            name = event_bus.get("transport", "amqp")
+            if name == "amqp":
+                params = config.rabbitmq or {}
+            elif name == "redis":
+                params = config.redis or {}
+            else:
+                params = event_bus.get(name, {})
+            self._transport = create_transport(name, **params)
+
+            # Register a loop run task to check connection's healthy.
+            LoopRunTask.register(self._check_connection, 10)
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def transport(self):
+        return self._transport
+
+    @property
+    def stats(self):
+        """Lag metrics of the consumer queue and every subscription."""
+        d = {
+            "mode": self._mode,
+            "queue": self._queue,
+            "prefetch_count": self._prefetch_count,
+            "consumed": self._consumed,
+            "published": self._published,
+            "unacked": self._unacked,
+            "subscriptions": [s.stats for s in self._subscriptions]
+        }
+        return d
 
     def initialize(self):
         asyncio.get_event_loop().run_until_complete(self.connect())
 
     @async_method_locker("EventCenter.subscribe")
-    async def subscribe(self, event: Event, callback=None, multi=False):
+    async def subscribe(self, event: Event, callback=None, multi=False, inline=False, conflate=False,
+                        prefetch_count=None):
         """ Subscribe a event.
 
         Args:
             event: Event type.
-            callback: Asynchronous callback.
-            multi: If subscribe multiple channel(routing_key) ?
+            callback: Asynchronous callback, called with the parsed object.
+            multi: If subscribe multiple channel(routing_key) ? Kept for compatibility.
+            inline: If True, callback is awaited by the consumer directly.
+            conflate: If True, only the newest pending event of every routing key is kept.
+            prefetch_count: Prefetch window asked by this subscription.
         """
         logger.info("NAME:", event.name, "EXCHANGE:", event.exchange, "QUEUE:", event.queue, "ROUTING_KEY:",
                     event.routing_key, caller=self)
-        self._subscribers.append((event, callback, multi))
+        if not callback:
+            return
+        subscription = Subscription(event, callback, inline, conflate, prefetch_count)
+        self._subscriptions.append(subscription)
+        if self._mode != EVENT_BUS_BROKER:
+            self._local_router.add(event.exchange, event.routing_key, subscription)
+        if self._mode == EVENT_BUS_LOCAL:
+            return
+        self._router.add(event.exchange, event.routing_key, subscription)
+        if prefetch_count and prefetch_count > self._prefetch_count:
+            self._prefetch_count = prefetch_count
+            if self._queue:
+                await self._transport.set_prefetch(prefetch_count)
+        binding = (event.exchange, event.routing_key)
+        if binding not in self._bindings:
+            self._bindings.append(binding)
+            if self._queue:
+                await self._transport.bind(self._queue, event.exchange, event.routing_key)
 
     async def publish(self, event):
         """ Publish a event.
@@ -452,105 +710,118 @@ class EventCenter:
         Args:
             event: A event to publish.
         """
-        if not self._connected:
-            logger.warn("RabbitMQ not ready right now!", caller=self)
+        self._published += 1
+        if self._mode != EVENT_BUS_BROKER:
+            await self._publish_local(event)
+            if self._mode == EVENT_BUS_LOCAL:
+                return
+            if self._remote_exchanges is not None and event.exchange not in self._remote_exchanges:
+                return
+        if not self._transport or not self._transport.connected:
+            logger.warn("event transport not ready right now!", caller=self)
             return
         data = event.dumps()
-        await self._channel.basic_publish(payload=data, exchange_name=event.exchange, routing_key=event.routing_key)
+        await self._transport.publish(event.exchange, event.routing_key, data, self._app_id)
+
+    async def _publish_local(self, event):
+        """Deliver a event to local subscribers, without serialization."""
+        subscriptions = self._local_router.match(event.exchange, event.routing_key)
+        if not subscriptions:
+            return
+        o = event.parse()
+        for subscription in subscriptions:
+            await subscription.deliver(o, event.routing_key)
+
+    def _is_local_message(self, properties):
+        """If a consumed message is published by this process and already delivered locally."""
+        return self._mode == EVENT_BUS_HYBRID and getattr(properties, "app_id", None) == self._app_id
 
     async def connect(self, reconnect=False):
-        """ Connect to RabbitMQ server and create default exchange.
+        """ Connect to the transport and create default exchanges.
 
         Args:
             reconnect: If this invoke is a re-connection ?
         """
-        logger.info("host:", self._host, "port:", self._port, caller=self)
-        if self._connected:
+        if self._mode == EVENT_BUS_LOCAL or not self._transport:
             return
-
-        # Create a connection.
-        try:
-            transport, protocol = await aioamqp.connect(host=self._host, port=self._port, login=self._username,
-                                                        password=self._password, login_method="PLAIN")
-        except Exception as e:
-            logger.error("connection error:", e, caller=self)
+        if self._transport.connected:
+            return
+        if not await self._transport.connect():
             return
-        finally:
-            if self._connected:
-                return
-        channel = await protocol.channel()
-        self._protocol = protocol
-        self._channel = channel
-        self._connected = True
-        logger.info("Rabbitmq initialize success!", caller=self)
-
-        # Create default exchanges.
-        exchanges = ["Orderbook", "Trade", "Kline", "Kline.5min", "Kline.15min", "Config", "Heartbeat", "Asset",
-                     "Order", ]
-        for name in exchanges:
-            await self._channel.exchange_declare(exchange_name=name, type_name="topic")
-        logger.debug("create default exchanges success!", caller=self)
 
         if reconnect:
-            self._bind_and_consume()
+            SingleTask.run(self._bind_and_consume)
         else:
             # Maybe we should waiting for all modules to be initialized successfully.
-            asyncio.get_event_loop().call_later(5, self._bind_and_consume)
-
-    def _bind_and_consume(self):
-        async def do_them():
-            for event, callback, multi in self._subscribers:
-                await self._initialize(event, callback, multi)
-        SingleTask.run(do_them)
-
-    async def _initialize(self, event: Event, callback=None, multi=False):
-        if event.queue:
-            await self._channel.queue_declare(queue_name=event.queue, auto_delete=True)
-            queue_name = event.queue
-        else:
-            result = await self._channel.queue_declare(exclusive=True)
-            queue_name = result["queue"]
-        await self._channel.queue_bind(queue_name=queue_name, exchange_name=event.exchange,
-                                       routing_key=event.routing_key)
-        await self._channel.basic_qos(prefetch_count=event.prefetch_count)
-        if callback:
-            if multi:
-                await self._channel.basic_consume(callback=callback, queue_name=queue_name, no_ack=True)
-                logger.info("multi message queue:", queue_name, caller=self)
-            else:
-                await self._channel.basic_consume(self._on_consume_event_msg, queue_name=queue_name)
-                logger.info("queue:", queue_name, caller=self)
-                self._add_event_handler(event, callback)
+            SingleTask.call_later(self._bind_and_consume, 5)
+
+    async def _bind_and_consume(self):
+        self._unacked = 0  # Delivery tags are reset with a new channel.
+        self._last_envelope = None
+        queue = await self._transport.declare_queue(self._queue_name, self._prefetch_count)
+        for exchange, routing_key in list(self._bindings):
+            await self._transport.bind(queue, exchange, routing_key)
+        await self._transport.consume(queue, self._on_consume_event_msg)
+        self._queue = queue
 
     async def _on_consume_event_msg(self, channel, body, envelope, properties):
         # logger.debug("exchange:", envelope.exchange_name, "routing_key:", envelope.routing_key,
         #              "body:", body, caller=self)
         try:
-            key = "{exchange}:{routing_key}".format(exchange=envelope.exchange_name, routing_key=envelope.routing_key)
-            funcs = self._event_handler[key]
-            for func in funcs:
-                SingleTask.run(func, channel, body, envelope, properties)
-        except:
-            logger.error("event handle error! body:", body, caller=self)
-            return
+            if self._is_local_message(properties):
+                return
+            subscriptions = self._router.match(envelope.exchange_name, envelope.routing_key)
+            if not subscriptions:
+                return
+            data = Event.loads_data(body).get("d")  # Decode once, and parse per subscription.
+            for subscription in subscriptions:
+                o = subscription.event.parse_data(data)
+                if subscription.inline:
+                    await subscription.deliver(o)
+                else:
+                    subscription.put(o, envelope.routing_key)
+        except Exception as e:
+            logger.error("event handle error! body:", body, e, caller=self)
         finally:
-            await self._channel.basic_client_ack(delivery_tag=envelope.delivery_tag)  # response ack
-
-    def _add_event_handler(self, event: Event, callback):
-        key = "{exchange}:{routing_key}".format(exchange=event.exchange, routing_key=event.routing_key)
-        if key in self._event_handler:
-            self._event_handler[key].append(callback)
-        else:
-            self._event_handler[key] = [callback]
-        logger.debug("event handlers:", self._event_handler.keys(), caller=self)
+            self._consumed += 1
+            await self._ack(envelope)
+
+    async def _ack(self, envelope):
+        """Ack messages in batch, the latest envelope acks all messages before it."""
+        self._unacked += 1
+        self._last_envelope = envelope
+        ack_batch = self._ack_batch or max(self._prefetch_count // 4, 1)
+        if self._unacked >= ack_batch:
+            await self._flush_acks()
+        elif not self._ack_handle:
+            self._ack_handle = asyncio.get_event_loop().call_later(self._ack_interval, SingleTask.run,
+                                                                   self._flush_acks)
+
+    async def _flush_acks(self):
+        if self._ack_handle:
+            self._ack_handle.cancel()
+            self._ack_handle = None
+        if not self._unacked:
+            return
+        envelope = self._last_envelope
+        multiple = self._unacked > 1
+        self._unacked = 0
+        self._last_envelope = None
+        try:
+            await self._transport.ack(envelope, multiple=multiple)
+        except Exception as e:
+            logger.error("ack error:", e, caller=self)
 
     async def _check_connection(self, *args, **kwargs):
-        if self._connected and self._channel and self._channel.is_open:
-            logger.debug("RabbitMQ connection ok.", caller=self)
+        if not self._transport:
+            return
+        if self._transport.is_alive():
+            logger.debug("event transport connection ok.", caller=self)
             return
         logger.error("CONNECTION LOSE! START RECONNECT RIGHT NOW!", caller=self)
-        self._connected = False
-        self._protocol = None
-        self._channel = None
-        self._event_handler = {}
+        self._queue = None
+        if self._ack_handle:
+            self._ack_handle.cancel()
+            self._ack_handle = None
+        await self._transport.close()
         SingleTask.run(self.connect, reconnect=True)
@@ -7,18 +7,191 @@ Author: xunfeng
 Date:   2018/04/26
 """
 
+import time
 import asyncio
-from json import tool
+import collections
 
 from quant.utils import tools
 from quant.utils import logger
 from quant.config import config
-import requests
-import json
 
 
 
-__all__ = ("heartbeat", )
+__all__ = ("heartbeat", "reporter", )
+
+
+class CentreReporter(object):
+    """ 向中心服务器上报心跳和状态，使用异步HTTP客户端，不阻塞事件循环
+
+    配置 `HEARTBEAT`:
+        timeout: 每次请求超时时间(秒)，默认5秒
+        retry_queue: 失败的状态上报最多保留条数，默认100条，超出时丢弃最早的
+        retry_interval: 失败的状态上报重试间隔(秒)，默认10秒
+
+    心跳合并: 上一次心跳请求未返回时，本次心跳不再发送，计入 `missed`，由下一次心跳一起带上；心跳失败不重试，下一次心跳会带上最新的数据。
+    状态上报(如机器人状态)失败时放入有限长度的重试队列，随心跳一起重试。
+    """
+
+    def __init__(self):
+        # 配置在第一次请求时读取，模块导入时配置文件还未加载
+        self._configured = False
+        self._timeout = 5
+        self._retry_interval = 10
+        self._retries = collections.deque(maxlen=100)  # [(path, data), ...]
+        self._beating = False  # 是否有心跳请求未返回
+        self._retrying = False
+        self._last_retry = 0
+        self._sent = 0  # 成功的心跳次数
+        self._missed = 0  # 上次成功后合并或失败的心跳次数
+        self._failed = 0  # 失败的请求次数
+        self._last_stats = None  # (time, consumed, published)
+
+    @property
+    def stats(self):
+        d = {
+            "sent": self._sent,
+            "missed": self._missed,
+            "failed": self._failed,
+            "retry_queue": len(self._retries)
+        }
+        return d
+
+    def _configure(self):
+        """读取 `HEARTBEAT` 配置"""
+        if self._configured:
+            return
+        self._configured = True
+        self._timeout = config.heartbeat.get("timeout", 5)
+        self._retry_interval = config.heartbeat.get("retry_interval", 10)
+        self._retries = collections.deque(self._retries, maxlen=config.heartbeat.get("retry_queue", 100))
+
+    def _url(self, path):
+        centre = getattr(config, "tyquantcentreserver", None) or {}
+        host = centre.get("host", "120.26.56.32")
+        port = centre.get("port", "8088")
+        return "http://" + host + ":" + port + path, port
+
+    async def _post(self, path, data):
+        """ 发送请求，8088端口的中心服务器使用表单，其他使用json
+
+        Returns:
+            success: 是否成功
+        """
+        from quant.utils.http_client import AsyncHttpRequests
+        self._configure()
+        url, port = self._url(path)
+        headers = {"Connection": "close"}
+        try:
+            if port == "8088":
+                _, result, error = await asyncio.wait_for(
+                    AsyncHttpRequests.post(url, body=data, headers=headers, timeout=self._timeout), self._timeout + 1)
+            else:
+                _, result, error = await asyncio.wait_for(
+                    AsyncHttpRequests.post(url, data=data, headers=headers, timeout=self._timeout), self._timeout + 1)
+        except asyncio.TimeoutError:
+            result, error = None, "timeout"
+        if error:
+            self._failed += 1
+            logger.info("err:", error, "url:", url, caller=self)
+            return False
+        if isinstance(result, dict) and result.get("code", 0) != 0:
+            self._failed += 1
+            logger.info("res:", result, "url:", url, caller=self)
+            return False
+        return True
+
+    def _collect(self, count):
+        """心跳数据，带上事件循环健康状况和事件吞吐量"""
+        from quant.quant import quant
+        now = time.time()
+        data = {
+            "timestamp": tools.get_cur_timestamp_ms(),
+            "count": count,
+            "missed": self._missed,
+            "tasks": len(asyncio.all_tasks()),
+            "retry_queue": len(self._retries)
+        }
+        if quant.loop_monitor:
+            histogram = quant.loop_monitor.histogram
+            data["loop_lag_p50"] = histogram.percentile(50)
+            data["loop_lag_p99"] = histogram.percentile(99)
+            data["loop_lag_max"] = histogram.max
+            data["loop_stalls"] = quant.loop_monitor.stats["stalls"]
+        if quant.event_center:
+            stats = quant.event_center.stats
+            consumed, published = stats["consumed"], stats["published"]
+            if self._last_stats:
+                t, c, p = self._last_stats
+                data["consumed_rate"] = round((consumed - c) / max(now - t, 0.001), 3)
+                data["published_rate"] = round((published - p) / max(now - t, 0.001), 3)
+            self._last_stats = (now, consumed, published)
+            data["consumed"] = consumed
+            data["published"] = published
+        return data
+
+    def beat(self, count):
+        """ 发送一次心跳，不等待返回
+
+        Args:
+            count: 心跳次数
+        """
+        if self._beating:
+            self._missed += 1
+            return
+        self._beating = True
+        asyncio.get_event_loop().create_task(self._beat(count))
+
+    async def _beat(self, count):
+        try:
+            if await self._post("/fet_client_time/", self._collect(count)):
+                self._sent += 1
+                self._missed = 0
+            else:
+                self._missed += 1
+        except Exception as e:
+            self._missed += 1
+            logger.info("err:", e, caller=self)
+        finally:
+            self._beating = False
+        if self._retries and time.time() - self._last_retry >= self._retry_interval:
+            await self.retry()
+
+    async def report(self, path, data, retries=0):
+        """ 上报状态，失败时放入重试队列
+
+        Args:
+            path: 请求路径，如 `/remoteupdaterobotstatus/`
+            data: 上报数据
+            retries: 立即重试次数，默认为0
+
+        Returns:
+            success: 是否成功
+        """
+        for _ in range(retries + 1):
+            try:
+                if await self._post(path, data):
+                    return True
+            except Exception as e:
+                logger.info("err:", e, caller=self)
+        self._retries.append((path, data))
+        return False
+
+    async def retry(self):
+        """重试队列中的状态上报，按顺序发送，遇到失败停止"""
+        if self._retrying:
+            return
+        self._retrying = True
+        self._last_retry = time.time()
+        try:
+            while self._retries:
+                path, data = self._retries[0]
+                if not await self._post(path, data):
+                    break
+                self._retries.popleft()
+        except Exception as e:
+            logger.info("err:", e, caller=self)
+        finally:
+            self._retrying = False
 
 
 class HeartBeat(object):
@@ -31,14 +204,33 @@ class HeartBeat(object):
         self._print_interval = config.heartbeat.get("interval", 0)  # 心跳打印时间间隔(秒)，0为不打印
         self._broadcast_interval = config.heartbeat.get("broadcast", 0)  # 心跳广播间隔(秒)，0为不广播
         self._tasks = {}  # 跟随心跳执行的回调任务列表，由 self.register 注册 {task_id: {...}}
+        self._external_clock = False  # 是否由外部时钟驱动(如行情回放的虚拟时钟)，是则不再按真实时间执行
 
     @property
     def count(self):
         return self._count
 
+    @property
+    def interval(self):
+        return self._interval
+
+    def set_external_clock(self, external=True):
+        """ 设置心跳由外部时钟驱动，外部时钟每 interval 秒调用一次 tick
+        @param external True为外部时钟驱动，False为恢复按真实时间执行
+        """
+        self._external_clock = external
+
     def ticker(self):
         """ 启动心跳， 每秒执行一次
         """
+        # 设置下一次心跳回调
+        asyncio.get_event_loop().call_later(self._interval, self.ticker)
+        if not self._external_clock:
+            self.tick()
+
+    def tick(self):
+        """ 执行一次心跳
+        """
         self._count += 1
 
         # 打印心跳次数
@@ -46,9 +238,6 @@ class HeartBeat(object):
             if self._count % self._print_interval == 0:
                 logger.info("do server heartbeat, count:", self._count, caller=self)
 
-        # 设置下一次心跳回调
-        asyncio.get_event_loop().call_later(self._interval, self.ticker)
-
         # 执行任务回调
         for task_id, task in self._tasks.items():
             interval = task["interval"]
@@ -94,21 +283,9 @@ class HeartBeat(object):
         """
         #from quant.event import EventHeartbeat
         #EventHeartbeat(config.server_id, self.count).publish()
-        #将毫秒时间戳发送到中心服务器,表示托管者服务正常
-        try:
-            ipaddress = config.tyquantcentreserver.get("host", "120.26.56.32")
-            port = config.tyquantcentreserver.get("port", "8088")
-            data = {
-                "timestamp":tools.get_cur_timestamp_ms(),
-            }
-            headers = {
-                    'Connection': 'close',
-                }
-            res=requests.post("http://"+ipaddress+":"+port+"/fet_client_time/",data=data,headers=headers)
-            logger.info("res:", res.text, caller=self)
-        except Exception as err:
-            logger.info("err:", err, caller=self)
-
+        #将毫秒时间戳和运行状态发送到中心服务器,表示托管者服务正常
+        reporter.beat(self._count)
 
 
 heartbeat = HeartBeat()
+reporter = CentreReporter()
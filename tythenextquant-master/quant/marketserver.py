@@ -0,0 +1,234 @@
+# -*- coding:utf-8 -*-
+
+"""
+Multi-process market server.
+Symbols of every platform in `MARKETS` are sharded across worker processes, every worker runs its own event loop with
+the Websocket connections of its symbols, so JSON decoding and orderbook merging of different symbols run on
+different cores. Market data is published to the event bus, and written into a shared book region per worker if
+`shared_book` is configured. Crashed workers are restarted by the supervisor.
+
+Config:
+    "MARKET_SERVER": {
+        "workers": 4,  # Worker processes, default is the number of CPU cores.
+        "restart_delay": 1,  # Seconds to wait before restarting a crashed worker, doubled every crash, max 60s.
+    },
+    "MARKETS": {
+        "binance": {
+            "symbols": ["BTCUSDT", "ETHUSDT", ...],
+            "channels": ["orderbook", "trade"],
+            "orderbook_length": 10,
+            "shards": [["BTCUSDT"], ["ETHUSDT", "BNBUSDT"]]  # Optional, shard `i` runs in worker `i % workers`.
+        }
+    }
+Symbols not in `shards` are assigned round-robin in sorted order, so a symbol runs in the same worker every start.
+
+Usage:
+    from quant.quant import quant
+    quant.start_market_server("config.json")
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import os
+import copy
+import time
+import signal
+import asyncio
+import multiprocessing
+from multiprocessing.connection import wait
+
+from quant import const
+from quant.utils import logger
+from quant.config import config
+
+
+__all__ = ("MarketServer", "assign_shards", )
+
+
+MAX_RESTART_DELAY = 60
+STABLE_SECONDS = 60  # A worker ran longer than this is stable, its restart delay is reset.
+
+
+def assign_shards(markets, workers):
+    """ Assign symbols of markets to workers.
+
+    Args:
+        markets: `MARKETS` config, e.g. {"binance": {"symbols": [...], "channels": [...], ...}}
+        workers: Number of workers.
+
+    Returns:
+        shards: Market params of every worker, e.g. [[{"platform": "binance", "symbols": [...], ...}, ...], ...]
+    """
+    shards = [[] for _ in range(workers)]
+    for platform, params in markets.items():
+        symbols = list(params.get("symbols") or [])
+        groups = [[] for _ in range(workers)]
+        assigned = set()
+        for i, shard in enumerate(params.get("shards") or []):
+            for symbol in shard:
+                if symbol in symbols and symbol not in assigned:
+                    groups[i % workers].append(symbol)
+                    assigned.add(symbol)
+        rest = sorted(s for s in set(symbols) if s not in assigned)
+        for i, symbol in enumerate(rest):
+            groups[i % workers].append(symbol)
+        for i, group in enumerate(groups):
+            if not group:
+                continue
+            p = copy.copy(params)
+            p.pop("shards", None)
+            p["platform"] = platform
+            p["symbols"] = group
+            if p.get("shared_book"):
+                p["shared_book"] = "{}.{}".format(p["shared_book"], i)  # Only one writer per region.
+            shards[i].append(p)
+    return shards
+
+
+def _market_class(platform):
+    """Get Market class of a platform, None if not supported."""
+    if platform == const.BINANCE:
+        from quant.platform.binance import BinanceMarket as M
+    elif platform == const.BINANCE_FUTURE:
+        from quant.platform.binance_future import BinanceFuMarket as M
+    elif platform == const.BYBIT:
+        from quant.platform.bybit import BybitMarketV5 as M
+    elif platform == const.OKX:
+        from quant.platform.okx import OkxMarket as M
+    elif platform == const.GATE:
+        from quant.platform.gate import GateMarketv4 as M
+    elif platform == const.KUCOIN:
+        from quant.platform.kucoin import KucoinMarket as M
+    elif platform == const.MEXC:
+        from quant.platform.mexc import MexcMarket as M
+    elif platform == const.BITGET:
+        from quant.platform.bitget import BitgetMarket as M
+    else:
+        return None
+    return M
+
+
+def _run_worker(index, shard):
+    """Worker process entry, run markets of a shard in a new event loop."""
+    from quant.quant import quant
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config.server_id = "{}.{}".format(config.server_id, index)
+    asyncio.set_event_loop(None)  # Don't share the loop of the supervisor, a new one is created below.
+    quant.loop = None
+    quant._get_event_loop()
+    quant._init_loop_monitor()
+    quant._init_db_instance()
+    quant._init_event_center()
+    quant._do_heartbeat()
+
+    markets = []
+    for params in shard:
+        M = _market_class(params["platform"])
+        if not M:
+            logger.error("platform error:", params["platform"], caller="MarketServer")
+            continue
+        markets.append(M(ispublic_to_mq=True, **params))
+        logger.info("worker:", index, "platform:", params["platform"], "symbols:", params["symbols"],
+                    caller="MarketServer")
+    quant.start()
+
+
+class _Worker:
+    """A worker process and its restart state."""
+
+    def __init__(self, index, shard, delay):
+        self.index = index
+        self.shard = shard
+        self.delay = delay
+        self.process = None
+        self.started_at = 0
+        self.restart_at = None  # Time to restart, None if running.
+        self.restarts = 0
+
+
+class MarketServer:
+    """ Multi-process market server supervisor.
+
+    Attributes:
+        markets: `MARKETS` config.
+        workers: Number of worker processes, default is the number of CPU cores.
+        restart_delay: Seconds to wait before restarting a crashed worker, doubled every crash, max 60s.
+    """
+
+    def __init__(self, markets, workers=None, restart_delay=1):
+        """Initialize."""
+        self._markets = markets
+        self._workers_count = workers or os.cpu_count() or 1
+        self._restart_delay = restart_delay
+        self._context = multiprocessing.get_context("fork")
+        self._workers = []
+        self._stopping = False
+
+    @property
+    def workers(self):
+        return self._workers
+
+    def _spawn(self, worker):
+        process = self._context.Process(target=_run_worker, args=(worker.index, worker.shard),
+                                        name="market-worker-{}".format(worker.index))
+        process.start()
+        worker.process = process
+        worker.started_at = time.time()
+        worker.restart_at = None
+        logger.info("worker started, index:", worker.index, "pid:", process.pid, caller=self)
+
+    def _on_exit(self, worker):
+        process = worker.process
+        process.join()
+        if self._stopping:
+            return
+        if time.time() - worker.started_at > STABLE_SECONDS:
+            worker.delay = self._restart_delay
+        worker.restarts += 1
+        worker.restart_at = time.time() + worker.delay
+        logger.error("worker exited, index:", worker.index, "pid:", process.pid, "exitcode:", process.exitcode,
+                     "restarts:", worker.restarts, "restart in:", worker.delay, caller=self)
+        worker.delay = min(worker.delay * 2, MAX_RESTART_DELAY)
+
+    def _stop(self, signum, frame):
+        logger.info("market server stopping, signal:", signum, caller=self)
+        self._stopping = True
+
+    def run(self):
+        """Start workers and supervise them until SIGINT / SIGTERM."""
+        default_mode = "broker" if config.rabbitmq or config.event_bus.get("transport") else "local"
+        local = config.event_bus.get("mode", default_mode) == "local"
+        if local and not any(p.get("shared_book") for p in self._markets.values()):
+            logger.warn("no event bus or shared book configured, market data can't leave worker processes!",
+                        caller=self)
+        shards = assign_shards(self._markets, self._workers_count)
+        self._workers = [_Worker(i, shard, self._restart_delay) for i, shard in enumerate(shards) if shard]
+        if not self._workers:
+            logger.error("no symbols in MARKETS!", caller=self)
+            return
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        for worker in self._workers:
+            self._spawn(worker)
+
+        while not self._stopping:
+            running = {w.process.sentinel: w for w in self._workers if w.restart_at is None}
+            for sentinel in wait(list(running), timeout=1):
+                self._on_exit(running[sentinel])
+            now = time.time()
+            for worker in self._workers:
+                if worker.restart_at is not None and now >= worker.restart_at and not self._stopping:
+                    self._spawn(worker)
+
+        for worker in self._workers:
+            if worker.process and worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self._workers:
+            if worker.process:
+                worker.process.join(5)
+                if worker.process.is_alive():
+                    worker.process.kill()
+        logger.info("market server stopped.", caller=self)
@@ -55,11 +55,13 @@ class Order:
         ctime: Order create time, millisecond.
         utime: Order update time, millisecond.
         etime: 事件时间.
+        ltime: Local receive time of the latest update, millisecond.
+        latency: Latency of the latest update corrected by exchange clock offset, millisecond.
     """
 
     def __init__(self, account=None, platform=None, strategy=None, order_no=None, symbol=None, action=None, price=0,
                  quantity=0, remain=0, status=ORDER_STATUS_NONE, avg_price=0, order_type=ORDER_TYPE_LIMIT,
-                 trade_type=TRADE_TYPE_NONE, ctime=None, utime=None, etime=None):
+                 trade_type=TRADE_TYPE_NONE, ctime=None, utime=None, etime=None, ltime=None, latency=None):
         self.platform = platform
         self.account = account
         self.strategy = strategy
@@ -76,6 +78,8 @@ class Order:
         self.ctime = ctime if ctime else tools.get_cur_timestamp_ms()
         self.utime = utime if utime else tools.get_cur_timestamp_ms()
         self.etime = etime if etime else tools.get_cur_timestamp_ms()
+        self.ltime = ltime
+        self.latency = latency
 
     def __str__(self):
         info = "[platform: {platform}, account: {account}, strategy: {strategy}, order_no: {order_no}, " \
@@ -31,6 +31,7 @@ from quant.utils.http_client import AsyncHttpRequests
 from quant.utils.http_client import SyncHttpRequests
 
 from quant.utils.decorator import async_method_locker
+from quant.utils.clock import get_clock
 from quant.order import ORDER_TYPE_LIMIT, ORDER_TYPE_MARKET
 from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
     ORDER_STATUS_CANCELED, ORDER_STATUS_FAILED
@@ -51,15 +52,40 @@ class BinanceRestAPI:
         host: HTTP request host.
         access_key: Account's ACCESS KEY.
         secret_key: Account's SECRET KEY.
+        recv_window: `recvWindow`(milliseconds) of signed requests, default is None, use exchange default 5000ms.
+
+    NOTE:
+        The `timestamp` of signed requests is replaced by the exchange clock corrected time before signing.
     """
 
-    def __init__(self, host, access_key, secret_key,platform=None,account=None):
+    def __init__(self, host, access_key, secret_key,platform=None,account=None,recv_window=None):
         """initialize REST API client."""
         self._host = host
         self._platform = platform
         self._account = account
         self._access_key = access_key
         self._secret_key = secret_key
+        self._recv_window = recv_window
+        self._clock = get_clock(BINANCE)
+        self._clock.set_server_time_func(self._fetch_server_time)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    async def _fetch_server_time(self):
+        """Server time probe of exchange clock."""
+        success, error = await self.get_server_time()
+        if error:
+            return None
+        return success["serverTime"]
+
+    def _sign_params(self, pdata):
+        """Correct `timestamp` with exchange clock and set `recvWindow` for a signed request."""
+        if "timestamp" in pdata:
+            pdata["timestamp"] = self._clock.now_ms()
+            if self._recv_window and "recvWindow" not in pdata:
+                pdata["recvWindow"] = self._recv_window
     
     async def GetExchangeInfo(self,symbol=None,autotry = False,sleep=100,reinfo = False):
         """ 获取交易所规则
@@ -892,6 +918,8 @@ class BinanceRestAPI:
         if body:
             pdata.update(body)
 
+        if auth:
+            self._sign_params(pdata)
         if pdata:
             query = "&".join(["=".join([str(k), str(v)]) for k, v in pdata.items()])
         else:
@@ -1041,6 +1069,8 @@ class BinanceRestAPI:
         if body:
             pdata.update(body)
 
+        if auth:
+            self._sign_params(pdata)
         if pdata:
             query = "&".join(["=".join([str(k), str(v)]) for k, v in pdata.items()])
         else:
@@ -1312,7 +1342,7 @@ class BinanceTrade(Websocket):
                 order_nos.append(order_no)
             return order_nos, None
 
-    @async_method_locker("BinanceTrade.process.locker")
+    @async_method_locker("BinanceTrade.process.locker", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -1321,6 +1351,7 @@ class BinanceTrade(Websocket):
         """
         logger.debug("msg:", json.dumps(msg), caller=self)
         e = msg.get("e")
+        stamp = self._rest_api.clock.stamp(e, msg.get("E"))
         if e == "executionReport":  # Order update.
             if msg["s"] != self._raw_symbol:
                 return
@@ -1361,6 +1392,9 @@ class BinanceTrade(Websocket):
             order.remain = float(msg["q"]) - float(msg["z"])
             order.status = status
             order.utime = msg["T"]
+            order.etime = msg["E"]
+            order.ltime = stamp["LocalTime"]
+            order.latency = stamp["Latency"]
             if self._order_update_callback:
                 SingleTask.run(self._order_update_callback, copy.copy(order))
         if e == "outboundAccountPosition":  # asset update.
@@ -1372,7 +1406,7 @@ class BinanceTrade(Websocket):
                 "timestamp": msg["E"],
                 "update": msg["u"]                    
             }
-            asset = Asset(**info)
+            asset = Asset(ltime=stamp["LocalTime"], latency=stamp["Latency"], **info)
             if self._asset_update_callback:
                 SingleTask.run(self._asset_update_callback, copy.copy(asset))
             
@@ -1489,7 +1523,7 @@ class BinanceAccount(Websocket):
             SingleTask.run(self._init_success_callback, True, None)
 
 
-    @async_method_locker("BinanceAccount.process.locker")
+    @async_method_locker("BinanceAccount.process.locker", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -1497,6 +1531,7 @@ class BinanceAccount(Websocket):
             msg: message received from Websocket connection.
         """
         e = msg.get("e")
+        stamp = self._rest_api.clock.stamp(e, msg.get("E"))
         if e == "executionReport":  # Order update.
             if msg["s"] not in self._raw_symbols:
                 return
@@ -1506,6 +1541,7 @@ class BinanceAccount(Websocket):
                 "strategy": self._strategy,
                 "Info":msg,
             }
+            info.update(stamp)
             order = info
             if self._order_update_callback:
                 SingleTask.run(self._order_update_callback, copy.copy(order))
@@ -1532,12 +1568,16 @@ class BinanceAccount(Websocket):
                 "timestamp": int(msg["E"]),
                 "update": int(msg["u"])                    
             }
+            info.update(stamp)
             asset = info
             if self._asset_update_callback:
                 SingleTask.run(self._asset_update_callback, copy.copy(asset))
             
 
 from quant.utils.web import Websocket
+from quant.utils.router import MessageRouter
+from quant.utils.sharedbook import get_writer
+from quant.utils.gapfill import GapFiller
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.event import EventTrade, EventKline, EventOrderbook
 
@@ -1558,6 +1598,11 @@ class BinanceMarket(Websocket):
             symbols: Symbol list.
             channels: Channel list, only `orderbook` / `trade` / `kline`/ `tickers` to be enabled.
             orderbook_length: The length of orderbook's data to be published via OrderbookEvent, default is 10.
+            shared_book: Shared memory name, if set, the latest orderbook / ticker / trade of every symbol are written
+                into it for strategy processes on the same host, read by `quant.utils.sharedbook.SharedBookReader`.
+            backfill: Max missing trades / klines fetched from REST API after a gap of trade ids / kline open times,
+                e.g. after reconnecting, default is 10000, 0 to log gaps only. Backfilled ones are marked by
+                `"Backfill": True`.
     """
 
     def __init__(self,ispublic_to_mq=False,islog=False, orderbook_update_callback=None,kline_update_callback=None,trade_update_callback=None,tickers_update_callback=None, **kwargs):
@@ -1571,8 +1616,18 @@ class BinanceMarket(Websocket):
         self._channels = kwargs.get("channels")
         self._orderbook_length = kwargs.get("orderbook_length", 10)
 
-        self._c_to_s = {}
+        self._router = MessageRouter()  # stream => handler with symbol bound, registered in `_make_url`.
         self._tickers = {}
+        # Shared exchange clock, offset synced by server time probes of a public REST API client.
+        self._rest_api = BinanceRestAPI(kwargs.get("host", "https://api.binance.com"), "", "")
+        self._clock = self._rest_api.clock
+        self._shared_book = None
+        if kwargs.get("shared_book"):
+            self._shared_book = get_writer(kwargs["shared_book"], depth=max(self._orderbook_length, 20))
+        backfill = kwargs.get("backfill", 10000)
+        self._trade_gaps = GapFiller(self._emit_trade, self._fetch_trades, max_gap=backfill)
+        self._kline_gaps = GapFiller(self._emit_kline, self._fetch_klines, step=60 * 1000, repeat=True,
+                                     max_gap=backfill)
 
         url = self._make_url()
         self._ws = Websocket(url, process_callback=self.BinanceMarket_process)
@@ -1587,6 +1642,10 @@ class BinanceMarket(Websocket):
         self._trade_update_callback = trade_update_callback
         self._tickers_update_callback = tickers_update_callback
     
+    @property
+    def clock(self):
+        return self._clock
+
     def find_closest(self,num):
         arr = [5, 10, 20]
         closest = arr[0]
@@ -1604,22 +1663,23 @@ class BinanceMarket(Websocket):
             if ch == "kline":
                 for symbol in self._symbols:
                     symbol=symbol.replace("_","")
-                    c = self._symbol_to_channel(symbol, "kline_1m")
+                    c = self._symbol_to_channel(symbol, "kline_1m", self.process_kline)
                     cc.append(c)
             elif ch == "orderbook":
                 for symbol in self._symbols:
                     symbol=symbol.replace("_","")
-                    c = self._symbol_to_channel(symbol, "depth"+str(self.find_closest(self._orderbook_length))+"@100ms")
+                    c = self._symbol_to_channel(symbol, "depth"+str(self.find_closest(self._orderbook_length))+"@100ms",
+                                                self.process_orderbook)
                     cc.append(c)
             elif ch == "trade":
                 for symbol in self._symbols:
                     symbol=symbol.replace("_","")
-                    c = self._symbol_to_channel(symbol, "trade")
+                    c = self._symbol_to_channel(symbol, "trade", self.process_trade)
                     cc.append(c)
             elif ch == "tickers":
                 for symbol in self._symbols:
                     symbol=symbol.replace("_","")
-                    c = self._symbol_to_channel(symbol, "bookTicker")
+                    c = self._symbol_to_channel(symbol, "bookTicker", self.process_tickers)
                     cc.append(c)
             else:
                 logger.error("channel error! channel:", ch, caller=self)
@@ -1636,28 +1696,18 @@ class BinanceMarket(Websocket):
         if not isinstance(msg, dict):
             return
 
-        channel = msg.get("stream")
-        if channel not in self._c_to_s:
+        handler = self._router.get(msg.get("stream"))
+        if not handler:
             logger.warn("unkown channel, msg:", msg, caller=self)
             return
 
-        symbol = self._c_to_s[channel]
         data = msg.get("data")
-        e = data.get("e")
         if data:
             pass
         else:
             #logger.info("返回数据有误:", msg, caller=self)
             return
-
-        if e == "kline":
-            await self.process_kline(symbol, data,msg)
-        elif "depth" in channel:
-            await self.process_orderbook(symbol, data,msg)
-        elif e == "trade":
-            await self.process_trade(symbol, data,msg)
-        elif "bookTicker" in channel:
-            await self.process_tickers(symbol, data,msg)
+        await handler(data, msg)
 
     #加修饰器使得行情信息依次处理,如果之前的数据未处理完新数据直接抛弃，避免数据堆积新旧穿插
     #@async_method_locker("process_kline",wait=False)
@@ -1672,14 +1722,50 @@ class BinanceMarket(Websocket):
             "Low": float(data.get("k").get("l")),
             "Close": float(data.get("k").get("c")),
             "Volume": float(data.get("k").get("v")),
-            "Time": msg.get("E"),
+            "Time": data.get("E"),
         }
+        kline.update(self._clock.stamp("kline", data.get("E")))
+        self._kline_gaps.feed(symbol, data["k"]["t"], data.get("E"), kline)
+
+    def _emit_kline(self, kline):
         if self.ispublic_to_mq:
             EventKline(**kline).publish()
         if self._kline_update_callback:
             SingleTask.run(self._kline_update_callback, kline)
         if self.islog:
-            logger.info("symbol:", symbol, "kline:", kline, caller=self)
+            logger.info("symbol:", kline["symbol"], "kline:", kline, caller=self)
+
+    async def _fetch_klines(self, symbol, last, last_time, seq, seq_time):
+        """Fetch 1m klines from open time `last` (updated to the final one) to `seq` (excluded)."""
+        params = {
+            "symbol": symbol.replace("/", "").upper(),
+            "interval": "1m",
+            "startTime": last,
+            "endTime": seq - 1,
+            "limit": 1000
+        }
+        success, error = await self._rest_api.request("GET", "/api/v3/klines", params)
+        if error:
+            logger.error("fetch klines error:", error, "symbol:", symbol, caller=self)
+            return None
+        rows = []
+        for k in success:
+            kline = {
+                "Info": k,
+                "platform": self._platform,
+                "symbol": symbol,
+                "Open": float(k[1]),
+                "High": float(k[2]),
+                "Low": float(k[3]),
+                "Close": float(k[4]),
+                "Volume": float(k[5]),
+                "Time": k[6],
+                "ExchangeTime": k[6],
+                "LocalTime": tools.get_cur_timestamp_ms(),
+                "Latency": None
+            }
+            rows.append((k[0], kline))
+        return rows
 
     #加修饰器使得行情信息依次处理,如果之前的数据未处理完新数据直接抛弃，避免数据堆积新旧穿插
     #@async_method_locker("process_orderbook",wait=False)
@@ -1699,6 +1785,9 @@ class BinanceMarket(Websocket):
             "Bids": data.get("bids")[:self._orderbook_length],
             "Time": tools.get_cur_timestamp_ms()
         }
+        orderbook.update(self._clock.stamp("orderbook"))  # Partial depth stream has no event time.
+        if self._shared_book:
+            self._shared_book.update_orderbook(symbol, orderbook["Asks"], orderbook["Bids"], orderbook["Time"])
         if self._orderbook_update_callback:
             SingleTask.run(self._orderbook_update_callback, orderbook)
         if self.ispublic_to_mq:
@@ -1719,12 +1808,56 @@ class BinanceMarket(Websocket):
             "Amount": data.get("q"),
             "Time": data.get("E")
         }
+        trade.update(self._clock.stamp("trade", data.get("E")))
+        self._trade_gaps.feed(symbol, data.get("t"), data.get("T"), trade)
+
+    def _emit_trade(self, trade):
+        symbol = trade["symbol"]
+        if self._shared_book:
+            self._shared_book.update_trade(symbol, trade["Price"], trade["Amount"], trade["Type"], trade["Time"])
         if self.ispublic_to_mq:
             EventTrade(**trade).publish()
         if self._trade_update_callback:
             SingleTask.run(self._trade_update_callback, trade)
         if self.islog:
             logger.info("symbol:", symbol, "trade:", trade, caller=self)
+
+    async def _fetch_trades(self, symbol, last, last_time, seq, seq_time):
+        """ Fetch trades between trade ids `last` and `seq` (both excluded). Public REST API has aggregate trades
+        only, an aggregate trade of ids `f` to `l` is returned as one trade with sequence `l` if all its ids are
+        missing.
+        """
+        rows = []
+        params = {
+            "symbol": symbol.replace("/", "").upper(),
+            "startTime": last_time,
+            "endTime": min(seq_time, last_time + 60 * 60 * 1000 - 1),  # Max time range of a request is 1 hour.
+            "limit": 1000
+        }
+        while True:
+            success, error = await self._rest_api.request("GET", "/api/v3/aggTrades", params)
+            if error:
+                logger.error("fetch trades error:", error, "symbol:", symbol, caller=self)
+                break
+            for t in success:
+                if t["f"] > last and t["l"] < seq:
+                    trade = {
+                        "Info": t,
+                        "platform": self._platform,
+                        "symbol": symbol,
+                        "Type": ORDER_ACTION_SELL if t["m"] else ORDER_ACTION_BUY,
+                        "Price": t["p"],
+                        "Amount": t["q"],
+                        "Time": t["T"],
+                        "ExchangeTime": t["T"],
+                        "LocalTime": tools.get_cur_timestamp_ms(),
+                        "Latency": None
+                    }
+                    rows.append((t["l"], trade))
+            if len(success) < 1000 or success[-1]["l"] >= seq - 1:
+                break
+            params = {"symbol": symbol.replace("/", "").upper(), "fromId": success[-1]["a"] + 1, "limit": 1000}
+        return rows
     
     #加修饰器使得行情信息依次处理,如果之前的数据未处理完新数据直接抛弃，避免数据堆积新旧穿插
     #@async_method_locker("process_tickers",wait=False)
@@ -1740,6 +1873,10 @@ class BinanceMarket(Websocket):
             "Buyamount"    : data.get("B"),             
             "Time"    : tools.get_cur_timestamp_ms() 
         }
+        ticker.update(self._clock.stamp("tickers"))  # bookTicker stream has no event time.
+        if self._shared_book:
+            self._shared_book.update_ticker(symbol, ticker["Buy"], ticker["Buyamount"], ticker["Sell"],
+                                            ticker["Sellamount"], ticker["Time"])
         if self._tickers_update_callback:
             SingleTask.run(self._tickers_update_callback, ticker)
         if self.ispublic_to_mq:
@@ -1747,7 +1884,7 @@ class BinanceMarket(Websocket):
         if self.islog:
             logger.info("symbol:", symbol, "ticker:", ticker, caller=self)
 
-    def _symbol_to_channel(self, symbol, channel_type="ticker"):
+    def _symbol_to_channel(self, symbol, channel_type, handler):
         channel = "{x}@{y}".format(x=symbol.replace("/", "").lower(), y=channel_type)
-        self._c_to_s[channel] = symbol
+        self._router.register(channel, handler, symbol)
         return channel
@@ -28,6 +28,7 @@ from quant.utils.http_client import AsyncHttpRequests
 from quant.utils.http_client import SyncHttpRequests
 
 from quant.utils.decorator import async_method_locker
+from quant.utils.clock import get_clock
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL, ORDER_TYPE_LIMIT, ORDER_TYPE_MARKET
 from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
     ORDER_STATUS_CANCELED, ORDER_STATUS_FAILED
@@ -44,6 +45,9 @@ class BinanceFutureRestAPI:
         host: HTTP request host.
         access_key: Account's ACCESS KEY.
         secret_key: Account's SECRET KEY.
+
+    NOTE:
+        The `timestamp` of signed requests is replaced by the exchange clock corrected time before signing.
     """
 
     def __init__(self, host, access_key, secret_key):
@@ -51,6 +55,19 @@ class BinanceFutureRestAPI:
         self._host = host
         self._access_key = access_key
         self._secret_key = secret_key
+        self._clock = get_clock(BINANCE_FUTURE)
+        self._clock.set_server_time_func(self._fetch_server_time)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    async def _fetch_server_time(self):
+        """Server time probe of exchange clock."""
+        success, error = await self.server_time()
+        if error:
+            return None
+        return success["serverTime"]
 
     async def ping(self):
         """Test connectivity to the Rest API."""
@@ -400,6 +417,8 @@ class BinanceFutureRestAPI:
             pdata.update(params)
         if body:
             pdata.update(body)
+        if auth and "timestamp" in pdata:
+            pdata["timestamp"] = self._clock.now_ms()
         if not headers:
             headers = {}
         if pdata:
@@ -551,6 +570,8 @@ class BinanceFutureRestAPI:
             pdata.update(params)
         if body:
             pdata.update(body)
+        if auth and "timestamp" in pdata:
+            pdata["timestamp"] = self._clock.now_ms()
 
         if pdata:
             query = "&".join(["=".join([str(k), str(v)]) for k, v in pdata.items()])
@@ -841,7 +862,7 @@ class BinanceFutureTrade:
             order_nos.append(order_no)
         return order_nos, None
 
-    @async_method_locker("BinanceTrade.process.locker")
+    @async_method_locker("BinanceTrade.process.locker", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -850,8 +871,9 @@ class BinanceFutureTrade:
         """
         logger.debug("msg:", json.dumps(msg), caller=self)
         e = msg.get("e")
+        stamp = self._rest_api.clock.stamp(e, msg.get("E"))
         if e == "ORDER_TRADE_UPDATE":  # Order update.
-            self._update_order(msg["o"])
+            self._update_order(msg["o"], stamp)
 
         if e == "ACCOUNT_UPDATE":  # Balance和Position update.推送原始信息
             info = {
@@ -861,7 +883,7 @@ class BinanceFutureTrade:
                 "timestamp": msg["E"],
                 "update": msg["T"]                    
             }
-            asset = Asset(**info)
+            asset = Asset(ltime=stamp["LocalTime"], latency=stamp["Latency"], **info)
             if self._asset_update_callback:
                 SingleTask.run(self._asset_update_callback, copy.copy(asset))
 
@@ -900,11 +922,12 @@ class BinanceFutureTrade:
         if update:
             await self._position_update_callback(copy.copy(self._position))
 
-    def _update_order(self, order_info):
+    def _update_order(self, order_info, stamp=None):
         """ Order update.
 
         Args:
             order_info: Order information.
+            stamp: Timestamps of the message, returned by `ExchangeClock.stamp`.
 
         Returns:
             Return order object if or None.
@@ -947,6 +970,10 @@ class BinanceFutureTrade:
         order.avg_price = order_info["L"]
         order.status = status
         order.utime = order_info["T"]
+        if stamp:
+            order.etime = stamp["ExchangeTime"] or order.etime
+            order.ltime = stamp["LocalTime"]
+            order.latency = stamp["Latency"]
         order.trade_type = int(order_no[-1])
         SingleTask.run(self._order_update_callback, copy.copy(order))
 
@@ -961,9 +988,16 @@ class BinanceFutureTrade:
 
 from quant import const
 from quant.utils.web import Websocket
+from quant.utils.router import MessageRouter
+from quant.utils.gapfill import GapFiller
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.event import EventTrade, EventKline, EventOrderbook
 
+
+def _event_data(data):
+    """Market data without the timestamps of exchange clock, which events don't carry."""
+    return {k: v for k, v in data.items() if k not in ("ExchangeTime", "LocalTime", "Latency")}
+
 #交易所行情数据对象
 #通过ws接口获取行情，并通过回调函数传递给策略使用
 class BinanceFuMarket(Websocket):
@@ -981,6 +1015,9 @@ class BinanceFuMarket(Websocket):
             symbols: Symbol list.
             channels: Channel list, only `orderbook` / `aggTrade` / `kline` to be enabled.
             orderbook_length: The length of orderbook's data to be published via OrderbookEvent, default is 10.
+            backfill: Max missing aggregate trades / klines fetched from REST API after a gap of aggregate trade ids /
+                kline open times, e.g. after reconnecting, default is 10000, 0 to log gaps only. Backfilled ones are
+                marked by `"Backfill": True`.
     """
 
     def __init__(self,ispublic_to_mq=False,islog=False, orderbook_update_callback=None,kline_update_callback=None,trade_update_callback=None, **kwargs):
@@ -992,8 +1029,15 @@ class BinanceFuMarket(Websocket):
         self._channels = kwargs.get("channels")
         self._orderbook_length = kwargs.get("orderbook_length", 10)
 
-        self._c_to_s = {}
+        self._router = MessageRouter()  # stream => handler with symbol bound, registered in `_make_url`.
         self._tickers = {}
+        # Shared exchange clock, offset synced by server time probes of a public REST API client.
+        self._rest_api = BinanceFutureRestAPI(kwargs.get("host", "https://fapi.binance.com"), "", "")
+        self._clock = self._rest_api.clock
+        backfill = kwargs.get("backfill", 10000)
+        self._trade_gaps = GapFiller(self._emit_trade, self._fetch_trades, max_gap=backfill)
+        self._kline_gaps = GapFiller(self._emit_kline, self._fetch_klines, step=60 * 1000, repeat=True,
+                                     max_gap=backfill)
 
         url = self._make_url()
         self._ws = Websocket(url, process_callback=self.process)
@@ -1006,6 +1050,10 @@ class BinanceFuMarket(Websocket):
         self._kline_update_callback = kline_update_callback
         self._trade_update_callback = trade_update_callback
 
+    @property
+    def clock(self):
+        return self._clock
+
     def _make_url(self):
         """Generate request url.
         """
@@ -1013,15 +1061,15 @@ class BinanceFuMarket(Websocket):
         for ch in self._channels:
             if ch == "kline":
                 for symbol in self._symbols:
-                    c = self._symbol_to_channel(symbol, "kline_1m")
+                    c = self._symbol_to_channel(symbol, "kline_1m", self.process_kline)
                     cc.append(c)
             elif ch == "orderbook":
                 for symbol in self._symbols:
-                    c = self._symbol_to_channel(symbol, "depth20")
+                    c = self._symbol_to_channel(symbol, "depth20", self.process_orderbook)
                     cc.append(c)
             elif ch == "aggTrade":
                 for symbol in self._symbols:
-                    c = self._symbol_to_channel(symbol, "aggTrade")
+                    c = self._symbol_to_channel(symbol, "aggTrade", self.process_trade)
                     cc.append(c)
             else:
                 logger.error("channel error! channel:", ch, caller=self)
@@ -1038,21 +1086,11 @@ class BinanceFuMarket(Websocket):
         if not isinstance(msg, dict):
             return
 
-        channel = msg.get("stream")
-        if channel not in self._c_to_s:
+        handler = self._router.get(msg.get("stream"))
+        if not handler:
             logger.warn("unkown channel, msg:", msg, caller=self)
             return
-
-        symbol = self._c_to_s[channel]
-        data = msg.get("data")
-        e = data.get("e")
-
-        if e == "kline":
-            await self.process_kline(symbol, data)
-        elif channel.endswith("depth20"):
-            await self.process_orderbook(symbol, data)
-        elif e == "aggTrade":
-            await self.process_trade(symbol, data)
+        await handler(msg.get("data"))
 
     async def process_kline(self, symbol, data):
         """Process kline data and publish KlineEvent."""
@@ -1067,12 +1105,45 @@ class BinanceFuMarket(Websocket):
             "timestamp": data.get("k").get("t"),
             "kline_type": const.MARKET_TYPE_KLINE
         }
+        kline.update(self._clock.stamp("kline", data.get("E")))
+        self._kline_gaps.feed(symbol, data["k"]["t"], data.get("E"), kline)
+
+    def _emit_kline(self, kline):
         if self.ispublic_to_mq:
-            EventKline(**kline).publish()
+            EventKline(**_event_data(kline)).publish()
         if self._kline_update_callback:
             SingleTask.run(self._kline_update_callback, kline)
         if self.islog:
-            logger.info("symbol:", symbol, "kline:", kline, caller=self)
+            logger.info("symbol:", kline["symbol"], "kline:", kline, caller=self)
+
+    async def _fetch_klines(self, symbol, last, last_time, seq, seq_time):
+        """Fetch 1m klines from open time `last` (updated to the final one) to `seq` (excluded)."""
+        params = {
+            "symbol": symbol.replace("/", "").upper(),
+            "interval": "1m",
+            "startTime": last,
+            "endTime": seq - 1,
+            "limit": 1000
+        }
+        success, error = await self._rest_api.request("GET", "/fapi/v1/klines", params)
+        if error:
+            logger.error("fetch klines error:", error, "symbol:", symbol, caller=self)
+            return None
+        rows = []
+        for k in success:
+            kline = {
+                "platform": self._platform,
+                "symbol": symbol,
+                "open": k[1],
+                "high": k[2],
+                "low": k[3],
+                "close": k[4],
+                "volume": k[7],
+                "timestamp": k[0],
+                "kline_type": const.MARKET_TYPE_KLINE
+            }
+            rows.append((k[0], kline))
+        return rows
 
     async def process_orderbook(self, symbol, data):
         """Process orderbook data and publish OrderbookEvent."""
@@ -1091,8 +1162,9 @@ class BinanceFuMarket(Websocket):
             "timestampe": data.get("E"),
             "timestampt": data.get("T"),
         }
+        orderbook.update(self._clock.stamp("orderbook", data.get("E")))
         if self.ispublic_to_mq:
-            EventOrderbook(**orderbook).publish()
+            EventOrderbook(**_event_data(orderbook)).publish()
         if self._orderbook_update_callback:
             SingleTask.run(self._orderbook_update_callback, orderbook)
 
@@ -1109,14 +1181,47 @@ class BinanceFuMarket(Websocket):
             "quantity": data.get("q"),
             "timestamp": data.get("T")
         }
+        trade.update(self._clock.stamp("trade", data.get("E")))
+        self._trade_gaps.feed(symbol, data.get("a"), data.get("T"), trade)
+
+    def _emit_trade(self, trade):
         if self.ispublic_to_mq:
-            EventTrade(**trade).publish()
+            EventTrade(**_event_data(trade)).publish()
         if self._trade_update_callback:
             SingleTask.run(self._trade_update_callback, trade)
         if self.islog:
-            logger.info("symbol:", symbol, "trade:", trade, caller=self)
+            logger.info("symbol:", trade["symbol"], "trade:", trade, caller=self)
+
+    async def _fetch_trades(self, symbol, last, last_time, seq, seq_time):
+        """Fetch aggregate trades between aggregate trade ids `last` and `seq` (both excluded)."""
+        rows = []
+        from_id = last + 1
+        while from_id < seq:
+            params = {
+                "symbol": symbol.replace("/", "").upper(),
+                "fromId": from_id,
+                "limit": min(seq - from_id, 1000)
+            }
+            success, error = await self._rest_api.request("GET", "/fapi/v1/aggTrades", params)
+            if error:
+                logger.error("fetch trades error:", error, "symbol:", symbol, caller=self)
+                break
+            for t in success:
+                trade = {
+                    "platform": self._platform,
+                    "symbol": symbol,
+                    "action": ORDER_ACTION_SELL if t["m"] else ORDER_ACTION_BUY,
+                    "price": t["p"],
+                    "quantity": t["q"],
+                    "timestamp": t["T"]
+                }
+                rows.append((t["a"], trade))
+            if not success:
+                break
+            from_id = success[-1]["a"] + 1
+        return rows
 
-    def _symbol_to_channel(self, symbol, channel_type="ticker"):
+    def _symbol_to_channel(self, symbol, channel_type, handler):
         channel = "{x}@{y}".format(x=symbol.replace("/", "").lower(), y=channel_type)
-        self._c_to_s[channel] = symbol
+        self._router.register(channel, handler, symbol)
         return channel
\ No newline at end of file
@@ -13,7 +13,6 @@ import time
 import json
 import copy
 import hmac
-import zlib
 import base64
 import hashlib
 from urllib.parse import urljoin
@@ -29,6 +28,7 @@ from quant.tasks import SingleTask,LoopRunTask
 from quant.utils.websocket import Websocket
 from quant.asset import Asset, AssetSubscribe
 from quant.utils.decorator import async_method_locker
+from quant.utils.clock import get_clock
 from quant.utils.http_client import AsyncHttpRequests
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.order import ORDER_TYPE_LIMIT, ORDER_TYPE_MARKET
@@ -39,6 +39,7 @@ from quant.utils.http_client import SyncHttpRequests
 
 from quant import const
 from quant.utils.web import Websocket
+from quant.utils.compress import Inflater, RAW_DEFLATE
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.event import EventTrade, EventKline, EventOrderbook
 
@@ -63,6 +64,9 @@ class BitgetRestAPI:
         access_key: Account's ACCESS KEY.
         secret_key: Account's SECRET KEY.
         passphrase: API KEY Passphrase.
+
+    NOTE:
+        The `ACCESS-TIMESTAMP` of signed requests is the exchange clock corrected time.
     """
 
     def __init__(self, host, access_key, secret_key, passphrase,platform=None,account=None):
@@ -73,6 +77,24 @@ class BitgetRestAPI:
         self._access_key = access_key
         self._secret_key = secret_key
         self._passphrase = passphrase
+        self._clock = get_clock(BITGET)
+        self._clock.set_server_time_func(self._fetch_server_time)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    async def _fetch_server_time(self):
+        """Server time probe of exchange clock."""
+        success, error = await self.request("GET", "/api/spot/v1/public/time")
+        if error or not success.get("data"):
+            return None
+        return int(success["data"])
+
+    def _timestamp(self):
+        """Exchange clock corrected time of signed requests, e.g. 1538054050.975"""
+        ts = self._clock.now_ms()
+        return "{}.{:03d}".format(ts // 1000, ts % 1000)
     
     async def GetExchangeInfo(self,symbol=None,autotry = False,sleep=100,reinfo = False):
         """ 获取交易所规则
@@ -805,7 +827,7 @@ class BitgetRestAPI:
             uri += "?" + query
         url = urljoin(self._host, uri)
         if auth:
-            timestamp = str(time.time()).split(".")[0] + "." + str(time.time()).split(".")[1][:3]
+            timestamp = self._timestamp()
             if body:
                 body = json.dumps(body)
             else:
@@ -944,7 +966,7 @@ class BitgetRestAPI:
         url = urljoin(self._host, uri)
 
         if auth:
-            timestamp = str(time.time()).split(".")[0] + "." + str(time.time()).split(".")[1][:3]
+            timestamp = self._timestamp()
             if body:
                 body = json.dumps(body)
             else:
@@ -1080,6 +1102,7 @@ class BitgetTrade(Websocket):
 
         url = self._wss + "/ws/v3"
         super(BitgetTrade, self).__init__(url, send_hb_interval=5)
+        self._inflater = Inflater(RAW_DEFLATE)  # Every frame is raw deflate compressed independently.
         self.heartbeat_msg = "ping"
 
         self._assets = {}  # Asset object. e.g. {"BTC": {"free": "1.1", "locked": "2.2", "total": "3.3"}, ... }
@@ -1108,7 +1131,7 @@ class BitgetTrade(Websocket):
 
     async def connected_callback(self):
         """After websocket connection created successfully, we will send a message to server for authentication."""
-        timestamp = str(time.time()).split(".")[0] + "." + str(time.time()).split(".")[1][:3]
+        timestamp = self._rest_api._timestamp()
         message = str(timestamp) + "GET" + "/users/self/verify"
         mac = hmac.new(bytes(self._secret_key, encoding="utf8"), bytes(message, encoding="utf8"), digestmod="sha256")
         d = mac.digest()
@@ -1119,7 +1142,7 @@ class BitgetTrade(Websocket):
         }
         await self.ws.send_json(data)
 
-    @async_method_locker("BitgetTrade.process_binary.locker")
+    @async_method_locker("BitgetTrade.process_binary.locker", per_instance=True)
     async def process_binary(self, raw):
         """ Process binary message that received from websocket.
 
@@ -1129,14 +1152,10 @@ class BitgetTrade(Websocket):
         Returns:
             None.
         """
-        decompress = zlib.decompressobj(-zlib.MAX_WBITS)
-        msg = decompress.decompress(raw)
-        msg += decompress.flush()
-        msg = msg.decode()
+        msg = await self._inflater.loads_async(raw)
         if msg == "pong":
             return
         logger.debug("msg:", msg, caller=self)
-        msg = json.loads(msg)
 
         # Authorization message received.
         if msg.get("event") == "login":
@@ -1183,7 +1202,8 @@ class BitgetTrade(Websocket):
             for data in msg["data"]:
                 data["ctime"] = data["timestamp"]
                 data["utime"] = data["last_fill_time"]
-                self._update_order(data)
+                self._update_order(data, self._rest_api.clock.stamp("spot/order",
+                                                                    tools.utctime_str_to_mts(data["utime"])))
 
     async def create_order(self, action, price, quantity, order_type=ORDER_TYPE_LIMIT):
         """ Create an order.
@@ -1275,11 +1295,12 @@ class BitgetTrade(Websocket):
                 order_nos.append(order_info["order_id"])
             return order_nos, None
 
-    def _update_order(self, order_info):
+    def _update_order(self, order_info, stamp=None):
         """ Order update.
 
         Args:
             order_info: Order information.
+            stamp: Timestamps of the message, returned by `ExchangeClock.stamp`, None if fetched from REST API.
 
         Returns:
             None.
@@ -1327,6 +1348,9 @@ class BitgetTrade(Websocket):
             self._orders[order_no] = order
         order.ctime = ctime
         order.utime = utime
+        if stamp:
+            order.ltime = stamp["LocalTime"]
+            order.latency = stamp["Latency"]
 
         SingleTask.run(self._order_update_callback, copy.copy(order))
 
@@ -1370,6 +1394,7 @@ class BitgetMarket:
         self._platform = kwargs.get("platform")
         self._account = kwargs.get("account")
 
+        self._host = kwargs.get("host", "https://api.bitget.com")
         self._wss = kwargs.get("wss", "wss://ws.bitget.com/spot/v1/stream")
         self._symbols = list(set(kwargs.get("symbols")))
         self._channels = kwargs.get("channels")
@@ -1379,6 +1404,10 @@ class BitgetMarket:
         self._tickers = {}
         self.isalive = False
 
+        # Shared exchange clock, offset synced by server time probes of a public REST API client.
+        self._rest_api = BitgetRestAPI(self._host, "", "", "")
+        self._clock = self._rest_api.clock
+
 
         url = self._make_url()
         self._ws = Websocket(url, connected_callback=self.connected_callback,process_callback=self.BitgetMarket_process)
@@ -1394,6 +1423,10 @@ class BitgetMarket:
         self._kline_update_callback = kline_update_callback
         self._trade_update_callback = trade_update_callback
         self._tickers_update_callback = tickers_update_callback
+
+    @property
+    def clock(self):
+        return self._clock
     
     def find_closest(self,num):
         arr = [5, 15]
@@ -1553,6 +1586,7 @@ class BitgetMarket:
                 "Volume": float(data[-1][5]),
                 "Time": tools.get_cur_timestamp_ms(),
             }
+            kline.update(self._clock.stamp("kline"))  # Candle has the open time only, no event time.
             if self._kline_update_callback:
                 SingleTask.run(self._kline_update_callback, kline)
             if self.ispublic_to_mq:
@@ -1581,6 +1615,7 @@ class BitgetMarket:
                 "Bids": data[0].get("bids")[:self._orderbook_length],
                 "Time": int(data[0].get("ts"))
             }
+            orderbook.update(self._clock.stamp("orderbook", orderbook["Time"]))
             if self._orderbook_update_callback:
                 SingleTask.run(self._orderbook_update_callback, orderbook)
             if self.ispublic_to_mq:
@@ -1604,6 +1639,7 @@ class BitgetMarket:
                 "Amount": data[0][2],
                 "Time": int(data[0][0])
             }
+            trade.update(self._clock.stamp("trade", trade["Time"]))
             if self._trade_update_callback:
                 SingleTask.run(self._trade_update_callback, trade)
             if self.ispublic_to_mq:
@@ -1628,6 +1664,7 @@ class BitgetMarket:
                 "Buyamount"    : data[0].get("bidSz"),             
                 "Time"    : int(data[0].get("ts") )  
             }
+            ticker.update(self._clock.stamp("tickers", ticker["Time"]))
             if self._tickers_update_callback:
                 SingleTask.run(self._tickers_update_callback, ticker)
             if self.ispublic_to_mq:
@@ -1691,6 +1728,11 @@ class BitgetAccount:
         self._raw_symbols = []
         for symbol in self._symbols:
             self._raw_symbols.append(symbol.replace("_", "")+"_SPBL")
+
+        # Shared exchange clock, corrects the login timestamp and the latency of pushed messages.
+        self._rest_api = BitgetRestAPI(self._host, self._access_key, self._secret_key, self._passphrase)
+        self._clock = self._rest_api.clock
+
         url=self._wss
         self._ws = Websocket(url, self.connected_callback, self.process)
         self._ws.initialize()
@@ -1719,7 +1761,7 @@ class BitgetAccount:
         """ After websocket connection created successfully, pull back all open order information.
         """
         logger.info("Websocket connection authorized successfully.", caller=self)
-        timestamp = str(time.time()).split(".")[0]
+        timestamp = str(self._clock.now_ms() // 1000)
         sign = await self.get_sign(timestamp)
         d={
             "op": "login",
@@ -1762,7 +1804,7 @@ class BitgetAccount:
             SingleTask.run(self._init_success_callback, True, None)
 
 
-    @async_method_locker("BitgetAccount.process.locker")
+    @async_method_locker("BitgetAccount.process.locker", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -1780,6 +1822,7 @@ class BitgetAccount:
                     "strategy": self._strategy,
                     "Info":msg,
                 }
+                info.update(self._clock.stamp(e, msg["data"][0].get("uTime")))
                 order = info
                 if self._order_update_callback:
                     SingleTask.run(self._order_update_callback, copy.copy(order))
@@ -1806,6 +1849,7 @@ class BitgetAccount:
                     "timestamp": tools.get_cur_timestamp_ms(),
                     "update": tools.get_cur_timestamp_ms()                
                 }
+                info.update(self._clock.stamp(e))  # Account push has no event time.
                 asset = info
                 if self._asset_update_callback:
                     SingleTask.run(self._asset_update_callback, copy.copy(asset))
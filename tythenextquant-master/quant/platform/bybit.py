@@ -30,6 +30,9 @@ import traceback
 
 from quant.utils import tools
 from quant.utils.decorator import async_method_locker
+from quant.utils.router import MessageRouter
+from quant.utils.staleness import FeedMonitor
+from quant.utils.clock import get_clock
 from quant.order import ORDER_TYPE_LIMIT, ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
     ORDER_STATUS_CANCELED, ORDER_STATUS_FAILED
@@ -48,6 +51,9 @@ class BybitRestAPIV5:
         host: HTTP request host.
         access_key: Account's ACCESS KEY.
         secret_key Account's SECRET KEY.
+
+    NOTE:
+        The `X-BAPI-TIMESTAMP` of requests is the exchange clock corrected time.
     """
 
     def __init__(self, host, access_key, secret_key,platform=None,account=None):
@@ -57,6 +63,19 @@ class BybitRestAPIV5:
         self._account = account
         self._access_key = access_key
         self._secret_key = secret_key
+        self._clock = get_clock(BYBIT)
+        self._clock.set_server_time_func(self._fetch_server_time)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    async def _fetch_server_time(self):
+        """Server time probe of exchange clock."""
+        success, error = await self.request("GET", "/v5/market/time")
+        if error or not success or success.get("retCode") != 0:
+            return None
+        return success["time"]
     
     async def GetExchangeInfo(self,symbol=None,autotry = False,sleep=100,reinfo = False):
         """ 获取交易所规则
@@ -601,7 +620,7 @@ class BybitRestAPIV5:
             error: Error information, otherwise it's None.
         """
         url = urljoin(self._host, uri)
-        ts = str(tools.get_cur_timestamp_ms())
+        ts = str(self._clock.now_ms())
         pdata = {}
         recv_window=0
         if params:
@@ -772,7 +791,7 @@ class BybitRestAPIV5:
             error: Error information, otherwise it's None.
         """
         url = urljoin(self._host, uri)
-        ts = str(tools.get_cur_timestamp_ms())
+        ts = str(self._clock.now_ms())
         pdata = {}
         recv_window=0
         if params:
@@ -1780,7 +1799,7 @@ class BybitTrade:
                 return
             await self._update_order(success["order"])
 
-    @async_method_locker("BybitTrade.order.locker")
+    @async_method_locker("BybitTrade.order.locker", per_instance=True)
     async def _update_order(self, order_info):
         """ Update order object.
 
@@ -1860,6 +1879,8 @@ class BybitTrade:
 
 from quant import const
 from quant.utils.web import Websocket
+from quant.utils.sharedbook import get_writer
+from quant.utils.gapfill import GapFiller
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.event import EventTrade, EventKline, EventOrderbook
 
@@ -1965,7 +1986,7 @@ class BybitAccount:
         logger.info("subscribe accountinf success.",topic,caller=self)
 
 
-    @async_method_locker("BybitAccount.process")
+    @async_method_locker("BybitAccount.process", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -2095,6 +2116,9 @@ class BybitAccountV5:
         self._order_update_callback = kwargs.get("order_update_callback")
         self._trader_update_callback = kwargs.get("trader_update_callback")
 
+        # Shared exchange clock, corrects the auth expires and the latency of pushed messages.
+        self._rest_api = BybitRestAPIV5(self._host, self._access_key, self._secret_key)
+        self._clock = self._rest_api.clock
 
         url = self._wss
         self._ws = Websocket(url, connected_callback=self.send_auth,process_callback=self.process)
@@ -2127,7 +2151,7 @@ class BybitAccountV5:
     async def send_auth(self):
         key = self._access_key
         secret = self._secret_key
-        expires = int((time.time() + 10) * 1000)
+        expires = self._clock.now_ms() + 10000
         _val = f'GET/realtime{expires}'
         signature = str(hmac.new(
             bytes(secret, 'utf-8'),
@@ -2148,7 +2172,7 @@ class BybitAccountV5:
         logger.info("subscribe accountinf success.",topic,caller=self)
 
 
-    @async_method_locker("BybitAccount.process")
+    @async_method_locker("BybitAccount.process", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -2157,6 +2181,7 @@ class BybitAccountV5:
         """
         try :
             e = msg.get("topic")
+            stamp = self._clock.stamp(e, msg.get("creationTime"))
             if e == "order":  # Order update.
                 data = msg.get("data")[0]
                 if data:
@@ -2171,6 +2196,7 @@ class BybitAccountV5:
                     "strategy": self._strategy,
                     "Info":msg,
                 }
+                info.update(stamp)
                 order = info
                 if self._order_update_callback:
                     SingleTask.run(self._order_update_callback, copy.copy(order))
@@ -2189,6 +2215,7 @@ class BybitAccountV5:
                     "strategy": self._strategy,
                     "Info":msg,
                 }
+                info.update(stamp)
                 order = info
                 if self._trader_update_callback:
                     SingleTask.run(self._trader_update_callback, copy.copy(order))
@@ -2220,6 +2247,7 @@ class BybitAccountV5:
                     "timestamp": int(msg["creationTime"]),
                     "update":int(msg["creationTime"])                
                 }
+                info.update(stamp)
                 asset = info
                 if self._asset_update_callback:
                     SingleTask.run(self._asset_update_callback, copy.copy(asset))
@@ -2503,6 +2531,17 @@ class BybitMarketV5:
             symbols: Symbol list.
             channels: Channel list, only `orderbook` / `trade` / `kline` to be enabled.
             orderbook_length: The length of orderbook's data to be published via OrderbookEvent, default is 10.
+            stale_ms: Stale threshold(milliseconds) of every (symbol, channel) feed, default is None, learned from
+                the update rate, and `trade` / `kline` feeds are not checked. A stale feed is resubscribed alone.
+            stale_callback: Asynchronous callback function will be called when a feed goes stale, e.g.
+                async def on_feed_stale(feed): pass
+            shared_book: Shared memory name, if set, the latest orderbook / best bid-ask / trade of every symbol are
+                written into it for strategy processes on the same host, read by
+                `quant.utils.sharedbook.SharedBookReader`.
+            backfill: Max missing trades / klines fetched from REST API after a gap of trade ids / kline open times,
+                e.g. after reconnecting, default is 10000, 0 to log gaps only. Backfilled ones are marked by
+                `"Backfill": True`. Trades are backfilled from recent trades only, and not tracked if trade ids are
+                not numeric, e.g. UUIDs of derivatives.
     """
 
     def __init__(self,ispublic_to_mq=False,islog=False, orderbook_update_callback=None,kline_update_callback=None,trade_update_callback=None,tickers_update_callback=None, **kwargs):
@@ -2521,10 +2560,27 @@ class BybitMarketV5:
         self._orderbooks = {}
         self._bookone = {}
         self.isalive = False
+        self._router = MessageRouter()  # topic => handler with symbol bound, registered when subscribing.
+        # Shared exchange clock, offset synced by server time probes of a public REST API client.
+        self._rest_api = BybitRestAPIV5(kwargs.get("host", "https://api.bybit.com"), "", "")
+        self._clock = self._rest_api.clock
+        self._category = self._wss.rstrip("/").rsplit("/", 1)[-1]  # e.g. spot, linear, inverse.
+        backfill = kwargs.get("backfill", 10000)
+        self._trade_gaps = GapFiller(self._emit_trade, self._fetch_trades, max_gap=backfill)
+        self._kline_gaps = GapFiller(self._emit_kline, self._fetch_klines, step=60 * 1000, repeat=True,
+                                     max_gap=backfill)
+        self._stale_ms = kwargs.get("stale_ms")
+        self._monitor = FeedMonitor(stale_callback=kwargs.get("stale_callback"))
+        self._feeds = {}  # topic => Feed
+        self._topics = {}  # (symbol, channel) => topic
+        self._shared_book = None
+        if kwargs.get("shared_book"):
+            self._shared_book = get_writer(kwargs["shared_book"], depth=max(self._orderbook_length, 20))
 
 
         url = self._make_url()
-        self._ws = Websocket(url, connected_callback=self.connected_callback,process_callback=self.BybitMarket_process)
+        self._ws = Websocket(url, connected_callback=self.connected_callback,process_callback=self.BybitMarket_process,
+                             channel_getter=self._channel_of)
         self._ws.initialize()
         LoopRunTask.register(self.send_heartbeat_msg, 20)
 
@@ -2565,6 +2621,7 @@ class BybitMarketV5:
                 for symbol in self._symbols: 
                     symbol=symbol.replace("_","")
                     args.append("kline.1."+symbol)
+                    self._register_topic("kline.1."+symbol, symbol, ch, self.process_kline)
                 culist = tools.cut_list(args,10)
                 for arg in culist:
                     if len(arg)<=10:
@@ -2583,6 +2640,10 @@ class BybitMarketV5:
                     symbol=symbol.replace("_","")
                     self._orderbooks[symbol]={}
                     args.append("orderbook."+str(books)+"."+symbol)
+                    if books == 1:
+                        self._register_topic("orderbook.1."+symbol, symbol, ch, self._on_bookone)
+                    else:
+                        self._register_topic("orderbook."+str(books)+"."+symbol, symbol, ch, self._on_orderbook)
                 culist = tools.cut_list(args,10)
                 for arg in culist:
                     if len(arg)<=10:
@@ -2598,6 +2659,7 @@ class BybitMarketV5:
                     symbol=symbol.replace("_","")
                     self._bookone[symbol]={}
                     args.append("orderbook."+str(1)+"."+symbol)
+                    self._register_topic("orderbook.1."+symbol, symbol, ch, self._on_bookone)
                 culist = tools.cut_list(args,10)
                 for arg in culist:
                     if len(arg)<=10:
@@ -2612,6 +2674,7 @@ class BybitMarketV5:
                 for symbol in self._symbols:
                     symbol=symbol.replace("_","")
                     args.append("publicTrade."+symbol)
+                    self._register_topic("publicTrade."+symbol, symbol, ch, self.process_trade)
                 culist = tools.cut_list(args,10)
                 for arg in culist:
                     if len(arg)<=10:
@@ -2626,6 +2689,7 @@ class BybitMarketV5:
                 for symbol in self._symbols:
                     symbol=symbol.replace("_","")
                     args.append("tickers."+symbol)
+                    self._register_topic("tickers."+symbol, symbol, ch, self.process_tickers)
                 culist = tools.cut_list(args,10)
                 for arg in culist:
                     if len(arg)<=10:
@@ -2638,10 +2702,45 @@ class BybitMarketV5:
                 logger.error("channel error! channel:", ch, caller=self)
         for tos in topicss:
             for to in tos:
-                await self._ws.send(json.dumps(to))
+                # 订阅会被记录，断线重连后自动重放
+                await self._ws.subscribe(json.dumps(to), channels=to["args"])
                 logger.info("subscribe",to,"success.", caller=self)
         return
 
+    def _register_topic(self, topic, symbol, channel, handler):
+        """Register message route and staleness monitor for a topic."""
+        self._router.register(topic, handler, symbol)
+        self._feeds[topic] = self._monitor.register(symbol, channel, self._stale_ms, self._resubscribe)
+        self._topics[(symbol, channel)] = topic
+
+    async def _resubscribe(self, symbol, channel):
+        """Resubscribe a stale feed only, orderbook will receive a new snapshot after subscribed."""
+        topic = self._topics.get((symbol, channel))
+        if not topic or not self._ws.ws or self._ws.ws.closed:
+            return
+        await self._ws.send(json.dumps({"op": "unsubscribe", "args": [topic]}))
+        await self._ws.send(json.dumps({"op": "subscribe", "args": [topic]}))
+        logger.info("resubscribe stale topic:", topic, caller=self)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    def is_fresh(self, symbol, channel, max_age_ms=None):
+        """ If a feed is fresh enough to be used, e.g. check orderbook before quoting off it.
+
+        Args:
+            symbol: Symbol name, e.g. BTC_USDT.
+            channel: Channel name, `orderbook` / `bookone` / `trade` / `kline` / `tickers`.
+            max_age_ms: Max age(milliseconds) of the latest update, default is the stale threshold.
+        """
+        return self._monitor.is_fresh(symbol.replace("_",""), channel, max_age_ms)
+
+    def _channel_of(self, msg):
+        """Get the subscribed topic of a message, used to signal channel live after re-connected."""
+        if isinstance(msg, dict):
+            return msg.get("topic")
+
     def _make_url(self):
         """Generate request url.
         """
@@ -2659,40 +2758,33 @@ class BybitMarketV5:
         if not isinstance(msg, dict):
             return
 
-        channel = msg.get("topic","")
-        #if channel not in self._channels:
-        #    logger.warn("unkown channel, msg:", msg, caller=self)
-        #    return
-
         data = msg.get("data")
         if data:
             pass
         else:
             #logger.info("返回数据有误:", msg, caller=self)
             return
-        if "kline" in channel:
-            symbol = msg.get("topic").split(".")[2]
-            await self.process_kline(symbol, data,msg)
-        elif "orderbook" in channel:
-            symbol = data.get("s")
-            otype = msg.get("type")
-            if "orderbook.1" in channel:
-                if otype=="snapshot":
-                    await self.process_bookone_partial(symbol,msg)
-                if otype=="delta":
-                    await self.deal_bookone_update(symbol,msg)
-            else:
-                if otype=="snapshot":
-                    await self.process_orderbook_partial(symbol,msg)
-                if otype=="delta":
-                    await self.deal_orderbook_update(symbol,msg)
-
-        elif "publicTrade" in channel:
-            symbol = data[0].get("s")
-            await self.process_trade(symbol, data,msg)
-        elif "tickers" in channel:
-            symbol = data.get("symbol")
-            await self.process_tickers(symbol, data,msg)
+        topic = msg.get("topic")
+        feed = self._feeds.get(topic)
+        if feed:
+            feed.touch()
+        handler = self._router.get(topic)
+        if handler:
+            await handler(data, msg)
+
+    async def _on_orderbook(self, symbol, data, msg):
+        otype = msg.get("type")
+        if otype=="snapshot":
+            await self.process_orderbook_partial(symbol,msg)
+        if otype=="delta":
+            await self.deal_orderbook_update(symbol,msg)
+
+    async def _on_bookone(self, symbol, data, msg):
+        otype = msg.get("type")
+        if otype=="snapshot":
+            await self.process_bookone_partial(symbol,msg)
+        if otype=="delta":
+            await self.deal_bookone_update(symbol,msg)
     
     async def process_orderbook_partial(self,symbol, msg):
         """
@@ -2718,7 +2810,7 @@ class BybitMarketV5:
             self._orderbooks[symbol]["Bids"][price] = quantity
         self._orderbooks[symbol]["Time"] = msg["data"].get("ts")
 
-    @async_method_locker("BybitMarketV5_deal_orderbook_update",wait=True)
+    @async_method_locker("BybitMarketV5_deal_orderbook_update", wait=True, per_instance=True, key=lambda self, symbol, *args: symbol)
     async def deal_orderbook_update(self, symbol, msg):
         """
         增量订单薄数据
@@ -2774,7 +2866,7 @@ class BybitMarketV5:
             self._bookone[symbol]["Bids"][price] = quantity
         self._bookone[symbol]["Time"] = msg["data"].get("ts")
 
-    @async_method_locker("BybitMarketV5_deal_orderbook_update",wait=True)
+    @async_method_locker("BybitMarketV5_deal_orderbook_update", wait=True, per_instance=True, key=lambda self, symbol, *args: symbol)
     async def deal_bookone_update(self, symbol, msg):
         """
         增量订单薄数据
@@ -2910,6 +3002,11 @@ class BybitMarketV5:
             "Bids": bids,
             "Time": ob["Time"]
         }
+        orderbook.update(self._clock.stamp("orderbook", msg.get("ts")))
+        if self._shared_book:
+            self._shared_book.update_orderbook(symbol, [[k, ob["Asks"][k]] for k in ask_keys[:self._orderbook_length]],
+                                               [[k, ob["Bids"][k]] for k in bid_keys[:self._orderbook_length]],
+                                               ob["Time"])
         if self._orderbook_update_callback:
             SingleTask.run(self._orderbook_update_callback, orderbook)
         if self.ispublic_to_mq:
@@ -2932,33 +3029,118 @@ class BybitMarketV5:
             "Volume": float(data[0].get("volume")),
             "Time": data[0].get("timestamp"),
         }
+        kline.update(self._clock.stamp("kline", msg.get("ts")))
+        self._kline_gaps.feed(symbol, int(data[0]["start"]), kline["Time"], kline)
+
+    def _emit_kline(self, kline):
         if self.ispublic_to_mq:
             EventKline(**kline).publish()
         if self._kline_update_callback:
             SingleTask.run(self._kline_update_callback, kline)
         if self.islog:
-            logger.info("symbol:", symbol, "kline:", kline, caller=self)
+            logger.info("symbol:", kline["symbol"], "kline:", kline, caller=self)
+
+    async def _fetch_klines(self, symbol, last, last_time, seq, seq_time):
+        """Fetch 1m klines from open time `last` (updated to the final one) to `seq` (excluded)."""
+        params = {
+            "category": self._category,
+            "symbol": symbol,
+            "interval": "1",
+            "start": last,
+            "end": seq - 1,
+            "limit": 1000
+        }
+        success, error = await self._rest_api.request("GET", "/v5/market/kline", params)
+        if not error and success.get("retCode") != 0:
+            error = success
+        if error:
+            logger.error("fetch klines error:", error, "symbol:", symbol, caller=self)
+            return None
+        rows = []
+        for k in reversed(success["result"]["list"]):
+            kline = {
+                "Info": k,
+                "platform": self._platform,
+                "symbol": symbol,
+                "Open": float(k[1]),
+                "High": float(k[2]),
+                "Low": float(k[3]),
+                "Close": float(k[4]),
+                "Volume": float(k[5]),
+                "Time": int(k[0]) + 60 * 1000 - 1,
+                "ExchangeTime": int(k[0]) + 60 * 1000 - 1,
+                "LocalTime": tools.get_cur_timestamp_ms(),
+                "Latency": None
+            }
+            rows.append((int(k[0]), kline))
+        return rows
 
 
     #加修饰器使得行情信息依次处理,如果之前的数据未处理完新数据直接抛弃，避免数据堆积新旧穿插
     #@async_method_locker("BybitMarketv3_process_trade",wait=False)
     async def process_trade(self, symbol, data,msg):
         """Process trade data and publish TradeEvent."""
-        trade = {
-            "Info":msg,
-            "platform": self._platform,
-            "symbol": symbol,
-            "Type":  0 if data[0]["S"]=="Buy" else 1, 
-            "Price": data[0].get("p"),
-            "Amount": data[0].get("v"),
-            "Time": msg.get("ts")
-        }
+        stamp = self._clock.stamp("trade", msg.get("ts"))
+        for d in data:
+            trade = {
+                "Info":msg,
+                "platform": self._platform,
+                "symbol": symbol,
+                "Type":  0 if d["S"]=="Buy" else 1,
+                "Price": d.get("p"),
+                "Amount": d.get("v"),
+                "Time": msg.get("ts")
+            }
+            trade.update(stamp)
+            trade_id = d.get("i")
+            self._trade_gaps.feed(symbol, int(trade_id) if trade_id and trade_id.isdigit() else None, d.get("T"),
+                                  trade)
+
+    def _emit_trade(self, trade):
+        symbol = trade["symbol"]
+        if self._shared_book:
+            self._shared_book.update_trade(symbol, trade["Price"], trade["Amount"],
+                                           ORDER_ACTION_BUY if trade["Type"] == 0 else ORDER_ACTION_SELL,
+                                           trade["Time"])
         if self.ispublic_to_mq:
             EventTrade(**trade).publish()
         if self._trade_update_callback:
             SingleTask.run(self._trade_update_callback, trade)
         if self.islog:
             logger.info("symbol:", symbol, "trade:", trade, caller=self)
+
+    async def _fetch_trades(self, symbol, last, last_time, seq, seq_time):
+        """Fetch trades between trade ids `last` and `seq` (both excluded) from recent trades, older ones are lost."""
+        params = {
+            "category": self._category,
+            "symbol": symbol,
+            "limit": 60 if self._category == "spot" else 1000
+        }
+        success, error = await self._rest_api.request("GET", "/v5/market/recent-trade", params)
+        if not error and success.get("retCode") != 0:
+            error = success
+        if error:
+            logger.error("fetch trades error:", error, "symbol:", symbol, caller=self)
+            return None
+        rows = []
+        for d in success["result"]["list"]:
+            if not d.get("execId", "").isdigit() or not last < int(d["execId"]) < seq:
+                continue
+            trade = {
+                "Info": d,
+                "platform": self._platform,
+                "symbol": symbol,
+                "Type": 0 if d["side"] == "Buy" else 1,
+                "Price": d.get("price"),
+                "Amount": d.get("size"),
+                "Time": int(d["time"]),
+                "ExchangeTime": int(d["time"]),
+                "LocalTime": tools.get_cur_timestamp_ms(),
+                "Latency": None
+            }
+            rows.append((int(d["execId"]), trade))
+        rows.sort(key=lambda r: r[0])
+        return rows
     
     #加修饰器使得行情信息依次处理,如果之前的数据未处理完新数据直接抛弃，避免数据堆积新旧穿插
     #@async_method_locker("BybitMarketv3_process_tickers",wait=False)
@@ -2974,6 +3156,7 @@ class BybitMarketV5:
             "Buyamount"    : data.get("volume24h"),             
             "Time"    : msg.get("ts")   
         }
+        ticker.update(self._clock.stamp("tickers", msg.get("ts")))
         if self.ispublic_to_mq:
             EventTrade(**ticker).publish()
         if self._tickers_update_callback:
@@ -3015,6 +3198,10 @@ class BybitMarketV5:
             "Buyamount"    : bids[0]["Amount"],             
             "Time"    : ob["Time"]   
         }
+        ticker.update(self._clock.stamp("bookone", msg.get("ts")))
+        if self._shared_book:
+            self._shared_book.update_ticker(symbol, ticker["Buy"], ticker["Buyamount"], ticker["Sell"],
+                                            ticker["Sellamount"], ticker["Time"])
         if self._tickers_update_callback:
             SingleTask.run(self._tickers_update_callback, ticker)
         if self.ispublic_to_mq:
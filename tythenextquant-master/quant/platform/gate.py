@@ -29,6 +29,7 @@ import time
 import json
 from quant.utils import tools
 from quant.utils.decorator import async_method_locker
+from quant.utils.clock import get_clock
 from quant.order import ORDER_TYPE_LIMIT, ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
     ORDER_STATUS_CANCELED, ORDER_STATUS_FAILED
@@ -49,6 +50,9 @@ class GateRestAPI:
         host: HTTP request host.
         access_key: Account's ACCESS KEY.
         secret_key Account's SECRET KEY.
+
+    NOTE:
+        The `Timestamp` of signed requests is the exchange clock corrected time.
     """
 
     def __init__(self, host, access_key, secret_key,platform=None,account=None):
@@ -58,6 +62,19 @@ class GateRestAPI:
         self._account = account
         self._access_key = access_key
         self._secret_key = secret_key
+        self._clock = get_clock(GATE)
+        self._clock.set_server_time_func(self._fetch_server_time)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    async def _fetch_server_time(self):
+        """Server time probe of exchange clock."""
+        success, error = await self.request("GET", "/api/v4/spot/time")
+        if error:
+            return None
+        return success["server_time"]
     
     async def GetExchangeInfo(self,symbol=None,autotry = False,sleep=100,reinfo = False):
         """ 获取交易所规则
@@ -734,7 +751,7 @@ class GateRestAPI:
 
 
     def gen_sign(self,method, url, query_string=None, payload_string=None):
-        t = time.time()
+        t = self._clock.now_ms() / 1000
         m = hashlib.sha512()
         m.update((payload_string or "").encode('utf-8'))
         hashed_payload = m.hexdigest()
@@ -1146,7 +1163,7 @@ class GateTrade:
                 return
             await self._update_order(success["order"])
 
-    @async_method_locker("GateTrade.order.locker")
+    @async_method_locker("GateTrade.order.locker", per_instance=True)
     async def _update_order(self, order_info):
         """ Update order object.
 
@@ -1243,7 +1260,7 @@ class GateAccount:
         if not kwargs.get("symbols"):
             e = Error("param symbols miss")
         if not kwargs.get("host"):
-            kwargs["host"] = "https://api.binance.com"
+            kwargs["host"] = "https://api.gateio.ws"
         if not kwargs.get("wss"):
             kwargs["wss"] = "wss://api.gateio.ws/ws/v4/"
         if not kwargs.get("access_key"):
@@ -1276,6 +1293,10 @@ class GateAccount:
 
         self._raw_symbols = self._symbols
 
+        # Shared exchange clock, corrects the time of subscriptions and the latency of pushed messages.
+        self._rest_api = GateRestAPI(self._host, self._access_key, self._secret_key)
+        self._clock = self._rest_api.clock
+
         LoopRunTask.register(self.send_ping, 10)
 
 
@@ -1304,7 +1325,7 @@ class GateAccount:
  
         #用户订单信息推送
         request = {
-            "time": int(time.time()),
+            "time": self._clock.now_ms() // 1000,
             "channel": "spot.orders",
             "event": "subscribe",  # "unsubscribe" for unsubscription
             "payload": ["!all"]
@@ -1315,7 +1336,7 @@ class GateAccount:
 
         #用户账户推送
         request = {
-            "time": int(time.time()),
+            "time": self._clock.now_ms() // 1000,
             "channel": "spot.balances",
             "event": "subscribe",  # "unsubscribe" for unsubscription
         }
@@ -1326,7 +1347,7 @@ class GateAccount:
 
 
         
-    @async_method_locker("GateAccount.process.locker")
+    @async_method_locker("GateAccount.process.locker", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -1335,6 +1356,7 @@ class GateAccount:
         """
         try:
             e = msg.get("channel")
+            stamp = self._clock.stamp(e, msg.get("time_ms"))
             if e == "spot.orders":  # Order update.
                 data = msg.get("result")[0]
                 if data:
@@ -1349,6 +1371,7 @@ class GateAccount:
                     "strategy": self._strategy,
                     "Info":msg,
                 }
+                info.update(stamp)
                 order = info
                 if self._order_update_callback:
                     SingleTask.run(self._order_update_callback, copy.copy(order))
@@ -1380,6 +1403,7 @@ class GateAccount:
                     "timestamp": int(data[0]["timestamp_ms"]),
                     "update": int(msg["time_ms"])                    
                 }
+                info.update(stamp)
                 asset = info
                 if self._asset_update_callback:
                     SingleTask.run(self._asset_update_callback, copy.copy(asset))
@@ -1411,6 +1435,10 @@ class GateMarketv4:
         self._orderbook_length = kwargs.get("orderbook_length", 20)
         self._orderbook_price_precious = kwargs.get("orderbook_price_precious", "100ms")
 
+        # Shared exchange clock, offset synced by server time probes of a public REST API client.
+        self._rest_api = GateRestAPI(kwargs.get("host", "https://api.gateio.ws"), "", "")
+        self._clock = self._rest_api.clock
+
         url = self._wss
         self._ws = Websocket(url, connected_callback=self.connected_callback, process_callback=self.process)
         self._ws.initialize()
@@ -1425,6 +1453,10 @@ class GateMarketv4:
         kwargs["kline_update_callback"] = self.process_kline
         kwargs["trade_update_callback"] = self.process_trade
         kwargs["tickers_update_callback"] = self.process_tickers
+
+    @property
+    def clock(self):
+        return self._clock
     
     def find_closest(self,num):
         arr = [5, 10, 20, 50, 100]
@@ -1537,6 +1569,7 @@ class GateMarketv4:
                 "Amount": data.get("amount"),
                 "Time": msg.get("time_ms")
             }
+            trade.update(self._clock.stamp("trade", msg.get("time_ms")))
             if self.ispublic_to_mq:
                 EventTrade(**trade).publish()
             if self._trade_update_callback:
@@ -1570,6 +1603,7 @@ class GateMarketv4:
                 "Bids": data.get("bids")[:self._orderbook_length],
                 "Time": msg.get("time_ms")
             }
+            orderbook.update(self._clock.stamp("orderbook", msg.get("time_ms")))
             if self._orderbook_update_callback:
                 SingleTask.run(self._orderbook_update_callback, orderbook)
             if self.ispublic_to_mq:
@@ -1600,6 +1634,7 @@ class GateMarketv4:
                 "Volume": float(data.get("v")),
                 "Time": msg.get("time_ms"),
             }
+            kline.update(self._clock.stamp("kline", msg.get("time_ms")))
             if self.ispublic_to_mq:
                 EventKline(**kline).publish()
             if self._kline_update_callback:
@@ -1625,6 +1660,7 @@ class GateMarketv4:
                 "Buyamount"    : data.get("B"),             
                 "Time"    : msg.get("time_ms")   
             }
+            ticker.update(self._clock.stamp("tickers", msg.get("time_ms")))
             if self.ispublic_to_mq:
                 EventTrade(**ticker).publish()
             if self._tickers_update_callback:
@@ -11,7 +11,6 @@ Date:   2018/08/30
 import json
 import hmac
 import copy
-import gzip
 import base64
 import urllib
 import hashlib
@@ -29,6 +28,7 @@ from quant.utils.websocket import Websocket
 from quant.asset import Asset, AssetSubscribe
 from quant.utils.decorator import async_method_locker
 from quant.utils.http_client import AsyncHttpRequests
+from quant.utils.compress import Inflater, GZIP
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.order import ORDER_TYPE_LIMIT, ORDER_TYPE_MARKET
 from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
@@ -598,6 +598,7 @@ class HuobiTrade(Websocket):
 
         url = self._wss + "/ws/v1"
         super(HuobiTrade, self).__init__(url, send_hb_interval=0)
+        self._inflater = Inflater(GZIP)  # Every frame is gzip compressed independently.
 
         self._assets = {}  # 资产 {"BTC": {"free": "1.1", "locked": "2.2", "total": "3.3"}, ... }
         self._orders = {}  # 订单
@@ -669,12 +670,12 @@ class HuobiTrade(Websocket):
         }
         await self.ws.send_json(params)
 
-    @async_method_locker("HuobiTrade.process_binary.locker")
+    @async_method_locker("HuobiTrade.process_binary.locker", per_instance=True)
     async def process_binary(self, raw):
         """ 处理websocket上接收到的消息
         @param raw 原始的压缩数据
         """
-        msg = json.loads(gzip.decompress(raw).decode())
+        msg = await self._inflater.loads_async(raw)
         logger.debug("msg:", msg, caller=self)
 
         op = msg.get("op")
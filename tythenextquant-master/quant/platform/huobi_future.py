@@ -9,7 +9,6 @@ Date:   2019/08/23
 Email:  xunfeng@test.com
 """
 
-import gzip
 import json
 import copy
 import hmac
@@ -30,6 +29,7 @@ from quant.utils.web import Websocket
 from quant.asset import Asset, AssetSubscribe
 from quant.utils.http_client import AsyncHttpRequests
 from quant.utils.decorator import async_method_locker
+from quant.utils.compress import Inflater, GZIP
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.order import ORDER_TYPE_LIMIT, ORDER_TYPE_MARKET
 from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
@@ -424,6 +424,7 @@ class HuobiFutureTrade:
         self._init_success_callback = kwargs.get("init_success_callback")
 
         url = self._wss + "/notification"
+        self._inflater = Inflater(GZIP)  # Every frame is gzip compressed independently.
         self._ws = Websocket(url, self.connected_callback, process_binary_callback=self.process_binary)
         self._ws.initialize()
 
@@ -517,12 +518,12 @@ class HuobiFutureTrade:
                 self._update_order(order_info)
             SingleTask.run(self._init_success_callback, True, None)
 
-    @async_method_locker("HuobiFutureTrade.process_binary.locker")
+    @async_method_locker("HuobiFutureTrade.process_binary.locker", per_instance=True)
     async def process_binary(self, raw):
         """ 处理websocket上接收到的消息
         @param raw 原始的压缩数据
         """
-        data = json.loads(gzip.decompress(raw).decode())
+        data = await self._inflater.loads_async(raw)
         logger.debug("data:", data, caller=self)
 
         op = data.get("op")
@@ -28,6 +28,7 @@ from quant.asset import Asset, AssetSubscribe
 from quant.tasks import SingleTask, LoopRunTask
 from quant.utils.http_client import AsyncHttpRequests,SyncHttpRequests
 from quant.utils.decorator import async_method_locker
+from quant.utils.clock import get_clock
 from quant.order import ORDER_TYPE_LIMIT, ORDER_TYPE_MARKET
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
@@ -46,6 +47,9 @@ class KucoinRestAPI:
         access_key: Account"s ACCESS KEY.
         secret_key: Account"s SECRET KEY.
         passphrase: API KEY passphrase.
+
+    NOTE:
+        The `KC-API-TIMESTAMP` of signed requests is the exchange clock corrected time.
     """
 
     def __init__(self, host, access_key, secret_key, passphrase,platform=None,account=None):
@@ -56,6 +60,19 @@ class KucoinRestAPI:
         self._access_key = access_key
         self._secret_key = secret_key
         self._passphrase = passphrase
+        self._clock = get_clock(KUCOIN)
+        self._clock.set_server_time_func(self._fetch_server_time)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    async def _fetch_server_time(self):
+        """Server time probe of exchange clock."""
+        success, error = await self.request("GET", "/api/v1/timestamp")
+        if error:
+            return None
+        return success
     
     async def GetExchangeInfo(self,symbol=None,autotry = False,sleep=100,reinfo = False):
         """ 获取交易所规则
@@ -793,7 +810,7 @@ class KucoinRestAPI:
         if auth:
             if not headers:
                 headers = {}
-            timestamp = str(tools.get_cur_timestamp_ms())
+            timestamp = str(self._clock.now_ms())
             signature = self._generate_signature(timestamp, method, uri, body)
             passphrase = base64.b64encode(hmac.new(self._secret_key.encode("utf-8"), self._passphrase.encode('utf-8'), hashlib.sha256).digest()).decode("utf-8")
             headers["KC-API-KEY"] = self._access_key
@@ -953,7 +970,7 @@ class KucoinRestAPI:
         if auth:
             if not headers:
                 headers = {}
-            timestamp = str(tools.get_cur_timestamp_ms())
+            timestamp = str(self._clock.now_ms())
             signature = self._generate_signature(timestamp, method, uri, body)
             headers["KC-API-KEY"] = self._access_key
             headers["KC-API-SIGN"] = signature
@@ -1198,7 +1215,7 @@ class KucoinTrade:
                 return
             await self._update_order(success)
 
-    @async_method_locker("KucoinTrade.order.locker")
+    @async_method_locker("KucoinTrade.order.locker", per_instance=True)
     async def _update_order(self, order_info):
         """ Update order object.
 
@@ -1261,6 +1278,7 @@ class KucoinTrade:
 
 from quant.event import EventTrade, EventKline, EventOrderbook
 from quant.utils.web import Websocket
+from quant.utils.router import MessageRouter
 
 
 class KucoinAccount:
@@ -1323,6 +1341,7 @@ class KucoinAccount:
 
         # Initialize our REST API client.
         self._rest_api = KucoinRestAPI(self._host, self._access_key, self._secret_key,self._passphrase)
+        self._clock = self._rest_api.clock
 
 
         LoopRunTask.register(self.send_heartbeat_msg, 15)
@@ -1358,7 +1377,7 @@ class KucoinAccount:
             return
         await self._ws.send(data)
 
-    @async_method_locker("KucoinAccount_generate_request_id")
+    @async_method_locker("KucoinAccount_generate_request_id", per_instance=True)
     async def generate_request_id(self):
         self._request_id = tools.get_cur_timestamp_ms()
         return self._request_id
@@ -1391,7 +1410,7 @@ class KucoinAccount:
             SingleTask.run(self._init_success_callback, True, None)
 
 
-    @async_method_locker("KucoinAccount.process.locker")
+    @async_method_locker("KucoinAccount.process.locker", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -1409,6 +1428,7 @@ class KucoinAccount:
                     "strategy": self._strategy,
                     "Info":msg,
                 }
+                info.update(self._clock.stamp(e, int(msg["data"]["ts"]) // 1000000))  # Nanoseconds.
                 order = info
                 if self._order_update_callback:
                     SingleTask.run(self._order_update_callback, copy.copy(order))
@@ -1430,6 +1450,7 @@ class KucoinAccount:
                     "timestamp": int(msg["time"]),
                     "update": int(msg["time"])                
                 }
+                info.update(self._clock.stamp(e, int(msg["time"])))
                 asset = info
                 if self._asset_update_callback:
                     SingleTask.run(self._asset_update_callback, copy.copy(asset))
@@ -1468,9 +1489,11 @@ class KucoinMarket:
         self._orderbooks = {}  # Orderbook data, e.g. {"symbol": {"bids": {"price": quantity, ...}, "asks": {...}, timestamp: 123, "sequence": 123}}
         self._last_publish_ts = 0  # The latest publish timestamp for OrderbookEvent.
         self._ws = None  # Websocket object.
+        self._router = MessageRouter()  # topic => handler, registered when subscribing.
 
         # REST API client.
         self._rest_api = KucoinRestAPI(self._host, None, None, None)
+        self._clock = self._rest_api.clock  # Shared exchange clock, synced by server time probes.
         
         self._orderbook_update_callback = orderbook_update_callback
         self._kline_update_callback = kline_update_callback
@@ -1483,6 +1506,10 @@ class KucoinMarket:
         kwargs["tickers_update_callback"] = self.process_tickers
 
         SingleTask.run(self._initialize)
+
+    @property
+    def clock(self):
+        return self._clock
         
     def find_closest(self,num):
         arr = [5, 50]
@@ -1525,6 +1552,7 @@ class KucoinMarket:
                 for s in self._symbols:
                     t = s.replace("_", "-")+"_1min"
                     symbols.append(t)                
+                    self._router.register("/market/candles:" + t, self.process_kline)
                 d = {
                     "id": request_id,
                     "type": "subscribe",
@@ -1535,6 +1563,9 @@ class KucoinMarket:
                 await self._ws.send(d)
                 logger.info("subscribe kline success.",d,caller=self)
             elif ch == "orderbook":
+                for s in symbols:
+                    self._router.register("/spotMarket/level2Depth"+str(self.find_closest(self._orderbook_length))+":" + s,
+                                          self.process_orderbook)
                 d = {
                     "id": request_id,
                     "type": "subscribe",
@@ -1544,6 +1575,8 @@ class KucoinMarket:
                 await self._ws.send(d)
                 logger.info("subscribe orderbook success.",d, caller=self)
             elif ch == "trade":
+                for s in symbols:
+                    self._router.register("/market/match:" + s, self.process_trade)
                 d = {
                     "id": request_id,
                     "type": "subscribe",
@@ -1554,6 +1587,8 @@ class KucoinMarket:
                 await self._ws.send(d)
                 logger.info("subscribe trade success.",d, caller=self)
             elif ch == "tickers":
+                for s in symbols:
+                    self._router.register("/market/ticker:" + s, self.process_tickers)
                 d = {
                     "id": request_id,
                     "type": "subscribe",
@@ -1577,7 +1612,7 @@ class KucoinMarket:
             return
         await self._ws.send(data)
 
-    @async_method_locker("_generate_request_id")
+    @async_method_locker("_generate_request_id", per_instance=True)
     async def generate_request_id(self):
         self._request_id = tools.get_cur_timestamp_ms()
         return self._request_id
@@ -1590,21 +1625,15 @@ class KucoinMarket:
         """
         #logger.debug("msg:", msg, caller=self)
 
-        topic = msg.get("topic", "")
         data = msg.get("data")
         if data:
             pass
         else:
             #logger.info("返回数据有误:", msg, caller=self)
             return
-        if "level2" in topic:
-            await self.process_orderbook(data,msg)
-        elif "match" in topic:
-            await self.process_trade(data,msg)
-        elif "ticker" in topic:
-            await self.process_tickers(data,msg)
-        elif "candles" in topic:
-            await self.process_kline(data,msg)
+        handler = self._router.get(msg.get("topic"))
+        if handler:
+            await handler(data,msg)
 
     #加修饰器使得行情信息依次处理,如果之前的数据未处理完新数据直接抛弃，避免数据堆积新旧穿插
     #@async_method_locker("KucoinMarket_process_trade",wait=False)
@@ -1624,6 +1653,7 @@ class KucoinMarket:
             "Amount": data.get("size"),
             "Time": int(data.get("time")/1000000)
         }
+        trade.update(self._clock.stamp("trade", trade["Time"]))
         if self._trade_update_callback:
             SingleTask.run(self._trade_update_callback, trade)
         if self.ispublic_to_mq:
@@ -1654,6 +1684,7 @@ class KucoinMarket:
             "Bids": data.get("bids")[:self._orderbook_length],
             "Time": data.get("timestamp")
         }
+        orderbook.update(self._clock.stamp("orderbook", data.get("timestamp")))
         if self._orderbook_update_callback:
             SingleTask.run(self._orderbook_update_callback, orderbook)
         if self.ispublic_to_mq:
@@ -1681,6 +1712,7 @@ class KucoinMarket:
             "Volume": float(data["candles"][5]),
             "Time": int(data.get("time")/1000000),
         }
+        kline.update(self._clock.stamp("kline", kline["Time"]))
         if self._kline_update_callback:
             SingleTask.run(self._kline_update_callback, kline)
         if self.ispublic_to_mq:
@@ -1703,6 +1735,7 @@ class KucoinMarket:
             "Buyamount"    : data.get("bestBidSize"),             
             "Time"    : tools.get_cur_timestamp_ms() 
         }
+        ticker.update(self._clock.stamp("tickers", data.get("time")))
         if self._tickers_update_callback:
             SingleTask.run(self._tickers_update_callback, ticker)
         if self.ispublic_to_mq:
@@ -29,6 +29,7 @@ import time
 import json
 from quant.utils import tools
 from quant.utils.decorator import async_method_locker
+from quant.utils.clock import get_clock
 from quant.order import ORDER_TYPE_LIMIT, ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
     ORDER_STATUS_CANCELED, ORDER_STATUS_FAILED
@@ -45,6 +46,9 @@ class MexcRestAPI:
         host: HTTP request host.
         access_key: Account's ACCESS KEY.
         secret_key Account's SECRET KEY.
+
+    NOTE:
+        The `timestamp` of signed requests is replaced by the exchange clock corrected time before signing.
     """
 
     def __init__(self, host, access_key, secret_key,platform=None,account=None):
@@ -54,6 +58,19 @@ class MexcRestAPI:
         self._account = account
         self._access_key = access_key
         self._secret_key = secret_key
+        self._clock = get_clock(MEXC)
+        self._clock.set_server_time_func(self._fetch_server_time)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    async def _fetch_server_time(self):
+        """Server time probe of exchange clock."""
+        success, error = await self.request("GET", "/api/v3/time")
+        if error:
+            return None
+        return success["serverTime"]
     
     async def GetExchangeInfo(self,symbol=None,autotry = False,sleep=100,reinfo = False):
         """ 获取交易所规则
@@ -704,6 +721,8 @@ class MexcRestAPI:
             pdata.update(params)
         if body:
             pdata.update(body)
+        if auth and "timestamp" in pdata:
+            pdata["timestamp"] = self._clock.now_ms()
 
         if pdata:
             query = "&".join(["=".join([str(k), str(v)]) for k, v in pdata.items()])
@@ -855,6 +874,8 @@ class MexcRestAPI:
             pdata.update(params)
         if body:
             pdata.update(body)
+        if auth and "timestamp" in pdata:
+            pdata["timestamp"] = self._clock.now_ms()
 
         if pdata:
             query = "&".join(["=".join([str(k), str(v)]) for k, v in pdata.items()])
@@ -1082,7 +1103,7 @@ class MexcTrade:
                 return
             await self._update_order(success["order"])
 
-    @async_method_locker("MexcTrade.order.locker")
+    @async_method_locker("MexcTrade.order.locker", per_instance=True)
     async def _update_order(self, order_info):
         """ Update order object.
 
@@ -1223,6 +1244,7 @@ class MexcAccount:
 
         # Initialize our REST API client.
         self._rest_api = MexcRestAPI(self._host, self._access_key, self._secret_key)
+        self._clock = self._rest_api.clock
 
 
         # Create a loop run task to reset listen key every 30 minutes.
@@ -1299,7 +1321,7 @@ class MexcAccount:
             SingleTask.run(self._init_success_callback, True, None)
 
     #继承父类方法
-    @async_method_locker("MexcAccount.process.locker")
+    @async_method_locker("MexcAccount.process.locker", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -1317,6 +1339,7 @@ class MexcAccount:
                     "strategy": self._strategy,
                     "Info":msg,
                 }
+                info.update(self._clock.stamp(e, msg.get("t")))
                 order = info
                 if self._order_update_callback:
                     SingleTask.run(self._order_update_callback, copy.copy(order))
@@ -1339,6 +1362,7 @@ class MexcAccount:
                     "timestamp": int(msg["d"]["c"]),
                     "update": int(msg["t"])                    
                 }
+                info.update(self._clock.stamp(e, msg.get("t")))
                 asset = info
                 if self._asset_update_callback:
                     SingleTask.run(self._asset_update_callback, copy.copy(asset))
@@ -1359,6 +1383,7 @@ class MexcMarket:
         trade_update_callback:成交数据回调函数
         kwargs:
             platform: Exchange platform name, must be `binance`.
+            host: HTTP request host, default is `https://api.mexc.com`.
             wss: Exchange Websocket host address, default is `wss://wbs.mexc.com/ws`.
             symbols: Symbol list.
             channels: Channel list, only `orderbook` / `trade` / `kline`/ `tickers` to be enabled.
@@ -1371,6 +1396,7 @@ class MexcMarket:
         self._platform = kwargs.get("platform")
         self._account = kwargs.get("account")
 
+        self._host = kwargs.get("host", "https://api.mexc.com")
         self._wss = kwargs.get("wss", "wss://wbs.mexc.com/ws")
         self._symbols = list(set(kwargs.get("symbols")))
         self._channels = kwargs.get("channels")
@@ -1379,6 +1405,10 @@ class MexcMarket:
         self._c_to_s = {}
         self._tickers = {}
 
+        # Public REST API client, only for the server time probes of exchange clock.
+        self._rest_api = MexcRestAPI(self._host, "", "")
+        self._clock = self._rest_api.clock
+
         url = self._wss
         self._ws = Websocket(url, connected_callback=self.connected_callback,process_callback=self.MexcMarket_process)
         self._ws.initialize()
@@ -1395,6 +1425,10 @@ class MexcMarket:
 
         LoopRunTask.register(self.send_ping, 10)
 
+    @property
+    def clock(self):
+        return self._clock
+
     def find_closest(self,num):
         arr = [5, 10, 20]
         closest = arr[0]
@@ -1521,6 +1555,7 @@ class MexcMarket:
             "Volume": float(data.get("k").get("v")),
             "Time": msg.get("t"),
         }
+        kline.update(self._clock.stamp("kline", msg.get("t")))
         if self.ispublic_to_mq:
             EventKline(**kline).publish()
         if self._kline_update_callback:
@@ -1547,6 +1582,7 @@ class MexcMarket:
             "Bids": data.get("bids")[:self._orderbook_length],
             "Time": msg.get("t")
         }
+        orderbook.update(self._clock.stamp("orderbook", msg.get("t")))
         if self._orderbook_update_callback:
             SingleTask.run(self._orderbook_update_callback, orderbook)
         if self.ispublic_to_mq:
@@ -1568,6 +1604,7 @@ class MexcMarket:
             "Amount": data.get("deals")[0].get("v"),
             "Time": msg.get("t")
         }
+        trade.update(self._clock.stamp("trade", msg.get("t")))
         if self.ispublic_to_mq:
             EventTrade(**trade).publish()
         if self._trade_update_callback:
@@ -1590,6 +1627,7 @@ class MexcMarket:
             "Buyamount"    : data.get("B"),             
             "Time"    : msg.get("t")
         }
+        ticker.update(self._clock.stamp("tickers", msg.get("t")))
         if self.ispublic_to_mq:
             EventTrade(**ticker).publish()
         if self._tickers_update_callback:
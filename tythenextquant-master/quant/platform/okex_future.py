@@ -12,7 +12,6 @@ Email:  xunfeng@test.com
 """
 
 import time
-import zlib
 import json
 import copy
 import hmac
@@ -30,6 +29,7 @@ from quant.utils.websocket import Websocket
 from quant.asset import Asset, AssetSubscribe
 from quant.utils.http_client import AsyncHttpRequests
 from quant.utils.decorator import async_method_locker
+from quant.utils.compress import Inflater, RAW_DEFLATE
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.order import ORDER_TYPE_LIMIT, ORDER_TYPE_MARKET
 from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
@@ -302,6 +302,7 @@ class OKExFutureTrade(Websocket):
 
         url = self._wss + "/ws/v3"
         super(OKExFutureTrade, self).__init__(url, send_hb_interval=5)
+        self._inflater = Inflater(RAW_DEFLATE)  # Every frame is raw deflate compressed independently.
         self.heartbeat_msg = "ping"
 
         self._assets = {}  # Asset object. e.g. {"BTC": {"free": "1.1", "locked": "2.2", "total": "3.3"}, ... }
@@ -354,7 +355,7 @@ class OKExFutureTrade(Websocket):
         }
         await self.ws.send_json(data)
 
-    @async_method_locker("OKExFutureTrade.process_binary.locker")
+    @async_method_locker("OKExFutureTrade.process_binary.locker", per_instance=True)
     async def process_binary(self, raw):
         """ Process binary message that received from websocket.
 
@@ -364,14 +365,10 @@ class OKExFutureTrade(Websocket):
         Returns:
             None.
         """
-        decompress = zlib.decompressobj(-zlib.MAX_WBITS)
-        msg = decompress.decompress(raw)
-        msg += decompress.flush()
-        msg = msg.decode()
+        msg = await self._inflater.loads_async(raw)
         if msg == "pong":
             return
         logger.debug("msg:", msg, caller=self)
-        msg = json.loads(msg)
 
         # Authorization message received.
         if msg.get("event") == "login":
@@ -30,6 +30,7 @@ from quant.tasks import SingleTask
 from quant.utils.websocket import Websocket
 from quant.asset import Asset, AssetSubscribe
 from quant.utils.decorator import async_method_locker
+from quant.utils.clock import get_clock
 from quant.utils.http_client import AsyncHttpRequests
 from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
 from quant.order import ORDER_TYPE_LIMIT, ORDER_TYPE_MARKET
@@ -37,6 +38,7 @@ from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORD
     ORDER_STATUS_CANCELED, ORDER_STATUS_FAILED
 from quant.utils.http_client import AsyncHttpRequests
 from quant.utils.http_client import SyncHttpRequests
+from quant.utils.compress import Inflater, RAW_DEFLATE
 
 __all__ = ("OkxRestAPI", "OkxTrade", )
 
@@ -59,6 +61,9 @@ class OkxRestAPI:
         access_key: Account's ACCESS KEY.
         secret_key: Account's SECRET KEY.
         passphrase: API KEY Passphrase.
+
+    NOTE:
+        The `OK-ACCESS-TIMESTAMP` of signed requests is the exchange clock corrected time.
     """
 
     def __init__(self, host, access_key, secret_key, passphrase,platform=None,account=None):
@@ -69,6 +74,24 @@ class OkxRestAPI:
         self._access_key = access_key
         self._secret_key = secret_key
         self._passphrase = passphrase
+        self._clock = get_clock(OKX)
+        self._clock.set_server_time_func(self._fetch_server_time)
+
+    @property
+    def clock(self):
+        return self._clock
+
+    async def _fetch_server_time(self):
+        """Server time probe of exchange clock."""
+        success, error = await self.request("GET", "/api/v5/public/time")
+        if error or not success.get("data"):
+            return None
+        return int(success["data"][0]["ts"])
+
+    def _timestamp(self):
+        """Exchange clock corrected time of signed requests, e.g. 1538054050.975"""
+        ts = self._clock.now_ms()
+        return "{}.{:03d}".format(ts // 1000, ts % 1000)
 
     async def GetExchangeInfo(self,symbol=None,autotry = False,sleep=100,reinfo = False):
         """ 获取交易所规则
@@ -796,7 +819,7 @@ class OkxRestAPI:
         url = urljoin(self._host, uri)
 
         if auth:
-            timestamp = str(time.time()).split(".")[0] + "." + str(time.time()).split(".")[1][:3]
+            timestamp = self._timestamp()
             if body:
                 body = json.dumps(body)
             else:
@@ -918,7 +941,7 @@ class OkxRestAPI:
         url = urljoin(self._host, uri)
 
         if auth:
-            timestamp = str(time.time()).split(".")[0] + "." + str(time.time()).split(".")[1][:3]
+            timestamp = self._timestamp()
             if body:
                 body = json.dumps(body)
             else:
@@ -1052,6 +1075,7 @@ class OkxTrade(Websocket):
 
         url = self._wss + "/ws/v3"
         super(OkxTrade, self).__init__(url, send_hb_interval=5)
+        self._inflater = Inflater(RAW_DEFLATE)  # Every frame is raw deflate compressed independently.
         self.heartbeat_msg = "ping"
 
         self._assets = {}  # Asset object. e.g. {"BTC": {"free": "1.1", "locked": "2.2", "total": "3.3"}, ... }
@@ -1080,7 +1104,7 @@ class OkxTrade(Websocket):
 
     async def connected_callback(self):
         """After websocket connection created successfully, we will send a message to server for authentication."""
-        timestamp = str(time.time()).split(".")[0] + "." + str(time.time()).split(".")[1][:3]
+        timestamp = self._rest_api._timestamp()
         message = str(timestamp) + "GET" + "/users/self/verify"
         mac = hmac.new(bytes(self._secret_key, encoding="utf8"), bytes(message, encoding="utf8"), digestmod="sha256")
         d = mac.digest()
@@ -1091,7 +1115,7 @@ class OkxTrade(Websocket):
         }
         await self.ws.send_json(data)
 
-    @async_method_locker("OkxTrade.process_binary.locker")
+    @async_method_locker("OkxTrade.process_binary.locker", per_instance=True)
     async def process_binary(self, raw):
         """ Process binary message that received from websocket.
 
@@ -1101,14 +1125,10 @@ class OkxTrade(Websocket):
         Returns:
             None.
         """
-        decompress = zlib.decompressobj(-zlib.MAX_WBITS)
-        msg = decompress.decompress(raw)
-        msg += decompress.flush()
-        msg = msg.decode()
+        msg = await self._inflater.loads_async(raw)
         if msg == "pong":
             return
         logger.debug("msg:", msg, caller=self)
-        msg = json.loads(msg)
 
         # Authorization message received.
         if msg.get("event") == "login":
@@ -1155,7 +1175,8 @@ class OkxTrade(Websocket):
             for data in msg["data"]:
                 data["ctime"] = data["timestamp"]
                 data["utime"] = data["last_fill_time"]
-                self._update_order(data)
+                self._update_order(data, self._rest_api.clock.stamp("spot/order",
+                                                                    tools.utctime_str_to_mts(data["utime"])))
 
     async def create_order(self, action, price, quantity, order_type=ORDER_TYPE_LIMIT):
         """ Create an order.
@@ -1247,11 +1268,12 @@ class OkxTrade(Websocket):
                 order_nos.append(order_info["order_id"])
             return order_nos, None
 
-    def _update_order(self, order_info):
+    def _update_order(self, order_info, stamp=None):
         """ Order update.
 
         Args:
             order_info: Order information.
+            stamp: Timestamps of the message, returned by `ExchangeClock.stamp`, None if fetched from REST API.
 
         Returns:
             None.
@@ -1299,6 +1321,9 @@ class OkxTrade(Websocket):
             self._orders[order_no] = order
         order.ctime = ctime
         order.utime = utime
+        if stamp:
+            order.ltime = stamp["LocalTime"]
+            order.latency = stamp["Latency"]
 
         SingleTask.run(self._order_update_callback, copy.copy(order))
 
@@ -1318,6 +1343,7 @@ class OkxTrade(Websocket):
         SingleTask.run(self._asset_update_callback, asset)
 
 from quant.utils.web import Websocket
+from quant.utils.gapfill import GapFiller
 from quant.event import EventTrade, EventKline, EventOrderbook
 from quant.tasks import SingleTask,LoopRunTask
 
@@ -1385,6 +1411,10 @@ class OkxAccount:
         for symbol in self._symbols:
             self._raw_symbols.append(symbol.replace("_", "-"))
 
+        # Shared exchange clock, corrects the login timestamp and the latency of pushed messages.
+        self._rest_api = OkxRestAPI(self._host, self._access_key, self._secret_key, self._passphrase)
+        self._clock = self._rest_api.clock
+
         LoopRunTask.register(self.send_ping, 20)
 
 
@@ -1408,7 +1438,7 @@ class OkxAccount:
         await self._ws.send(data)
 
     async def send_auth(self):        
-        timestamp = str(time.time()).split(".")[0] + "." + str(time.time()).split(".")[1][:3]
+        timestamp = self._rest_api._timestamp()
         message = str(timestamp) + "GET" + "/users/self/verify"
         mac = hmac.new(bytes(self._secret_key, encoding="utf8"), bytes(message, encoding="utf8"), digestmod="sha256")
         d = mac.digest()
@@ -1444,7 +1474,7 @@ class OkxAccount:
         logger.info("subscribe orders success.",data,caller=self)
 
 
-    @async_method_locker("OkxAccount.process")
+    @async_method_locker("OkxAccount.process", per_instance=True)
     async def process(self, msg):
         """ Process message that received from Websocket connection.
 
@@ -1466,6 +1496,8 @@ class OkxAccount:
                 SingleTask.run(self._allinfo_callback, copy.copy(info))
                 return
             e = msg.get("arg").get("channel")
+            if msg.get("data"):
+                stamp = self._clock.stamp(e, msg["data"][0].get("uTime"))
             if e == "orders":  # Order update.
                 if msg.get("data"):
                     info = {
@@ -1474,6 +1506,7 @@ class OkxAccount:
                         "strategy": self._strategy,
                         "Info":msg,
                     }
+                    info.update(stamp)
                     order = info
                     if self._order_update_callback:
                         SingleTask.run(self._order_update_callback, copy.copy(order))
@@ -1503,6 +1536,7 @@ class OkxAccount:
                     "timestamp": int(msg.get("data")[0].get("uTime")),
                     "update": int(msg.get("data")[0].get("uTime"))                    
                 }
+                info.update(stamp)
                 asset = info
                 if self._asset_update_callback:
                     SingleTask.run(self._asset_update_callback, copy.copy(asset))
@@ -1536,6 +1570,9 @@ class OkxMarket:
             symbols: symbol list, OKEx Future instrument_id list.
             channels: channel list, only `orderbook`, `kline` and `trade` to be enabled.
             orderbook_length: The length of orderbook's data to be published via OrderbookEvent, default is 10.
+            backfill: Max missing trades / klines fetched from REST API after a gap of trade ids / kline open times,
+                e.g. after reconnecting, default is 10000, 0 to log gaps only. Backfilled ones are marked by
+                `"Backfill": True`.
     """
 
     def __init__(self,ispublic_to_mq=False,islog=False, orderbook_update_callback=None,kline_update_callback=None,trade_update_callback=None,tickers_update_callback=None, **kwargs):
@@ -1551,6 +1588,14 @@ class OkxMarket:
 
         self._orderbooks = {}  # 订单薄数据 {"symbol": {"bids": {"price": quantity, ...}, "asks": {...}}}
 
+        # Shared exchange clock, offset synced by server time probes of a public REST API client.
+        self._rest_api = OkxRestAPI(kwargs.get("host", "https://www.okx.com"), "", "", "")
+        self._clock = self._rest_api.clock
+        backfill = kwargs.get("backfill", 10000)
+        self._trade_gaps = GapFiller(self._emit_trade, self._fetch_trades, max_gap=backfill)
+        self._kline_gaps = GapFiller(self._emit_kline, self._fetch_klines, step=60 * 1000, repeat=True,
+                                     max_gap=backfill)
+
         url = self._wss
         self._ws = Websocket(url, connected_callback=self.connected_callback,process_callback=self.process)
         self._ws.initialize()
@@ -1566,6 +1611,10 @@ class OkxMarket:
         self._tickers_update_callback = tickers_update_callback
 
         LoopRunTask.register(self.send_heartbeat_msg, 10)
+
+    @property
+    def clock(self):
+        return self._clock
     
     def find_closest(self,num):
         arr = [5, 10, 20]
@@ -1736,7 +1785,7 @@ class OkxMarket:
             self._orderbooks[symbol]["Bids"][price] = quantity
         self._orderbooks[symbol]["Time"] = data.get("ts")
 
-    @async_method_locker("OkxMarket_deal_orderbook_update",wait=True)
+    @async_method_locker("OkxMarket_deal_orderbook_update", wait=True, per_instance=True, key=lambda self, symbol, *args: symbol)
     async def deal_orderbook_update(self, symbol, data,msg):
         """
         增量订单薄数据
@@ -1872,6 +1921,7 @@ class OkxMarket:
             "Bids": bids,
             "Time": int(ob["Time"])
         }
+        orderbook.update(self._clock.stamp("orderbook", orderbook["Time"]))
         if self._orderbook_update_callback:
             SingleTask.run(self._orderbook_update_callback, orderbook)
         if self.ispublic_to_mq:
@@ -1882,22 +1932,65 @@ class OkxMarket:
     #@async_method_locker("OkxMarket_process_trade",wait=False)
     async def process_trade(self, symbol, data,msg):
         """Process trade data and publish TradeEvent."""
-        data = data[0]
-        trade = {
-            "Info":msg,
-            "platform": self._platform,
-            "symbol": symbol,
-            "Type":  0 if data["side"]=="buy" else 1, 
-            "Price": data.get("px"),
-            "Amount": data.get("sz"),
-            "Time": int(data.get("ts"))
-        }
+        for d in sorted(data, key=lambda d: int(d["tradeId"])):
+            trade = {
+                "Info":msg,
+                "platform": self._platform,
+                "symbol": symbol,
+                "Type":  0 if d["side"]=="buy" else 1,
+                "Price": d.get("px"),
+                "Amount": d.get("sz"),
+                "Time": int(d.get("ts"))
+            }
+            trade.update(self._clock.stamp("trade", trade["Time"]))
+            # A message may aggregate `count` trades of a taker order at one price, `tradeId` is the last one.
+            self._trade_gaps.feed(symbol, int(d["tradeId"]), trade["Time"], trade, int(d.get("count") or 1))
+
+    def _emit_trade(self, trade):
         if self.ispublic_to_mq:
             EventTrade(**trade).publish()
         if self._trade_update_callback:
             SingleTask.run(self._trade_update_callback, trade)
         if self.islog:
-            logger.info("symbol:", symbol, "trade:", trade, caller=self)
+            logger.info("symbol:", trade["symbol"], "trade:", trade, caller=self)
+
+    async def _fetch_trades(self, symbol, last, last_time, seq, seq_time):
+        """Fetch trades between trade ids `last` and `seq` (both excluded), paged backward from `seq`."""
+        rows = []
+        after = seq
+        while after > last + 1:
+            params = {
+                "instId": symbol,
+                "type": 1,  # Page by trade id, trades before `after`.
+                "after": after,
+                "limit": 100
+            }
+            success, error = await self._rest_api.request("GET", "/api/v5/market/history-trades", params)
+            if not error and success.get("code") != "0":
+                error = success
+            if error:
+                logger.error("fetch trades error:", error, "symbol:", symbol, caller=self)
+                break
+            data = success.get("data")
+            if not data:
+                break
+            for d in data:
+                trade_id = int(d["tradeId"])
+                if trade_id <= last:
+                    break
+                trade = {
+                    "Info": d,
+                    "platform": self._platform,
+                    "symbol": symbol,
+                    "Type": 0 if d["side"] == "buy" else 1,
+                    "Price": d.get("px"),
+                    "Amount": d.get("sz"),
+                    "Time": int(d.get("ts"))
+                }
+                rows.append((trade_id, trade))
+            after = int(data[-1]["tradeId"])
+        rows.reverse()
+        return rows
     
     #@async_method_locker("OkxMarket_process_kline",wait=False)
     async def process_kline(self, symbol, data,msg):
@@ -1921,12 +2014,54 @@ class OkxMarket:
             "Volume": volume,
             "Time": timestamp,
         }
+        kline.update(self._clock.stamp("kline"))  # Candle has the open time only, no event time.
+        self._kline_gaps.feed(symbol, timestamp, timestamp, kline)
+
+    def _emit_kline(self, kline):
         if self.ispublic_to_mq:
             EventKline(**kline).publish()
         if self._kline_update_callback:
             SingleTask.run(self._kline_update_callback, kline)
         if self.islog:
-            logger.info("symbol:", symbol, "kline:", kline, caller=self)
+            logger.info("symbol:", kline["symbol"], "kline:", kline, caller=self)
+
+    async def _fetch_klines(self, symbol, last, last_time, seq, seq_time):
+        """Fetch 1m klines from open time `last` (updated to the final one) to `seq` (excluded)."""
+        rows = []
+        after = seq
+        while after > last:
+            params = {
+                "instId": symbol,
+                "bar": "1m",
+                "after": after,  # Klines before `after` and after `before`, both excluded.
+                "before": last - 1,
+                "limit": 300
+            }
+            success, error = await self._rest_api.request("GET", "/api/v5/market/candles", params)
+            if not error and success.get("code") != "0":
+                error = success
+            if error:
+                logger.error("fetch klines error:", error, "symbol:", symbol, caller=self)
+                break
+            data = success.get("data")
+            if not data:
+                break
+            for k in data:
+                kline = {
+                    "Info": k,
+                    "platform": self._platform,
+                    "symbol": symbol,
+                    "Open": float(k[1]),
+                    "High": float(k[2]),
+                    "Low": float(k[3]),
+                    "Close": float(k[4]),
+                    "Volume": float(k[5]),
+                    "Time": int(k[0]),
+                }
+                rows.append((int(k[0]), kline))
+            after = int(data[-1][0])
+        rows.reverse()
+        return rows
     
     #加修饰器使得行情信息依次处理,如果之前的数据未处理完新数据直接抛弃，避免数据堆积新旧穿插
     #@async_method_locker("OkxMarket_process_tickers",wait=False)
@@ -1943,6 +2078,7 @@ class OkxMarket:
             "Buyamount"    : data.get("bidSz"),             
             "Time"    : int(data.get("ts"))   
         }
+        ticker.update(self._clock.stamp("tickers", ticker["Time"]))
         if self.ispublic_to_mq:
             EventTrade(**ticker).publish()
         if self._tickers_update_callback:
@@ -1963,6 +2099,7 @@ class OkxMarket:
             "Buyamount"    : data.get("bids",[])[0][1],             
             "Time"    : int(data.get("ts"))   
         }
+        ticker.update(self._clock.stamp("bookone", ticker["Time"]))
         if self.ispublic_to_mq:
             EventTrade(**ticker).publish()
         if self._tickers_update_callback:
@@ -1992,6 +2129,7 @@ class OkxMarket:
             "Bids": bids,
             "Time": int(data[0].get("ts"))
         }
+        orderbook.update(self._clock.stamp("orderbook", orderbook["Time"]))
         if self._orderbook_update_callback:
             SingleTask.run(self._orderbook_update_callback, orderbook)
         if self.ispublic_to_mq:
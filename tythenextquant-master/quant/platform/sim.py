@@ -0,0 +1,704 @@
+# -*- coding:utf-8 -*-
+
+"""
+Simulated exchange for backtesting, platform `sim`.
+Orders created by `Trade(platform="sim", ...)` are matched by a price-time priority matching engine against replayed
+orderbooks and trades, instead of being sent to an exchange. Market data is fed by the adapters' callbacks, e.g.
+replayed by `quant.replay.ReplayEngine`, or directly by a backtest loop:
+
+    from quant.platform import sim
+
+    trader = Trade(platform="sim", strategy="test", account="sim", symbol="BTC/USDT", assets={"USDT": 10000},
+                   latency=20, maker_fee=0.0002, taker_fee=0.0005, order_update_callback=on_order)
+    market = BinanceMarket(platform="binance", symbols=["BTC/USDT"], channels=["orderbook", "trade"],
+                           orderbook_update_callback=sim.on_orderbook_update,
+                           trade_update_callback=sim.on_trade_update)
+    ...
+    print(sim.report())
+
+Matching model:
+    * Every order and cancel request arrives at the engine `latency` milliseconds after it's sent, in market data
+        time, market data between them is processed first.
+    * Marketable orders take the liquidity of the latest orderbook level by level, the liquidity taken is not
+        available again until the next orderbook. The remainder of a market order is canceled, the remainder of a
+        limit order rests.
+    * A resting order is queued behind the quantity of its price level when it arrives, the queue ahead shrinks by
+        trades at its price and by the level quantity decreasing below it. It's filled by trades after the queue
+        ahead is cleared, by trades through its price, and fully when the opposite side of the orderbook crosses it.
+        If `queue_position` is False, resting orders are at the front of the queue.
+    * Fees are charged in the quote currency, maker fee for resting orders and taker fee for marketable orders.
+
+Benchmark:
+    python -m quant.platform.sim --events 500000
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import copy
+import time
+import heapq
+import random
+import bisect
+import asyncio
+import argparse
+
+from quant.error import Error
+from quant.utils import tools
+from quant.utils import logger
+from quant.const import SIM
+from quant.order import Order
+from quant.asset import Asset
+from quant.position import Position
+from quant.tasks import SingleTask
+from quant.order import ORDER_ACTION_BUY, ORDER_ACTION_SELL
+from quant.order import ORDER_TYPE_LIMIT, ORDER_TYPE_MARKET
+from quant.order import ORDER_STATUS_SUBMITTED, ORDER_STATUS_PARTIAL_FILLED, ORDER_STATUS_FILLED, \
+    ORDER_STATUS_CANCELED, ORDER_STATUS_FAILED
+
+
+__all__ = ("SimTrade", "MatchingEngine", "on_orderbook_update", "on_trade_update", "report", )
+
+
+EPSILON = 1e-9  # Remain quantity less than `quantity * EPSILON` is filled.
+
+# Events of the matching engine.
+EVENT_ACCEPTED = "accepted"
+EVENT_FILLED = "filled"
+EVENT_CANCELED = "canceled"
+
+
+class SimOrder:
+    """Order in the matching engine."""
+
+    __slots__ = ("order_no", "action", "order_type", "price", "quantity", "remain", "ahead", "filled_value")
+
+    def __init__(self, order_no, action, order_type, price, quantity):
+        self.order_no = order_no
+        self.action = action
+        self.order_type = order_type
+        self.price = price
+        self.quantity = quantity
+        self.remain = quantity
+        self.ahead = 0  # Quantity ahead in the queue of its price level.
+        self.filled_value = 0
+
+
+class MatchingEngine:
+    """ Price-time priority matching of own orders against replayed orderbooks and trades.
+
+    Attributes:
+        listener: Function called on order events, e.g. `listener(event, order, price, quantity, maker)`, `price`,
+            `quantity` and `maker` are only set for `EVENT_FILLED`.
+        latency: Milliseconds for order and cancel requests to arrive, default is 0.
+        queue_position: If True, resting orders are queued behind the quantity of their price level, default is True.
+    """
+
+    def __init__(self, listener, latency=0, queue_position=True):
+        """Initialize."""
+        self.listener = listener
+        self.latency = latency
+        self.queue_position = queue_position
+        self.now = None  # Market data time, millisecond.
+        self._asks = []  # Latest orderbook, e.g. [[price, quantity], ...], liquidity taken by own orders is removed.
+        self._bids = []
+        self._last_price = None
+        self._buys = {}  # Resting orders, e.g. {price: [order, ...]}, in time priority.
+        self._sells = {}
+        self._buy_prices = []  # Sorted prices of resting orders.
+        self._sell_prices = []
+        self._pending = []  # Heap of requests, e.g. [(arrive time, seq, order or order_no), ...]
+        self._seq = 0
+        self._orders = {}  # Open orders, e.g. {order_no: order}
+
+    @property
+    def mid_price(self):
+        if self._asks and self._bids:
+            return (self._asks[0][0] + self._bids[0][0]) / 2
+        return self._last_price
+
+    @property
+    def best_ask(self):
+        return self._asks[0][0] if self._asks else self._last_price
+
+    @property
+    def best_bid(self):
+        return self._bids[0][0] if self._bids else self._last_price
+
+    def open_order_nos(self):
+        return list(self._orders.keys())
+
+    def submit(self, order):
+        """Send an order, it arrives after `latency`."""
+        self._orders[order.order_no] = order
+        self._push(order)
+
+    def cancel(self, order_no):
+        """Send a cancel request, it arrives after `latency`, ignored if the order is closed before it arrives."""
+        self._push(order_no)
+
+    def _push(self, request):
+        now = self.now if self.now is not None else tools.get_cur_timestamp_ms()
+        self._seq += 1
+        heapq.heappush(self._pending, (now + self.latency, self._seq, request))
+
+    def advance(self, ts):
+        """Advance market data time, process requests arrived before `ts`."""
+        pending = self._pending
+        while pending and pending[0][0] <= ts:
+            due, _, request = heapq.heappop(pending)
+            self.now = due
+            if isinstance(request, SimOrder):
+                self._arrive(request)
+            else:
+                self._cancel(request)
+        self.now = ts
+
+    def update_orderbook(self, ts, asks, bids):
+        """ Update the latest orderbook.
+
+        Args:
+            ts: Orderbook time, millisecond.
+            asks: Asks, e.g. [[price, quantity], ...], ascending by price.
+            bids: Bids, e.g. [[price, quantity], ...], descending by price.
+        """
+        self.advance(ts)
+        self._asks = [[float(p), float(q)] for p, q in asks]
+        self._bids = [[float(p), float(q)] for p, q in bids]
+        if self._buy_prices:
+            if self._asks:
+                self._fill_crossed(self._buys, self._buy_prices, self._asks[0][0], True)
+            self._update_ahead(self._buys, self._bids, True)
+        if self._sell_prices:
+            if self._bids:
+                self._fill_crossed(self._sells, self._sell_prices, self._bids[0][0], False)
+            self._update_ahead(self._sells, self._asks, False)
+
+    def update_trade(self, ts, action, price, quantity):
+        """ Match resting orders against a trade.
+
+        Args:
+            ts: Trade time, millisecond.
+            action: Taker side, BUY or SELL, a SELL trade fills resting buy orders.
+            price: Trade price.
+            quantity: Trade quantity.
+        """
+        self.advance(ts)
+        price = float(price)
+        left = float(quantity)
+        self._last_price = price
+        if action == ORDER_ACTION_SELL:
+            book, prices, iterate = self._buys, self._buy_prices, reversed(self._buy_prices[:])
+            through = lambda p: p > price
+        else:
+            book, prices, iterate = self._sells, self._sell_prices, iter(self._sell_prices[:])
+            through = lambda p: p < price
+        for p in iterate:
+            if left <= 0 or not (p == price or through(p)):
+                break
+            queue = book[p]
+            if p == price and self.queue_position:
+                for order in queue:
+                    order.ahead -= left
+                    if order.ahead < 0:
+                        self._fill(order, p, min(order.remain, -order.ahead), True)
+                        order.ahead = 0
+            else:
+                for order in queue:
+                    if left <= 0:
+                        break
+                    take = min(order.remain, left)
+                    left -= take
+                    self._fill(order, p, take, True)
+            self._clean(book, prices, p)
+
+    def _arrive(self, order):
+        if order.order_no not in self._orders:
+            return
+        self.listener(EVENT_ACCEPTED, order, None, None, None)
+        if order.action == ORDER_ACTION_BUY:
+            levels, crossed = self._asks, lambda p: p <= order.price
+        else:
+            levels, crossed = self._bids, lambda p: p >= order.price
+        market = order.order_type == ORDER_TYPE_MARKET
+        while order.remain > 0 and levels and (market or crossed(levels[0][0])):
+            level = levels[0]
+            take = min(order.remain, level[1])
+            level[1] -= take
+            if level[1] <= 0:
+                levels.pop(0)
+            self._fill(order, level[0], take, False)
+        if order.order_no not in self._orders:
+            return
+        if market:
+            self._close(order, EVENT_CANCELED)
+            return
+        if order.action == ORDER_ACTION_BUY:
+            book, prices, same = self._buys, self._buy_prices, self._bids
+        else:
+            book, prices, same = self._sells, self._sell_prices, self._asks
+        queue = book.get(order.price)
+        if queue is None:
+            queue = book[order.price] = []
+            bisect.insort(prices, order.price)
+        if self.queue_position:
+            ahead = sum(o.remain for o in queue)
+            for p, q in same:
+                if p == order.price:
+                    ahead += q
+                    break
+            order.ahead = ahead
+        queue.append(order)
+
+    def _cancel(self, order_no):
+        order = self._orders.get(order_no)
+        if not order:
+            return
+        book, prices = (self._buys, self._buy_prices) if order.action == ORDER_ACTION_BUY else \
+            (self._sells, self._sell_prices)
+        queue = book.get(order.price)
+        if queue and order in queue:
+            queue.remove(order)
+            self._clean(book, prices, order.price)
+        self._close(order, EVENT_CANCELED)
+
+    def _fill(self, order, price, quantity, maker):
+        if quantity <= 0:
+            return
+        order.remain -= quantity
+        order.filled_value += price * quantity
+        if order.remain <= order.quantity * EPSILON:
+            order.remain = 0
+        self.listener(EVENT_FILLED, order, price, quantity, maker)
+        if not order.remain:
+            self._orders.pop(order.order_no, None)
+
+    def _close(self, order, event):
+        self._orders.pop(order.order_no, None)
+        self.listener(event, order, None, None, None)
+
+    def _clean(self, book, prices, price):
+        """Remove filled orders of a price level."""
+        queue = book[price]
+        if any(not o.remain for o in queue):
+            queue[:] = [o for o in queue if o.remain]
+        if not queue:
+            del book[price]
+            prices.remove(price)
+
+    def _fill_crossed(self, book, prices, best, buy):
+        """Fill resting orders crossed by the opposite side of the orderbook at their prices."""
+        crossed = prices[bisect.bisect_left(prices, best):] if buy else prices[:bisect.bisect_right(prices, best)]
+        for p in crossed:
+            for order in book[p]:
+                self._fill(order, p, order.remain, True)
+            self._clean(book, prices, p)
+
+    def _update_ahead(self, book, levels, buy):
+        """Shrink queues ahead to the quantities of their price levels."""
+        if not self.queue_position or not levels:
+            return
+        quantities = {p: q for p, q in levels}
+        worst = levels[-1][0]
+        for p, queue in book.items():
+            if (buy and p < worst) or (not buy and p > worst):
+                continue  # Deeper than the orderbook, the level quantity is unknown.
+            own = 0
+            level = quantities.get(p, 0)
+            for order in queue:
+                if order.ahead > level + own:
+                    order.ahead = level + own
+                own += order.remain
+
+
+class SimTrade:
+    """ Simulated Trade module, orders are matched by `MatchingEngine`, spot balances are checked and locked.
+
+    Attributes:
+        account: Account name for this trade exchange.
+        strategy: What's name would you want to created for your strategy.
+        symbol: Symbol name for your trade, e.g. `BTC/USDT`, market data of the same symbol (separators ignored) are
+            matched.
+        base: Base currency, default is parsed from symbol, e.g. `BTC`.
+        quote: Quote currency, default is parsed from symbol, e.g. `USDT`.
+        assets: Initial balances, e.g. {"USDT": 10000, "BTC": 1}.
+        latency: Milliseconds for order and cancel requests to arrive, default is 0.
+        maker_fee: Fee rate of resting orders, default is 0.
+        taker_fee: Fee rate of marketable orders, default is 0.
+        queue_position: If True, resting orders are queued behind the quantity of their price level, default is True.
+        keep_fills: If True, all fills are kept in `fills`, default is False.
+        asset_update_callback: Asynchronous callback function for asset updates.
+        order_update_callback: Asynchronous callback function for order updates.
+        position_update_callback: Asynchronous callback function for position updates.
+        init_success_callback: Asynchronous callback function after initialized.
+    """
+
+    def __init__(self, **kwargs):
+        """Initialize Trade module."""
+        e = None
+        if not kwargs.get("account"):
+            e = Error("param account miss")
+        if not kwargs.get("strategy"):
+            e = Error("param strategy miss")
+        if not kwargs.get("symbol"):
+            e = Error("param symbol miss")
+        if e:
+            logger.error(e, caller=self)
+            if kwargs.get("init_success_callback"):
+                SingleTask.run(kwargs["init_success_callback"], False, e)
+            return
+
+        self._platform = SIM
+        self._account = kwargs["account"]
+        self._strategy = kwargs["strategy"]
+        self._symbol = kwargs["symbol"]
+        base, quote = _split_symbol(self._symbol)
+        self._base = kwargs.get("base") or base
+        self._quote = kwargs.get("quote") or quote
+        self._maker_fee = kwargs.get("maker_fee", 0)
+        self._taker_fee = kwargs.get("taker_fee", 0)
+        self._keep_fills = kwargs.get("keep_fills", False)
+        self._asset_update_callback = kwargs.get("asset_update_callback")
+        self._order_update_callback = kwargs.get("order_update_callback")
+        self._position_update_callback = kwargs.get("position_update_callback")
+        self._init_success_callback = kwargs.get("init_success_callback")
+
+        self._engine = MatchingEngine(self._on_engine_event, kwargs.get("latency", 0),
+                                      kwargs.get("queue_position", True))
+        self._balances = {}  # e.g. {"USDT": [free, locked], ... }
+        for currency, amount in (kwargs.get("assets") or {}).items():
+            self._balances[currency] = [float(amount), 0]
+        for currency in (self._base, self._quote):
+            self._balances.setdefault(currency, [0, 0])
+        self._initial = {c: b[0] for c, b in self._balances.items()}
+        self._orders = {}  # Open orders, e.g. {order_no: order, ... }
+        self._locked = {}  # Balance locked by open orders, e.g. {order_no: amount, ... }
+        self._position = Position(self._platform, self._account, self._strategy, self._symbol)
+        self._net = 0  # Net position in base currency.
+        self._avg_price = 0
+        self._order_id = 0
+        self._stats = {"orders": 0, "rejected": 0, "fills": 0, "maker_fills": 0, "taker_fills": 0, "volume": 0,
+                       "fees": 0, "realized_pnl": 0}
+        self.fills = []  # e.g. [(time, order_no, action, price, quantity, fee, maker), ...], if `keep_fills`.
+
+        _traders.setdefault(_normalize(self._symbol), []).append(self)
+        if self._init_success_callback:
+            SingleTask.run(self._init_success_callback, True, None)
+
+    @property
+    def assets(self):
+        return {c: {"free": _format(f), "locked": _format(l), "total": _format(f + l)}
+                for c, (f, l) in self._balances.items()}
+
+    @property
+    def orders(self):
+        return copy.copy(self._orders)
+
+    @property
+    def position(self):
+        return copy.copy(self._position)
+
+    @property
+    def rest_api(self):
+        return None
+
+    @property
+    def engine(self):
+        return self._engine
+
+    async def create_order(self, action, price, quantity, order_type=ORDER_TYPE_LIMIT, resptype="FULL", **kwargs):
+        """ Create an order.
+
+        Args:
+            action: Trade direction, BUY or SELL.
+            price: Price of each contract, ignored for market orders.
+            quantity: The buying or selling quantity, in base currency.
+            order_type: Limit order or market order, LIMIT or MARKET.
+
+        Returns:
+            order_no: Order ID if created successfully, otherwise it's None.
+            error: Error information, otherwise it's None.
+        """
+        price = float(price or 0)
+        quantity = float(quantity)
+        if action not in (ORDER_ACTION_BUY, ORDER_ACTION_SELL) or quantity <= 0 or \
+                (order_type == ORDER_TYPE_LIMIT and price <= 0):
+            return None, Error("order param error")
+        if action == ORDER_ACTION_BUY:
+            currency = self._quote
+            estimate = price if order_type == ORDER_TYPE_LIMIT else self._engine.best_ask
+            if not estimate:
+                return None, Error("no market price")
+            amount = estimate * quantity * (1 + max(self._maker_fee, self._taker_fee))
+        else:
+            currency = self._base
+            amount = quantity
+        balance = self._balances[currency]
+        if balance[0] < amount * (1 - EPSILON):
+            self._stats["rejected"] += 1
+            return None, Error("insufficient balance: {} free {} required {}".format(currency, balance[0], amount))
+        balance[0] -= amount
+        balance[1] += amount
+
+        self._order_id += 1
+        self._stats["orders"] += 1
+        order_no = "{}_{}".format(self._strategy, self._order_id)
+        now = self._engine.now if self._engine.now is not None else tools.get_cur_timestamp_ms()
+        order = Order(self._account, self._platform, self._strategy, order_no, self._symbol, action, price, quantity,
+                      order_type=order_type, ctime=now, utime=now, etime=now)
+        self._orders[order_no] = order
+        self._locked[order_no] = amount
+        self._engine.submit(SimOrder(order_no, action, order_type, price, quantity))
+        self._publish_asset()
+        return order_no, None
+
+    async def revoke_order(self, *order_nos):
+        """ Revoke (an) order(s), orders are canceled after `latency`, and may be filled before canceled.
+
+        Args:
+            order_nos: Order id list, you can set this param to 0 or multiple items. If you set 0 param, you can cancel
+                all orders for this symbol(initialized in Trade object). If you set 1 param, you can cancel an order.
+                If you set multiple param, you can cancel multiple orders.
+
+        Returns:
+            Success or error, see bellow.
+        """
+        if len(order_nos) == 0:
+            for order_no in self._engine.open_order_nos():
+                self._engine.cancel(order_no)
+            return True, None
+        if len(order_nos) == 1:
+            if order_nos[0] not in self._orders:
+                return None, Error("order not found: {}".format(order_nos[0]))
+            self._engine.cancel(order_nos[0])
+            return order_nos[0], None
+        success, error = [], []
+        for order_no in order_nos:
+            if order_no in self._orders:
+                self._engine.cancel(order_no)
+                success.append(order_no)
+            else:
+                error.append((order_no, Error("order not found")))
+        return success, error
+
+    async def get_open_order_nos(self):
+        """ Get open order id list.
+
+        Returns:
+            order_nos: Open order id list, otherwise it's None.
+            error: Error information, otherwise it's None.
+        """
+        return list(self._orders.keys()), None
+
+    def on_orderbook(self, orderbook):
+        """ Process an orderbook, e.g. {"Asks": [[price, quantity], ...], "Bids": [...], "Time": 1570000000000}."""
+        asks = orderbook.get("Asks") or orderbook.get("asks") or []
+        bids = orderbook.get("Bids") or orderbook.get("bids") or []
+        ts = orderbook.get("Time") or orderbook.get("timestamp") or tools.get_cur_timestamp_ms()
+        self._engine.update_orderbook(int(ts), asks, bids)
+
+    def on_trade(self, trade):
+        """ Process a trade, e.g. {"Type": "BUY", "Price": "1.0", "Amount": "0.1", "Time": 1570000000000}."""
+        action = trade.get("Type") or trade.get("action")
+        price = trade.get("Price") or trade.get("price")
+        quantity = trade.get("Amount") or trade.get("quantity")
+        ts = trade.get("Time") or trade.get("timestamp") or tools.get_cur_timestamp_ms()
+        self._engine.update_trade(int(ts), action, price, quantity)
+
+    def report(self):
+        """ Report fills and PnL, unrealized PnL is valued at the mid price.
+
+        Returns:
+            result: e.g. {"symbol": "BTC/USDT", "orders": 10, "fills": 8, "volume": 1000.0, "fees": 0.5,
+                "realized_pnl": 2.0, "unrealized_pnl": 1.0, "pnl": 2.5, "position": 0.01, ...}
+        """
+        price = self._engine.mid_price or 0
+        unrealized = self._net * (price - self._avg_price) if price and self._net else 0
+        equity = sum(self._balances[self._quote]) + sum(self._balances[self._base]) * price
+        initial = self._initial[self._quote] + self._initial[self._base] * price
+        d = {
+            "symbol": self._symbol,
+            "time": self._engine.now,
+            "unrealized_pnl": unrealized,
+            "pnl": self._stats["realized_pnl"] + unrealized - self._stats["fees"],
+            "position": self._net,
+            "avg_price": self._avg_price,
+            "mark_price": price,
+            "equity": equity,
+            "equity_change": equity - initial,
+            "open_orders": len(self._orders)
+        }
+        d.update(self._stats)
+        return d
+
+    def _on_engine_event(self, event, sim_order, price, quantity, maker):
+        order = self._orders.get(sim_order.order_no)
+        if not order:
+            return
+        order.utime = self._engine.now
+        if event == EVENT_ACCEPTED:
+            order.status = ORDER_STATUS_SUBMITTED
+        elif event == EVENT_FILLED:
+            self._settle(order, sim_order, price, quantity, maker)
+            order.remain = sim_order.remain
+            order.avg_price = sim_order.filled_value / (sim_order.quantity - sim_order.remain)
+            order.status = ORDER_STATUS_FILLED if not sim_order.remain else ORDER_STATUS_PARTIAL_FILLED
+        elif event == EVENT_CANCELED:
+            order.status = ORDER_STATUS_CANCELED
+        else:
+            order.status = ORDER_STATUS_FAILED
+        if order.status in (ORDER_STATUS_FILLED, ORDER_STATUS_CANCELED, ORDER_STATUS_FAILED):
+            self._orders.pop(order.order_no)
+            self._unlock(order, self._locked.pop(order.order_no, 0))
+            self._publish_asset()
+        if self._order_update_callback:
+            SingleTask.run(self._order_update_callback, copy.copy(order))
+
+    def _settle(self, order, sim_order, price, quantity, maker):
+        """Update balances, position and PnL of a fill."""
+        value = price * quantity
+        fee = value * (self._maker_fee if maker else self._taker_fee)
+        base, quote = self._balances[self._base], self._balances[self._quote]
+        # Release locked balance in proportion to the quantity filled.
+        unlock = self._locked[order.order_no] * quantity / (sim_order.remain + quantity)
+        self._locked[order.order_no] -= unlock
+        if order.action == ORDER_ACTION_BUY:
+            quote[1] -= unlock
+            quote[0] += unlock - value - fee
+            base[0] += quantity
+            signed = quantity
+        else:
+            base[1] -= unlock
+            quote[0] += value - fee
+            signed = -quantity
+
+        if not self._net or (self._net > 0) == (signed > 0):
+            self._avg_price = (self._avg_price * abs(self._net) + value) / (abs(self._net) + quantity)
+        else:
+            closed = min(quantity, abs(self._net))
+            self._stats["realized_pnl"] += closed * (price - self._avg_price) * (1 if self._net > 0 else -1)
+            if quantity > closed:
+                self._avg_price = price
+        self._net += signed
+        if abs(self._net) <= quantity * EPSILON:
+            self._net = 0
+            self._avg_price = 0
+
+        self._stats["fills"] += 1
+        self._stats["maker_fills" if maker else "taker_fills"] += 1
+        self._stats["volume"] += value
+        self._stats["fees"] += fee
+        if self._keep_fills:
+            self.fills.append((self._engine.now, order.order_no, order.action, price, quantity, fee, maker))
+
+        if self._net >= 0:
+            self._position.update(0, 0, self._net, self._avg_price, utime=self._engine.now)
+        else:
+            self._position.update(-self._net, self._avg_price, 0, 0, utime=self._engine.now)
+        if self._position_update_callback:
+            SingleTask.run(self._position_update_callback, copy.copy(self._position))
+
+    def _unlock(self, order, amount):
+        if not amount:
+            return
+        balance = self._balances[self._quote if order.action == ORDER_ACTION_BUY else self._base]
+        balance[0] += amount
+        balance[1] -= amount
+
+    def _publish_asset(self):
+        if not self._asset_update_callback:
+            return
+        asset = Asset(self._platform, self._account, self.assets, self._engine.now, True)
+        SingleTask.run(self._asset_update_callback, asset)
+
+
+_traders = {}  # Simulated traders of symbols, e.g. {"BTCUSDT": [trader, ...]}
+
+
+def _normalize(symbol):
+    return symbol.replace("/", "").replace("_", "").replace("-", "").upper()
+
+
+def _format(amount):
+    """Format an amount without scientific notation, e.g. 0.00001 -> "0.00001"."""
+    return ("%.12f" % amount).rstrip("0").rstrip(".") or "0"
+
+
+def _split_symbol(symbol):
+    """Split symbol into base and quote currencies, e.g. `BTC/USDT` -> (`BTC`, `USDT`)."""
+    for sep in ("/", "_", "-"):
+        if sep in symbol:
+            base, quote = symbol.split(sep, 1)
+            return base.upper(), quote.upper()
+    for quote in ("USDT", "USDC", "BUSD", "USD", "BTC", "ETH"):
+        if symbol.upper().endswith(quote) and len(symbol) > len(quote):
+            return symbol[:-len(quote)].upper(), quote
+    return symbol.upper(), "QUOTE"
+
+
+async def on_orderbook_update(orderbook):
+    """Orderbook callback of market adapters, matches simulated traders of the symbol."""
+    for trader in _traders.get(_normalize(orderbook.get("symbol") or ""), ()):
+        trader.on_orderbook(orderbook)
+
+
+async def on_trade_update(trade):
+    """Trade callback of market adapters, matches simulated traders of the symbol."""
+    for trader in _traders.get(_normalize(trade.get("symbol") or ""), ()):
+        trader.on_trade(trade)
+
+
+def report():
+    """Report fills and PnL of all simulated traders, e.g. [{"symbol": "BTC/USDT", "pnl": 1.0, ...}, ...]"""
+    return [trader.report() for traders in _traders.values() for trader in traders]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated exchange benchmark with a market making strategy.")
+    parser.add_argument("--events", type=int, default=500000, help="Market data events.")
+    parser.add_argument("--interval", type=int, default=100, help="Milliseconds between events.")
+    parser.add_argument("--latency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    async def run():
+        rnd = random.Random(args.seed)
+        trader = SimTrade(account="sim", strategy="mm", symbol="BTC/USDT", assets={"USDT": 1000000, "BTC": 10},
+                          latency=args.latency, maker_fee=0.0002, taker_fee=0.0005)
+        mid = 10000.0
+        ts = 1570000000000
+        quotes = []
+        begin = time.perf_counter()
+        for i in range(args.events):
+            ts += args.interval
+            mid += rnd.gauss(0, 1)
+            if i % 4:
+                orderbook = {"symbol": "BTCUSDT", "Time": ts,
+                             "Asks": [[mid + 0.5 + k, rnd.random() * 2] for k in range(10)],
+                             "Bids": [[mid - 0.5 - k, rnd.random() * 2] for k in range(10)]}
+                await on_orderbook_update(orderbook)
+            else:
+                action = ORDER_ACTION_BUY if rnd.random() < 0.5 else ORDER_ACTION_SELL
+                price = mid + 0.5 if action == ORDER_ACTION_BUY else mid - 0.5
+                await on_trade_update({"symbol": "BTCUSDT", "Type": action, "Price": price,
+                                       "Amount": rnd.random(), "Time": ts})
+            if i % 50 == 0:
+                if quotes:
+                    await trader.revoke_order(*quotes)
+                quotes = []
+                for action, price in ((ORDER_ACTION_BUY, round(mid - 1)), (ORDER_ACTION_SELL, round(mid + 1))):
+                    order_no, _ = await trader.create_order(action, price, 0.1)
+                    if order_no:
+                        quotes.append(order_no)
+        elapsed = time.perf_counter() - begin
+        simulated = args.events * args.interval / 1000
+        print("events: {} elapsed: {:.3f}s events/s: {:.0f} simulated: {:.0f}s speed: {:.0f}x".format(
+            args.events, elapsed, args.events / elapsed, simulated, simulated / elapsed))
+        print(trader.report())
+
+    asyncio.get_event_loop().run_until_complete(run())
+
+
+if __name__ == "__main__":
+    main()
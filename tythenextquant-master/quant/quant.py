@@ -10,8 +10,6 @@ Email:  xunfeng@test.com
 
 import signal
 import asyncio
-import requests
-import json
 from quant.utils import logger
 from quant.config import config
 
@@ -23,6 +21,7 @@ class Quant:
     def __init__(self):
         self.loop = None
         self.event_center = None
+        self.loop_monitor = None
 
     def initialize(self, config_module=None,configsrc = "file"):
         """ Initialize.
@@ -31,13 +30,29 @@ class Quant:
             config_module: config file path, normally it"s a json file.或者是json文件
             configsrc: 配置源默认为文件,也可以是json对象
         """
-        self._get_event_loop()
         self._load_settings(config_module,configsrc=configsrc)
         self._init_logger()
+        self._get_event_loop()
+        self._init_loop_monitor()
         self._init_db_instance()
         self._init_event_center()
         self._do_heartbeat()
 
+    def start_market_server(self, config_module=None, configsrc="file"):
+        """ Start a multi-process market server, symbols of `MARKETS` are sharded across worker processes, every
+        worker runs its own event loop and publishes market data to the event bus. Blocked until SIGINT / SIGTERM.
+
+        Args:
+            config_module: config file path, normally it"s a json file.或者是json文件
+            configsrc: 配置源默认为文件,也可以是json对象
+        """
+        from quant.marketserver import MarketServer
+        self._load_settings(config_module, configsrc=configsrc)
+        self._init_logger()
+        server = MarketServer(config.markets, config.market_server.get("workers"),
+                              config.market_server.get("restart_delay", 1))
+        server.run()
+
     def start(self):
         """Start the event loop."""
         def keyboard_interrupt(s, f):
@@ -49,47 +64,69 @@ class Quant:
         self.loop.run_forever()
 
     def stop(self,username=None,robotid=None):
-        """Stop the event loop."""
+        """ Stop the event loop, the robot status is reported to the central server before stopped, it waits for
+        `HEARTBEAT.timeout` seconds at most and does not block the event loop. Buffered MongoDB writes are flushed.
+        """
         logger.info("stop io loop.", caller=self)
-        try:
-            if username and robotid:                
-                ipaddress = config.tyquantcentreserver.get("host", "120.26.56.32")
-                port = config.tyquantcentreserver.get("port", "8088")
-                url = "http://"+ipaddress+":"+port+"/remoteupdaterobotstatus/"
-                data = {
-                    "username":username,
-                    "robotid":robotid,
-                    "statuscode":3
-                }
-                headers = {
-                    'Connection': 'close',
-                }
-                trynum = 0
-                while trynum<5:
-                    try:
-                        if port=="8088":
-                            res = requests.post(url=url,data=data,headers=headers,timeout=10)
-                        else:
-                            res = requests.post(url=url,json=data,headers=headers,timeout=10)
-                        resjson = json.loads(res.text)
-                        if resjson["code"]==0:
-                            break
-                        logger.info(str(json.loads(res.text)), caller=self)
-                    except Exception as r:
-                        logger.info("更新机器人状态出错"+str(trynum)+str(r), caller=self)
-                    trynum += 1
-            else:
-                logger.info("未输入用户名与机器人ID", caller=self)
-        except Exception as r:
-            logger.info("更新机器人状态出错"+str(r), caller=self)
-        self.loop.stop()
+        coros = []
+        if config.mongodb:
+            from quant.utils.mongo import flush_all
+            coros.append(flush_all())
+        if username and robotid:
+            from quant.heartbeat import reporter
+            data = {
+                "username":username,
+                "robotid":robotid,
+                "statuscode":3
+            }
+            coros.append(reporter.report("/remoteupdaterobotstatus/", data, retries=2))
+        else:
+            logger.info("未输入用户名与机器人ID", caller=self)
+        if not coros:
+            self.loop.stop()
+            return
+        async def stopping():
+            await asyncio.gather(*coros, return_exceptions=True)
+        coro = stopping()
+        if self.loop.is_running():
+            task = self.loop.create_task(coro)
+            task.add_done_callback(lambda _: self.loop.stop())
+        else:
+            self.loop.run_until_complete(coro)
+            self.loop.stop()
 
     def _get_event_loop(self):
-        """ Get a main io loop. """
+        """ Get a main io loop, uvloop is used if `LOOP.uvloop` is True and it's installed. """
         if not self.loop:
-            self.loop = asyncio.get_event_loop()
+            if config.loop.get("uvloop"):
+                try:
+                    import uvloop
+                    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+                except ImportError:
+                    logger.warn("uvloop not installed, use default asyncio loop.", caller=self)
+            try:
+                self.loop = asyncio.get_event_loop()
+            except RuntimeError:  # No current loop, e.g. in a market server worker process.
+                self.loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self.loop)
         return self.loop
 
+    def _init_loop_monitor(self):
+        """ Start event loop lag monitor if `LOOP.monitor` is True.
+            interval: Sampling interval(milliseconds), default is 5ms.
+            warn: Lag(milliseconds) larger than this is logged as warning, default is 100ms.
+            slow_callback: Log the stack of the loop thread if the loop is blocked longer than this(milliseconds),
+                default is 200ms.
+            report_interval: Interval(seconds) to log lag percentiles, default is 60s.
+        """
+        if not config.loop.get("monitor"):
+            return
+        from quant.utils.loopmonitor import LoopMonitor
+        self.loop_monitor = LoopMonitor(config.loop.get("interval", 5), config.loop.get("warn", 100),
+                                        config.loop.get("slow_callback", 200), config.loop.get("report_interval", 60),
+                                        loop=self.loop)
+        self.loop_monitor.start()
+
     def _load_settings(self, config_module,configsrc="file"):
         """ Load config settings.
 
@@ -118,10 +155,10 @@ class Quant:
             initMongodb(**config.mongodb)
 
     def _init_event_center(self):
-        """Initialize event center."""
-        if config.rabbitmq:
-            from quant.event import EventCenter
-            self.event_center = EventCenter()
+        """Initialize event center, events are delivered in process only if no RabbitMQ configured."""
+        from quant.event import EventCenter, EVENT_BUS_LOCAL
+        self.event_center = EventCenter()
+        if self.event_center.mode != EVENT_BUS_LOCAL:
             self.loop.run_until_complete(self.event_center.connect())
             config.register_run_time_update()
 
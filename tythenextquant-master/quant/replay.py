@@ -0,0 +1,252 @@
+# -*- coding:utf-8 -*-
+
+"""
+Deterministic market data replay.
+Raw frames recorded by `FrameRecorder` are fed into the real exchange adapters, through the same handlers as frames
+received from Websocket connections, e.g. `BinanceMarket.BinanceMarket_process`, so strategies can be run and
+profiled against production traffic.
+
+While a `ReplayEngine` is active, Websocket objects created by adapters don't connect, they are attached to the
+engine and matched to recorded connections by url, in creation order if several connections have the same url.
+Frames of several recordings are merged by receive time, segments are memory-mapped and only the blocks in the time
+window are decompressed.
+
+The engine drives a virtual clock: `tools.get_cur_timestamp` / `tools.get_cur_timestamp_ms` return the receive time of
+the current frame, and the heartbeat, and so `LoopRunTask`, ticks every `heartbeat.interval` seconds of virtual time.
+After every frame, the tasks created by handlers run before the next frame, so a replay is deterministic.
+
+NOTE: `connected_callback` of connections is not called, recorded frames include the responses of subscriptions.
+
+Usage:
+    engine = ReplayEngine("data/frames", start=1570000000000, end=1570003600000, speed=0)
+    engine.activate()
+    market = BinanceMarket(platform="binance", symbols=["BTCUSDT"], channels=["orderbook"], ...)
+    await engine.run()
+    print(engine.stats)
+
+Benchmark:
+    python -m quant.replay config.json data/frames --start 1570000000000 --end 1570003600000
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import sys
+import json
+import time
+import heapq
+import asyncio
+import argparse
+
+from quant.utils import tools
+from quant.utils import logger
+from quant.heartbeat import heartbeat
+from quant.utils.recorder import FrameReader
+
+
+__all__ = ("ReplayEngine", "attach_replay", "get_replay_engine", )
+
+
+_engine = None  # Active replay engine.
+
+
+def get_replay_engine():
+    """Get the active replay engine, None if not replaying."""
+    return _engine
+
+
+def attach_replay(ws):
+    """ Attach a Websocket object to the active replay engine, called by `Websocket.initialize`.
+
+    Args:
+        ws: Websocket object, `quant.utils.web.Websocket` or `quant.utils.websocket.Websocket`.
+
+    Returns:
+        attached: True if attached, and the Websocket object must not connect.
+    """
+    if not _engine:
+        return False
+    _engine.attach(ws)
+    return True
+
+
+class ReplayEngine:
+    """ Replay recorded frames into Websocket objects.
+
+    Attributes:
+        sources: Recordings, a directory or a list of directories / (directory, name) pairs, name is the prefix of
+            segment files, e.g. `frames-{server_id}-{pid}`, all recordings of a directory are replayed if not given.
+        start: Start time in milliseconds, included, default is the first frame.
+        end: End time in milliseconds, included, default is the last frame.
+        speed: Replay speed relative to wall clock, e.g. 1 is real time and 10 is 10 times faster, 0 is as fast as
+            possible, default is 0.
+    """
+
+    def __init__(self, sources, start=None, end=None, speed=0):
+        """Initialize."""
+        if isinstance(sources, (str, tuple)):
+            sources = [sources]
+        self._readers = []
+        for source in sources:
+            if isinstance(source, tuple):
+                self._readers.append(FrameReader(*source))
+            else:
+                for name in FrameReader.recordings(source):
+                    self._readers.append(FrameReader(source, name))
+        self._start = start
+        self._end = end
+        self._speed = speed
+        self._targets = []  # Attached Websocket objects, in creation order.
+        self._routes = {}  # (source index, connection id) -> Websocket object.
+        self._claimed = set()  # Websocket objects matched to a recorded connection.
+        self._now = None  # Virtual time in milliseconds.
+        self._next_tick = None  # Virtual time of the next heartbeat.
+        self._frames = 0
+        self._fed = 0
+        self._skipped = 0
+        self._errors = 0
+        self._elapsed = 0
+
+    @property
+    def now(self):
+        return self._now
+
+    @property
+    def stats(self):
+        d = {
+            "frames": self._frames,
+            "fed": self._fed,
+            "skipped": self._skipped,
+            "errors": self._errors,
+            "elapsed": round(self._elapsed, 3),
+            "throughput": round(self._frames / self._elapsed, 3) if self._elapsed else 0
+        }
+        return d
+
+    def activate(self):
+        """Make this engine active, Websocket objects created after this are attached to it."""
+        global _engine
+        _engine = self
+
+    def deactivate(self):
+        global _engine
+        if _engine is self:
+            _engine = None
+
+    def attach(self, ws):
+        """Attach a Websocket object, frames of the recorded connection with the same url are fed to it."""
+        self._targets.append(ws)
+
+    def _route(self, source, conn):
+        """Match a recorded connection to an attached Websocket object by url."""
+        url = self._readers[source].connections.get(conn)
+        ws = None
+        for target in self._targets:
+            if target not in self._claimed and target._url == url:
+                ws = target
+                self._claimed.add(ws)
+                break
+        else:
+            logger.error("no connection attached for url:", url, "conn:", conn, caller=self)
+        self._routes[(source, conn)] = ws
+        return ws
+
+    def _time(self):
+        return time.time() if self._now is None else self._now / 1000
+
+    def _iter_frames(self):
+        """Frames of all sources merged by time, e.g. (timestamp, source index, conn, kind, data)."""
+        def frames(index, reader):
+            for f in reader.iter_frames(self._start, self._end):
+                yield f.timestamp, index, f.conn, f.kind, f.data
+
+        iterators = [frames(i, reader) for i, reader in enumerate(self._readers)]
+        return heapq.merge(*iterators, key=lambda f: (f[0], f[1]))
+
+    async def _advance(self, ts):
+        """Advance the virtual clock, tick heartbeat for every interval passed."""
+        self._now = ts
+        if self._next_tick is None:
+            self._next_tick = ts + heartbeat.interval * 1000
+            return
+        while self._next_tick <= ts:
+            saved, self._now = self._now, self._next_tick
+            heartbeat.tick()
+            await asyncio.sleep(0)
+            self._now = saved
+            self._next_tick += heartbeat.interval * 1000
+
+    async def run(self):
+        """ Replay all frames, the virtual clock and heartbeat are restored when finished.
+
+        Returns:
+            stats: Replay stats, same as `stats`.
+        """
+        self.activate()
+        tools.set_time_func(self._time)
+        heartbeat.set_external_clock(True)
+        begin = time.time()
+        first = None
+        try:
+            for ts, source, conn, kind, data in self._iter_frames():
+                self._frames += 1
+                if self._speed > 0:
+                    if first is None:
+                        first = ts
+                    delay = (ts - first) / 1000 / self._speed - (time.time() - begin)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await self._advance(ts)
+                key = (source, conn)
+                ws = self._routes[key] if key in self._routes else self._route(source, conn)
+                if not ws:
+                    self._skipped += 1
+                    continue
+                try:
+                    await ws.feed(kind, data)
+                    self._fed += 1
+                except Exception as e:
+                    self._errors += 1
+                    logger.error("feed frame error:", e, caller=self)
+                await asyncio.sleep(0)  # Run the tasks created by handlers before the next frame.
+        finally:
+            self._elapsed = time.time() - begin
+            heartbeat.set_external_clock(False)
+            tools.set_time_func(None)
+            self.deactivate()
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded frames into the market adapters of `MARKETS`.")
+    parser.add_argument("config", help="Config file, with `MARKETS` of the recorded connections.")
+    parser.add_argument("path", help="Directory of segment files.")
+    parser.add_argument("--name", default=None, help="Recording name, e.g. `frames-{server_id}-{pid}`, default is all "
+                                                     "recordings in the directory.")
+    parser.add_argument("--start", type=int, default=None, help="Start time in milliseconds.")
+    parser.add_argument("--end", type=int, default=None, help="End time in milliseconds.")
+    parser.add_argument("--speed", type=float, default=0, help="Speed relative to wall clock, 0 is fastest.")
+    args = parser.parse_args()
+
+    from quant.config import config
+    from quant.marketserver import _market_class
+
+    config.loads(args.config)
+    source = (args.path, args.name) if args.name else args.path
+    engine = ReplayEngine(source, args.start, args.end, args.speed)
+    engine.activate()
+    markets = []
+    for platform, params in (config.markets or {}).items():
+        M = _market_class(platform)
+        if not M:
+            logger.error("platform error:", platform, caller=engine)
+            continue
+        markets.append(M(platform=platform, **params))
+    stats = asyncio.get_event_loop().run_until_complete(engine.run())
+    print(json.dumps(stats))
+    sys.exit(1 if stats["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ Email:  xunfeng@test.com
 """
 
 import copy
+import importlib
 
 from quant import const
 from quant.error import Error
@@ -22,6 +23,59 @@ from quant.position import Position
 from quant.event import EventOrder
 
 
+# Trade adapters of platforms, e.g. {platform: "module.path.ClassName" or class}, modules are imported on first use.
+TRADE_PLATFORMS = {
+    const.OKX: "quant.platform.okx.OKExTrade",
+    const.OKEX_MARGIN: "quant.platform.okex_margin.OKExMarginTrade",
+    const.OKEX_FUTURE: "quant.platform.okex_future.OKExFutureTrade",
+    const.OKEX_SWAP: "quant.platform.okex_swap.OKExSwapTrade",
+    const.DERIBIT: "quant.platform.deribit.DeribitTrade",
+    const.BITMEX: "quant.platform.bitmex.BitmexTrade",
+    const.BINANCE: "quant.platform.binance.BinanceTrade",
+    const.BINANCE_FUTURE: "quant.platform.binance_future.BinanceFutureTrade",
+    const.HUOBI: "quant.platform.huobi.HuobiTrade",
+    const.COINSUPER: "quant.platform.coinsuper.CoinsuperTrade",
+    const.COINSUPER_PRE: "quant.platform.coinsuper_pre.CoinsuperPreTrade",
+    const.KRAKEN: "quant.platform.kraken.KrakenTrade",
+    const.GATE: "quant.platform.gate.GateTrade",
+    const.KUCOIN: "quant.platform.kucoin.KucoinTrade",
+    const.HUOBI_FUTURE: "quant.platform.huobi_future.HuobiFutureTrade",
+    const.SIM: "quant.platform.sim.SimTrade",
+}
+
+
+def register_trade_platform(platform, trade_class):
+    """ Register a Trade adapter.
+
+    Args:
+        platform: Exchange platform name.
+        trade_class: Trade class, or its path `module.path.ClassName` to be imported on first use.
+    """
+    TRADE_PLATFORMS[platform] = trade_class
+
+
+def get_trade_class(platform):
+    """ Get the Trade adapter of a platform, its module is imported at the first time.
+
+    Args:
+        platform: Exchange platform name.
+
+    Returns:
+        trade_class: Trade class, None if platform not registered or import error.
+    """
+    T = TRADE_PLATFORMS.get(platform)
+    if not isinstance(T, str):
+        return T
+    module_name, class_name = T.rsplit(".", 1)
+    try:
+        T = getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError) as e:
+        logger.error("import trade module error! platform:", platform, "module:", module_name, "error:", e)
+        return None
+    TRADE_PLATFORMS[platform] = T
+    return T
+
+
 class Trade:
     """ Trade Module.
 
@@ -76,37 +130,8 @@ class Trade:
         self._position_update_callback = position_update_callback
         self._init_success_callback = init_success_callback
 
-        if platform == const.OKX:
-            from quant.platform.okx import OKExTrade as T
-        elif platform == const.OKEX_MARGIN:
-            from quant.platform.okex_margin import OKExMarginTrade as T
-        elif platform == const.OKEX_FUTURE:
-            from quant.platform.okex_future import OKExFutureTrade as T
-        elif platform == const.OKEX_SWAP:
-            from quant.platform.okex_swap import OKExSwapTrade as T
-        elif platform == const.DERIBIT:
-            from quant.platform.deribit import DeribitTrade as T
-        elif platform == const.BITMEX:
-            from quant.platform.bitmex import BitmexTrade as T
-        elif platform == const.BINANCE:
-            from quant.platform.binance import BinanceTrade as T
-        elif platform == const.BINANCE_FUTURE:
-            from quant.platform.binance_future import BinanceFutureTrade as T
-        elif platform == const.HUOBI:
-            from quant.platform.huobi import HuobiTrade as T
-        elif platform == const.COINSUPER:
-            from quant.platform.coinsuper import CoinsuperTrade as T
-        elif platform == const.COINSUPER_PRE:
-            from quant.platform.coinsuper_pre import CoinsuperPreTrade as T
-        elif platform == const.KRAKEN:
-            from quant.platform.kraken import KrakenTrade as T
-        elif platform == const.GATE:
-            from quant.platform.gate import GateTrade as T
-        elif platform == const.KUCOIN:
-            from quant.platform.kucoin import KucoinTrade as T
-        elif platform == const.HUOBI_FUTURE:
-            from quant.platform.huobi_future import HuobiFutureTrade as T
-        else:
+        T = get_trade_class(platform)
+        if not T:
             logger.error("platform error:", platform, caller=self)
             e = Error("platform error")
             SingleTask.run(self._init_success_callback, False, e)
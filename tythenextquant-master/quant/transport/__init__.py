@@ -0,0 +1,39 @@
+# -*- coding:utf-8 -*-
+
+"""
+Event transports of EventCenter.
+    amqp: RabbitMQ, default, configured by `RABBITMQ`.
+    unix: Brokerless Unix domain sockets for processes on one host, configured by `EVENT_BUS.unix`.
+    redis: Redis Streams, configured by `REDIS`.
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+from quant.transport.base import Transport, Envelope, Properties, topic_match, DEFAULT_EXCHANGES
+
+
+def create_transport(name, **kwargs):
+    """ Create a transport.
+
+    Args:
+        name: Transport name, `amqp` / `unix` / `redis`.
+        kwargs: Transport params.
+
+    Returns:
+        transport: Transport object, None if name error.
+    """
+    if name == "amqp":
+        from quant.transport.amqp import AmqpTransport
+        return AmqpTransport(**kwargs)
+    elif name == "unix":
+        from quant.transport.unixsocket import UnixSocketTransport
+        return UnixSocketTransport(**kwargs)
+    elif name == "redis":
+        from quant.transport.redisstream import RedisStreamTransport
+        return RedisStreamTransport(**kwargs)
+    else:
+        from quant.utils import logger
+        logger.error("transport name error! name:", name)
+        return None
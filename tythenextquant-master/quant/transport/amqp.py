@@ -0,0 +1,108 @@
+# -*- coding:utf-8 -*-
+
+"""
+RabbitMQ event transport.
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import aioamqp
+
+from quant.utils import logger
+from quant.transport.base import Transport, DEFAULT_EXCHANGES
+
+
+__all__ = ("AmqpTransport", )
+
+
+class AmqpTransport(Transport):
+    """ RabbitMQ transport, every exchange is a topic exchange.
+
+    Attributes:
+        host: RabbitMQ host, default is `localhost`.
+        port: RabbitMQ port, default is 5672.
+        username: Login username, default is `guest`.
+        password: Login password, default is `guest`.
+    """
+
+    name = "amqp"
+
+    def __init__(self, host="localhost", port=5672, username="guest", password="guest", **kwargs):
+        """Initialize."""
+        super(AmqpTransport, self).__init__()
+        self._host = host
+        self._port = port
+        self._username = username
+        self._password = password
+        self._protocol = None
+        self._channel = None  # Connection channel.
+
+    def is_alive(self):
+        return self._connected and self._channel and self._channel.is_open
+
+    async def connect(self, exchanges=None):
+        logger.info("host:", self._host, "port:", self._port, caller=self)
+        if self._connected:
+            return True
+
+        # Create a connection.
+        try:
+            transport, protocol = await aioamqp.connect(host=self._host, port=self._port, login=self._username,
+                                                        password=self._password, login_method="PLAIN")
+        except Exception as e:
+            logger.error("connection error:", e, caller=self)
+            return False
+        finally:
+            if self._connected:
+                return True
+        channel = await protocol.channel()
+        self._protocol = protocol
+        self._channel = channel
+        self._connected = True
+        logger.info("Rabbitmq initialize success!", caller=self)
+
+        # Create default exchanges.
+        for name in exchanges or DEFAULT_EXCHANGES:
+            await self._channel.exchange_declare(exchange_name=name, type_name="topic")
+        logger.debug("create default exchanges success!", caller=self)
+        return True
+
+    async def close(self):
+        self._connected = False
+        protocol = self._protocol
+        self._protocol = None
+        self._channel = None
+        if protocol:
+            try:
+                await protocol.close()
+            except Exception:
+                pass
+
+    async def publish(self, exchange, routing_key, payload, app_id=None):
+        properties = {"app_id": app_id} if app_id else None
+        await self._channel.basic_publish(payload=payload, exchange_name=exchange, routing_key=routing_key,
+                                          properties=properties)
+
+    async def declare_queue(self, queue=None, prefetch_count=1):
+        if queue:
+            await self._channel.queue_declare(queue_name=queue, auto_delete=True)
+        else:
+            result = await self._channel.queue_declare(exclusive=True)
+            queue = result["queue"]
+        await self._channel.basic_qos(prefetch_count=prefetch_count)
+        return queue
+
+    async def bind(self, queue, exchange, routing_key):
+        await self._channel.queue_bind(queue_name=queue, exchange_name=exchange, routing_key=routing_key)
+
+    async def consume(self, queue, callback, no_ack=False):
+        await self._channel.basic_consume(callback=callback, queue_name=queue, no_ack=no_ack)
+        logger.info("queue:", queue, caller=self)
+
+    async def set_prefetch(self, prefetch_count):
+        await self._channel.basic_qos(prefetch_count=prefetch_count)
+
+    async def ack(self, envelope, multiple=False):
+        await self._channel.basic_client_ack(delivery_tag=envelope.delivery_tag, multiple=multiple)
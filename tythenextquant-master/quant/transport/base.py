@@ -0,0 +1,155 @@
+# -*- coding:utf-8 -*-
+
+"""
+Event transport base.
+A transport moves serialized events between processes for `EventCenter`, the exchange / routing key / queue scheme of
+RabbitMQ topic exchanges is kept by every transport, so events and subscribers need not know which one is used.
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import functools
+
+
+__all__ = ("Transport", "Envelope", "Properties", "topic_match", "DEFAULT_EXCHANGES", )
+
+
+# Default exchanges created by `EventCenter`.
+DEFAULT_EXCHANGES = ["Orderbook", "Trade", "Kline", "Kline.5min", "Kline.15min", "Config", "Heartbeat", "Asset",
+                     "Order", ]
+
+
+@functools.lru_cache(maxsize=4096)
+def topic_match(pattern, routing_key):
+    """ If a routing key matches a binding pattern, the same as RabbitMQ topic exchange, words are delimited by `.`,
+    `*` matches exactly one word and `#` matches zero or more words.
+    """
+    def match(p, k):
+        if not p:
+            return not k
+        if p[0] == "#":
+            return any(match(p[1:], k[i:]) for i in range(len(k) + 1))
+        if not k:
+            return False
+        if p[0] == "*" or p[0] == k[0]:
+            return match(p[1:], k[1:])
+        return False
+    return match(tuple(pattern.split(".")), tuple(routing_key.split(".")))
+
+
+class Envelope:
+    """ Delivery information of a consumed message, the same attributes as `aioamqp.envelope.Envelope` that used.
+    """
+
+    __slots__ = ("exchange_name", "routing_key", "delivery_tag", )
+
+    def __init__(self, exchange_name, routing_key, delivery_tag=None):
+        self.exchange_name = exchange_name
+        self.routing_key = routing_key
+        self.delivery_tag = delivery_tag
+
+
+class Properties:
+    """ Properties of a consumed message, the same attributes as `aioamqp.properties.Properties` that used.
+    """
+
+    __slots__ = ("app_id", )
+
+    def __init__(self, app_id=None):
+        self.app_id = app_id
+
+
+class Transport:
+    """ Event transport interface.
+
+    Consumer callbacks are called the same as aioamqp, e.g.
+        async def callback(channel, body, envelope, properties): pass
+    `channel` is None for transports except AMQP.
+    """
+
+    name = None
+
+    def __init__(self):
+        """Initialize."""
+        self._connected = False
+
+    @property
+    def connected(self):
+        return self._connected
+
+    def is_alive(self):
+        """If the connection is healthy, checked by `EventCenter` every 10 seconds."""
+        return self._connected
+
+    async def connect(self, exchanges=None):
+        """ Connect and create exchanges.
+
+        Args:
+            exchanges: Exchange names to be created, default is `DEFAULT_EXCHANGES`.
+
+        Returns:
+            success: True if connected, otherwise False.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """Close connection, `connect` can be called again after closed."""
+        self._connected = False
+
+    async def publish(self, exchange, routing_key, payload, app_id=None):
+        """ Publish a message.
+
+        Args:
+            exchange: Exchange name.
+            routing_key: Routing key.
+            payload: Serialized event, bytes.
+            app_id: Publisher id.
+        """
+        raise NotImplementedError
+
+    async def declare_queue(self, queue=None, prefetch_count=1):
+        """ Declare a queue, messages of all bindings of a queue are delivered to its consumer once.
+
+        Args:
+            queue: Queue name, None means an exclusive queue named by the transport.
+            prefetch_count: How many messages can be delivered before acked.
+
+        Returns:
+            queue: Queue name.
+        """
+        raise NotImplementedError
+
+    async def bind(self, queue, exchange, routing_key):
+        """ Bind a queue to an exchange.
+
+        Args:
+            queue: Queue name returned by `declare_queue`.
+            exchange: Exchange name.
+            routing_key: Binding pattern of routing key, `*` and `#` supported.
+        """
+        raise NotImplementedError
+
+    async def consume(self, queue, callback, no_ack=False):
+        """ Consume messages of a queue.
+
+        Args:
+            queue: Queue name returned by `declare_queue`.
+            callback: Asynchronous callback function.
+            no_ack: If True, messages need not to be acked.
+        """
+        raise NotImplementedError
+
+    async def set_prefetch(self, prefetch_count):
+        """Change how many messages can be delivered before acked."""
+        pass
+
+    async def ack(self, envelope, multiple=False):
+        """ Ack a consumed message.
+
+        Args:
+            envelope: Envelope of the message.
+            multiple: If True, ack all messages up to this one.
+        """
+        pass
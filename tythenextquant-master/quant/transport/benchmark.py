@@ -0,0 +1,140 @@
+# -*- coding:utf-8 -*-
+
+"""
+Event transport benchmark, publish and consume through a transport in one process.
+    latency: Publish one message and wait for it, `count` rounds, microseconds.
+    throughput: Publish `count` messages back to back, messages per second until all consumed.
+
+Usage:
+    python -m quant.transport.benchmark unix
+    python -m quant.transport.benchmark amqp --host 127.0.0.1 --username test --password 123456
+    python -m quant.transport.benchmark redis --host 127.0.0.1 --count 20000 --size 2048
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import sys
+import time
+import struct
+import asyncio
+import argparse
+
+
+__all__ = ("benchmark", )
+
+
+STAMP = struct.Struct(">Q")
+
+# Latency buckets in microseconds.
+BOUNDS = (10, 20, 30, 50, 70, 100, 150, 200, 300, 500, 700, 1000, 2000, 5000, 10000, 50000)
+
+
+async def benchmark(transport, count=10000, size=512, timeout=30):
+    """ Benchmark a transport.
+
+    Args:
+        transport: Transport object, not connected.
+        count: How many messages of every test.
+        size: Payload size(bytes), the size of a small orderbook event is about 500 bytes.
+        timeout: Max seconds to wait for messages of every test.
+
+    Returns:
+        result: e.g. {"transport": "unix", "count": 10000, "size": 512, "latency_us": {...}, "throughput": 85000.0,
+            "lost": 0}
+    """
+    from quant.utils.clock import LatencyHistogram
+
+    if not await transport.connect():
+        return None
+    exchange, routing_key = "Orderbook", "benchmark.BTC/USDT"
+    padding = b"x" * max(size - STAMP.size, 0)
+    histogram = LatencyHistogram(BOUNDS)
+    state = {"received": 0, "expect": 0, "done": asyncio.Event()}
+
+    async def on_message(channel, body, envelope, properties):
+        histogram.record((time.perf_counter_ns() - STAMP.unpack_from(body)[0]) / 1000)
+        state["received"] += 1
+        if state["received"] >= state["expect"]:
+            state["done"].set()
+
+    queue = await transport.declare_queue(None, prefetch_count=1000)
+    await transport.bind(queue, exchange, "benchmark.#")
+    await transport.consume(queue, on_message, no_ack=True)
+    await asyncio.sleep(1.5)  # Let the binding reach the publisher.
+
+    # Latency, one message in flight.
+    for _ in range(count):
+        state["expect"] += 1
+        state["done"].clear()
+        await transport.publish(exchange, routing_key, STAMP.pack(time.perf_counter_ns()) + padding)
+        try:
+            await asyncio.wait_for(state["done"].wait(), timeout)
+        except asyncio.TimeoutError:
+            break
+    latency = histogram.data
+
+    # Throughput, all messages in flight.
+    histogram.reset()
+    state["received"] = 0
+    state["expect"] = count
+    state["done"].clear()
+    start = time.perf_counter()
+    for i in range(count):
+        await transport.publish(exchange, routing_key, STAMP.pack(time.perf_counter_ns()) + padding)
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+    try:
+        await asyncio.wait_for(state["done"].wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    await transport.close()
+    await asyncio.sleep(0.1)
+
+    result = {
+        "transport": transport.name,
+        "count": count,
+        "size": size,
+        "latency_us": latency,
+        "throughput": round(state["received"] / elapsed, 1),
+        "throughput_latency_us": {"p50": histogram.percentile(50), "p99": histogram.percentile(99)},
+        "lost": count - state["received"]
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event transport benchmark.")
+    parser.add_argument("transport", choices=["amqp", "unix", "redis"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--username", default="guest")
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--path", default="/tmp/quant_bus_benchmark")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--size", type=int, default=512)
+    args = parser.parse_args()
+    sys.argv = sys.argv[:1]  # `quant.utils.sqlite3db` loads sys.argv[1] as config file when first used.
+
+    from quant.transport import create_transport
+
+    if args.transport == "amqp":
+        params = {"host": args.host, "port": args.port or 5672, "username": args.username,
+                  "password": args.password or "guest"}
+    elif args.transport == "redis":
+        params = {"host": args.host, "port": args.port or 6379, "password": args.password}
+    else:
+        params = {"path": args.path}
+    transport = create_transport(args.transport, **params)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        print(loop.run_until_complete(benchmark(transport, args.count, args.size)))
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
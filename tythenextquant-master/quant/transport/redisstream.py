@@ -0,0 +1,153 @@
+# -*- coding:utf-8 -*-
+
+"""
+Redis Streams event transport.
+
+Every exchange is a stream `{prefix}:{exchange}`, a message is an entry with fields `k` (routing key), `a` (app id)
+and `b` (body). Subscribers read the streams of their bindings with a blocking XREAD and filter routing keys with the
+same topic rules as RabbitMQ. Streams are capped by `maxlen`, so a restarted subscriber can't replay old events.
+
+NOTE: Requires `redis>=4.2` (redis.asyncio), configured by `REDIS`, e.g. {"host": "127.0.0.1", "port": 6379}.
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import time
+import asyncio
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+from quant.utils import logger
+from quant.utils import tools
+from quant.tasks import SingleTask
+from quant.utils.router import TopicRouter
+from quant.transport.base import Transport, Envelope, Properties
+
+
+__all__ = ("RedisStreamTransport", )
+
+
+class RedisStreamTransport(Transport):
+    """ Redis Streams transport.
+
+    Attributes:
+        host: Redis host, default is `localhost`.
+        port: Redis port, default is 6379.
+        password: Redis password, default is None.
+        db: Redis database, default is 0.
+        prefix: Stream name prefix, default is `quant`.
+        maxlen: Approximate max entries kept in one stream, default is 10000.
+        block_ms: Max blocking time(milliseconds) of one XREAD, default is 1000ms.
+        count: Max entries returned by one XREAD, default is 500.
+    """
+
+    name = "redis"
+
+    def __init__(self, host="localhost", port=6379, password=None, db=0, prefix="quant", maxlen=10000,
+                 block_ms=1000, count=500, **kwargs):
+        """Initialize."""
+        super(RedisStreamTransport, self).__init__()
+        self._host = host
+        self._port = port
+        self._password = password
+        self._db = db
+        self._prefix = prefix
+        self._maxlen = maxlen
+        self._block_ms = block_ms
+        self._count = count
+        self._redis = None
+        self._streams = {}  # Streams to read and the last entry id, e.g. {"quant:Orderbook": "1539486224000-0"}
+        self._queues = {}  # e.g. {queue: callback}
+        self._router = TopicRouter()  # (exchange, routing_key) => queues.
+        self._reading = False
+
+    def _stream(self, exchange):
+        return "{}:{}".format(self._prefix, exchange)
+
+    async def connect(self, exchanges=None):
+        if self._connected:
+            return True
+        if aioredis is None:
+            logger.error("redis package not installed, `pip install redis>=4.2`", caller=self)
+            return False
+        logger.info("host:", self._host, "port:", self._port, caller=self)
+        try:
+            self._redis = aioredis.Redis(host=self._host, port=self._port, password=self._password, db=self._db)
+            await self._redis.ping()
+        except Exception as e:
+            logger.error("connection error:", e, caller=self)
+            self._redis = None
+            return False
+        self._connected = True
+        logger.info("Redis initialize success!", caller=self)
+        return True
+
+    async def close(self):
+        self._connected = False
+        self._reading = False
+        client = self._redis
+        self._redis = None
+        if client:
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+    async def publish(self, exchange, routing_key, payload, app_id=None):
+        fields = {"k": routing_key, "a": app_id or "", "b": payload}
+        await self._redis.xadd(self._stream(exchange), fields, maxlen=self._maxlen, approximate=True)
+
+    async def declare_queue(self, queue=None, prefetch_count=1):
+        if not queue:
+            queue = "exclusive.{}".format(tools.get_uuid1())
+        self._queues.setdefault(queue, None)
+        return queue
+
+    async def bind(self, queue, exchange, routing_key):
+        self._router.add(exchange, routing_key, queue)
+        stream = self._stream(exchange)
+        if stream not in self._streams:
+            # Start from now, so the events published before the next XREAD are not lost.
+            self._streams[stream] = "{}-0".format(int(time.time() * 1000))
+        logger.info("bind:", queue, exchange, routing_key, caller=self)
+
+    async def consume(self, queue, callback, no_ack=False):
+        self._queues[queue] = callback
+        if not self._reading:
+            self._reading = True
+            SingleTask.run(self._read)
+
+    async def _read(self):
+        """Read subscribed streams until closed."""
+        prefix_len = len(self._prefix) + 1
+        while self._reading and self._redis:
+            try:
+                result = await self._redis.xread(dict(self._streams), count=self._count, block=self._block_ms)
+            except Exception as e:
+                logger.error("xread error:", e, caller=self)
+                self._connected = False
+                self._reading = False
+                return
+            for stream, entries in result or []:
+                stream = stream.decode() if isinstance(stream, bytes) else stream
+                exchange = stream[prefix_len:]
+                for entry_id, fields in entries:
+                    self._streams[stream] = entry_id
+                    routing_key = fields[b"k"].decode()
+                    app_id = fields[b"a"].decode() or None
+                    envelope = Envelope(exchange, routing_key)
+                    properties = Properties(app_id)
+                    for queue in self._router.match(exchange, routing_key):
+                        callback = self._queues.get(queue)
+                        if not callback:
+                            continue
+                        try:
+                            await callback(None, fields[b"b"], envelope, properties)
+                        except Exception as e:
+                            logger.error("callback error:", e, caller=self)
+            await asyncio.sleep(0)
@@ -0,0 +1,234 @@
+# -*- coding:utf-8 -*-
+
+"""
+Brokerless event transport over Unix domain sockets, for processes on one host.
+
+Every process listens on its own socket file in a shared directory, and connects to every socket file found there
+(including its own, so a process receives its own events like a broker does). A subscriber sends its bindings to
+every publisher, and the publisher only writes matched messages to that subscriber, like ZeroMQ PUB/SUB with
+publisher side filtering. There is no queue: every subscriber gets its own copy, and a subscriber that can't keep up
+loses messages instead of blocking the publisher.
+
+Frame:
+    header: op(1 byte), length of exchange / routing_key / app_id (2 bytes each), length of body (4 bytes)
+    exchange + routing_key + app_id + body
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import os
+import glob
+import struct
+import asyncio
+
+from quant.utils import tools
+from quant.utils import logger
+from quant.tasks import SingleTask
+from quant.utils.router import TopicRouter
+from quant.transport.base import Transport, Envelope, Properties, topic_match
+
+
+__all__ = ("UnixSocketTransport", )
+
+
+OP_SUBSCRIBE = 1
+OP_MESSAGE = 2
+
+HEADER = struct.Struct(">BHHHI")
+
+
+def pack_frame(op, exchange, routing_key, app_id=None, body=b""):
+    e = exchange.encode()
+    r = routing_key.encode()
+    a = (app_id or "").encode()
+    return HEADER.pack(op, len(e), len(r), len(a), len(body)) + e + r + a + body
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(HEADER.size)
+    op, le, lr, la, lb = HEADER.unpack(header)
+    data = await reader.readexactly(le + lr + la + lb)
+    exchange = data[:le].decode()
+    routing_key = data[le:le + lr].decode()
+    app_id = data[le + lr:le + lr + la].decode() or None
+    body = data[le + lr + la:]
+    return op, exchange, routing_key, app_id, body
+
+
+class UnixSocketTransport(Transport):
+    """ Unix domain socket transport.
+
+    Attributes:
+        path: Directory of socket files, default is `/tmp/quant_bus`.
+        scan_interval: Interval(seconds) to find new publishers in `path`, default is 1s.
+        high_water: Max bytes buffered for one subscriber, messages are dropped for a slow subscriber over it,
+            default is 16MB.
+    """
+
+    name = "unix"
+
+    def __init__(self, path="/tmp/quant_bus", scan_interval=1, high_water=16 * 1024 * 1024, **kwargs):
+        """Initialize."""
+        super(UnixSocketTransport, self).__init__()
+        self._path = path
+        self._scan_interval = scan_interval
+        self._high_water = high_water
+        self._node_id = tools.get_uuid1()
+        self._sock_file = os.path.join(path, "{}.sock".format(self._node_id))
+        self._server = None
+        self._scan_handle = None
+        self._peers = {}  # Subscribers connected to us, e.g. {writer: {(exchange, pattern), ...}}
+        self._peer_routes = {}  # Matched subscribers cache, e.g. {(exchange, routing_key): [writer, ...]}
+        self._publishers = {}  # Publishers we connected to, e.g. {sock_file: writer}
+        self._receivers = {}  # Receive tasks of publishers, e.g. {sock_file: task}
+        self._queues = {}  # Our queues, e.g. {queue: callback}
+        self._router = TopicRouter()  # (exchange, routing_key) => our queues.
+        self._patterns = []  # Our bindings sent to publishers, e.g. [(exchange, pattern), ...]
+        self._dropped = 0
+
+    @property
+    def dropped(self):
+        """How many messages dropped for slow subscribers."""
+        return self._dropped
+
+    def is_alive(self):
+        return self._connected and self._server is not None and os.path.exists(self._sock_file)
+
+    async def connect(self, exchanges=None):
+        if self._connected:
+            return True
+        try:
+            os.makedirs(self._path, exist_ok=True)
+            self._server = await asyncio.start_unix_server(self._on_subscriber, path=self._sock_file)
+        except Exception as e:
+            logger.error("listen error:", self._sock_file, e, caller=self)
+            return False
+        self._connected = True
+        logger.info("listen on:", self._sock_file, caller=self)
+        await self._scan()
+        return True
+
+    async def close(self):
+        self._connected = False
+        if self._scan_handle:
+            self._scan_handle.cancel()
+            self._scan_handle = None
+        if self._server:
+            self._server.close()
+            self._server = None
+        for writer in list(self._peers.keys()) + list(self._publishers.values()):
+            writer.close()
+        for task in self._receivers.values():
+            task.cancel()
+        self._receivers = {}
+        self._peers = {}
+        self._peer_routes = {}
+        self._publishers = {}
+        try:
+            os.unlink(self._sock_file)
+        except OSError:
+            pass
+
+    async def publish(self, exchange, routing_key, payload, app_id=None):
+        key = (exchange, routing_key)
+        writers = self._peer_routes.get(key)
+        if writers is None:
+            writers = [w for w, bindings in self._peers.items()
+                       if any(e == exchange and topic_match(p, routing_key) for e, p in bindings)]
+            self._peer_routes[key] = writers
+        if not writers:
+            return
+        frame = pack_frame(OP_MESSAGE, exchange, routing_key, app_id, payload)
+        for writer in writers:
+            if writer.transport.get_write_buffer_size() > self._high_water:
+                self._dropped += 1
+                continue
+            writer.write(frame)
+
+    async def declare_queue(self, queue=None, prefetch_count=1):
+        if not queue:
+            queue = "exclusive.{}".format(tools.get_uuid1())
+        self._queues.setdefault(queue, None)
+        return queue
+
+    async def bind(self, queue, exchange, routing_key):
+        self._router.add(exchange, routing_key, queue)
+        if (exchange, routing_key) in self._patterns:
+            return
+        self._patterns.append((exchange, routing_key))
+        frame = pack_frame(OP_SUBSCRIBE, exchange, routing_key)
+        for writer in self._publishers.values():
+            writer.write(frame)
+        logger.info("bind:", queue, exchange, routing_key, caller=self)
+
+    async def consume(self, queue, callback, no_ack=False):
+        self._queues[queue] = callback
+
+    async def _on_subscriber(self, reader, writer):
+        """A subscriber connected, read its bindings until disconnected."""
+        self._peers[writer] = set()
+        try:
+            while True:
+                op, exchange, routing_key, _, _ = await read_frame(reader)
+                if op == OP_SUBSCRIBE:
+                    self._peers[writer].add((exchange, routing_key))
+                    self._peer_routes = {}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._peers.pop(writer, None)
+            self._peer_routes = {}
+            writer.close()
+
+    async def _scan(self):
+        """Connect to new publishers in `path`."""
+        self._scan_handle = None
+        if not self._connected:
+            return
+        for sock_file in glob.glob(os.path.join(self._path, "*.sock")):
+            if sock_file in self._publishers:
+                continue
+            try:
+                reader, writer = await asyncio.open_unix_connection(sock_file)
+            except ConnectionRefusedError:
+                logger.warn("remove dead socket file:", sock_file, caller=self)
+                try:
+                    os.unlink(sock_file)
+                except OSError:
+                    pass
+                continue
+            except Exception as e:
+                logger.warn("connect error:", sock_file, e, caller=self)
+                continue
+            self._publishers[sock_file] = writer
+            for exchange, pattern in self._patterns:
+                writer.write(pack_frame(OP_SUBSCRIBE, exchange, pattern))
+            self._receivers[sock_file] = SingleTask.run(self._receive, sock_file, reader, writer)
+        self._scan_handle = asyncio.get_event_loop().call_later(self._scan_interval, SingleTask.run, self._scan)
+
+    async def _receive(self, sock_file, reader, writer):
+        """Receive messages from a publisher."""
+        try:
+            while True:
+                op, exchange, routing_key, app_id, body = await read_frame(reader)
+                if op != OP_MESSAGE:
+                    continue
+                envelope = Envelope(exchange, routing_key)
+                properties = Properties(app_id)
+                for queue in self._router.match(exchange, routing_key):
+                    callback = self._queues.get(queue)
+                    if not callback:
+                        continue
+                    try:
+                        await callback(None, body, envelope, properties)
+                    except Exception as e:
+                        logger.error("callback error:", e, caller=self)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.info("publisher disconnected:", sock_file, caller=self)
+        finally:
+            if self._publishers.get(sock_file) is writer:
+                self._publishers.pop(sock_file)
+                self._receivers.pop(sock_file, None)
+            writer.close()
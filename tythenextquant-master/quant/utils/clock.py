@@ -0,0 +1,304 @@
+# -*- coding:utf-8 -*-
+
+"""
+Exchange clock service.
+Estimate the offset between local clock and exchange server clock from repeated server time probes, the probe with
+the smallest round trip time (RTT) is the most accurate one, so keep the min-RTT sample of a sliding window. The same
+offset is used to correct the latency of every market / user-stream message, and the `timestamp` of signed requests.
+
+Syncing starts on the first use of the clock, `now_ms` / `stamp`, or `start`, so creating REST API clients has no
+side effect. The local time of `stamp` is the receive time of the frame being processed, set by the Websocket receive
+loops with `set_receive_time`, so a busy event loop doesn't hide latency.
+
+Usage:
+    clock = get_clock(BINANCE)
+    clock.set_server_time_func(fetch_server_time)  # async def fetch_server_time(): return server time(ms) or None
+    ...
+    clock.now_ms()  # Exchange server time(ms) estimated by local clock.
+    data.update(clock.stamp("kline", data["E"]))  # {"ExchangeTime": ..., "LocalTime": ..., "Latency": ...}
+    clock.histogram("kline").percentile(99)
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import time
+import bisect
+import contextvars
+import collections
+
+from quant.utils import logger
+from quant.tasks import SingleTask, LoopRunTask
+
+
+__all__ = ("ExchangeClock", "LatencyHistogram", "get_clock", "set_receive_time", )
+
+
+# Receive time(milliseconds) of the frame being processed, inherited by the tasks created to process it.
+_receive_time = contextvars.ContextVar("receive_time", default=None)
+
+
+def set_receive_time(ms=None):
+    """ Set the receive time of the frame being processed, called by Websocket receive loops before dispatching it,
+    tasks created after this call see it.
+
+    Args:
+        ms: Receive time(milliseconds), default is now.
+    """
+    _receive_time.set(int(time.time() * 1000) if ms is None else ms)
+
+
+class LatencyHistogram:
+    """ Latency histogram with fixed log-spaced buckets, record is O(log n) and no sample is kept.
+
+    Attributes:
+        bounds: Upper bounds(milliseconds) of buckets, the last bucket is unbounded.
+    """
+
+    BOUNDS = (1, 2, 3, 5, 7, 10, 15, 20, 30, 50, 70, 100, 150, 200, 300, 500, 700, 1000, 2000, 5000, 10000)
+
+    def __init__(self, bounds=BOUNDS):
+        """Initialize."""
+        self.bounds = tuple(bounds)
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, ms):
+        """ Record a latency sample.
+
+        Args:
+            ms: Latency(milliseconds), negative value means the clock offset is not accurate enough.
+        """
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if self.min is None or ms < self.min:
+            self.min = ms
+        if self.max is None or ms > self.max:
+            self.max = ms
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p):
+        """ Get the upper bound of the bucket which the p-th percentile falls in.
+
+        Args:
+            p: Percentile, 0 ~ 100, e.g. 50/99.
+
+        Returns:
+            ms: Latency(milliseconds), None if no sample, the max sample if it falls in the last bucket.
+        """
+        if not self.count:
+            return None
+        rank = self.count * p / 100
+        n = 0
+        for i, c in enumerate(self.counts):
+            n += c
+            if n >= rank and c:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    @property
+    def data(self):
+        d = {
+            "count": self.count,
+            "mean": round(self.mean, 3) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": {str(b): c for b, c in zip(self.bounds + ("inf", ), self.counts) if c}
+        }
+        return d
+
+    def __str__(self):
+        return str(self.data)
+
+    def __repr__(self):
+        return str(self)
+
+
+class ExchangeClock:
+    """ Clock of an exchange.
+
+    Attributes:
+        platform: Exchange platform name.
+        max_rtt_ms: Probes with RTT larger than this(milliseconds) are dropped, default is 1000ms.
+        samples: How many probes every sync, default is 5.
+        window: How many accepted probes are kept to choose the min-RTT one, default is 20.
+        interval: Sync interval(seconds), default is 60s.
+
+    NOTE:
+        offset = server_time - (t0 + t1) / 2, t0 and t1 are the local time before sending and after receiving a probe,
+        so the error of a probe is at most RTT / 2.
+    """
+
+    def __init__(self, platform, max_rtt_ms=1000, samples=5, window=20, interval=60):
+        """Initialize."""
+        self.platform = platform
+        self.max_rtt_ms = max_rtt_ms
+        self.samples = samples
+        self.interval = interval
+        self._server_time_func = None
+        self._started = False
+        self._probes = collections.deque(maxlen=window)  # e.g. [(rtt, offset), ... ]
+        self._offset = 0
+        self._rtt = None
+        self._synced_at = None
+        self._histograms = {}  # e.g. {"channel": LatencyHistogram, ... }
+
+    @property
+    def offset_ms(self):
+        """Exchange server time - local time, milliseconds."""
+        return self._offset
+
+    @property
+    def rtt_ms(self):
+        """RTT of the probe the offset taken from."""
+        return self._rtt
+
+    @property
+    def synced(self):
+        return self._synced_at is not None
+
+    @property
+    def histograms(self):
+        return self._histograms
+
+    def set_server_time_func(self, func):
+        """ Set the server time probe, only the first one takes effect. Syncing starts on the first use of the clock.
+
+        Args:
+            func: Asynchronous function returns exchange server time(milliseconds), or None if failed, e.g.
+                async def fetch_server_time(): return 1539486224000
+        """
+        if self._server_time_func:
+            return
+        self._server_time_func = func
+
+    def start(self):
+        """Start syncing every `interval` seconds, if a server time probe is set and not started yet."""
+        if self._started or not self._server_time_func:
+            return
+        self._started = True
+        SingleTask.run(self.sync)
+        LoopRunTask.register(self.sync, self.interval)
+
+    async def probe(self):
+        """ Probe server time once.
+
+        Returns:
+            (rtt, offset): Milliseconds, None if failed or RTT too large.
+        """
+        t0 = time.time() * 1000
+        server_time = await self._server_time_func()
+        t1 = time.time() * 1000
+        if server_time is None:
+            return None
+        rtt = t1 - t0
+        if rtt > self.max_rtt_ms:
+            return None
+        return rtt, float(server_time) - (t0 + t1) / 2
+
+    async def sync(self, *args, **kwargs):
+        """Probe server time several times and update offset with the min-RTT probe of the window."""
+        if not self._server_time_func:
+            return
+        accepted = 0
+        for _ in range(self.samples):
+            try:
+                result = await self.probe()
+            except Exception as e:
+                logger.warn("probe server time error:", self.platform, e, caller=self)
+                continue
+            if result:
+                self._probes.append(result)
+                accepted += 1
+        if not self._probes:
+            logger.warn("no valid server time probe:", self.platform, caller=self)
+            return
+        rtt, offset = min(self._probes)
+        self._rtt = round(rtt, 3)
+        self._offset = round(offset, 3)
+        self._synced_at = time.time()
+        logger.debug("platform:", self.platform, "offset(ms):", self._offset, "rtt(ms):", self._rtt,
+                     "accepted:", accepted, caller=self)
+
+    def now_ms(self):
+        """Exchange server time(milliseconds) estimated by local clock, used as `timestamp` of signed requests."""
+        if not self._started:
+            self.start()
+        return int(time.time() * 1000 + self._offset)
+
+    def histogram(self, channel):
+        h = self._histograms.get(channel)
+        if h is None:
+            h = self._histograms[channel] = LatencyHistogram()
+        return h
+
+    def stamp(self, channel, exchange_time=None, local_time=None):
+        """ Timestamps of a received message, and record its latency into the channel histogram.
+
+        Args:
+            channel: Channel name, e.g. kline/trade/orderbook/executionReport.
+            exchange_time: Exchange event time(milliseconds) in the message, None if the message has no timestamp.
+            local_time: Local receive time(milliseconds), default is the one set by `set_receive_time`, or now.
+
+        Returns:
+            stamp: {"ExchangeTime": exchange time, "LocalTime": local receive time, "Latency": corrected latency(ms)},
+                Latency is None if no exchange time.
+        """
+        if not self._started:
+            self.start()
+        if local_time is None:
+            local_time = _receive_time.get() or int(time.time() * 1000)
+        latency = None
+        if exchange_time:
+            latency = round(local_time + self._offset - int(exchange_time), 3)
+            self.histogram(channel).record(latency)
+        return {"ExchangeTime": exchange_time, "LocalTime": local_time, "Latency": latency}
+
+    @property
+    def data(self):
+        d = {
+            "platform": self.platform,
+            "offset_ms": self._offset,
+            "rtt_ms": self._rtt,
+            "synced_at": self._synced_at,
+            "latency": {channel: h.data for channel, h in self._histograms.items()}
+        }
+        return d
+
+    def __str__(self):
+        return str(self.data)
+
+    def __repr__(self):
+        return str(self)
+
+
+_CLOCKS = {}  # e.g. {platform: ExchangeClock, ... }
+
+
+def get_clock(platform):
+    """ Get the clock of an exchange, all market / trade / REST API objects of one exchange share one clock.
+
+    Args:
+        platform: Exchange platform name.
+
+    Returns:
+        clock: ExchangeClock object.
+    """
+    clock = _CLOCKS.get(platform)
+    if clock is None:
+        clock = _CLOCKS[platform] = ExchangeClock(platform)
+    return clock
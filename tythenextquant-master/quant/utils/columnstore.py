@@ -0,0 +1,314 @@
+# -*- coding:utf-8 -*-
+
+"""
+Append-only columnar store of time series, e.g. klines, in local files.
+Rows are sorted by the first column, the time column. Every column of a segment is a file of 8-byte little endian
+values, int64 or float64, named `{segment:06d}.{column}`, a new segment is started every `segment_rows` rows.
+Files are memory-mapped to read, a range in one segment is read without copy, as NumPy arrays if installed, otherwise
+as `memoryview`.
+
+Time lookup is O(log n): the first time of every segment is kept in memory as a sparse index to find the segment, then
+the memory-mapped time column of the segment is binary searched.
+
+A row with the same time as the last row replaces it, e.g. updates of the current kline, a row older than the last
+row is rejected, so rows stay sorted. After a crash, columns are truncated to the shortest one on open.
+
+Usage:
+    store = ColumnStore("data/kline/binance/BTCUSDT/1m")
+    store.append([(t, o, h, l, c, v), ...])
+    columns = store.read(start, end)  # {"t": array([...]), "o": array([...]), ...}
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import os
+import mmap
+import array
+import bisect
+
+from quant.utils import logger
+
+
+__all__ = ("ColumnStore", )
+
+
+COLUMNS = ("t", "o", "h", "l", "c", "v")
+INT_COLUMNS = ("t", )
+SEGMENT_ROWS = 1 << 20  # About 2 years of 1m klines, 8MB per column.
+ITEM_SIZE = 8
+
+
+class _Segment:
+    """Column files of a segment and their memory maps."""
+
+    def __init__(self, path, index, columns):
+        self.index = index
+        self.rows = 0
+        self.first = None  # Time of the first row.
+        self._fds = {}
+        self._maps = {}  # column -> (mmap, rows mapped)
+        for c in columns:
+            filename = os.path.join(path, "{:06d}.{}".format(index, c))
+            self._fds[c] = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+        sizes = [os.fstat(fd).st_size for fd in self._fds.values()]
+        self.rows = min(sizes) // ITEM_SIZE
+        for fd, size in zip(self._fds.values(), sizes):
+            if size != self.rows * ITEM_SIZE:
+                os.ftruncate(fd, self.rows * ITEM_SIZE)
+
+    def write(self, column, offset, data):
+        os.pwrite(self._fds[column], data, offset * ITEM_SIZE)
+
+    def buffer(self, column):
+        """Memory map of a column with all rows, remapped if rows appended."""
+        m = self._maps.get(column)
+        if not m or m[1] < self.rows:
+            mm = mmap.mmap(self._fds[column], self.rows * ITEM_SIZE, access=mmap.ACCESS_READ)
+            m = (mm, self.rows)
+            self._maps[column] = m  # The old map is closed when no array refers to it.
+        return m[0]
+
+    def sync(self):
+        for fd in self._fds.values():
+            os.fsync(fd)
+
+    def close(self):
+        self._maps.clear()
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+
+class ColumnStore:
+    """ Append-only columnar store in a directory.
+
+    Attributes:
+        path: Directory of column files, created if not exist.
+        columns: Column names, the first one is the time column, default is kline columns ("t", "o", "h", "l", "c",
+            "v").
+        int_columns: Columns of int64 type, the others are float64, default is ("t", ).
+        segment_rows: Rows per segment, default is `SEGMENT_ROWS`.
+    """
+
+    def __init__(self, path, columns=COLUMNS, int_columns=INT_COLUMNS, segment_rows=SEGMENT_ROWS):
+        """Initialize."""
+        self.path = path
+        self.columns = tuple(columns)
+        self.time_column = self.columns[0]
+        self.segment_rows = segment_rows
+        self._codes = {c: "q" if c in int_columns else "d" for c in self.columns}
+        self._segments = []
+        self._firsts = []  # Sparse index, the first time of every segment.
+        self._starts = []  # Global row number of the first row of every segment.
+        self._last = None  # Time of the last row.
+        os.makedirs(path, exist_ok=True)
+        indexes = sorted({int(f.split(".")[0]) for f in os.listdir(path) if f.split(".")[0].isdigit()})
+        for index in indexes:
+            segment = _Segment(path, index, self.columns)
+            if not segment.rows:
+                segment.close()
+                continue
+            self._add_segment(segment)
+
+    @property
+    def rows(self):
+        if not self._segments:
+            return 0
+        return self._starts[-1] + self._segments[-1].rows
+
+    def _add_segment(self, segment):
+        if segment.rows:
+            times = self._view(segment, self.time_column)
+            segment.first = times[0]
+            self._last = times[-1]
+        self._starts.append(self.rows)
+        self._segments.append(segment)
+        self._firsts.append(segment.first)
+
+    def _view(self, segment, column, start=0, end=None):
+        """Zero-copy memoryview of rows [start, end) of a column in a segment."""
+        end = segment.rows if end is None else end
+        if end <= start:
+            return memoryview(b"").cast(self._codes[column])
+        return memoryview(segment.buffer(column))[start * ITEM_SIZE: end * ITEM_SIZE].cast(self._codes[column])
+
+    def append(self, rows):
+        """ Append rows in time order.
+
+        Args:
+            rows: Rows, every row is a tuple / list of values in `columns` order, None is 0 for int64 and NaN for
+                float64.
+
+        Returns:
+            (appended, replaced, rejected): Rows appended, replaced the last row, rejected because older than the
+                last row.
+        """
+        replaced = rejected = 0
+        pending = []
+        for row in rows:
+            t = int(row[0])
+            if self._last is not None and t <= self._last:
+                if t < self._last:
+                    rejected += 1
+                    continue
+                replaced += 1
+                if pending:
+                    pending[-1] = row
+                else:
+                    self._write([row], replace=True)
+                continue
+            pending.append(row)
+            self._last = t
+        appended = len(pending)
+        while pending:
+            segment = self._segments[-1] if self._segments else None
+            if not segment or segment.rows >= self.segment_rows:
+                index = segment.index + 1 if segment else 0
+                segment = _Segment(self.path, index, self.columns)
+                self._add_segment(segment)
+            n = min(len(pending), self.segment_rows - segment.rows)
+            self._write(pending[:n])
+            pending = pending[n:]
+        if rejected:
+            logger.warn("rows older than the last row rejected:", rejected, "path:", self.path, caller=self)
+        return appended, replaced, rejected
+
+    def _write(self, rows, replace=False):
+        segment = self._segments[-1]
+        offset = segment.rows - 1 if replace else segment.rows
+        # The time column is written last, rows are counted by the shortest column if crashed while writing.
+        for i in reversed(range(len(self.columns))):
+            c = self.columns[i]
+            if self._codes[c] == "q":
+                values = array.array("q", (int(r[i] or 0) for r in rows))
+            else:
+                values = array.array("d", (float("nan") if r[i] is None else float(r[i]) for r in rows))
+            segment.write(c, offset, values.tobytes())
+        if not replace:
+            if segment.first is None:
+                segment.first = int(rows[0][0])
+                self._firsts[-1] = segment.first
+            segment.rows += len(rows)
+
+    def search(self, ts, right=False):
+        """ Find the row of a time.
+
+        Args:
+            ts: Time.
+            right: If False, the first row whose time >= `ts`, otherwise the first row whose time > `ts`.
+
+        Returns:
+            row: Global row number, `rows` if not found.
+        """
+        k = bisect.bisect_right(self._firsts, ts) - 1
+        if k < 0:
+            return 0
+        segment = self._segments[k]
+        times = self._view(segment, self.time_column)
+        i = bisect.bisect_right(times, ts) if right else bisect.bisect_left(times, ts)
+        return self._starts[k] + i
+
+    def read_rows(self, start, end, columns=None):
+        """ Read rows [start, end), without copy if all rows in one segment.
+
+        Args:
+            start: Global row number.
+            end: Global row number.
+            columns: Columns to read, default is all.
+
+        Returns:
+            result: Column values, e.g. {"t": array([...]), ...}, NumPy arrays if installed, otherwise memoryview.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        columns = columns or self.columns
+        start = max(start, 0)
+        end = min(end, self.rows)
+        parts = {c: [] for c in columns}
+        k = max(bisect.bisect_right(self._starts, start) - 1, 0)
+        while k < len(self._segments) and self._starts[k] < end:
+            s = max(start - self._starts[k], 0)
+            e = min(end - self._starts[k], self._segments[k].rows)
+            for c in columns:
+                parts[c].append(self._view(self._segments[k], c, s, e))
+            k += 1
+        result = {}
+        for c in columns:
+            views = parts[c]
+            if np:
+                dtype = np.int64 if self._codes[c] == "q" else np.float64
+                arrays = [np.frombuffer(v, dtype=dtype) for v in views]
+                if not arrays:
+                    result[c] = np.empty(0, dtype=dtype)
+                else:
+                    result[c] = arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+            elif len(views) == 1:
+                result[c] = views[0]
+            else:
+                result[c] = memoryview(b"".join(v.tobytes() for v in views)).cast(self._codes[c])
+        return result
+
+    def read(self, start=None, end=None, columns=None):
+        """ Read rows between two times.
+
+        Args:
+            start: Start time, included, default is the first row.
+            end: End time, included, default is the last row.
+            columns: Columns to read, default is all.
+
+        Returns:
+            result: Column values, e.g. {"t": array([...]), ...}, NumPy arrays if installed, otherwise memoryview.
+        """
+        i = 0 if start is None else self.search(start)
+        j = self.rows if end is None else self.search(end, right=True)
+        return self.read_rows(i, j, columns)
+
+    def iter_rows(self, start=None, end=None, batch_size=10000):
+        """ Iterate rows between two times, read in batches.
+
+        Args:
+            start: Start time, included, default is the first row.
+            end: End time, included, default is the last row.
+            batch_size: Rows per batch, default is 10000.
+
+        Yield:
+            row: Dict of a row, e.g. {"t": 1570000000000, "o": 1.0, ...}
+        """
+        i = 0 if start is None else self.search(start)
+        j = self.rows if end is None else self.search(end, right=True)
+        while i < j:
+            n = min(batch_size, j - i)
+            yield from self._iter_rows(i, i + n)
+            i += n
+
+    def row(self, i):
+        """Get a row by global row number, e.g. {"t": 1570000000000, "o": 1.0, ...}, None if out of range."""
+        if not 0 <= i < self.rows:
+            return None
+        return next(self._iter_rows(i, i + 1))
+
+    def last(self):
+        """Get the last row, None if empty."""
+        return self.row(self.rows - 1)
+
+    def _iter_rows(self, start, end):
+        data = self.read_rows(start, end)
+        values = [data[c].tolist() for c in self.columns]
+        for row in zip(*values):
+            yield dict(zip(self.columns, row))
+
+    def sync(self):
+        """Flush written data to disk."""
+        for segment in self._segments:
+            segment.sync()
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+        self._firsts = []
+        self._starts = []
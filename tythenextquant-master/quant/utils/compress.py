@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+
+"""
+Decompress exchange-level compressed Websocket messages.
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import json
+import zlib
+import asyncio
+
+
+__all__ = ("Inflater", "RAW_DEFLATE", "GZIP", "ZLIB", "PARSE_IN_THREAD_SIZE")
+
+
+RAW_DEFLATE = -zlib.MAX_WBITS  # OKx / Bitget, raw deflate stream without header.
+GZIP = 16 + zlib.MAX_WBITS  # Huobi, gzip header and trailer.
+ZLIB = zlib.MAX_WBITS  # zlib header and trailer.
+
+# Frames larger than this size(bytes) can be decompressed and parsed in a worker thread, e.g. full orderbook snapshots.
+PARSE_IN_THREAD_SIZE = 64 * 1024
+
+
+class Inflater:
+    """ Reusable decompress context for exchange-level compressed messages.
+
+    Every message of OKx/Bitget/Huobi is compressed independently, so a one-shot `zlib.decompress` with the right
+    `wbits` is enough and much cheaper than creating a new `decompressobj` or `GzipFile` per frame.
+
+    Attributes:
+        wbits: Compress format, `RAW_DEFLATE` / `GZIP` / `ZLIB`, default is `RAW_DEFLATE`.
+        thread_size: Frames larger than this size(bytes) will be decompressed and parsed in a worker thread by
+            `loads_async`, 0 means never, default is `PARSE_IN_THREAD_SIZE`.
+    """
+
+    def __init__(self, wbits=RAW_DEFLATE, thread_size=PARSE_IN_THREAD_SIZE):
+        """Initialize."""
+        self._wbits = wbits
+        self._thread_size = thread_size
+        self._last = None  # Future done when the last call of `loads_async` returned.
+
+    def decompress(self, raw):
+        """ Decompress a frame.
+
+        Args:
+            raw: Compressed binary message.
+
+        Returns:
+            data: Decompressed bytes.
+        """
+        return zlib.decompress(raw, self._wbits)
+
+    def decode(self, raw):
+        """Decompress a frame and decode it to string."""
+        return self.decompress(raw).decode()
+
+    def loads(self, raw):
+        """ Decompress a frame and parse it as json, if it's not json format, return the decoded string.
+
+        Args:
+            raw: Compressed binary message.
+
+        Returns:
+            msg: Json object or string, e.g. "pong".
+        """
+        text = self.decode(raw)
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+
+    async def loads_async(self, raw):
+        """ Same as `loads`, but large frames are decompressed and parsed in a worker thread, so that big snapshots
+        will not block the event loop. Calls return in call order, i.e. receive order of frames, a small frame
+        waits for a large one received before it, so order / asset / position updates are never reordered.
+        """
+        prev = self._last
+        small = not self._thread_size or len(raw) < self._thread_size
+        if small and (prev is None or prev.done()):
+            return self.loads(raw)
+        loop = asyncio.get_event_loop()
+        returned = self._last = loop.create_future()
+        try:
+            try:
+                msg = self.loads(raw) if small else await loop.run_in_executor(None, self.loads, raw)
+                error = None
+            except Exception as e:
+                msg, error = None, e
+            if prev is not None and not prev.done():
+                await prev
+            if error:
+                raise error
+            return msg
+        finally:
+            returned.set_result(None)
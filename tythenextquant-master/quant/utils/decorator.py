@@ -8,15 +8,131 @@ Date:   2018/08/03
 Email:  xunfeng@test.com
 """
 
+import time
 import asyncio
+import weakref
 import functools
 
 
-# Coroutine lockers. e.g. {"locker_name": locker}
+# Coroutine lockers. e.g. {"locker_name": LockerGroup}
 METHOD_LOCKERS = {}
 
 
-def async_method_locker(name, wait=True):
+class _Locker:
+    """A lock in use and how many coroutines are waiting for it."""
+
+    __slots__ = ("lock", "waiters", )
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiters = 0
+
+
+class LockerGroup:
+    """ Lockers of a name, one locker per key, the locker of a key is created when used and dropped when nobody holds
+    or waits for it, so keys (e.g. symbols / instances) never used again take no memory.
+
+    Attributes:
+        name: Locker name.
+        stripes: If > 0, keys are hashed into so many lockers, keys in one stripe share a locker.
+
+    Metrics:
+        acquired: Times acquired.
+        contended: Times that had to wait.
+        skipped: Times not executed because locked and `wait` is False.
+        wait_ms: Total waiting time(milliseconds).
+        max_wait_ms: Max waiting time(milliseconds).
+        max_waiters: Max coroutines waiting for one locker.
+    """
+
+    def __init__(self, name, stripes=0):
+        """Initialize."""
+        self.name = name
+        self.stripes = stripes
+        self._lockers = {}  # e.g. {key: _Locker}
+        self._instances = weakref.WeakKeyDictionary()  # Instance => {key: _Locker}, for per-instance lockers.
+        self._unreferenceable = {}  # id(instance) => {key: _Locker}, instances not weak referenceable.
+        self.acquired = 0
+        self.contended = 0
+        self.skipped = 0
+        self.wait_ms = 0
+        self.max_wait_ms = 0
+        self.max_waiters = 0
+
+    @property
+    def stats(self):
+        d = {
+            "name": self.name,
+            "lockers": len(self._lockers) + sum(len(v) for v in self._instances.values()) +
+                       sum(len(v) for v in self._unreferenceable.values()),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "skipped": self.skipped,
+            "wait_ms": round(self.wait_ms, 3),
+            "avg_wait_ms": round(self.wait_ms / self.contended, 3) if self.contended else 0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "max_waiters": self.max_waiters
+        }
+        return d
+
+    def _lockers_of(self, instance):
+        if instance is None:
+            return self._lockers
+        try:
+            lockers = self._instances.get(instance)
+            if lockers is None:
+                lockers = self._instances[instance] = {}
+        except TypeError:  # Not weak referenceable or not hashable.
+            return self._unreferenceable.setdefault(id(instance), {})
+        return lockers
+
+    async def run(self, method, args, kwargs, instance=None, key=None, wait=True):
+        """ Run a method with the locker of a key held.
+
+        Args:
+            method: Asynchronous method.
+            args: Positional arguments of method.
+            kwargs: Keyword arguments of method.
+            instance: If not None, lockers are separated per instance.
+            key: Locker key, e.g. symbol.
+            wait: If waiting when locked, otherwise return None immediately.
+        """
+        lockers = self._lockers_of(instance)
+        if self.stripes:
+            key = hash(key) % self.stripes
+        locker = lockers.get(key)
+        if locker is None:
+            locker = lockers[key] = _Locker()
+        lock = locker.lock
+        if lock.locked():
+            if not wait:
+                self.skipped += 1
+                return
+            self.contended += 1
+            locker.waiters += 1
+            if locker.waiters > self.max_waiters:
+                self.max_waiters = locker.waiters
+            start = time.perf_counter()
+            try:
+                await lock.acquire()
+            finally:
+                locker.waiters -= 1
+            wait_ms = (time.perf_counter() - start) * 1000
+            self.wait_ms += wait_ms
+            if wait_ms > self.max_wait_ms:
+                self.max_wait_ms = wait_ms
+        else:
+            await lock.acquire()
+        self.acquired += 1
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            lock.release()
+            if not locker.waiters and not lock.locked() and lockers.get(key) is locker:
+                del lockers[key]
+
+
+def async_method_locker(name, wait=True, per_instance=False, key=None, stripes=0):
     """ In order to share memory between any asynchronous coroutine methods, we should use locker to lock our method,
         so that we can avoid some un-prediction actions.
 
@@ -24,32 +140,48 @@ def async_method_locker(name, wait=True):
         name: Locker name.
         wait: If waiting to be executed when the locker is locked? if True, waiting until to be executed, else return
             immediately (do not execute).
+        per_instance: If True, every instance (the first argument `self`) has its own lockers, otherwise all instances
+            share the lockers of this name.
+        key: Locker key getter, called with the arguments of the method, e.g. `lambda self, symbol, *a: symbol` locks
+            every symbol separately, default is None, one locker.
+        stripes: If > 0, keys are hashed into so many lockers, default is 0, one locker per key.
 
     NOTE:
         This decorator must to be used on `async method`.
+        Methods decorated with the same name share lockers.
     """
     assert isinstance(name, str)
 
     def decorating_function(method):
         global METHOD_LOCKERS
-        locker = METHOD_LOCKERS.get(name)
-        if not locker:
-            locker = asyncio.Lock()
-            METHOD_LOCKERS[name] = locker
+        group = METHOD_LOCKERS.get(name)
+        if not group:
+            group = METHOD_LOCKERS[name] = LockerGroup(name, stripes)
 
         @functools.wraps(method)
         async def wrapper(*args, **kwargs):
-            if not wait and locker.locked():
-                return
-            try:
-                await locker.acquire()
-                return await method(*args, **kwargs)
-            finally:
-                locker.release()
+            instance = args[0] if per_instance and args else None
+            k = key(*args, **kwargs) if key else None
+            return await group.run(method, args, kwargs, instance, k, wait)
         return wrapper
     return decorating_function
 
 
+def get_locker_stats(name=None):
+    """ Get contention metrics of lockers.
+
+    Args:
+        name: Locker name, None means all.
+
+    Returns:
+        stats: Metrics of a locker, or a list of all lockers' metrics sorted by total waiting time.
+    """
+    if name is not None:
+        group = METHOD_LOCKERS.get(name)
+        return group.stats if group else None
+    return sorted([g.stats for g in METHOD_LOCKERS.values()], key=lambda d: d["wait_ms"], reverse=True)
+
+
 # class Test:
 #
 #     @async_method_locker('my_fucker', False)
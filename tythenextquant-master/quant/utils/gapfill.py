@@ -0,0 +1,153 @@
+# -*- coding:utf-8 -*-
+
+"""
+Gap detection and backfill of market streams.
+Track the sequence of every symbol of a stream, e.g. trade ids or kline open times, when a sequence jumps, e.g. trades
+lost while reconnecting, fetch only the missing range from REST API in background, and emit the missing events before
+the live ones, in sequence order. Live events received while backfilling are held and emitted after the backfilled
+ones. Backfilled events are marked by `"Backfill": True`.
+
+Usage:
+    trades = GapFiller(emit=self._emit_trade, fetch=self._fetch_trades, step=1)
+    ...
+    trades.feed(symbol, trade_id, trade_time, trade)  # instead of emitting the trade directly.
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import asyncio
+
+from quant.utils import logger
+from quant.tasks import SingleTask
+
+
+__all__ = ("GapFiller", )
+
+
+class _Stream:
+    """Sequence state of a symbol."""
+
+    __slots__ = ("last", "last_time", "pending")
+
+    def __init__(self):
+        self.last = None  # Last sequence emitted.
+        self.last_time = None  # Time of the last event emitted.
+        self.pending = None  # Live events held while backfilling, e.g. [(seq, time, event, count), ...]
+
+
+class GapFiller:
+    """ Gap detection and backfill of a stream.
+
+    Attributes:
+        emit: Function to emit an event, e.g. `def emit(event): pass`.
+        fetch: Asynchronous function to fetch missing events between two sequences (both excluded), returns events in
+            sequence order, e.g.
+            async def fetch(symbol, last, last_time, seq, seq_time): return [(seq, event), ...]
+        step: Sequence step of adjacent events, e.g. 1 for trade ids, 60000 for open times of 1m klines.
+        repeat: Events with the same sequence as the last one are updates and emitted, e.g. klines, otherwise they are
+            duplicates and dropped, default is False.
+        max_gap: Max missing events to backfill, larger gaps are logged and skipped, default is 10000.
+        timeout: Timeout(seconds) of a backfill, default is 30.
+    """
+
+    def __init__(self, emit, fetch, step=1, repeat=False, max_gap=10000, timeout=30):
+        """Initialize."""
+        self._emit = emit
+        self._fetch = fetch
+        self._step = step
+        self._repeat = repeat
+        self._max_gap = max_gap
+        self._timeout = timeout
+        self._streams = {}  # e.g. {symbol: _Stream, ... }
+        self._gaps = 0
+        self._filled = 0
+        self._lost = 0
+        self._dropped = 0
+
+    @property
+    def stats(self):
+        d = {
+            "gaps": self._gaps,
+            "filled": self._filled,
+            "lost": self._lost,
+            "dropped": self._dropped
+        }
+        return d
+
+    def feed(self, symbol, seq, time, event, count=1):
+        """ Feed a live event, it is emitted now, or after the missing events are backfilled.
+
+        Args:
+            symbol: Symbol name.
+            seq: Sequence of the event, e.g. trade id or kline open time, None if unknown and emitted directly.
+            time: Millisecond timestamp of the event.
+            event: Event to emit.
+            count: Sequences covered by the event and ended with `seq`, e.g. aggregated trades, default is 1.
+        """
+        if seq is None:
+            self._emit(event)
+            return
+        stream = self._streams.get(symbol)
+        if not stream:
+            stream = self._streams[symbol] = _Stream()
+        if stream.pending is not None:
+            stream.pending.append((seq, time, event, count))
+            return
+        self._process(symbol, stream, seq, time, event, count)
+
+    def _process(self, symbol, stream, seq, time, event, count=1):
+        last = stream.last
+        if last is not None:
+            if seq < last or (seq == last and not self._repeat):
+                self._dropped += 1
+                return
+            first = seq - (count - 1) * self._step
+            missing = (first - last) // self._step - 1
+            if missing > 0:
+                self._gaps += 1
+                if missing <= self._max_gap and not self._replaying():
+                    stream.pending = [(seq, time, event, count)]
+                    SingleTask.run(self._backfill, symbol, stream, last, stream.last_time, first, time)
+                    return
+                logger.warn("gap not backfilled, symbol:", symbol, "last:", last, "seq:", seq, "missing:", missing,
+                            caller=self)
+                self._lost += missing
+        stream.last = seq
+        stream.last_time = time
+        self._emit(event)
+
+    async def _backfill(self, symbol, stream, last, last_time, seq, time):
+        """Fetch and emit the missing events after `last` and before `seq`, then the live events held."""
+        rows = None
+        try:
+            rows = await asyncio.wait_for(self._fetch(symbol, last, last_time, seq, time), self._timeout)
+        except Exception as e:
+            logger.error("backfill error:", e, "symbol:", symbol, "last:", last, "seq:", seq, caller=self)
+        filled = 0
+        for s, event in rows or []:
+            if s < stream.last or s >= seq or (s == stream.last and not self._repeat):
+                continue
+            if s > stream.last:
+                filled += 1
+            event["Backfill"] = True
+            stream.last = s
+            self._emit(event)
+        self._filled += filled
+        self._lost += max((seq - last) // self._step - 1 - filled, 0)
+
+        # Missing events not returned are lost, the held events continue the stream.
+        stream.last = max(stream.last, seq - self._step)
+        stream.last_time = time
+        pending, stream.pending = stream.pending, None
+        for i, (s, t, event, count) in enumerate(pending):
+            if stream.pending is not None:
+                stream.pending.extend(pending[i:])
+                break
+            self._process(symbol, stream, s, t, event, count)
+
+    def _replaying(self):
+        """Recorded frames are replayed, the missing events are not in the recording either."""
+        from quant.replay import get_replay_engine
+        return get_replay_engine() is not None
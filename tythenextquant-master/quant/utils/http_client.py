@@ -15,7 +15,6 @@ from urllib.parse import urlparse
 from quant.utils import logger
 from quant.config import config
 
-import requests
 
 class AsyncHttpRequests(object):
     """ Asynchronous HTTP Request Client.
@@ -250,6 +249,7 @@ class SyncHttpRequests(object):
         parsed_url = urlparse(url)
         key = parsed_url.netloc or parsed_url.hostname
         if key not in self._SESSIONS:
+            import requests
             session = requests.Session()
             self._SESSIONS[key] = session
         return self._SESSIONS[key]
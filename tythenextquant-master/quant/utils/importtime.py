@@ -0,0 +1,107 @@
+# -*- coding:utf-8 -*-
+
+"""
+Import time benchmark.
+Every module is imported in a fresh interpreter in an empty directory, with a fake config file in `sys.argv[1]`, and
+checked that the import has no side effects: no sqlite file created, no argv parsed, and no heavy optional dependency
+or exchange adapter loaded. CLI tools and worker processes import these modules at start.
+
+Usage:
+    python -m quant.utils.importtime
+    python -m quant.utils.importtime --repeat 5 quant.trade quant.quant
+
+The exit code is 1 if any import has side effects, so it can be run as a check.
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import os
+import sys
+import json
+import tempfile
+import argparse
+import subprocess
+
+
+__all__ = ("measure", )
+
+
+MODULES = ["quant.utils.logger", "quant.utils.tools", "quant.config", "quant.tasks", "quant.heartbeat", "quant.event",
+           "quant.trade", "quant.market", "quant.quant"]
+
+# Modules must not be loaded by importing the modules above.
+HEAVY = ["requests", "psutil", "aiohttp", "aioamqp", "pymongo", "motor", "redis", "uvloop", "quant.platform.",
+         "quant.utils.sqlite3db"]
+
+CHILD = """
+import sys, time, json
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+heavy = sorted(m for m in sys.modules if any(m == h or (h.endswith(".") and m.startswith(h)) for h in {heavy!r}))
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy}}))
+"""
+
+
+def measure(module, repeat=3):
+    """ Measure the import time of a module.
+
+    Args:
+        module: Module name.
+        repeat: Fresh interpreters to run, the min time is used.
+
+    Returns:
+        result: e.g. {"module": "quant.trade", "ms": 35.2, "heavy": [], "files": [], "error": None}
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = root + os.pathsep + env.get("PYTHONPATH", "")
+    best, heavy, files, error = None, [], [], None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as cwd:
+            code = CHILD.format(module=module, heavy=HEAVY)
+            p = subprocess.run([sys.executable, "-c", code, "not_exist_config.json"], cwd=cwd, env=env,
+                               capture_output=True, text=True)
+            files = sorted(os.listdir(cwd))
+        lines = p.stdout.strip().splitlines()
+        if p.returncode != 0 or not lines:
+            error = (p.stderr or p.stdout).strip().splitlines()[-1:] or ["exit code {}".format(p.returncode)]
+            break
+        try:
+            d = json.loads(lines[-1])
+        except ValueError:
+            error = lines[-1:]
+            break
+        heavy = d["heavy"]
+        if best is None or d["ms"] < best:
+            best = d["ms"]
+    result = {
+        "module": module,
+        "ms": round(best, 3) if best is not None else None,
+        "heavy": heavy,
+        "files": files,
+        "error": error[0] if error else None
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time benchmark.")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    failed = False
+    for module in args.modules:
+        r = measure(module, args.repeat)
+        ok = not (r["heavy"] or r["files"] or r["error"])
+        failed = failed or not ok
+        print("{:<24} {:>10} ms  {}".format(r["module"], r["ms"] if r["ms"] is not None else "-",
+                                             "ok" if ok else "heavy: {} files: {} error: {}".format(
+                                                 r["heavy"], r["files"], r["error"])))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
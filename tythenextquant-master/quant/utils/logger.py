@@ -15,12 +15,28 @@ import shutil
 import logging
 import traceback
 from logging.handlers import TimedRotatingFileHandler
-from quant.utils import sqlite3db
 
-TY = sqlite3db.Sqlitedb()
+_TY = None  # 机器人信息库，第一次写日志时创建
 initialized = False
 
 
+def get_db():
+    """ 获取机器人信息库(sqlite3db.Sqlitedb)，第一次调用时创建，导入本模块不会创建数据库文件
+    """
+    global _TY
+    if _TY is None:
+        from quant.utils import sqlite3db
+        _TY = sqlite3db.Sqlitedb()
+    return _TY
+
+
+def __getattr__(name):
+    # 兼容 `logger.TY`
+    if name == "TY":
+        return get_db()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
 def initLogger(log_level="DEBUG", log_path=None, logfile_name=None, clear=False, backup_count=0):
     """ 初始化日志输出
     @param log_level 日志级别 DEBUG/INFO
@@ -55,14 +71,14 @@ def initLogger(log_level="DEBUG", log_path=None, logfile_name=None, clear=False,
 def info(*args, **kwargs):
     func_name, kwargs = _log_msg_header(*args, **kwargs)
     log_msg = _log(func_name, *args, **kwargs)
-    TY.Log(log_msg)
+    get_db().Log(log_msg)
     logging.info(log_msg)
 
 
 def warn(*args, **kwargs):
     msg_header, kwargs = _log_msg_header(*args, **kwargs)
     log_msg = _log(msg_header, *args, **kwargs)
-    TY.Log(log_msg)
+    get_db().Log(log_msg)
     logging.warning(log_msg)
 
 
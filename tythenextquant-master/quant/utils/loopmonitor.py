@@ -0,0 +1,137 @@
+# -*- coding:utf-8 -*-
+
+"""
+Event loop lag monitor.
+A sampler callback is scheduled every `interval` milliseconds, the delay between its scheduled time and the time it
+actually runs is the loop lag, it grows when callbacks block the loop by JSON parsing, logging, etc.
+A watchdog thread checks if the sampler is still running, if the loop is blocked longer than `slow_callback`
+milliseconds, the stack of the loop thread is logged, which is the code blocking the loop.
+
+Usage:
+    monitor = LoopMonitor(interval=5, warn=100, slow_callback=200)
+    monitor.start()
+    monitor.histogram.percentile(99)
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import sys
+import time
+import asyncio
+import threading
+import traceback
+
+from quant.utils import logger
+from quant.utils.clock import LatencyHistogram
+
+
+__all__ = ("LoopMonitor", )
+
+
+STACK_DEPTH = 8  # Innermost frames logged of a blocked loop.
+
+
+class LoopMonitor:
+    """ Event loop lag monitor.
+
+    Attributes:
+        interval: Sampling interval(milliseconds), default is 5ms.
+        warn: Lag(milliseconds) larger than this is logged as warning, default is 100ms.
+        slow_callback: If the loop is blocked longer than this(milliseconds), the stack of the loop thread is logged,
+            default is 200ms, 0 means no watchdog thread.
+        report_interval: Interval(seconds) to log lag percentiles and reset the histogram, default is 60s, 0 means
+            never.
+        loop: Event loop, default is the current one.
+    """
+
+    def __init__(self, interval=5, warn=100, slow_callback=200, report_interval=60, loop=None):
+        """Initialize."""
+        self.interval = interval / 1000
+        self.warn = warn
+        self.slow_callback = slow_callback / 1000
+        self.report_interval = report_interval
+        self._loop = loop or asyncio.get_event_loop()
+        self._histogram = LatencyHistogram()
+        self._expected = None
+        self._last_tick = None  # Monotonic time of the latest sample, read by watchdog thread.
+        self._last_report = None
+        self._loop_thread_id = None
+        self._running = False
+        self._handle = None
+        self._warnings = 0
+        self._stalls = 0
+
+    @property
+    def histogram(self):
+        """Lag histogram since the latest report."""
+        return self._histogram
+
+    @property
+    def stats(self):
+        d = {
+            "lag_ms": self._histogram.data,
+            "warnings": self._warnings,
+            "stalls": self._stalls
+        }
+        return d
+
+    def start(self):
+        """Start sampling, must be called in the loop thread."""
+        if self._running:
+            return
+        self._running = True
+        self._loop_thread_id = threading.get_ident()
+        self._last_report = time.monotonic()
+        self._schedule()
+        if self.slow_callback > 0:
+            thread = threading.Thread(target=self._watchdog, name="LoopMonitor", daemon=True)
+            thread.start()
+        logger.info("loop monitor started, interval:", self.interval * 1000, "loop:", type(self._loop).__name__,
+                    caller=self)
+
+    def stop(self):
+        self._running = False
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        now = self._loop.time()
+        self._last_tick = time.monotonic()
+        self._expected = now + self.interval
+        self._handle = self._loop.call_at(self._expected, self._tick)
+
+    def _tick(self):
+        lag = (self._loop.time() - self._expected) * 1000
+        self._histogram.record(lag)
+        if lag > self.warn:
+            self._warnings += 1
+            logger.warn("event loop lag:", round(lag, 3), "ms", caller=self)
+        if self.report_interval and time.monotonic() - self._last_report >= self.report_interval:
+            logger.info("event loop lag(ms):", self._histogram, caller=self)
+            self._histogram.reset()
+            self._last_report = time.monotonic()
+        if self._running:
+            self._schedule()
+
+    def _watchdog(self):
+        """Log the stack of the loop thread once per stall."""
+        reported = None
+        while self._running:
+            time.sleep(self.slow_callback / 2)
+            last_tick = self._last_tick
+            blocked = time.monotonic() - last_tick - self.interval
+            if blocked < self.slow_callback or reported == last_tick:
+                continue
+            reported = last_tick
+            self._stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if not frame:
+                continue
+            # One line per frame joined, the logger escapes newlines. The innermost frame is the blocking code.
+            stack = " <- ".join("{}:{} {}: {}".format(f.filename, f.lineno, f.name, f.line)
+                                for f in reversed(traceback.extract_stack(frame, limit=STACK_DEPTH)))
+            # `logger.error` only writes log handlers, `info`/`warn` also write sqlite that the loop thread may be using.
+            logger.error("event loop blocked", round(blocked * 1000), "ms, stack:", stack, caller=self)
@@ -4,29 +4,44 @@
 Mongodb async API client.
 https://docs.mongodb.org/manual/
 
+`BulkWriter` is a write-behind buffer of a collection, documents are inserted / updated by `bulk_write` when
+`size` operations are buffered or `interval` milliseconds passed since the first one, instead of a round trip per
+document.
+
 Author: xunfeng
 Date:   2018/04/28
 Email:  xunfeng@test.com
 """
 
 import copy
+import time
+import array
+import asyncio
+import itertools
+import collections
 
 import motor.motor_asyncio
 from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
 from urllib.parse import quote_plus
 
 from quant.utils import tools
 from quant.utils import logger
+from quant.utils.clock import LatencyHistogram
 
 
-__all__ = ("initMongodb", "MongoDBBase", )
+__all__ = ("initMongodb", "MongoDBBase", "BulkWriter", "get_bulk_writer", "get_bulk_writer_stats", "flush_all", )
 
 
 MONGO_CONN = None
 DELETE_FLAG = "delete"  # Delete flag, `True` is deleted, otherwise is not deleted.
+BULK_CONFIG = {}  # Default params of `BulkWriter`, `MONGODB.bulk` config.
+BULK_WRITERS = {}  # Bulk writers, e.g. {"binance.kline_BTCUSDT": BulkWriter, ... }
+INDEXES = set()  # Indexes created by this process, e.g. {"binance.kline_BTCUSDT:[('t', 1)]", ... }
 
 
-def initMongodb(host="127.0.0.1", port=27017, username="", password="", dbname="admin"):
+def initMongodb(host="127.0.0.1", port=27017, username="", password="", dbname="admin", bulk=None):
     """ Initialize a connection pool for MongoDB.
 
     Args:
@@ -35,6 +50,7 @@ def initMongodb(host="127.0.0.1", port=27017, username="", password="", dbname="
         username: Username for MongoDB server.
         password: Username for MongoDB server.
         dbname: DB name to connect for, default is `admin`.
+        bulk: Default params of bulk writers, e.g. {"size": 500, "interval": 1000, "max_pending": 100000}
     """
     if username and password:
         uri = "mongodb://{username}:{password}@{host}:{port}/{dbname}".format(username=quote_plus(username),
@@ -47,6 +63,7 @@ def initMongodb(host="127.0.0.1", port=27017, username="", password="", dbname="
     mongo_client = motor.motor_asyncio.AsyncIOMotorClient(uri)
     global MONGO_CONN
     MONGO_CONN = mongo_client
+    BULK_CONFIG.update(bulk or {})
     logger.info("create mongodb connection pool.")
 
 
@@ -78,6 +95,17 @@ class MongoDBBase(object):
         cursor = self._conn[db][collection]
         return cursor
 
+    def bulk_writer(self, cursor=None):
+        """ Get the bulk writer of a cursor.
+
+        Args:
+            cursor: Query cursor, default is `self._cursor`.
+
+        Return:
+            writer: `BulkWriter` object, shared by all `MongoDBBase` of the same collection.
+        """
+        return get_bulk_writer(cursor or self._cursor)
+
     async def get_list(self, spec=None, fields=None, sort=None, skip=0, limit=9999, cursor=None):
         """ Get multiple document list.
 
@@ -113,6 +141,135 @@ class MongoDBBase(object):
             datas.append(item)
         return datas
 
+    async def iter_list(self, spec=None, fields=None, sort=None, skip=0, limit=0, batch_size=1000, cursor=None):
+        """ Iterate documents, documents are fetched from the server in batches, no limit by default.
+
+        Args:
+            spec: Query params, optional. Specifies selection filter using query operators.
+            fields: projection params, optional. Specifies the fields to return in the documents that match the query
+                filter, fetch only the fields needed to save memory and bandwidth.
+            sort: A Set() document that defines the sort order of the result set. e.g. [("age": 1), ("name": -1)]
+            skip: The cursor start point, default is 0.
+            limit: The max documents to return, default is 0, no limit.
+            batch_size: Documents per batch fetched from the server, default is 1000.
+            cursor: Query cursor, default is `self._cursor`.
+
+        Yield:
+            item: Document.
+
+        Usage:
+            async for item in db.iter_list({"t": {"$gte": start}}, fields={"t": 1, "c": 1, "_id": 0}):
+                ...
+        """
+        if not spec:
+            spec = {}
+        if not sort:
+            sort = []
+        if not cursor:
+            cursor = self._cursor
+        if "_id" in spec:
+            spec["_id"] = self._convert_id_object(spec["_id"])
+        spec[DELETE_FLAG] = {"$ne": True}
+        result = cursor.find(spec, fields, sort=sort, skip=skip, limit=limit, batch_size=batch_size)
+        async for item in result:
+            if "_id" in item:
+                item["_id"] = str(item["_id"])
+            yield item
+
+    async def get_columns(self, spec=None, columns=("t", "o", "h", "l", "c", "v"), int_columns=("t", ), sort=None,
+                          limit=0, batch_size=5000, cursor=None):
+        """ Get fields of documents as NumPy arrays, no document dict is kept, every value takes 8 bytes.
+
+        Args:
+            spec: Query params, optional. Specifies selection filter using query operators.
+            columns: Fields to get, default is kline fields ("t", "o", "h", "l", "c", "v").
+            int_columns: Fields of int64 type, the others are float64, default is ("t", ). A missing field is 0 for
+                int64 and NaN for float64.
+            sort: A Set() document that defines the sort order of the result set. e.g. [("t": 1)]
+            limit: The max documents to return, default is 0, no limit.
+            batch_size: Documents per batch fetched from the server, default is 5000.
+            cursor: Query cursor, default is `self._cursor`.
+
+        Return:
+            result: Arrays of fields, e.g. {"t": array([...]), "o": array([...]), ...}, None if NumPy not installed.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            logger.error("numpy not installed, `pip install numpy` to get columns.", caller=self)
+            return None
+        fields = {c: 1 for c in columns}
+        fields["_id"] = 0
+        ints = [c for c in columns if c in int_columns]
+        floats = [c for c in columns if c not in int_columns]
+        buffers = {c: array.array("q") for c in ints}
+        buffers.update({c: array.array("d") for c in floats})
+        nan = float("nan")
+        async for item in self.iter_list(spec, fields, sort=sort, limit=limit, batch_size=batch_size, cursor=cursor):
+            for c in ints:
+                buffers[c].append(int(item.get(c) or 0))
+            for c in floats:
+                v = item.get(c)
+                buffers[c].append(nan if v is None else float(v))
+        result = {}
+        for c in columns:
+            dtype = np.int64 if c in int_columns else np.float64
+            result[c] = np.frombuffer(buffers[c], dtype=dtype) if buffers[c] else np.empty(0, dtype=dtype)
+        return result
+
+    async def aggregate(self, pipeline, cursor=None):
+        """ Run an aggregation pipeline.
+
+        Args:
+            pipeline: Aggregation stages, a pipeline ends with `$merge` / `$out` returns no document.
+            cursor: Query cursor, default is `self._cursor`.
+
+        Return:
+            datas: Documents.
+        """
+        if not cursor:
+            cursor = self._cursor
+        datas = []
+        async for item in cursor.aggregate(pipeline, allowDiskUse=True):
+            datas.append(item)
+        return datas
+
+    async def ensure_index(self, keys, unique=False, cursor=None):
+        """ Create an index if not created by this process yet, e.g. on first use of a collection. If a unique index
+        can't be created because of duplicated documents, a non-unique one is created.
+
+        Args:
+            keys: Index keys, e.g. [("t", 1)]
+            unique: Create a unique index? True or False.
+            cursor: Query cursor, default is `self._cursor`.
+
+        Return:
+            success: True if the index exists.
+        """
+        if not cursor:
+            cursor = self._cursor
+        name = "{}.{}:{}".format(cursor.database.name, cursor.name, keys)
+        if name in INDEXES:
+            return True
+        INDEXES.add(name)
+        try:
+            await cursor.create_index(keys, unique=unique, background=True)
+            return True
+        except Exception as e:
+            if not unique:
+                logger.error("create index error:", e, "collection:", cursor.name, "keys:", keys, caller=self)
+                INDEXES.discard(name)
+                return False
+            logger.warn("create unique index error:", e, "collection:", cursor.name, "keys:", keys,
+                        "create a non-unique one.", caller=self)
+        try:
+            await cursor.create_index(keys, background=True)
+            return True
+        except Exception as e:
+            logger.error("create index error:", e, "collection:", cursor.name, "keys:", keys, caller=self)
+            INDEXES.discard(name)
+            return False
+
     async def find_one(self, spec=None, fields=None, sort=None, cursor=None):
         """ Get one document.
 
@@ -166,19 +323,15 @@ class MongoDBBase(object):
         """
         if not cursor:
             cursor = self._cursor
-        docs_data = copy.deepcopy(docs)
         ret_ids = []
         is_one = False
-        create_time = tools.get_cur_timestamp_ms()
-        if not isinstance(docs_data, list):
-            docs_data = [docs_data]
+        if not isinstance(docs, list):
+            docs = [docs]
             is_one = True
+        docs_data = _new_docs(docs)
         for doc in docs_data:
-            doc["_id"] = ObjectId()
-            doc["create_time"] = create_time
-            doc["update_time"] = create_time
             ret_ids.append(str(doc["_id"]))
-        cursor.insert_many(docs_data)
+        await cursor.insert_many(docs_data)
         if is_one:
             return ret_ids[0]
         else:
@@ -328,11 +481,258 @@ class MongoDBBase(object):
     def _convert_id_object(self, origin):
         """ Convert a string id to `ObjectId`.
         """
-        if isinstance(origin, str):
-            return ObjectId(origin)
-        elif isinstance(origin, (list, set)):
-            return [ObjectId(item) for item in origin]
-        elif isinstance(origin, dict):
-            for key, value in origin.items():
-                origin[key] = self._convert_id_object(value)
-        return origin
+        return _convert_id_object(origin)
+
+
+def _convert_id_object(origin):
+    """ Convert a string id to `ObjectId`.
+    """
+    if isinstance(origin, str):
+        return ObjectId(origin)
+    elif isinstance(origin, (list, set)):
+        return [ObjectId(item) for item in origin]
+    elif isinstance(origin, dict):
+        for key, value in origin.items():
+            origin[key] = _convert_id_object(value)
+    return origin
+
+
+def _new_docs(docs):
+    """ Copy documents to be inserted with `_id`, `create_time` and `update_time`, only the top level is copied, the
+    input documents are not changed.
+    """
+    create_time = tools.get_cur_timestamp_ms()
+    docs_data = []
+    for doc in docs:
+        doc = dict(doc)
+        doc["_id"] = ObjectId()
+        doc["create_time"] = create_time
+        doc["update_time"] = create_time
+        docs_data.append(doc)
+    return docs_data
+
+
+class BulkWriter:
+    """ Write-behind buffered writer of a collection.
+
+    Inserts and updates are buffered in order and written by one ordered `bulk_write` of at most `size` operations,
+    when `size` operations are buffered or `interval` milliseconds passed since the first one. Buffered updates of the
+    same spec with only `$set` are merged into one, e.g. the status updates of an order. Failed operations are kept
+    and retried in the next flush, except the one rejected by the server (e.g. duplicate key). If `max_pending`
+    operations are buffered, the caller waits for a flush, and the oldest operations are dropped if the flush failed.
+
+    Attributes:
+        cursor: Collection cursor.
+        size: Max operations per `bulk_write`, default is 500.
+        interval: Max milliseconds an operation is buffered, default is 1000.
+        max_pending: Max operations buffered, default is 100000.
+    """
+
+    def __init__(self, cursor, size=500, interval=1000, max_pending=100000):
+        """Initialize."""
+        self._cursor = cursor
+        self.name = "{}.{}".format(cursor.database.name, cursor.name)
+        self.size = size
+        self.interval = interval / 1000
+        self.max_pending = max(max_pending, size)
+        self._ops = collections.OrderedDict()  # key -> [doc / spec, update fields, upsert, enqueue time(monotonic)]
+        self._seq = itertools.count()
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._histogram = LatencyHistogram()  # Milliseconds from enqueued to written.
+        self._inserted = 0
+        self._modified = 0
+        self._upserted = 0
+        self._merged = 0
+        self._flushes = 0
+        self._errors = 0
+        self._rejected = 0
+        self._dropped = 0
+        self._last_error = None
+
+    @property
+    def pending(self):
+        return len(self._ops)
+
+    @property
+    def stats(self):
+        d = {
+            "pending": len(self._ops),
+            "inserted": self._inserted,
+            "modified": self._modified,
+            "upserted": self._upserted,
+            "merged": self._merged,
+            "flushes": self._flushes,
+            "errors": self._errors,
+            "rejected": self._rejected,
+            "dropped": self._dropped,
+            "last_error": self._last_error,
+            "lag_ms": self._histogram.data
+        }
+        return d
+
+    async def insert(self, docs):
+        """ Insert (a) document(s), the same as `MongoDBBase.insert`, but written later.
+
+        Args:
+            docs: Dict or List to be inserted.
+
+        Return:
+            ret_ids: Document id(s) to be inserted, if insert a dict, `ret_ids` is a id string; if insert a list,
+                `ret_ids` is a id list.
+        """
+        is_one = not isinstance(docs, list)
+        docs_data = _new_docs([docs] if is_one else docs)
+        ret_ids = []
+        for doc in docs_data:
+            await self._put(next(self._seq), [doc, None, False])
+            ret_ids.append(str(doc["_id"]))
+        return ret_ids[0] if is_one else ret_ids
+
+    async def update(self, spec, update_fields, upsert=False):
+        """ Update a document, the same as `MongoDBBase.update`, but written later.
+
+        Args:
+            spec: Query params. Specifies selection filter using query operators.
+            update_fields: Fields to be updated.
+            upsert: If server this document if not exist? True or False.
+        """
+        spec = dict(spec)
+        spec[DELETE_FLAG] = {"$ne": True}
+        if "_id" in spec:
+            spec["_id"] = _convert_id_object(spec["_id"])
+        update_fields = {k: dict(v) for k, v in update_fields.items()}
+        update_fields.setdefault("$set", {})["update_time"] = tools.get_cur_timestamp_ms()
+        if list(update_fields) == ["$set"]:
+            key = (repr(sorted(spec.items())), upsert)
+            item = self._ops.get(key)
+            if item:
+                item[1]["$set"].update(update_fields["$set"])
+                self._merged += 1
+                return
+        else:
+            key = next(self._seq)
+        await self._put(key, [spec, update_fields, upsert])
+
+    async def _put(self, key, item):
+        if len(self._ops) >= self.max_pending:
+            await self.flush()
+            while len(self._ops) >= self.max_pending:
+                self._ops.popitem(last=False)
+                self._dropped += 1
+                if self._dropped == 1 or self._dropped % 1000 == 0:
+                    logger.error("bulk writer full, operations dropped:", self._dropped, "collection:", self.name,
+                                 "last error:", self._last_error, caller=self)
+        item.append(time.monotonic())
+        self._ops[key] = item
+        if len(self._ops) >= self.size:
+            if not self._lock.locked():
+                asyncio.ensure_future(self.flush())
+        elif not self._timer:
+            self._timer = asyncio.get_event_loop().call_later(self.interval, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        if self._ops and not self._lock.locked():
+            asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """ Write all buffered operations.
+
+        Return:
+            success: True if all operations written, otherwise False and failed operations are kept to retry.
+        """
+        async with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            success = True
+            while self._ops and success:
+                batch = []
+                for _ in range(min(self.size, len(self._ops))):
+                    batch.append(self._ops.popitem(last=False))
+                success = await self._write(batch)
+            if self._ops and not self._timer:
+                self._timer = asyncio.get_event_loop().call_later(self.interval, self._on_timer)
+            return success
+
+    async def _write(self, batch):
+        """Write a batch by one ordered `bulk_write`, requeue the operations not written if failed."""
+        self._flushes += 1
+        requests = [InsertOne(a) if b is None else UpdateOne(a, b, upsert=upsert) for _, (a, b, upsert, _t) in batch]
+        try:
+            result = await self._cursor.bulk_write(requests, ordered=True)
+        except BulkWriteError as e:
+            details = e.details or {}
+            self._count(details.get("nInserted", 0), details.get("nModified", 0), len(details.get("upserted", [])))
+            errors = details.get("writeErrors") or [{}]
+            index = errors[0].get("index", -1)
+            self._errors += 1
+            self._rejected += 1 if index >= 0 else 0
+            self._last_error = errors[0].get("errmsg") or str(e)
+            logger.error("bulk write error:", self._last_error, "collection:", self.name, caller=self)
+            self._requeue(batch[index + 1:])
+            return False
+        except Exception as e:
+            self._errors += 1
+            self._last_error = str(e)
+            logger.error("bulk write error:", e, "collection:", self.name, "operations:", len(batch), caller=self)
+            self._requeue(batch)
+            return False
+        self._count(result.inserted_count, result.modified_count, result.upserted_count)
+        self._histogram.record((time.monotonic() - min(item[3] for _, item in batch)) * 1000)
+        return True
+
+    def _count(self, inserted, modified, upserted):
+        self._inserted += inserted
+        self._modified += modified
+        self._upserted += upserted
+
+    def _requeue(self, batch):
+        """Put operations back to the front, updates merged into them while writing are merged back."""
+        ops = collections.OrderedDict(batch)
+        for key, item in self._ops.items():
+            if key in ops:
+                ops[key][1]["$set"].update(item[1]["$set"])
+            else:
+                ops[key] = item
+        self._ops = ops
+
+
+def get_bulk_writer(cursor, **kwargs):
+    """ Get the bulk writer of a collection, created if not exist.
+
+    Args:
+        cursor: Collection cursor.
+        kwargs: Params of `BulkWriter` if created, default is `MONGODB.bulk` config.
+
+    Return:
+        writer: `BulkWriter` object.
+    """
+    name = "{}.{}".format(cursor.database.name, cursor.name)
+    writer = BULK_WRITERS.get(name)
+    if not writer:
+        params = dict(BULK_CONFIG)
+        params.update(kwargs)
+        writer = BulkWriter(cursor, **params)
+        BULK_WRITERS[name] = writer
+    return writer
+
+
+def get_bulk_writer_stats():
+    """ Get stats of all bulk writers.
+
+    Return:
+        stats: e.g. {"binance.kline_BTCUSDT": {"pending": 12, "inserted": 1200, ...}, ... }
+    """
+    return {name: writer.stats for name, writer in BULK_WRITERS.items()}
+
+
+async def flush_all():
+    """ Write buffered operations of all bulk writers, e.g. before the process exit.
+
+    Return:
+        success: True if all operations written.
+    """
+    results = await asyncio.gather(*[writer.flush() for writer in BULK_WRITERS.values()])
+    return all(results)
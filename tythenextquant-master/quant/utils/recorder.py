@@ -0,0 +1,435 @@
+# -*- coding:utf-8 -*-
+
+"""
+Raw market data recorder.
+Every raw frame received by Websocket connections is recorded with its receive time and connection id, so production
+behaviour can be reproduced by replaying them. The receive path only appends a tuple to a queue, frames are encoded,
+compressed and written by a background thread.
+
+Segment file `{name}-{start_ms}.seg` is a sequence of blocks, little endian, `name` is the recording name, e.g.
+`frames-{server_id}-{pid}`, so every process records its own connection ids into its own segments, `start_ms` is the
+receive time of the first frame of the segment:
+    block header: compressed size(I) raw size(I) first time(q) last time(q) frame count(I), times in microseconds.
+    block body: compressed frames, every frame is time(q) connection id(I) kind(B) size(I) followed by `size` bytes.
+Index file `{name}-{start_ms}.idx` is JSON lines, the first line is {"codec": ..., "version": 1, "start": ...} and
+every other line is a block {"offset": ..., "size": ..., "first": ..., "last": ..., "count": ...}, so the blocks of a
+time window are located without decompressing others.
+The url of a connection id is recorded as a `KIND_META` frame at the start of every segment and when connected.
+
+Config:
+    "RECORDER": {
+        "path": "data/frames",  # Directory of segment files.
+        "codec": "zstd",  # `zstd` / `lz4` / `zlib`, zlib is used if the module of `zstd` / `lz4` not installed.
+        "max_bytes": 268435456,  # Rotate segment when it's larger than this, default is 256MB.
+        "max_seconds": 3600  # Rotate segment when it's older than this, default is 1 hour.
+    }
+
+Usage:
+    reader = FrameReader("data/frames")  # The latest recording, or `FrameReader("data/frames", name)`.
+    for frame in reader.iter_frames(start, end):  # Frame(timestamp, conn, kind, data), timestamp in milliseconds.
+        ...
+
+Benchmark:
+    python -m quant.utils.recorder --count 200000
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import atexit
+import struct
+import argparse
+import threading
+import collections
+
+from quant.utils import logger
+from quant.config import config
+
+
+__all__ = ("FrameRecorder", "FrameReader", "Frame", "get_recorder", "KIND_META", "KIND_TEXT", "KIND_BINARY", )
+
+
+KIND_META = 0  # JSON of connection information, e.g. {"conn": 1, "url": "wss://...", "event": "connected"}
+KIND_TEXT = 1
+KIND_BINARY = 2
+
+VERSION = 1
+BLOCK_HEADER = struct.Struct("<IIqqI")
+FRAME_HEADER = struct.Struct("<qIBI")
+BLOCK_SIZE = 1024 * 1024  # Raw bytes per block.
+
+Frame = collections.namedtuple("Frame", ["timestamp", "conn", "kind", "data"])
+
+
+def _get_codec(name):
+    """ Get compress and decompress functions of a codec.
+
+    Returns:
+        (name, compress, decompress): Codec name used, zlib if the module of `name` not installed.
+    """
+    if name == "zstd":
+        try:
+            import zstandard
+            c = zstandard.ZstdCompressor(level=3)
+            d = zstandard.ZstdDecompressor()
+            return name, c.compress, lambda data, size: d.decompress(data, max_output_size=size)
+        except ImportError:
+            logger.warn("zstandard not installed, use zlib.", caller="FrameRecorder")
+    elif name == "lz4":
+        try:
+            import lz4.frame
+            return name, lz4.frame.compress, lambda data, size: lz4.frame.decompress(data)
+        except ImportError:
+            logger.warn("lz4 not installed, use zlib.", caller="FrameRecorder")
+    return "zlib", lambda data: zlib.compress(data, 1), lambda data, size: zlib.decompress(data)
+
+
+class FrameRecorder:
+    """ Record raw frames into rotating compressed segment files.
+
+    Attributes:
+        path: Directory of segment files, created if not exist.
+        name: Prefix of segment file names, default is `frames`, the server id and process id are appended, e.g.
+            `frames-{server_id}-{pid}`, so processes recording into the same directory never share segments.
+        codec: `zstd` / `lz4` / `zlib`, default is `zstd`.
+        max_bytes: Rotate segment when it's larger than this, default is 256MB.
+        max_seconds: Rotate segment when it's older than this, default is 3600.
+        flush_interval: Seconds between two writes of the background thread, default is 0.2s.
+        max_queue: Frames queued more than this are dropped, e.g. the disk is too slow, default is 1000000.
+    """
+
+    def __init__(self, path, name="frames", codec="zstd", max_bytes=256 * 1024 * 1024, max_seconds=3600,
+                 flush_interval=0.2, max_queue=1000000):
+        """Initialize."""
+        self.path = path
+        self.name = "-".join(str(s) for s in (name, config.server_id, os.getpid()) if s)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.codec, self._compress, _ = _get_codec(codec)
+        self._queue = collections.deque()
+        self._connections = {}  # Connection id -> url.
+        self._seg = None  # Segment file.
+        self._idx = None  # Index file.
+        self._seg_start = None
+        self._seg_size = 0
+        self._recorded = 0
+        self._written = 0
+        self._dropped = 0
+        self._bytes = 0
+        self._segments = 0
+        self._running = True
+        self._lock = threading.Lock()  # Serialize writes of the background thread and `close`.
+        os.makedirs(path, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="FrameRecorder", daemon=True)
+        self._thread.start()
+
+    @property
+    def stats(self):
+        d = {
+            "recorded": self._recorded,
+            "written": self._written,
+            "dropped": self._dropped,
+            "queued": len(self._queue),
+            "bytes": self._bytes,
+            "segments": self._segments,
+            "codec": self.codec
+        }
+        return d
+
+    def register(self, url):
+        """ Register a connection.
+
+        Args:
+            url: Connection url.
+
+        Returns:
+            conn: Connection id.
+        """
+        conn = len(self._connections) + 1
+        self._connections[conn] = url
+        return conn
+
+    def record(self, conn, kind, data):
+        """ Record a frame, it only appends to a queue.
+
+        Args:
+            conn: Connection id returned by `register`.
+            kind: `KIND_TEXT` / `KIND_BINARY` / `KIND_META`.
+            data: Frame data, str or bytes.
+        """
+        if len(self._queue) >= self.max_queue:
+            self._dropped += 1
+            return
+        self._queue.append((time.time(), conn, kind, data))
+        self._recorded += 1
+
+    def connected(self, conn):
+        """Record a connection (re)connected."""
+        self.record(conn, KIND_META, json.dumps({"conn": conn, "url": self._connections.get(conn),
+                                                 "event": "connected"}))
+
+    def _run(self):
+        while self._running:
+            time.sleep(self.flush_interval)
+            try:
+                self._write()
+            except Exception as e:
+                logger.error("write frames error:", e, caller=self)
+
+    def _write(self):
+        with self._lock:
+            while self._queue:
+                frames = []
+                parts = []
+                size = 0
+                while self._queue and size < BLOCK_SIZE:
+                    ts, conn, kind, data = self._queue.popleft()
+                    if isinstance(data, str):
+                        data = data.encode("utf-8")
+                    us = int(ts * 1000000)
+                    parts.append(FRAME_HEADER.pack(us, conn, kind, len(data)))
+                    parts.append(data)
+                    frames.append(us)
+                    size += FRAME_HEADER.size + len(data)
+                self._write_block(frames[0], frames[-1], len(frames), b"".join(parts))
+
+    def _write_block(self, first, last, count, raw):
+        # Segments are named and rotated by receive times, frames may be written up to `flush_interval` later.
+        if self._seg and (self._seg_size >= self.max_bytes or first - self._seg_start >= self.max_seconds * 1000000):
+            self._close_segment()
+        if not self._seg:
+            self._open_segment(first)
+            # Connection urls at the start of every segment, so a segment can be read alone.
+            meta = []
+            for conn, url in list(self._connections.items()):
+                data = json.dumps({"conn": conn, "url": url}).encode("utf-8")
+                meta.append(FRAME_HEADER.pack(first, conn, KIND_META, len(data)) + data)
+            if meta:
+                raw = b"".join(meta) + raw
+                count += len(meta)
+        body = self._compress(raw)
+        header = BLOCK_HEADER.pack(len(body), len(raw), first, last, count)
+        offset = self._seg_size
+        self._seg.write(header)
+        self._seg.write(body)
+        self._seg.flush()
+        size = BLOCK_HEADER.size + len(body)
+        self._idx.write(json.dumps({"offset": offset, "size": size, "first": first, "last": last,
+                                    "count": count}) + "\n")
+        self._idx.flush()
+        self._seg_size += size
+        self._written += count
+        self._bytes += size
+
+    def _open_segment(self, first):
+        start = first // 1000
+        filename = os.path.join(self.path, "{}-{}".format(self.name, start))
+        self._seg = open(filename + ".seg", "ab")
+        self._idx = open(filename + ".idx", "a")
+        self._idx.write(json.dumps({"codec": self.codec, "version": VERSION, "start": start}) + "\n")
+        self._seg_start = first
+        self._seg_size = 0
+        self._segments += 1
+
+    def _close_segment(self):
+        self._seg.close()
+        self._idx.close()
+        self._seg = None
+        self._idx = None
+
+    def close(self):
+        """Write all queued frames and close files."""
+        self._running = False
+        try:
+            self._write()
+        except Exception as e:
+            logger.error("write frames error:", e, caller=self)
+        with self._lock:
+            if self._seg:
+                self._close_segment()
+
+
+class FrameReader:
+    """ Read frames recorded by `FrameRecorder`.
+
+    Attributes:
+        path: Directory of segment files.
+        name: Recording name, the prefix of segment file names, e.g. `frames-{server_id}-{pid}`, default is the
+            recording with the latest segment in the directory.
+    """
+
+    def __init__(self, path, name=None):
+        """Initialize."""
+        self.path = path
+        if name is None:
+            names = self.recordings(path)
+            name = names[-1] if names else "frames"
+        self.name = name
+        self.connections = {}  # Connection id -> url, updated while reading.
+
+    @staticmethod
+    def recordings(path):
+        """ Get recording names in a directory.
+
+        Returns:
+            names: Recording names, ordered by the start time of their latest segment.
+        """
+        latest = {}
+        for f in os.listdir(path):
+            if not f.endswith(".idx"):
+                continue
+            name, _, start = f[:-len(".idx")].rpartition("-")
+            if name and start.isdigit():
+                latest[name] = max(latest.get(name, 0), int(start))
+        return sorted(latest, key=lambda name: (latest[name], name))
+
+    def segments(self):
+        """ Get segments in time order.
+
+        Returns:
+            segments: [(start, segment filename, index filename), ...], start is a millisecond timestamp.
+        """
+        result = []
+        prefix = self.name + "-"
+        for f in os.listdir(self.path):
+            if not (f.startswith(prefix) and f.endswith(".idx")):
+                continue
+            start = f[len(prefix):-len(".idx")]
+            if not start.isdigit():
+                continue
+            filename = os.path.join(self.path, f[:-len(".idx")])
+            result.append((int(start), filename + ".seg", filename + ".idx"))
+        result.sort()
+        return result
+
+    def iter_frames(self, start=None, end=None, conns=None, kinds=(KIND_TEXT, KIND_BINARY)):
+        """ Iterate frames in time order, only blocks in the time window are decompressed, segment files are
+        memory-mapped and blocks are decompressed without copy.
+
+        Args:
+            start: Start millisecond timestamp, included, default is the first frame.
+            end: End millisecond timestamp, included, default is the last frame.
+            conns: Connection ids to read, default is all.
+            kinds: Kinds of frames to yield, default is text and binary frames, connection urls are always read into
+                `connections`.
+
+        Yield:
+            frame: `Frame(timestamp, conn, kind, data)`, timestamp in milliseconds, data is str for text frames.
+        """
+        start_us = None if start is None else int(start * 1000)
+        end_us = None if end is None else int(end * 1000)
+        segments = self.segments()
+        for i, (seg_start, seg_file, idx_file) in enumerate(segments):
+            if end is not None and seg_start > end:
+                break
+            if start is not None and i + 1 < len(segments) and segments[i + 1][0] < start:
+                continue
+            with open(idx_file) as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+            if not lines:
+                continue
+            _, _, decompress = _get_codec(lines[0]["codec"])
+            blocks = lines[1:]
+            with open(seg_file, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if not size:
+                    continue
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mm)
+            try:
+                for n, block in enumerate(blocks):
+                    # The first block holds connection urls of the segment.
+                    if n and ((start_us is not None and block["last"] < start_us) or
+                              (end_us is not None and block["first"] > end_us)):
+                        continue
+                    offset = block["offset"]
+                    if offset + BLOCK_HEADER.size > size:
+                        break  # Not written completely.
+                    csize, rsize, _, _, _ = BLOCK_HEADER.unpack_from(mm, offset)
+                    offset += BLOCK_HEADER.size
+                    if offset + csize > size:
+                        break
+                    raw = decompress(view[offset: offset + csize], rsize)
+                    yield from self._iter_block(raw, start_us, end_us, conns, kinds)
+            finally:
+                view.release()
+                mm.close()
+
+    def _iter_block(self, raw, start_us, end_us, conns, kinds):
+        view = memoryview(raw)
+        pos = 0
+        while pos + FRAME_HEADER.size <= len(raw):
+            us, conn, kind, size = FRAME_HEADER.unpack_from(raw, pos)
+            pos += FRAME_HEADER.size
+            data = view[pos: pos + size]
+            pos += size
+            if kind == KIND_META:
+                info = json.loads(bytes(data))
+                if "url" in info:
+                    self.connections[info["conn"]] = info["url"]
+            if kind not in kinds:
+                continue
+            if (start_us is not None and us < start_us) or (end_us is not None and us > end_us):
+                continue
+            if conns and conn not in conns:
+                continue
+            data = str(data, "utf-8") if kind != KIND_BINARY else bytes(data)
+            yield Frame(us / 1000, conn, kind, data)
+
+
+_recorder = None
+
+
+def get_recorder():
+    """ Get the recorder of `RECORDER` config, created on first use.
+
+    Returns:
+        recorder: `FrameRecorder` object, None if `RECORDER` is not configured.
+    """
+    global _recorder
+    if _recorder is None and config.recorder:
+        params = dict(config.recorder)
+        _recorder = FrameRecorder(params.pop("path", "data/frames"), **params)
+        atexit.register(_recorder.close)
+        logger.info("frame recorder started, path:", _recorder.path, "codec:", _recorder.codec, caller=_recorder)
+    return _recorder
+
+
+def main():
+    import tempfile
+    parser = argparse.ArgumentParser(description="Frame recorder benchmark.")
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--codec", default="zstd")
+    args = parser.parse_args()
+    sys.argv = sys.argv[:1]  # The config file is parsed from `sys.argv` when first used.
+
+    frame = json.dumps({"e": "depthUpdate", "E": 1570000000000, "s": "BTCUSDT",
+                        "b": [["9000.01", "1.5"]] * 10, "a": [["9000.02", "2.5"]] * 10})
+    with tempfile.TemporaryDirectory() as path:
+        recorder = FrameRecorder(path, codec=args.codec)
+        conn = recorder.register("wss://stream.binance.com:9443/ws")
+        t = time.perf_counter()
+        for _ in range(args.count):
+            recorder.record(conn, KIND_TEXT, frame)
+        elapsed = time.perf_counter() - t
+        recorder.close()
+        print("record:  {:.3f} us/frame".format(elapsed / args.count * 1e6))
+        print("written: {} frames, {} -> {} bytes, codec: {}".format(
+            recorder.stats["written"], len(frame) * args.count, recorder.stats["bytes"], recorder.codec))
+        reader = FrameReader(path)
+        t = time.perf_counter()
+        n = sum(1 for _ in reader.iter_frames())
+        print("read:    {} frames, {:.3f} us/frame".format(n, (time.perf_counter() - t) / max(n, 1) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# -*- coding:utf-8 -*-
+
+"""
+Message router for market adapters.
+The channel/topic names are known when subscribing, so every message can be dispatched to its handler with one dict
+lookup, instead of scanning the channel name with `in` and splitting it for the symbol on every message.
+
+Usage:
+    router = MessageRouter()
+    router.register("kline.1.BTCUSDT", self.process_kline, "BTCUSDT")
+    ...
+    handler = router.get(msg["topic"])
+    if handler:
+        await handler(msg["data"], msg)  # => await self.process_kline("BTCUSDT", data, msg)
+
+Benchmark:
+    python -m quant.utils.router
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import time
+import asyncio
+import functools
+
+
+__all__ = ("MessageRouter", "TopicRouter", )
+
+
+class MessageRouter:
+    """ Map exact channel names to bound handlers and pre-parsed arguments (e.g. symbol).
+    """
+
+    def __init__(self):
+        """Initialize."""
+        self._routes = {}  # e.g. {"channel": handler bound with (symbol, ...), ... }
+
+    @property
+    def channels(self):
+        return list(self._routes.keys())
+
+    def register(self, channel, handler, *args):
+        """ Register a route.
+
+        Args:
+            channel: Exact channel/topic name in received message.
+            handler: Asynchronous handler function, called as `handler(*args, *payload)`.
+            args: Pre-parsed arguments bound to this channel, e.g. symbol.
+        """
+        self._routes[channel] = functools.partial(handler, *args) if args else handler
+
+    def unregister(self, channel):
+        """ Unregister a route.
+
+        Args:
+            channel: Channel/topic name.
+        """
+        self._routes.pop(channel, None)
+
+    def get(self, channel):
+        """ Get the handler of a channel, this is the fastest way to dispatch on a hot path.
+
+        Args:
+            channel: Channel/topic name.
+
+        Returns:
+            handler: Asynchronous handler with the pre-parsed arguments bound, or None if not registered.
+        """
+        return self._routes.get(channel)
+
+    async def dispatch(self, channel, *payload):
+        """ Dispatch a message to its handler.
+
+        Args:
+            channel: Channel/topic name in received message.
+            payload: Message data passed to handler after the bound arguments.
+
+        Returns:
+            If channel registered, return True, otherwise return False.
+        """
+        handler = self._routes.get(channel)
+        if handler is None:
+            return False
+        await handler(*payload)
+        return True
+
+
+class TopicRouter:
+    """ Route (exchange, routing key) to values bound with RabbitMQ topic patterns, `*` matches exactly one word and
+    `#` matches zero or more words. Patterns are kept in a trie of words per exchange, and matched results are cached
+    per routing key, so dispatching a known routing key is one dict lookup and no allocation.
+    """
+
+    def __init__(self):
+        """Initialize."""
+        self._tries = {}  # e.g. {"exchange": trie node}, node is {"word": node, ..., None: [(seq, value), ...]}
+        self._cache = {}  # e.g. {("exchange", "routing_key"): (value, ...)}
+        self._seq = 0
+
+    def add(self, exchange, pattern, value):
+        """ Bind a value.
+
+        Args:
+            exchange: Exchange name.
+            pattern: Routing key pattern, e.g. `binance.BTC/USDT` / `#.BTC/USDT` / `*.*`.
+            value: Any object, e.g. a subscription.
+        """
+        node = self._tries.setdefault(exchange, {})
+        for word in pattern.split("."):
+            node = node.setdefault(word, {})
+        self._seq += 1
+        node.setdefault(None, []).append((self._seq, value))
+        self._cache = {}
+
+    def remove(self, exchange, pattern, value):
+        """Unbind a value, empty nodes are kept."""
+        node = self._tries.get(exchange)
+        for word in pattern.split("."):
+            if node is None:
+                return
+            node = node.get(word)
+        if node and node.get(None):
+            node[None] = [(seq, v) for seq, v in node[None] if v is not value]
+            self._cache = {}
+
+    def match(self, exchange, routing_key):
+        """ Get values bound to patterns matching a routing key.
+
+        Args:
+            exchange: Exchange name.
+            routing_key: Routing key of a message.
+
+        Returns:
+            values: Tuple of matched values in binding order, a value bound with several matched patterns is returned
+                once.
+        """
+        key = (exchange, routing_key)
+        values = self._cache.get(key)
+        if values is None:
+            values = self._cache[key] = self._match(exchange, routing_key)
+        return values
+
+    def _match(self, exchange, routing_key):
+        root = self._tries.get(exchange)
+        if not root:
+            return ()
+        words = routing_key.split(".")
+        n = len(words)
+        found = []
+        stack = [(root, 0)]
+        visited = set()
+        while stack:
+            node, i = stack.pop()
+            if (id(node), i) in visited:
+                continue
+            visited.add((id(node), i))
+            h = node.get("#")
+            if h is not None:
+                for j in range(i, n + 1):  # `#` eats zero or more words.
+                    stack.append((h, j))
+            if i == n:
+                found.extend(node.get(None, []))
+                continue
+            child = node.get(words[i])
+            if child is not None:
+                stack.append((child, i + 1))
+            child = node.get("*")
+            if child is not None:
+                stack.append((child, i + 1))
+        values = []
+        for _, v in sorted(found, key=lambda x: x[0]):
+            if not any(v is x for x in values):
+                values.append(v)
+        return tuple(values)
+
+
+def benchmark(count=200000, symbols=50):
+    """ Measure dispatch cost per message, compared with a substring if-chain and `split` like the adapters did.
+
+    Args:
+        count: How many messages to dispatch.
+        symbols: How many symbols subscribed, every symbol has 4 channels.
+
+    Returns:
+        result: Nanoseconds per message, `direct` is the cost of awaiting the handler only, e.g.
+            {"direct": 480.3, "router": 560.2, "if_chain": 740.8}
+    """
+    async def handler(*args):
+        pass
+
+    router = MessageRouter()
+    topics = []
+    for i in range(symbols):
+        symbol = "SYM{}USDT".format(i)
+        for topic in ("kline.1." + symbol, "orderbook.50." + symbol, "publicTrade." + symbol, "tickers." + symbol):
+            router.register(topic, handler, symbol)
+            topics.append(topic)
+    messages = [topics[i % len(topics)] for i in range(count)]
+
+    async def run_direct():
+        for topic in messages:
+            await handler(topic, None, None)
+
+    async def run_router():
+        get = router.get
+        for topic in messages:
+            h = get(topic)
+            if h is not None:
+                await h(None, None)
+
+    async def run_if_chain():
+        for topic in messages:
+            if "kline" in topic:
+                await handler(topic.split(".")[2], None, None)
+            elif "orderbook" in topic:
+                await handler(topic.split(".")[2], None, None)
+            elif "publicTrade" in topic:
+                await handler(topic.split(".")[1], None, None)
+            elif "tickers" in topic:
+                await handler(topic.split(".")[1], None, None)
+
+    loop = asyncio.new_event_loop()
+    result = {}
+    try:
+        for name, func in (("direct", run_direct), ("router", run_router), ("if_chain", run_if_chain)):
+            start = time.perf_counter()
+            loop.run_until_complete(func())
+            result[name] = round((time.perf_counter() - start) * 1e9 / count, 1)
+    finally:
+        loop.close()
+    return result
+
+
+if __name__ == "__main__":
+    print("dispatch cost per message(ns):", benchmark())
@@ -0,0 +1,528 @@
+# -*- coding:utf-8 -*-
+
+"""
+Shared memory market snapshots.
+The market process writes the top-N orderbook, ticker and last trade of every symbol into a shared memory region, and
+strategy processes on the same host read them lock-free, no socket, no JSON/zlib decoding.
+
+Region layout, little endian:
+    header: magic(8s) version(I) depth(I) max_symbols(I) count(I) slot_size(I) writer pid(I), padded to 64 bytes.
+    directory: `max_symbols` symbol names, 32 bytes each, utf-8 padded with `\\0`.
+    slots: `max_symbols` slots, every slot is `SLOT_FIELDS + 4 * depth` 8-byte words,
+        word 0 is the sequence of a seqlock, the others are float64 fields and [price, quantity] arrays.
+
+Seqlock: the writer makes the sequence odd, writes fields, then makes it even again. A reader copies the slot with one
+memcpy and retries if the sequence was odd or changed during the copy.
+
+Usage:
+    # Market process, or `BinanceMarket(..., shared_book="quant_book")`.
+    writer = get_writer("quant_book", depth=20)
+    writer.update_orderbook("BTC/USDT", asks, bids, timestamp)
+
+    # Strategy process.
+    reader = SharedBookReader("quant_book")
+    orderbook = reader.get_orderbook("BTC/USDT")  # {"Asks": [[price, quantity], ...], "Bids": ..., "Time": ...}
+
+Benchmark:
+    python -m quant.utils.sharedbook --count 100000 --depth 20
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import os
+import sys
+import time
+import struct
+import argparse
+
+from multiprocessing import shared_memory
+
+
+__all__ = ("SharedBookWriter", "SharedBookReader", "get_writer", )
+
+
+MAGIC = b"QSHMBOOK"
+VERSION = 2
+HEADER = struct.Struct("<8sIIIIII")
+HEADER_SIZE = 64
+COUNT_OFFSET = 20  # Offset of `count` in header.
+NAME_SIZE = 32
+
+# Word index of fields in a slot.
+SEQ = 0
+OB_TIME = 1  # Orderbook time(ms).
+OB_LTIME = 2  # Local time(ms) the orderbook was written.
+ASKS_N = 3
+BIDS_N = 4
+TK_BUY = 5
+TK_BUY_AMOUNT = 6
+TK_SELL = 7
+TK_SELL_AMOUNT = 8
+TK_TIME = 9
+TK_LTIME = 10
+TR_PRICE = 11
+TR_AMOUNT = 12
+TR_SIDE = 13  # 1 is BUY, -1 is SELL.
+TR_TIME = 14
+TR_LTIME = 15
+SLOT_FIELDS = 16
+
+SPIN = 1000  # Max retries of one read, a writer died in the middle of a write leaves the sequence odd.
+BUSY_SPIN = 50  # Retries before yielding CPU, the writer may be preempted in the middle of a write.
+
+
+_CREATED = set()  # Regions created by writers of this process.
+
+
+def _untrack(shm):
+    """Attached readers must not unlink the region at exit, which `resource_tracker` does before Python 3.13."""
+    if shm.name in _CREATED:
+        return
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class _SharedBook:
+    """Layout of a shared book region."""
+
+    def _attach(self, shm):
+        self._shm = shm
+        buf = shm.buf
+        magic, version, depth, max_symbols, _, slot_size, _ = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("shared book layout error, name: {}".format(shm.name))
+        self.depth = depth
+        self.max_symbols = max_symbols
+        self._slot_size = slot_size
+        self._slot_words = slot_size // 8
+        self._dir_offset = HEADER_SIZE
+        self._slot_offset = HEADER_SIZE + NAME_SIZE * max_symbols
+        self._words = buf[self._slot_offset:].cast("Q")
+        self._index = {}  # e.g. {symbol: slot index}
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def count(self):
+        return struct.unpack_from("<I", self._shm.buf, COUNT_OFFSET)[0]
+
+    @property
+    def symbols(self):
+        self._refresh()
+        return list(self._index)
+
+    def _refresh(self):
+        """Load symbols added since last time."""
+        buf = self._shm.buf
+        for i in range(len(self._index), self.count):
+            offset = self._dir_offset + i * NAME_SIZE
+            symbol = bytes(buf[offset:offset + NAME_SIZE]).rstrip(b"\0").decode()
+            self._index[symbol] = i
+
+    @staticmethod
+    def size(depth, max_symbols):
+        return HEADER_SIZE + NAME_SIZE * max_symbols + (SLOT_FIELDS + 4 * depth) * 8 * max_symbols
+
+    def close(self):
+        self._words.release()
+        self._words = None
+        self._shm.close()
+
+
+def _alive(pid):
+    """Whether a process is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner(shm):
+    """Pid of the writer process of an existing region, None if unknown, e.g. an older layout."""
+    if shm.size < HEADER.size:
+        return None
+    magic, version, _, _, _, _, pid = HEADER.unpack_from(shm.buf, 0)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return pid
+
+
+class SharedBookWriter(_SharedBook):
+    """ Writer of a shared book region, only one writer process per region, the pid of the writer is kept in the
+    header, a region left by a writer not exited normally is recreated, and `FileExistsError` is raised if the writer
+    is still running.
+
+    Attributes:
+        name: Shared memory name.
+        depth: Orderbook levels kept of every side, default is 20.
+        max_symbols: Max symbols in the region, default is 256.
+    """
+
+    def __init__(self, name, depth=20, max_symbols=256):
+        """Initialize."""
+        size = self.size(depth, max_symbols)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            old = shared_memory.SharedMemory(name=name)
+            pid = _owner(old)
+            if pid and pid != os.getpid() and _alive(pid):
+                _untrack(old)
+                old.close()
+                raise FileExistsError("shared book is written by another process, name: {} pid: {}".format(name, pid))
+            # Left by a writer not exited normally, recreate it. Attached readers keep the old one until reopened.
+            old.close()
+            old.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _CREATED.add(shm.name)
+        slot_size = (SLOT_FIELDS + 4 * depth) * 8
+        HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, depth, max_symbols, 0, slot_size, os.getpid())
+        self._attach(shm)
+        self._doubles = shm.buf[self._slot_offset:].cast("d")
+        self._side = struct.Struct("<{}d".format(2 * depth))
+
+    def slot(self, symbol):
+        """ Get the slot index of a symbol, allocated at the first time.
+
+        Returns:
+            index: Slot index, None if the region is full.
+        """
+        index = self._index.get(symbol)
+        if index is not None:
+            return index
+        index = len(self._index)
+        if index >= self.max_symbols:
+            return None
+        buf = self._shm.buf
+        offset = self._dir_offset + index * NAME_SIZE
+        buf[offset:offset + NAME_SIZE] = symbol.encode()[:NAME_SIZE].ljust(NAME_SIZE, b"\0")
+        struct.pack_into("<I", buf, COUNT_OFFSET, index + 1)  # Publish the name after it's written.
+        self._index[symbol] = index
+        return index
+
+    def _pack_side(self, base, levels):
+        n = min(len(levels), self.depth)
+        flat = [0.0] * (2 * self.depth)
+        for i in range(n):
+            flat[2 * i] = float(levels[i][0])
+            flat[2 * i + 1] = float(levels[i][1])
+        self._side.pack_into(self._shm.buf, self._slot_offset + base * 8, *flat)
+        return n
+
+    def update_orderbook(self, symbol, asks, bids, timestamp=None):
+        """ Write orderbook.
+
+        Args:
+            symbol: Symbol name.
+            asks: Asks list, e.g. [[price, quantity], ...], price and quantity may be strings.
+            bids: Bids list, e.g. [[price, quantity], ...]
+            timestamp: Orderbook time(ms).
+        """
+        index = self.slot(symbol)
+        if index is None:
+            return
+        base = index * self._slot_words
+        words, d = self._words, self._doubles
+        words[base] += 1
+        asks_n = self._pack_side(base + SLOT_FIELDS, asks)
+        bids_n = self._pack_side(base + SLOT_FIELDS + 2 * self.depth, bids)
+        d[base + OB_TIME] = timestamp or 0
+        d[base + OB_LTIME] = time.time() * 1000
+        d[base + ASKS_N] = asks_n
+        d[base + BIDS_N] = bids_n
+        words[base] += 1
+
+    def update_ticker(self, symbol, buy, buy_amount, sell, sell_amount, timestamp=None):
+        """ Write best bid/ask.
+
+        Args:
+            symbol: Symbol name.
+            buy: Best bid price.
+            buy_amount: Best bid quantity.
+            sell: Best ask price.
+            sell_amount: Best ask quantity.
+            timestamp: Ticker time(ms).
+        """
+        index = self.slot(symbol)
+        if index is None:
+            return
+        base = index * self._slot_words
+        words, d = self._words, self._doubles
+        words[base] += 1
+        d[base + TK_BUY] = float(buy)
+        d[base + TK_BUY_AMOUNT] = float(buy_amount)
+        d[base + TK_SELL] = float(sell)
+        d[base + TK_SELL_AMOUNT] = float(sell_amount)
+        d[base + TK_TIME] = timestamp or 0
+        d[base + TK_LTIME] = time.time() * 1000
+        words[base] += 1
+
+    def update_trade(self, symbol, price, amount, action, timestamp=None):
+        """ Write last trade.
+
+        Args:
+            symbol: Symbol name.
+            price: Trade price.
+            amount: Trade quantity.
+            action: Trade action, BUY or SELL.
+            timestamp: Trade time(ms).
+        """
+        index = self.slot(symbol)
+        if index is None:
+            return
+        base = index * self._slot_words
+        words, d = self._words, self._doubles
+        words[base] += 1
+        d[base + TR_PRICE] = float(price)
+        d[base + TR_AMOUNT] = float(amount)
+        d[base + TR_SIDE] = 1 if action == "BUY" else -1
+        d[base + TR_TIME] = timestamp or 0
+        d[base + TR_LTIME] = time.time() * 1000
+        words[base] += 1
+
+    def close(self):
+        self._doubles.release()
+        self._doubles = None
+        super(SharedBookWriter, self).close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+
+class SharedBookReader(_SharedBook):
+    """ Reader of a shared book region, lookups return the same dicts as market callbacks.
+
+    Attributes:
+        name: Shared memory name.
+    """
+
+    def __init__(self, name):
+        """Initialize."""
+        shm = shared_memory.SharedMemory(name=name)
+        _untrack(shm)
+        self._attach(shm)
+        self._slot = struct.Struct("<{}d".format(self._slot_words))
+
+    def _read(self, symbol):
+        """ Read a consistent copy of a slot.
+
+        Returns:
+            (seq, values): Sequence and float64 fields of the slot, None if symbol not found or always being written.
+        """
+        index = self._index.get(symbol)
+        if index is None:
+            self._refresh()
+            index = self._index.get(symbol)
+            if index is None:
+                return None
+        base = index * self._slot_words
+        words, buf = self._words, self._shm.buf
+        start = self._slot_offset + index * self._slot_size
+        for i in range(SPIN):
+            seq = words[base]
+            if not seq & 1:
+                raw = bytes(buf[start:start + self._slot_size])
+                if words[base] == seq:
+                    return seq, self._slot.unpack(raw)
+            if i >= BUSY_SPIN:
+                os.sched_yield()
+        return None
+
+    def seq(self, symbol):
+        """Sequence of a symbol, increased by 2 every update, readers can poll it to find changes."""
+        index = self._index.get(symbol)
+        if index is None:
+            self._refresh()
+            index = self._index.get(symbol)
+            if index is None:
+                return None
+        return self._words[index * self._slot_words]
+
+    def get_orderbook(self, symbol):
+        """ Get orderbook.
+
+        Returns:
+            orderbook: e.g. {"symbol": "BTC/USDT", "Asks": [[price, quantity], ...], "Bids": [[price, quantity], ...],
+                "Time": 1539486224000, "LocalTime": 1539486224001.5}, None if not found.
+        """
+        result = self._read(symbol)
+        if not result or not result[1][OB_LTIME]:
+            return None
+        v = result[1]
+        asks_base = SLOT_FIELDS
+        bids_base = SLOT_FIELDS + 2 * self.depth
+        orderbook = {
+            "symbol": symbol,
+            "Asks": [[v[asks_base + 2 * i], v[asks_base + 2 * i + 1]] for i in range(int(v[ASKS_N]))],
+            "Bids": [[v[bids_base + 2 * i], v[bids_base + 2 * i + 1]] for i in range(int(v[BIDS_N]))],
+            "Time": int(v[OB_TIME]),
+            "LocalTime": v[OB_LTIME]
+        }
+        return orderbook
+
+    def get_ticker(self, symbol):
+        """ Get best bid/ask.
+
+        Returns:
+            ticker: e.g. {"symbol": "BTC/USDT", "Buy": 1.0, "Buyamount": 1.0, "Sell": 1.1, "Sellamount": 1.0,
+                "Time": 1539486224000, "LocalTime": 1539486224001.5}, None if not found.
+        """
+        result = self._read(symbol)
+        if not result or not result[1][TK_LTIME]:
+            return None
+        v = result[1]
+        ticker = {
+            "symbol": symbol,
+            "Buy": v[TK_BUY],
+            "Buyamount": v[TK_BUY_AMOUNT],
+            "Sell": v[TK_SELL],
+            "Sellamount": v[TK_SELL_AMOUNT],
+            "Time": int(v[TK_TIME]),
+            "LocalTime": v[TK_LTIME]
+        }
+        return ticker
+
+    def get_trade(self, symbol):
+        """ Get last trade.
+
+        Returns:
+            trade: e.g. {"symbol": "BTC/USDT", "Type": "BUY", "Price": 1.0, "Amount": 1.0, "Time": 1539486224000,
+                "LocalTime": 1539486224001.5}, None if not found.
+        """
+        result = self._read(symbol)
+        if not result or not result[1][TR_LTIME]:
+            return None
+        v = result[1]
+        trade = {
+            "symbol": symbol,
+            "Type": "BUY" if v[TR_SIDE] > 0 else "SELL",
+            "Price": v[TR_PRICE],
+            "Amount": v[TR_AMOUNT],
+            "Time": int(v[TR_TIME]),
+            "LocalTime": v[TR_LTIME]
+        }
+        return trade
+
+
+_WRITERS = {}
+
+
+def get_writer(name, depth=20, max_symbols=256):
+    """ Get the writer of a region, all market objects of one process share one writer per region.
+
+    Args:
+        name: Shared memory name.
+        depth: Orderbook levels kept of every side, only used when created.
+        max_symbols: Max symbols in the region, only used when created.
+
+    Returns:
+        writer: SharedBookWriter object.
+    """
+    writer = _WRITERS.get(name)
+    if writer is None:
+        writer = _WRITERS[name] = SharedBookWriter(name, depth, max_symbols)
+    return writer
+
+
+def _bench_writer(name, depth, count, interval):
+    writer = SharedBookWriter(name, depth, 4)
+    asks = [[100.0 + i, 1.0] for i in range(depth)]
+    bids = [[99.0 - i, 1.0] for i in range(depth)]
+    time.sleep(1)  # Let the reader attach.
+    for i in range(count):
+        asks[0][1] = i
+        writer.update_orderbook("BTC/USDT", asks, bids, i)
+        if interval:
+            end = time.perf_counter() + interval
+            while time.perf_counter() < end:
+                os.sched_yield()
+    time.sleep(0.5)
+    writer.close()
+    writer.unlink()
+
+
+def benchmark(depth=20, count=100000, interval=0.0001):
+    """ Benchmark shared book against JSON+zlib decoding, a writer process updates one symbol and this process reads.
+
+    Args:
+        depth: Orderbook levels of every side.
+        count: Updates written.
+        interval: Seconds between two updates.
+
+    Returns:
+        result: e.g. {"read_us": 2.1, "decode_us": 35.2, "latency_us": {...}, "updates": 100000, "seen": 62000}
+    """
+    import json
+    import zlib
+    import multiprocessing
+    from quant.utils.clock import LatencyHistogram
+
+    name = "quant_book_bench"
+    process = multiprocessing.Process(target=_bench_writer, args=(name, depth, count, interval))
+    process.start()
+    reader = None
+    while reader is None:
+        try:
+            reader = SharedBookReader(name)
+        except (FileNotFoundError, ValueError):
+            time.sleep(0.01)
+    histogram = LatencyHistogram((1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000))
+    last, seen, reads, read_time = 0, 0, 0, 0
+    while True:
+        seq = reader.seq("BTC/USDT")
+        if seq is None or seq == last:
+            os.sched_yield()  # Polling strategies should yield too when sharing cores with the writer.
+            continue
+        start = time.perf_counter()
+        orderbook = reader.get_orderbook("BTC/USDT")
+        read_time += time.perf_counter() - start
+        reads += 1
+        if not orderbook:
+            continue
+        histogram.record((time.time() * 1000 - orderbook["LocalTime"]) * 1000)
+        last = seq
+        seen += 1
+        if orderbook["Time"] == count - 1:
+            break
+    process.join()
+    reader.close()
+
+    payload = zlib.compress(json.dumps({"n": "Orderbook", "d": orderbook}).encode())
+    start = time.perf_counter()
+    for _ in range(1000):
+        json.loads(zlib.decompress(payload))
+    decode_us = (time.perf_counter() - start) * 1000
+
+    result = {
+        "depth": depth,
+        "updates": count,
+        "seen": seen,
+        "read_us": round(read_time / max(reads, 1) * 1000000, 3),
+        "decode_us": round(decode_us, 3),
+        "latency_us": histogram.data
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared book benchmark.")
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--interval", type=float, default=0.0001)
+    args = parser.parse_args()
+    sys.argv = sys.argv[:1]  # `quant.utils.sqlite3db` loads sys.argv[1] as config file when first used.
+    print(benchmark(args.depth, args.count, args.interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,15 +17,13 @@ from quant.utils import tools
 
 
 
-if len(sys.argv) > 1:
-    config_file = sys.argv[1]
-else:
-    config_file = None
 SERVER_ID = "0"
+_loaded = False
 
 
 def loads(config_file=None,configsrc="file"):
-    global SERVER_ID
+    global SERVER_ID, _loaded
+    _loaded = True
     configures = {}
     if configsrc == "file" : 
         if config_file:
@@ -47,7 +45,13 @@ def loads(config_file=None,configsrc="file"):
                 exit(0)
     SERVER_ID=configures.get("SERVER_ID", "0")
 
-loads(config_file,configsrc="file")      
+
+def get_server_id():
+    """ 机器人ID，第一次使用时从命令行参数 `sys.argv[1]` 的配置文件中读取 `SERVER_ID`，默认为 "0"
+    """
+    if not _loaded:
+        loads(sys.argv[1] if len(sys.argv) > 1 else None, configsrc="file")
+    return SERVER_ID
 
 
 class Sqlitedb:
@@ -57,11 +61,10 @@ class Sqlitedb:
         db: DB name.
         collection: Collection name.
     """
-    global SERVER_ID
 
-    def __init__(self,robotId=SERVER_ID,Logtocmd = False):
+    def __init__(self,robotId=None,Logtocmd = False):
         """ Initialize. """
-        self.robotid = robotId
+        self.robotid = robotId or get_server_id()
         self.Logtocmd = Logtocmd
         self._conn = sqlite3.connect(self.robotid+".db3",check_same_thread=False)
         self._cursor = self._conn.cursor()
@@ -0,0 +1,214 @@
+# -*- coding:utf-8 -*-
+
+"""
+Feed staleness monitor.
+Track the last update time and update rate of every (symbol, channel) market feed, if a feed goes quiet, call the
+stale callback and resubscribe only that stream, so that an open but silent socket for one symbol will be found.
+Event-driven feeds, e.g. trades and klines of an illiquid symbol, may be quiet for a long time, they are not checked
+unless a fixed stale threshold is given.
+
+Usage:
+    monitor = FeedMonitor(stale_callback=on_stale)
+    feed = monitor.register("BTCUSDT", "orderbook", resubscribe=resubscribe_orderbook)
+    ...
+    feed.touch()  # on every message of this feed.
+    ...
+    if monitor.is_fresh("BTCUSDT", "orderbook"): quote ...
+
+Author: xunfeng
+Date:   2026/10/19
+Email:  xunfeng@test.com
+"""
+
+import time
+import asyncio
+
+from quant.utils import logger
+from quant.tasks import SingleTask
+
+
+__all__ = ("Feed", "FeedMonitor", )
+
+
+class Feed:
+    """ A (symbol, channel) market feed.
+
+    Attributes:
+        symbol: Symbol name.
+        channel: Channel name, e.g. orderbook/trade/kline/tickers.
+        stale_ms: Fixed stale threshold(milliseconds), if None, the threshold is learned from the update rate.
+        resubscribe: Asynchronous function to resubscribe (or re-snapshot) this feed only, e.g.
+            async def resubscribe(symbol, channel): pass
+        last_update: Monotonic time(seconds) of the latest update, None if no update yet.
+        interval: Exponential moving average of the update interval(seconds).
+        stale: If this feed is stale right now.
+        stale_count: How many times this feed went stale.
+    """
+
+    __slots__ = ("symbol", "channel", "stale_ms", "resubscribe", "last_update", "interval", "stale", "stale_count",
+                 "_last_action", "_created")
+
+    def __init__(self, symbol, channel, stale_ms=None, resubscribe=None):
+        """Initialize."""
+        self.symbol = symbol
+        self.channel = channel
+        self.stale_ms = stale_ms
+        self.resubscribe = resubscribe
+        self.last_update = None
+        self.interval = None
+        self.stale = False
+        self.stale_count = 0
+        self._last_action = 0
+        self._created = time.monotonic()
+
+    def touch(self):
+        """Record an update, must be cheap, it's called for every message."""
+        now = time.monotonic()
+        last = self.last_update
+        if last is not None:
+            delta = now - last
+            self.interval = delta if self.interval is None else self.interval * 0.9 + delta * 0.1
+        self.last_update = now
+
+    def age_ms(self, now=None):
+        """Milliseconds since the latest update, or since registered if no update yet."""
+        if now is None:
+            now = time.monotonic()
+        return (now - (self.last_update or self._created)) * 1000
+
+    @property
+    def data(self):
+        d = {
+            "symbol": self.symbol,
+            "channel": self.channel,
+            "age_ms": round(self.age_ms(), 1),
+            "interval_ms": round(self.interval * 1000, 1) if self.interval is not None else None,
+            "stale": self.stale,
+            "stale_count": self.stale_count
+        }
+        return d
+
+    def __str__(self):
+        return str(self.data)
+
+    def __repr__(self):
+        return str(self)
+
+
+class FeedMonitor:
+    """ Staleness monitor of market feeds.
+
+    Attributes:
+        stale_callback: Asynchronous callback function will be called when a feed goes stale, e.g.
+            async def stale_callback(feed: Feed): pass
+        check_interval_ms: Check interval(milliseconds), a quiet feed is found within `threshold + check_interval_ms`,
+            default is 100ms.
+        min_stale_ms: Min stale threshold(milliseconds) learned from the update rate, default is 1000ms.
+        max_stale_ms: Stale threshold(milliseconds) before any update rate learned, default is 30000ms.
+        factor: Learned threshold is `factor` times of the average update interval, not capped, so a slow feed is
+            not resubscribed again and again, default is 10.
+        event_channels: Channels updated only when something happens, not checked unless `stale_ms` of the feed is
+            given, default is ("trade", "kline").
+        retry_ms: Min interval(milliseconds) to resubscribe again while a feed is still stale, default is 5000ms.
+    """
+
+    def __init__(self, stale_callback=None, check_interval_ms=100, min_stale_ms=1000, max_stale_ms=30000, factor=10,
+                 retry_ms=5000, event_channels=("trade", "kline")):
+        """Initialize."""
+        self._stale_callback = stale_callback
+        self._check_interval = check_interval_ms / 1000
+        self._min_stale_ms = min_stale_ms
+        self._max_stale_ms = max_stale_ms
+        self._factor = factor
+        self._retry_ms = retry_ms
+        self._event_channels = set(event_channels or ())
+        self._feeds = {}  # e.g. {(symbol, channel): feed, ... }
+        self._running = False
+
+    @property
+    def feeds(self):
+        return list(self._feeds.values())
+
+    def register(self, symbol, channel, stale_ms=None, resubscribe=None):
+        """ Register a feed to be monitored, the check loop starts with the first feed registered.
+
+        Args:
+            symbol: Symbol name.
+            channel: Channel name.
+            stale_ms: Fixed stale threshold(milliseconds), default is None, learned from the update rate.
+            resubscribe: Asynchronous function to resubscribe this feed, called as `resubscribe(symbol, channel)`.
+
+        Returns:
+            feed: Feed object, call `feed.touch()` on every message of this feed.
+        """
+        feed = self._feeds.get((symbol, channel))
+        if not feed:
+            feed = Feed(symbol, channel, stale_ms, resubscribe)
+            self._feeds[(symbol, channel)] = feed
+        else:
+            feed.stale_ms = stale_ms
+            feed.resubscribe = resubscribe
+        if not self._running:
+            self._running = True
+            asyncio.get_event_loop().call_later(self._check_interval, self._check)
+        return feed
+
+    def unregister(self, symbol, channel):
+        self._feeds.pop((symbol, channel), None)
+
+    def get(self, symbol, channel):
+        return self._feeds.get((symbol, channel))
+
+    def threshold_ms(self, feed):
+        """Stale threshold(milliseconds) of a feed."""
+        if feed.stale_ms:
+            return feed.stale_ms
+        if feed.interval is None:
+            return self._max_stale_ms
+        return max(feed.interval * 1000 * self._factor, self._min_stale_ms)
+
+    def is_fresh(self, symbol, channel, max_age_ms=None):
+        """ If a feed is fresh enough to be used, e.g. before quoting off an orderbook.
+
+        Args:
+            symbol: Symbol name.
+            channel: Channel name.
+            max_age_ms: Max age(milliseconds) of the latest update, default is the stale threshold of this feed.
+
+        Returns:
+            fresh: True or False, a feed not registered or never updated is not fresh.
+        """
+        feed = self._feeds.get((symbol, channel))
+        if not feed or feed.last_update is None:
+            return False
+        if max_age_ms is None:
+            max_age_ms = self.threshold_ms(feed)
+        return feed.age_ms() <= max_age_ms
+
+    def _check(self):
+        """Find out quiet feeds, run every `check_interval_ms`."""
+        if not self._feeds:
+            self._running = False
+            return
+        asyncio.get_event_loop().call_later(self._check_interval, self._check)
+        now = time.monotonic()
+        for feed in self._feeds.values():
+            if not feed.stale_ms and feed.channel in self._event_channels:
+                continue
+            age = feed.age_ms(now)
+            if age <= self.threshold_ms(feed):
+                if feed.stale:
+                    feed.stale = False
+                    logger.info("feed recovered:", feed.symbol, feed.channel, caller=self)
+                continue
+            if feed.stale and (now - feed._last_action) * 1000 < max(self.threshold_ms(feed), self._retry_ms):
+                continue
+            if not feed.stale:
+                feed.stale = True
+                feed.stale_count += 1
+                logger.warn("feed stale:", feed.symbol, feed.channel, "age(ms):", round(age, 1), caller=self)
+                if self._stale_callback:
+                    SingleTask.run(self._stale_callback, feed)
+            feed._last_action = now
+            if feed.resubscribe:
+                SingleTask.run(feed.resubscribe, feed.symbol, feed.channel)
@@ -12,27 +12,35 @@ import uuid
 import time
 import decimal
 import datetime
-import requests
 import json
 import asyncio
-import psutil
 import os
 from datetime import timedelta
 from datetime import timezone
 
 
+_time = time.time  # 当前时间戳的时间源，回放行情时替换为虚拟时钟
+
+
+def set_time_func(func=None):
+    """ 设置 get_cur_timestamp / get_cur_timestamp_ms 的时间源
+    @param func 返回当前时间戳(秒，浮点数)的函数，None为恢复 time.time
+    """
+    global _time
+    _time = func or time.time
+
 
 def get_cur_timestamp():
     """ 获取当前时间戳
     """
-    ts = int(time.time())
+    ts = int(_time())
     return ts
 
 
 def get_cur_timestamp_ms():
     """ 获取当前时间戳(毫秒)
     """
-    ts = int(time.time() * 1000)
+    ts = int(_time() * 1000)
     return ts
 
 
@@ -232,6 +240,7 @@ def C_N(num, Precision):
 def GetUSDCNY():
     USDCNY = 7
     try:
+        import requests
         trynum = 0
         while trynum<3:
             t = time.time()
@@ -274,6 +283,7 @@ def getmemoryinfo():
     pidmemory = 0
     pid = 0
     try:
+        import psutil
         info = psutil.virtual_memory()
         percent = info.percent #内存使用占比
         used = info.used/1024/1024 #MB
@@ -9,6 +9,8 @@ Email:  xunfeng@test.com
 
 import json
 import base64
+import random
+import asyncio
 
 import aiohttp
 from aiohttp import web
@@ -19,10 +21,18 @@ from quant.utils import logger
 from quant.config import config
 from quant.utils import exceptions
 from quant.tasks import LoopRunTask, SingleTask
+from quant.utils.compress import PARSE_IN_THREAD_SIZE
+from quant.utils.clock import set_receive_time
+from quant.utils.recorder import get_recorder, KIND_TEXT, KIND_BINARY
 
 
 __all__ = ("routes", "WebViewBase", "AuthToken", "auth_middleware", "error_middleware", "options_middleware",
-           "Websocket", "AsyncHttpRequests")
+           "Websocket", "ConnectionStats", "AsyncHttpRequests", "get_websocket_session", "reconnect_delay",
+           "loads_message")
+
+
+# Kinds of frames recorded by the recorder.
+RECORD_KINDS = {aiohttp.WSMsgType.TEXT: KIND_TEXT, aiohttp.WSMsgType.BINARY: KIND_BINARY}
 
 routes = web.RouteTableDef()
 
@@ -133,6 +143,116 @@ async def options_middleware(request, handler):
     return response
 
 
+# One session for every Websocket connection in this process, created lazily inside the running event loop.
+_WS_SESSION = None
+
+
+def get_websocket_session():
+    """ Get the process wide Websocket session, if no session or the session was closed, create a new.
+
+    Returns:
+        session: aiohttp client session.
+    """
+    global _WS_SESSION
+    if not _WS_SESSION or _WS_SESSION.closed:
+        _WS_SESSION = aiohttp.ClientSession()
+    return _WS_SESSION
+
+
+def reconnect_delay(attempts, base=0.5, cap=30):
+    """ Jittered exponential backoff delay for a re-connection.
+
+    Args:
+        attempts: How many consecutive connect attempts already failed.
+        base: Backoff base time(seconds), default is 0.5s.
+        cap: Max backoff time(seconds), default is 30s.
+
+    Returns:
+        delay: Time(seconds) to wait before next connect attempt, a random value in [0, min(cap, base * 2^attempts)].
+    """
+    return random.uniform(0, min(cap, base * (2 ** min(attempts, 16))))
+
+
+def loads_message(text):
+    """ Parse a `text` Websocket message as json, if it's not json format, return the raw string.
+    """
+    try:
+        return json.loads(text)
+    except:
+        return text
+
+
+class ConnectionStats:
+    """ Connection statistics for a Websocket connection.
+
+    Attributes:
+        connect_count: How many times the connection was established.
+        reconnect_count: How many times the connection was re-established.
+        failed_attempts: Consecutive failed connect attempts since the last message received.
+        connected_at: Millisecond timestamp of current connection established.
+        first_message_at: Millisecond timestamp of first message received on current connection.
+        time_to_first_message: Milliseconds between connection established and first message received.
+    """
+
+    def __init__(self):
+        """Initialize."""
+        self.connect_count = 0
+        self.failed_attempts = 0
+        self.connected_at = None
+        self.first_message_at = None
+        self.time_to_first_message = None
+
+    @property
+    def reconnect_count(self):
+        return max(self.connect_count - 1, 0)
+
+    @property
+    def uptime(self):
+        """Milliseconds since current connection established, 0 if not connected."""
+        if not self.connected_at:
+            return 0
+        return tools.get_cur_timestamp_ms() - self.connected_at
+
+    def on_connect_failed(self):
+        self.failed_attempts += 1
+
+    def on_connected(self):
+        self.connect_count += 1
+        self.connected_at = tools.get_cur_timestamp_ms()
+        self.first_message_at = None
+        self.time_to_first_message = None
+
+    def on_disconnected(self):
+        self.connected_at = None
+
+    def on_message(self):
+        """Only the first message of a connection should be recorded, return True if it is."""
+        if self.first_message_at:
+            return False
+        self.first_message_at = tools.get_cur_timestamp_ms()
+        if self.connected_at:
+            self.time_to_first_message = self.first_message_at - self.connected_at
+        self.failed_attempts = 0
+        return True
+
+    @property
+    def data(self):
+        d = {
+            "uptime": self.uptime,
+            "reconnect_count": self.reconnect_count,
+            "failed_attempts": self.failed_attempts,
+            "connected_at": self.connected_at,
+            "time_to_first_message": self.time_to_first_message
+        }
+        return d
+
+    def __str__(self):
+        return json.dumps(self.data)
+
+    def __repr__(self):
+        return str(self)
+
+
 class Websocket:
     """ Websocket connection.
 
@@ -146,73 +266,217 @@ class Websocket:
             connection, this function only callback `binary` message. e.g.
                 async def process_binary_callback(binary_message): pass
         check_conn_interval: Check Websocket connection interval time(seconds), default is 10s.
+        channel_live_callback: Asynchronous callback function will be called when a channel subscribed by `subscribe`
+            receives its first message after (re)connected. e.g.
+                async def channel_live_callback(channel): pass
+        channel_getter: Function to get channel name from a decoded `text/json` message, e.g. lambda msg: msg["topic"].
+            If not set, all subscribed channels become live at the first message.
+        reconnect_base: Re-connection backoff base time(seconds), default is 0.5s.
+        reconnect_max: Re-connection max backoff time(seconds), default is 30s.
+        compress: Offer permessage-deflate with this window bits, servers not support it just ignore the offer,
+            0 means no compression, default is 15.
+        parse_in_thread_size: `text` messages larger than this size will be parsed in a worker thread, messages are
+            still processed in order, 0 means never, default is 64KB.
+
+    Raw frames received are recorded by the recorder of `RECORDER` config, if configured.
     """
 
     def __init__(self, url, connected_callback=None, process_callback=None, process_binary_callback=None,
-                 check_conn_interval=10):
+                 check_conn_interval=10, channel_live_callback=None, channel_getter=None, reconnect_base=0.5,
+                 reconnect_max=30, compress=15, parse_in_thread_size=PARSE_IN_THREAD_SIZE):
         """Initialize."""
         self._url = url
         self._connected_callback = connected_callback
         self._process_callback = process_callback
         self._process_binary_callback = process_binary_callback
         self._check_conn_interval = check_conn_interval
+        self._channel_live_callback = channel_live_callback
+        self._channel_getter = channel_getter
+        self._reconnect_base = reconnect_base
+        self._reconnect_max = reconnect_max
+        self._compress = compress
+        self._parse_in_thread_size = parse_in_thread_size
         self._ws = None  # Websocket connection object.
+        self._connecting = False  # If a connect loop is running.
+        self._subscriptions = {}  # Subscriptions to be replayed after re-connected. e.g. {key: (data, channels), ... }
+        self._subscribed = set()  # Subscription keys already sent on current connection.
+        self._pending_channels = set()  # Channels subscribed but no message received yet on current connection.
+        self._stats = ConnectionStats()
+        self._recorder = get_recorder()
+        self._conn_id = self._recorder.register(url) if self._recorder else None
 
     @property
     def ws(self):
         return self._ws
 
+    @property
+    def stats(self):
+        return self._stats
+
+    @property
+    def pending_channels(self):
+        return set(self._pending_channels)
+
     def initialize(self):
+        from quant.replay import attach_replay
+        if attach_replay(self):
+            return  # Messages are fed by the replay engine, no connection.
         LoopRunTask.register(self._check_connection, self._check_conn_interval)
         SingleTask.run(self._connect)
 
+    async def feed(self, kind, data):
+        """ Process a raw frame the same as received, used by the replay engine.
+
+        Args:
+            kind: `KIND_TEXT` / `KIND_BINARY`.
+            data: Frame data, str for text frame, bytes for binary frame.
+        """
+        set_receive_time(tools.get_cur_timestamp_ms())
+        if kind == KIND_TEXT:
+            if self._process_callback:
+                await self._process_callback(loads_message(data))
+        elif self._process_binary_callback:
+            await self._process_binary_callback(data)
+
     async def _connect(self):
-        logger.info("url:", self._url, caller=self)
-        proxy = config.proxy
-        session = aiohttp.ClientSession()
-        try:
-            self._ws = await session.ws_connect(self._url, proxy=proxy)
-        except aiohttp.client_exceptions.ClientConnectorError as e:
-            logger.error("connect to Websocket server error! url:", self._url,e, caller=self)
+        """Connect to Websocket server, retry with jittered exponential backoff until success."""
+        if self._connecting:
             return
+        self._connecting = True
+        try:
+            while True:
+                logger.info("url:", self._url, caller=self)
+                try:
+                    self._ws = await get_websocket_session().ws_connect(self._url, proxy=config.proxy,
+                                                                        compress=self._compress)
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    delay = reconnect_delay(self._stats.failed_attempts, self._reconnect_base, self._reconnect_max)
+                    self._stats.on_connect_failed()
+                    logger.error("connect to Websocket server error! url:", self._url, e, "retry after(s):",
+                                 round(delay, 3), caller=self)
+                    await asyncio.sleep(delay)
+        finally:
+            self._connecting = False
+        self._stats.on_connected()
+        if self._recorder:
+            self._recorder.connected(self._conn_id)
+        self._subscribed = set()
+        self._pending_channels = set()
+        SingleTask.run(self._receive)
+        await self._replay_subscriptions()
         if self._connected_callback:
             SingleTask.run(self._connected_callback)
-        SingleTask.run(self._receive)
 
-    async def _reconnect(self):
-        """Re-connect to Websocket server."""
-        logger.warn("reconnecting to Websocket server right now!", caller=self)
+    async def _reconnect(self, ws=None):
+        """ Re-connect to Websocket server.
+
+        Args:
+            ws: The connection to be replaced, if it has already been replaced, do nothing.
+        """
+        if ws is not None and ws is not self._ws:
+            return
+        logger.warn("reconnecting to Websocket server right now!", caller=self, **self._stats.data)
+        self._stats.on_disconnected()
+        ws, self._ws = self._ws, None
+        if ws and not ws.closed:
+            await ws.close()
         await self._connect()
 
+    async def _replay_subscriptions(self):
+        """Send all subscriptions recorded by `subscribe` again on the new connection."""
+        for key, (data, channels) in list(self._subscriptions.items()):
+            if key in self._subscribed:
+                continue
+            self._subscribed.add(key)
+            self._pending_channels.update(channels)
+            await self.send(data)
+        if self._subscriptions:
+            logger.info("replay subscriptions:", len(self._subscriptions), caller=self)
+
+    async def subscribe(self, data, channels=None):
+        """ Send a subscribe message and remember it, so it will be replayed automatically after re-connected.
+
+        Args:
+            data: Subscribe message, must be dict or string.
+            channels: Channel names this message subscribes, used for `channel_live_callback`, default is [data].
+
+        Returns:
+            If send successfully, return True, otherwise return False. A message already sent on current connection
+            will not be sent again.
+        """
+        key = json.dumps(data, sort_keys=True) if isinstance(data, dict) else str(data)
+        if not channels:
+            channels = [key]
+        self._subscriptions[key] = (data, list(channels))
+        if key in self._subscribed:
+            return True
+        if not self._ws or self._ws.closed:
+            return False
+        self._subscribed.add(key)
+        self._pending_channels.update(channels)
+        return await self.send(data)
+
+    def _check_channel_live(self, data):
+        """Mark channel(s) live when the first message of them received."""
+        if self._channel_getter:
+            try:
+                channels = [self._channel_getter(data)]
+            except:
+                return
+        else:
+            channels = list(self._pending_channels)
+        for channel in channels:
+            if channel not in self._pending_channels:
+                continue
+            self._pending_channels.discard(channel)
+            logger.info("channel live:", channel, "uptime(ms):", self._stats.uptime, caller=self)
+            if self._channel_live_callback:
+                SingleTask.run(self._channel_live_callback, channel)
+
     async def _receive(self):
         """Receive stream message from Websocket connection."""
-        async for msg in self.ws:
+        ws = self._ws
+        recorder = self._recorder
+        async for msg in ws:
+            set_receive_time()
+            if recorder and msg.type in RECORD_KINDS:
+                recorder.record(self._conn_id, RECORD_KINDS[msg.type], msg.data)
+            if self._stats.on_message():
+                logger.info("first message received, time to first message(ms):",
+                            self._stats.time_to_first_message, caller=self)
             if msg.type == aiohttp.WSMsgType.TEXT:
+                if self._parse_in_thread_size and len(msg.data) >= self._parse_in_thread_size:
+                    data = await asyncio.get_event_loop().run_in_executor(None, loads_message, msg.data)
+                else:
+                    data = loads_message(msg.data)
+                if self._pending_channels:
+                    self._check_channel_live(data)
                 if self._process_callback:
-                    try:
-                        data = json.loads(msg.data)
-                    except:
-                        data = msg.data
                     SingleTask.run(self._process_callback, data)
             elif msg.type == aiohttp.WSMsgType.BINARY:
                 if self._process_binary_callback:
                     SingleTask.run(self._process_binary_callback, msg.data)
             elif msg.type == aiohttp.WSMsgType.CLOSED:
                 logger.warn("receive event CLOSED:", msg, caller=self)
-                SingleTask.run(self._reconnect)
-                return
+                break
             elif msg.type == aiohttp.WSMsgType.ERROR:
                 logger.error("receive event ERROR:", msg, caller=self)
             else:
                 logger.warn("unhandled msg:", msg, caller=self)
+        # The connection was closed by server or network, do not wait for `_check_connection`.
+        if ws is self._ws:
+            SingleTask.run(self._reconnect, ws)
 
     async def _check_connection(self, *args, **kwargs):
         """Check Websocket connection, if connection closed, re-connect immediately."""
+        if self._connecting:
+            return
         if not self.ws:
             logger.warn("Websocket connection not connected yet!", caller=self)
             return
         if self.ws.closed:
-            SingleTask.run(self._reconnect)
+            SingleTask.run(self._reconnect, self.ws)
 
     async def send(self, data):
         """ Send message to Websocket server.
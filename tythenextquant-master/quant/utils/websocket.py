@@ -14,27 +14,57 @@ import asyncio
 from quant.utils import logger
 from quant.config import config
 from quant.heartbeat import heartbeat
+from quant.utils.compress import PARSE_IN_THREAD_SIZE
+from quant.utils import tools
+from quant.utils.clock import set_receive_time
+from quant.utils.recorder import get_recorder, KIND_TEXT
+from quant.utils.web import ConnectionStats, get_websocket_session, reconnect_delay, loads_message, RECORD_KINDS
 
 
 class Websocket:
     """ websocket接口封装
     """
 
-    def __init__(self, url, check_conn_interval=10, send_hb_interval=10):
+    def __init__(self, url, check_conn_interval=10, send_hb_interval=10, reconnect_base=0.5, reconnect_max=30,
+                 compress=15, parse_in_thread_size=PARSE_IN_THREAD_SIZE):
         """ 初始化
         @param url 建立websocket的地址
         @param check_conn_interval 检查websocket连接时间间隔
         @param send_hb_interval 发送心跳时间间隔，如果是0就不发送心跳消息
+        @param reconnect_base 重连退避基础时间(秒)
+        @param reconnect_max 重连退避最大时间(秒)
+        @param compress 协商 permessage-deflate 压缩的窗口大小，服务器不支持时自动忽略，0为不压缩
+        @param parse_in_thread_size 超过该大小的text消息在工作线程中解析(消息顺序不变)，0为不使用线程
+        * NOTE: 配置了 RECORDER 时，接收到的原始消息由录制器保存
         """
         self._url = url
         self._check_conn_interval = check_conn_interval
         self._send_hb_interval = send_hb_interval
+        self._reconnect_base = reconnect_base
+        self._reconnect_max = reconnect_max
+        self._compress = compress
+        self._parse_in_thread_size = parse_in_thread_size
         self.ws = None  # websocket连接对象
         self.heartbeat_msg = None  # 心跳消息
+        self._connecting = False  # 是否正在建立连接
+        self._subscriptions = {}  # 重连后需要重放的订阅消息 {key: (data, channels)}
+        self._subscribed = set()  # 当前连接上已发送的订阅
+        self._pending_channels = set()  # 已订阅但当前连接上还未收到消息的频道
+        self._stats = ConnectionStats()  # 连接统计: 在线时长、重连次数、首条消息耗时
+        self._recorder = get_recorder()  # 原始消息录制器，未配置时为None
+        self._conn_id = self._recorder.register(url) if self._recorder else None
+
+    @property
+    def stats(self):
+        return self._stats
 
     def initialize(self):
         """ 初始化
         """
+        # 行情回放时由回放引擎推送消息，不建立连接
+        from quant.replay import attach_replay
+        if attach_replay(self):
+            return
         # 注册服务 检查连接是否正常
         heartbeat.register(self._check_connection, self._check_conn_interval)
         # 注册服务 发送心跳
@@ -44,23 +74,105 @@ class Websocket:
         asyncio.get_event_loop().create_task(self._connect())
 
     async def _connect(self):
-        logger.info("url:", self._url, caller=self)
-        proxy = config.proxy
-        session = aiohttp.ClientSession()
-        try:
-            self.ws = await session.ws_connect(self._url, proxy=proxy)
-        except aiohttp.client_exceptions.ClientConnectorError:
-            logger.error("connect to server error! url:", self._url, caller=self)
+        """ 建立websocket连接，失败后按带抖动的指数退避立即重试，直到连接成功
+        """
+        if self._connecting:
             return
-        asyncio.get_event_loop().create_task(self.connected_callback())
+        self._connecting = True
+        try:
+            while True:
+                logger.info("url:", self._url, caller=self)
+                try:
+                    self.ws = await get_websocket_session().ws_connect(self._url, proxy=config.proxy,
+                                                                       compress=self._compress)
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    delay = reconnect_delay(self._stats.failed_attempts, self._reconnect_base, self._reconnect_max)
+                    self._stats.on_connect_failed()
+                    logger.error("connect to server error! url:", self._url, e, "retry after(s):", round(delay, 3),
+                                 caller=self)
+                    await asyncio.sleep(delay)
+        finally:
+            self._connecting = False
+        self._stats.on_connected()
+        if self._recorder:
+            self._recorder.connected(self._conn_id)
+        self._subscribed = set()
+        self._pending_channels = set()
         asyncio.get_event_loop().create_task(self.receive())
+        await self._replay_subscriptions()
+        asyncio.get_event_loop().create_task(self.connected_callback())
 
-    async def _reconnect(self):
+    async def _reconnect(self, ws=None):
         """ 重新建立websocket连接
+        @param ws 需要被替换的连接，如果已经被替换则不做处理
         """
-        logger.warn("reconnecting websocket right now!", caller=self)
+        if ws is not None and ws is not self.ws:
+            return
+        logger.warn("reconnecting websocket right now!", caller=self, **self._stats.data)
+        self._stats.on_disconnected()
+        ws, self.ws = self.ws, None
+        if ws and not ws.closed:
+            await ws.close()
         await self._connect()
 
+    async def _replay_subscriptions(self):
+        """ 在新连接上重放所有通过 subscribe 记录的订阅
+        """
+        for key, (data, channels) in list(self._subscriptions.items()):
+            if key in self._subscribed:
+                continue
+            self._subscribed.add(key)
+            self._pending_channels.update(channels)
+            await self._send(data)
+        if self._subscriptions:
+            logger.info("replay subscriptions:", len(self._subscriptions), caller=self)
+
+    async def subscribe(self, data, channels=None):
+        """ 发送订阅消息并记录，重连后自动重放
+        @param data 订阅消息，dict或者str
+        @param channels 该消息订阅的频道名称列表，用于 channel_live 回调，默认为 [data]
+        @return 发送成功返回True，否则返回False；当前连接上已发送过的订阅不会重复发送
+        """
+        key = json.dumps(data, sort_keys=True) if isinstance(data, dict) else str(data)
+        if not channels:
+            channels = [key]
+        self._subscriptions[key] = (data, list(channels))
+        if key in self._subscribed:
+            return True
+        if not self.ws or self.ws.closed:
+            return False
+        self._subscribed.add(key)
+        self._pending_channels.update(channels)
+        return await self._send(data)
+
+    def channel_of(self, msg):
+        """ 从消息中解析频道名称，用于判断订阅的频道是否已恢复推送
+        * NOTE: 子类按需实现，返回None时首条消息即认为所有订阅频道已恢复
+        """
+        return None
+
+    async def channel_live(self, channel):
+        """ 订阅的频道在(重)连接后收到第一条消息的回调函数
+        * NOTE: 子类按需实现
+        """
+        pass
+
+    def _check_channel_live(self, msg):
+        """ 收到频道的第一条消息时，标记该频道已恢复
+        """
+        try:
+            channel = self.channel_of(msg)
+        except:
+            return
+        channels = [channel] if channel is not None else list(self._pending_channels)
+        for channel in channels:
+            if channel not in self._pending_channels:
+                continue
+            self._pending_channels.discard(channel)
+            logger.info("channel live:", channel, "uptime(ms):", self._stats.uptime, caller=self)
+            asyncio.get_event_loop().create_task(self.channel_live(channel))
+
     async def connected_callback(self):
         """ 连接建立成功的回调函数
         * NOTE: 子类继承实现
@@ -70,23 +182,46 @@ class Websocket:
     async def receive(self):
         """ 接收消息
         """
-        async for msg in self.ws:
+        ws = self.ws
+        recorder = self._recorder
+        async for msg in ws:
+            set_receive_time()
+            if recorder and msg.type in RECORD_KINDS:
+                recorder.record(self._conn_id, RECORD_KINDS[msg.type], msg.data)
+            if self._stats.on_message():
+                logger.info("first message received, time to first message(ms):",
+                            self._stats.time_to_first_message, caller=self)
             if msg.type == aiohttp.WSMsgType.TEXT:
-                try:
-                    data = json.loads(msg.data)
-                except:
-                    data = msg.data
+                if self._parse_in_thread_size and len(msg.data) >= self._parse_in_thread_size:
+                    data = await asyncio.get_event_loop().run_in_executor(None, loads_message, msg.data)
+                else:
+                    data = loads_message(msg.data)
+                if self._pending_channels:
+                    self._check_channel_live(data)
                 await asyncio.get_event_loop().create_task(self.process(data))
             elif msg.type == aiohttp.WSMsgType.BINARY:
                 await asyncio.get_event_loop().create_task(self.process_binary(msg.data))
             elif msg.type == aiohttp.WSMsgType.CLOSED:
                 logger.warn("receive event CLOSED:", msg, caller=self)
-                await asyncio.get_event_loop().create_task(self._reconnect())
-                return
+                break
             elif msg.type == aiohttp.WSMsgType.ERROR:
                 logger.error("receive event ERROR:", msg, caller=self)
             else:
                 logger.warn("unhandled msg:", msg, caller=self)
+        # 连接已被服务端或网络断开，立即重连，不等待 _check_connection
+        if ws is self.ws:
+            asyncio.get_event_loop().create_task(self._reconnect(ws))
+
+    async def feed(self, kind, data):
+        """ 按接收到的原始消息处理，用于行情回放
+        @param kind KIND_TEXT / KIND_BINARY
+        @param data 原始消息，text消息为str，binary消息为bytes
+        """
+        set_receive_time(tools.get_cur_timestamp_ms())
+        if kind == KIND_TEXT:
+            await self.process(loads_message(data))
+        else:
+            await self.process_binary(data)
 
     async def process(self, msg):
         """ 处理websocket上接收到的消息 text 类型
@@ -104,11 +239,13 @@ class Websocket:
         """ 检查连接是否正常
         """
         # 检查websocket连接是否关闭，如果关闭，那么立即重连
+        if self._connecting:
+            return
         if not self.ws:
             logger.warn("websocket connection not connected yet!", caller=self)
             return
         if self.ws.closed:
-            await asyncio.get_event_loop().create_task(self._reconnect())
+            await asyncio.get_event_loop().create_task(self._reconnect(self.ws))
             return
 
     async def _send_heartbeat_msg(self, *args, **kwargs):
@@ -126,3 +263,21 @@ class Websocket:
                 logger.error("send heartbeat msg failed! heartbeat msg:", self.heartbeat_msg, caller=self)
                 return
             logger.debug("send ping message:", self.heartbeat_msg, caller=self)
+
+    async def _send(self, data):
+        """ 发送消息给服务器
+        @param data 消息内容，dict或者str
+        @return 发送成功返回True，否则返回False
+        """
+        if not self.ws:
+            logger.warn("websocket connection not connected yet!", caller=self)
+            return False
+        if isinstance(data, dict):
+            await self.ws.send_json(data)
+        elif isinstance(data, str):
+            await self.ws.send_str(data)
+        else:
+            logger.error("send message failed:", data, caller=self)
+            return False
+        logger.debug("send message:", data, caller=self)
+        return True
@@ -10,6 +10,7 @@ setup(
         "quant",
         "quant.utils",
         "quant.platform",
+        "quant.transport",
     ],
     description="Asynchronous driven quantitative trading framework.",
     url="",